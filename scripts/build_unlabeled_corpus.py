@@ -1,13 +1,49 @@
 #!/usr/bin/env python3
-"""Build unlabeled tweet text corpus for optional teacher DAPT (MLM)."""
+"""Build unlabeled tweet text corpus for optional teacher DAPT (MLM).
+
+Inputs are streamed in line-aligned byte ranges by worker processes. The
+workers clean each text, then compute its exact digest and its MinHash LSH
+band keys (near_dup.py). The main process keeps input order and drops:
+
+- exact duplicates, found with a seen-set of blake2b digests;
+- near duplicates: texts whose MinHash Jaccard with an earlier kept text is
+  at least ``--near-dup-threshold``, e.g. template spam with swapped handles.
+  LSH band buckets only propose candidates. Each candidate is confirmed
+  against the kept text's signature, stored on disk (near_dup.SignatureIndex).
+
+At most ``2 * --workers`` chunks are in flight at once, so workers cannot run
+ahead of the main loop. By default the exact seen-set is a fixed-size Bloom
+filter, and another Bloom filter screens band keys before the disk lookup.
+Memory is therefore bounded by ``--expected-rows`` and ``--chunk-mb``.
+``--index sqlite`` keeps exact digests on disk too. Drop statistics,
+including the LSH candidates rejected below the threshold, are written next
+to the output as ``.meta.json``.
+"""
 
 from __future__ import annotations
 
 import argparse
 import hashlib
+import json
+import multiprocessing as mp
+import tempfile
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import asdict, dataclass
 from pathlib import Path
 
-from transformer_common import DATA_DIR, clean_text, load_jsonl
+import numpy as np
+
+from near_dup import (
+    BloomFilter,
+    MinHashConfig,
+    MinHasher,
+    SignatureIndex,
+    SqliteKeyIndex,
+    band_keys,
+    lsh_params,
+)
+from transformer_common import DATA_DIR, clean_text, save_json, utc_now_iso
 
 DEFAULT_INPUTS = [
     DATA_DIR / "train.jsonl",
@@ -17,6 +53,14 @@ DEFAULT_INPUTS = [
 DEFAULT_OUTPUT = DATA_DIR / "transformer" / "unlabeled_corpus.txt"
 
 
+@dataclass(frozen=True)
+class CleanOptions:
+    min_chars: int
+    normalize: bool
+    lowercase: bool
+    strip_urls: bool
+
+
 def iter_input_paths(paths_value: str | None) -> list[Path]:
     if not paths_value:
         return list(DEFAULT_INPUTS)
@@ -29,8 +73,106 @@ def iter_input_paths(paths_value: str | None) -> list[Path]:
     return out
 
 
+def plan_chunks(paths: list[Path], chunk_bytes: int) -> list[tuple[str, int, int]]:
+    """Split each file into line-aligned (path, start, end) byte ranges."""
+
+    tasks: list[tuple[str, int, int]] = []
+    for path in paths:
+        size = path.stat().st_size
+        start = 0
+        with path.open("rb") as handle:
+            while start < size:
+                handle.seek(min(start + chunk_bytes, size))
+                if handle.tell() < size:
+                    handle.readline()
+                end = handle.tell()
+                tasks.append((str(path), start, end))
+                start = end
+    return tasks
+
+
+_OPTIONS: CleanOptions | None = None
+_HASHER: MinHasher | None = None
+_BANDS = (0, 0)
+
+
+def _init_worker(options: CleanOptions, config: MinHashConfig | None) -> None:
+    global _OPTIONS, _HASHER, _BANDS
+    _OPTIONS = options
+    _HASHER = MinHasher(config) if config is not None else None
+    if config is not None:
+        _BANDS = lsh_params(config.threshold, config.num_perm)
+
+
+def process_chunk(task: tuple[str, int, int]) -> dict:
+    """Clean one byte range; return kept candidates with their dedup keys."""
+
+    assert _OPTIONS is not None
+    path, start, end = task
+    rows: list[tuple[str, bytes, list[bytes], np.ndarray | None]] = []
+    skipped_empty = 0
+    skipped_short = 0
+    with open(path, "rb") as handle:
+        handle.seek(start)
+        while handle.tell() < end:
+            line = handle.readline().strip()
+            if not line:
+                continue
+            sample = json.loads(line)
+            text_raw = sample.get("text") or sample.get("raw_text") or ""
+            text = clean_text(
+                text_raw,
+                normalize=_OPTIONS.normalize,
+                lowercase=_OPTIONS.lowercase,
+                strip_urls=_OPTIONS.strip_urls,
+            )
+            if not text:
+                skipped_empty += 1
+                continue
+            if len(text) < _OPTIONS.min_chars:
+                skipped_short += 1
+                continue
+            digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+            keys: list[bytes] = []
+            signature = None
+            if _HASHER is not None:
+                bands, rows_per_band = _BANDS
+                signature = _HASHER.signature(text)
+                keys = band_keys(signature, bands=bands, rows=rows_per_band)
+            rows.append((text, digest, keys, signature))
+    return {
+        "path": path,
+        "rows": rows,
+        "skipped_empty": skipped_empty,
+        "skipped_short": skipped_short,
+    }
+
+
+def imap_bounded(pool, func: Callable, tasks: Iterable, *, window: int) -> Iterator:
+    """Ordered ``pool.imap`` with at most ``window`` tasks submitted ahead.
+
+    ``Pool.imap`` queues every task at once, so fast workers could pile up
+    finished chunks while the main loop is busy with the dedup index.
+    """
+
+    pending: deque = deque()
+    task_iter = iter(tasks)
+    for task in task_iter:
+        pending.append(pool.apply_async(func, (task,)))
+        if len(pending) >= window:
+            break
+    while pending:
+        result = pending.popleft().get()
+        for task in task_iter:
+            pending.append(pool.apply_async(func, (task,)))
+            break
+        yield result
+
+
 def main() -> None:
-    parser = argparse.ArgumentParser(description=__doc__)
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
     parser.add_argument(
         "--inputs",
         type=str,
@@ -43,6 +185,37 @@ def main() -> None:
     parser.add_argument("--strip-urls", action="store_true")
     parser.add_argument("--no-normalize", action="store_true")
     parser.add_argument("--no-lowercase", action="store_true")
+    parser.add_argument(
+        "--no-near-dup",
+        action="store_true",
+        help="Only drop exact duplicates.",
+    )
+    parser.add_argument("--near-dup-threshold", type=float, default=0.8)
+    parser.add_argument("--num-perm", type=int, default=128)
+    parser.add_argument("--shingle-size", type=int, default=5)
+    parser.add_argument(
+        "--index",
+        choices=("bloom", "sqlite"),
+        default="bloom",
+        help="bloom = Bloom filter for exact digests (tiny false-drop rate) and "
+        "as a prefilter for band keys; sqlite = exact digests on disk. "
+        "Near duplicates are verified against stored signatures either way",
+    )
+    parser.add_argument(
+        "--expected-rows",
+        type=int,
+        default=2_000_000,
+        help="Bloom filter sizing; exceeding it raises the false-drop rate",
+    )
+    parser.add_argument("--bloom-error-rate", type=float, default=1e-6)
+    parser.add_argument(
+        "--index-dir",
+        type=Path,
+        default=None,
+        help="Directory for the sqlite indexes (default: a temporary directory)",
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk-mb", type=float, default=16.0)
     args = parser.parse_args()
 
     paths = iter_input_paths(args.inputs)
@@ -52,47 +225,141 @@ def main() -> None:
         if not path.exists():
             raise SystemExit(f"Input not found: {path}")
 
-    seen: set[str] = set()
+    options = CleanOptions(
+        min_chars=args.min_chars,
+        normalize=not args.no_normalize,
+        lowercase=not args.no_lowercase,
+        strip_urls=args.strip_urls,
+    )
+    config: MinHashConfig | None = None
+    if not args.no_near_dup:
+        try:
+            config = MinHashConfig(
+                num_perm=args.num_perm,
+                shingle_size=args.shingle_size,
+                threshold=args.near_dup_threshold,
+            )
+        except ValueError as exc:
+            raise SystemExit(str(exc)) from exc
+    bands = lsh_params(config.threshold, config.num_perm)[0] if config else 0
+    tasks = plan_chunks(paths, max(1, int(args.chunk_mb * 1024 * 1024)))
+
+    per_input = {
+        str(path): {
+            "kept": 0,
+            "exact_dups": 0,
+            "near_dups": 0,
+            "skipped_empty": 0,
+            "skipped_short": 0,
+        }
+        for path in paths
+    }
     kept = 0
-    skipped_short = 0
-    skipped_empty = 0
 
-    args.output.parent.mkdir(parents=True, exist_ok=True)
-    with args.output.open("w", encoding="utf-8", newline="\n") as out_f:
-        for path in paths:
-            for sample in load_jsonl(path):
-                text_raw = sample.get("text") or sample.get("raw_text") or ""
-                text = clean_text(
-                    text_raw,
-                    normalize=not args.no_normalize,
-                    lowercase=not args.no_lowercase,
-                    strip_urls=args.strip_urls,
-                )
-                if not text:
-                    skipped_empty += 1
-                    continue
-                if len(text) < args.min_chars:
-                    skipped_short += 1
-                    continue
-
-                digest = hashlib.blake2b(
-                    text.encode("utf-8"), digest_size=16
-                ).hexdigest()
-                if digest in seen:
-                    continue
-                seen.add(digest)
-
-                out_f.write(text + "\n")
-                kept += 1
+    with tempfile.TemporaryDirectory() as tmp:
+        index_dir = args.index_dir or Path(tmp)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        db_paths = [
+            index_dir / f"corpus_dedup_{name}.sqlite" for name in ("exact", "bands")
+        ]
+        for db_path in db_paths:
+            db_path.unlink(missing_ok=True)
+        prefilter = None
+        if args.index == "sqlite":
+            exact_index = SqliteKeyIndex(db_paths[0], table="exact")
+        else:
+            try:
+                exact_index = BloomFilter(args.expected_rows, args.bloom_error_rate)
+                if config is not None:
+                    prefilter = BloomFilter(
+                        max(1, args.expected_rows * bands), args.bloom_error_rate
+                    )
+            except ValueError as exc:
+                raise SystemExit(str(exc)) from exc
+        near_index = None
+        if config is not None:
+            near_index = SignatureIndex(
+                db_paths[1], threshold=config.threshold, prefilter=prefilter
+            )
+
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with (
+            args.output.open("w", encoding="utf-8", newline="\n") as out_f,
+            mp.get_context("spawn").Pool(
+                max(1, args.workers),
+                initializer=_init_worker,
+                initargs=(options, config),
+            ) as pool,
+        ):
+            for result in imap_bounded(
+                pool, process_chunk, tasks, window=2 * max(1, args.workers)
+            ):
+                stats = per_input[result["path"]]
+                stats["skipped_empty"] += result["skipped_empty"]
+                stats["skipped_short"] += result["skipped_short"]
+                for text, digest, keys, signature in result["rows"]:
+                    if exact_index.contains_any([digest]):
+                        stats["exact_dups"] += 1
+                        continue
+                    exact_index.add_all([digest])
+                    if near_index is not None:
+                        if near_index.find(keys, signature):
+                            stats["near_dups"] += 1
+                            continue
+                        near_index.add(keys, signature)
+
+                    out_f.write(text + "\n")
+                    stats["kept"] += 1
+                    kept += 1
+                    if args.max_rows > 0 and kept >= args.max_rows:
+                        break
                 if args.max_rows > 0 and kept >= args.max_rows:
+                    pool.terminate()
                     break
-            if args.max_rows > 0 and kept >= args.max_rows:
-                break
 
+        index_stats = {"exact": exact_index.stats()}
+        if isinstance(exact_index, SqliteKeyIndex):
+            exact_index.close()
+        if near_index is not None:
+            index_stats["near"] = near_index.stats()
+            near_index.close()
+
+    totals = {
+        key: sum(item[key] for item in per_input.values())
+        for key in ("kept", "exact_dups", "near_dups", "skipped_empty", "skipped_short")
+    }
+    save_json(
+        args.output.with_suffix(".meta.json"),
+        {
+            "created_at": utc_now_iso(),
+            "inputs": [str(path) for path in paths],
+            "output": str(args.output),
+            "options": asdict(options),
+            "near_dup": config.to_dict() if config else None,
+            "index": index_stats,
+            "max_rows": args.max_rows,
+            "totals": totals,
+            "per_input": per_input,
+        },
+    )
     print(
         f"Wrote {kept} unique lines to {args.output} "
-        f"(skipped_empty={skipped_empty}, skipped_short={skipped_short})"
+        f"(exact_dups={totals['exact_dups']}, near_dups={totals['near_dups']}, "
+        f"skipped_empty={totals['skipped_empty']}, "
+        f"skipped_short={totals['skipped_short']})"
     )
+    if near_index is not None:
+        print(
+            f"Near-dup LSH candidates: {near_index.candidates} "
+            f"(rejected below threshold {config.threshold}: {near_index.rejected})"
+        )
+    exact_stats = index_stats["exact"]
+    if exact_stats.get("expected_error_rate", 0.0) > 10 * args.bloom_error_rate:
+        print(
+            "Warning: exact Bloom filter is over capacity "
+            f"(false-drop rate ~{exact_stats['expected_error_rate']:.2e}); "
+            "raise --expected-rows."
+        )
 
 
 if __name__ == "__main__":
@@ -1,10 +1,17 @@
 #!/usr/bin/env python3
-"""Cache calibrated teacher logits (and hidden states) for student distillation."""
+"""Cache calibrated teacher logits (and CLS hidden states) for student distillation."""
 
 from __future__ import annotations
 
 import argparse
+import gc
+import hashlib
 import json
+import multiprocessing as mp
+import os
+import shutil
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
 from pathlib import Path
 
 import numpy as np
@@ -12,19 +19,28 @@ import torch
 from torch import nn
 from torch.utils.data import DataLoader, Dataset
 from tqdm.auto import tqdm
-from transformers import AutoModel, AutoTokenizer
+from transformers import AutoConfig, AutoTokenizer
 
+from logits_store import (
+    LogitsStore,
+    is_logits_store,
+    merge_logits_stores,
+    open_logits_cache,
+    write_logits_store,
+)
+from teacher_runtime import JanitrTeacherModel
 from transformer_common import (
     DATA_DIR,
     MODELS_DIR,
     TRAINING_CLASSES,
     PreparedRecord,
+    autocast_settings,
     current_git_commit,
     hash_label_map,
     hash_prepared_rows,
     load_json,
     load_prepared_rows,
-    require_cuda,
+    resolve_device,
     save_json,
     set_seed,
     stable_object_hash,
@@ -37,36 +53,6 @@ DEFAULT_TEACHER_DIR = MODELS_DIR / "teacher"
 DEFAULT_CALIBRATION = MODELS_DIR / "teacher_calibration.json"
 
 
-class JanitrTeacherModel(nn.Module):
-    def __init__(self, model_name_or_path: str) -> None:
-        super().__init__()
-        self.encoder = AutoModel.from_pretrained(
-            model_name_or_path,
-            output_hidden_states=True,
-        )
-        hidden_size = int(self.encoder.config.hidden_size)
-        dropout_prob = float(getattr(self.encoder.config, "hidden_dropout_prob", 0.1))
-        self.dropout = nn.Dropout(dropout_prob)
-        self.head_scam_clean = nn.Linear(hidden_size, 2)
-        self.head_topic = nn.Linear(hidden_size, 1)
-
-    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> dict:
-        out = self.encoder(
-            input_ids=input_ids,
-            attention_mask=attention_mask,
-            output_hidden_states=True,
-            return_dict=True,
-        )
-        cls = self.dropout(out.last_hidden_state[:, 0])
-        scam_logits = self.head_scam_clean(cls)
-        topic_logits = self.head_topic(cls).squeeze(-1)
-        return {
-            "scam_logits": scam_logits,
-            "topic_logits": topic_logits,
-            "hidden_states": out.hidden_states,
-        }
-
-
 class PreparedDataset(Dataset):
     def __init__(self, rows: list[PreparedRecord], tokenizer, max_length: int) -> None:
         self.rows = rows
@@ -132,7 +118,7 @@ def layer_indices(num_hidden_layers: int, target_layers: int = 4) -> list[int]:
 
 
 def load_teacher(
-    seed_dir: Path, device: torch.device
+    seed_dir: Path, device: torch.device, *, quantize_int8: bool = False
 ) -> tuple[JanitrTeacherModel, any, int, str]:
     config_path = seed_dir / "teacher_config.json"
     if not config_path.exists():
@@ -147,126 +133,759 @@ def load_teacher(
     model = JanitrTeacherModel(model_name)
     state = torch.load(seed_dir / "pytorch_model.bin", map_location="cpu")
     model.load_state_dict(state)
+    if quantize_int8:
+        # Dynamic int8 on the encoder Linears only; the tiny heads stay fp32.
+        model.encoder = torch.ao.quantization.quantize_dynamic(
+            model.encoder, {nn.Linear}, dtype=torch.qint8
+        )
     model.to(device)
     model.eval()
     return model, tokenizer, max_length, model_name
 
 
+CACHE_FINGERPRINT_KEYS = (
+    "teacher_id",
+    "calibration_id",
+    "seeds",
+    "label_map_hash",
+    "split",
+    "split_hash",
+)
+CONSTANT_COLUMNS = ("hidden_layer_indices", "scam_temp", "topic_temp")
+# Allowed drift vs a reference cache, per scoring dtype. References usually come
+# from the GPU bf16/fp16 path and are stored as fp16, so fp32 still sees noise.
+PARITY_TOLERANCES = {
+    "fp32": {
+        "max_abs_logit": 0.1,
+        "mean_abs_logit": 0.02,
+        "min_label_agreement": 0.99,
+        "min_hidden_cosine": 0.995,
+    },
+    "fp16": {
+        "max_abs_logit": 0.25,
+        "mean_abs_logit": 0.05,
+        "min_label_agreement": 0.98,
+        "min_hidden_cosine": 0.99,
+    },
+    "bf16": {
+        "max_abs_logit": 0.25,
+        "mean_abs_logit": 0.05,
+        "min_label_agreement": 0.98,
+        "min_hidden_cosine": 0.99,
+    },
+    "int8": {
+        "max_abs_logit": 0.5,
+        "mean_abs_logit": 0.1,
+        "min_label_agreement": 0.97,
+        "min_hidden_cosine": 0.98,
+    },
+}
+
+
+def shard_dir_for(out_path: Path) -> Path:
+    return out_path.with_name(f"{out_path.name}.shards")
+
+
+def check_existing_metadata(
+    meta_path: Path, metadata: dict, *, keys: tuple[str, ...] = CACHE_FINGERPRINT_KEYS
+) -> None:
+    if not meta_path.exists():
+        return
+    existing = load_json(meta_path)
+    for key in keys:
+        if existing.get(key) != metadata.get(key):
+            raise SystemExit(
+                f"Existing cache metadata mismatch for {meta_path} key={key}: "
+                f"existing={existing.get(key)} new={metadata.get(key)}"
+            )
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def plan_reuse(
+    *,
+    base_cache: Path,
+    rows: list[PreparedRecord],
+    metadata: dict,
+    hid_indices: list[int],
+) -> tuple[list[int], dict]:
+    """Map each row to its index in base_cache (same id + text hash) or -1."""
+
+    base_meta_path = Path(f"{base_cache}.meta.json")
+    if not base_meta_path.exists():
+        raise SystemExit(
+            f"Base cache metadata missing: {base_meta_path}. Cannot reuse rows safely."
+        )
+    base_meta = load_json(base_meta_path)
+    # Rows can only be reused from the same teacher ensemble and calibration.
+    for key in ("teacher_id", "calibration_id", "seeds", "label_map_hash"):
+        if base_meta.get(key) != metadata.get(key):
+            raise SystemExit(
+                f"Base cache {base_cache} was built with a different {key}: "
+                f"base={base_meta.get(key)} current={metadata.get(key)}"
+            )
+
+    base = open_logits_cache(base_cache)
+    base_layers = [int(x) for x in np.asarray(base["hidden_layer_indices"])]
+    if base_layers != list(hid_indices):
+        raise SystemExit(
+            f"Base cache hidden layers {base_layers} != current teacher layers {hid_indices}"
+        )
+    base_ids = base["ids"].tolist()
+    base_texts = base["texts"].tolist()
+    base_index = {
+        (str(sample_id), text_sha256(text)): idx
+        for idx, (sample_id, text) in enumerate(zip(base_ids, base_texts, strict=True))
+    }
+    reuse = [
+        base_index.get((row.id, text_sha256(row.text_normalized)), -1) for row in rows
+    ]
+    reused = sum(1 for idx in reuse if idx >= 0)
+    info = {
+        "base_cache": str(base_cache),
+        "base_logits_cache_id": base_meta.get("logits_cache_id"),
+        "base_split_hash": base_meta.get("split_hash"),
+        "reused_rows": reused,
+        "scored_rows": len(rows) - reused,
+    }
+    return reuse, info
+
+
+def load_progress(
+    shard_dir: Path, *, fingerprint: str, fresh: bool
+) -> dict[str, object]:
+    progress_path = shard_dir / "progress.json"
+    if fresh and shard_dir.exists():
+        shutil.rmtree(shard_dir)
+    if progress_path.exists():
+        progress = load_json(progress_path)
+        if progress.get("fingerprint") != fingerprint:
+            raise SystemExit(
+                f"Shard progress at {progress_path} was written for a different "
+                "teacher/calibration/split/shard layout. Re-run with --fresh to discard it."
+            )
+        return progress
+    return {}
+
+
+def teacher_layout(seed_dirs: list[Path]) -> tuple[int, list[int], int]:
+    """Return (max_length, hidden layer indices, hidden size) without loading weights."""
+
+    max_lengths: list[int] = []
+    num_layers: set[int] = set()
+    hidden_sizes: set[int] = set()
+    for seed_dir in seed_dirs:
+        config_path = seed_dir / "teacher_config.json"
+        if not config_path.exists():
+            raise SystemExit(f"Missing teacher config at {config_path}")
+        config = load_json(config_path)
+        max_lengths.append(int(config.get("max_length", 96)))
+        encoder_config = AutoConfig.from_pretrained(str(config["model_name_or_path"]))
+        num_layers.add(int(encoder_config.num_hidden_layers))
+        hidden_sizes.add(int(encoder_config.hidden_size))
+    if len(num_layers) != 1 or len(hidden_sizes) != 1:
+        raise SystemExit(
+            f"Teacher seeds disagree on encoder shape: layers={sorted(num_layers)} "
+            f"hidden={sorted(hidden_sizes)}"
+        )
+    return (
+        min(max_lengths),
+        layer_indices(num_layers.pop(), target_layers=4),
+        hidden_sizes.pop(),
+    )
+
+
+@dataclass(frozen=True)
+class ScoringConfig:
+    seed_dirs: tuple[Path, ...]
+    device: str
+    dtype: str
+    batch_size: int
+    threads: int | None = None
+    # Ensemble max_length, so single-seed scorers truncate like the full ensemble.
+    max_length: int | None = None
+    # "batch": every seed resident, averaged per batch. "seed": one seed resident
+    # at a time, summed over the split (see run_seed_passes).
+    ensemble_schedule: str = "batch"
+
+
+class TeacherScorer:
+    """Seed ensemble that turns prepared rows into averaged logits + CLS states."""
+
+    def __init__(self, config: ScoringConfig) -> None:
+        self.device = torch.device(config.device)
+        self.batch_size = config.batch_size
+        # CUDA keeps fixed-length padding so existing GPU caches stay bit-stable;
+        # CPU trims every batch to its longest row.
+        self.dynamic_padding = self.device.type == "cpu"
+        self.use_amp, self.amp_dtype = autocast_settings(
+            self.device.type, "fp32" if config.dtype == "int8" else config.dtype
+        )
+
+        self.models: list[JanitrTeacherModel] = []
+        tokenizers = []
+        max_lengths: list[int] = []
+        for seed_dir in config.seed_dirs:
+            model, tokenizer, max_length, _model_name = load_teacher(
+                seed_dir, device=self.device, quantize_int8=config.dtype == "int8"
+            )
+            self.models.append(model)
+            tokenizers.append(tokenizer)
+            max_lengths.append(max_length)
+
+        self.tokenizer = tokenizers[0]
+        self.max_length = config.max_length or min(max_lengths)
+        num_layers = int(self.models[0].encoder.config.num_hidden_layers)
+        self.hid_indices = layer_indices(num_layers, target_layers=4)
+
+    def score(self, rows: list[PreparedRecord], *, desc: str) -> dict[str, np.ndarray]:
+        dataset = PreparedDataset(rows, self.tokenizer, max_length=self.max_length)
+        loader = DataLoader(
+            dataset, batch_size=self.batch_size, shuffle=False, collate_fn=collate
+        )
+
+        scam_logits_raw: list[np.ndarray] = []
+        topic_logits_raw: list[np.ndarray] = []
+        hidden_cls: list[np.ndarray] = []
+
+        with torch.inference_mode():
+            for batch in tqdm(loader, desc=desc):
+                input_ids = batch["input_ids"]
+                attention_mask = batch["attention_mask"]
+                if self.dynamic_padding:
+                    longest = int(attention_mask.sum(dim=1).max())
+                    input_ids = input_ids[:, :longest]
+                    attention_mask = attention_mask[:, :longest]
+                input_ids = input_ids.to(self.device)
+                attention_mask = attention_mask.to(self.device)
+
+                seed_scam: list[np.ndarray] = []
+                seed_topic: list[np.ndarray] = []
+                seed_hidden: list[np.ndarray] = []
+
+                for model in self.models:
+                    with torch.autocast(
+                        device_type=self.device.type,
+                        enabled=self.use_amp,
+                        dtype=self.amp_dtype,
+                    ):
+                        out = model(
+                            input_ids=input_ids,
+                            attention_mask=attention_mask,
+                            cls_layers=self.hid_indices,
+                        )
+                    scam = out["scam_logits"].cpu().float().numpy()
+                    topic = out["topic_logits"].cpu().float().numpy().reshape(-1)
+                    # [batch, len(hid_indices), hidden]: CLS rows only, sliced
+                    # on device so full layer activations never leave it.
+                    hidden = out["hidden_cls"].cpu().float().numpy()
+
+                    seed_scam.append(scam)
+                    seed_topic.append(topic)
+                    seed_hidden.append(hidden)
+
+                scam_logits_raw.append(np.mean(np.stack(seed_scam, axis=0), axis=0))
+                topic_logits_raw.append(np.mean(np.stack(seed_topic, axis=0), axis=0))
+                hidden_cls.append(np.mean(np.stack(seed_hidden, axis=0), axis=0))
+
+        return {
+            "scam_logits": np.concatenate(scam_logits_raw).astype(np.float32),
+            "topic_logits": np.concatenate(topic_logits_raw).astype(np.float32),
+            "hidden": np.concatenate(hidden_cls).astype(np.float32),
+        }
+
+
+TEACHER_COLUMNS = (
+    "scam_logits_raw",
+    "topic_logits_raw",
+    "scam_logits_cal",
+    "topic_logits_cal",
+    "teacher_hidden_cls",
+)
+
+
+def teacher_columns(
+    scored: dict[str, np.ndarray], *, scam_temp: float, topic_temp: float
+) -> dict[str, np.ndarray]:
+    scam_logits = scored["scam_logits"]
+    topic_logits = scored["topic_logits"]
+    return {
+        "scam_logits_raw": scam_logits.astype(np.float16),
+        "topic_logits_raw": topic_logits.astype(np.float16),
+        "scam_logits_cal": (scam_logits / float(scam_temp)).astype(np.float16),
+        "topic_logits_cal": (topic_logits / float(topic_temp)).astype(np.float16),
+        "teacher_hidden_cls": scored["hidden"].astype(np.float16),
+    }
+
+
+def write_shard(
+    path: Path,
+    *,
+    rows: list[PreparedRecord],
+    teacher: dict[str, np.ndarray],
+    hid_indices: list[int],
+    scam_temp: float,
+    topic_temp: float,
+) -> None:
+    write_logits_store(
+        path,
+        arrays={
+            "y_scam_clean": np.array(
+                [int(row.y_scam_clean) for row in rows], dtype=np.int64
+            ),
+            "y_topic": np.array([int(row.y_topics[0]) for row in rows], dtype=np.int64),
+            **{name: teacher[name] for name in TEACHER_COLUMNS},
+            "hidden_layer_indices": np.array(hid_indices, dtype=np.int64),
+            "scam_temp": np.array([scam_temp], dtype=np.float32),
+            "topic_temp": np.array([topic_temp], dtype=np.float32),
+        },
+        strings={
+            "ids": [row.id for row in rows],
+            "texts": [row.text_normalized for row in rows],
+            "collapsed_label": [row.collapsed_label for row in rows],
+        },
+    )
+
+
+@dataclass(frozen=True)
+class ShardTask:
+    shard_idx: int
+    rows: list[PreparedRecord]
+    path: Path
+    desc: str
+    scam_temp: float
+    topic_temp: float
+    hid_indices: list[int]
+    # Incremental mode: per-row index into base_cache, or -1 to score the row.
+    base_cache: Path | None = None
+    reuse: list[int] | None = None
+    # Seed schedule: rows to score were summed into this accumulator (starting at
+    # ensemble_offset) by run_seed_passes and only need dividing by num_seeds.
+    ensemble_dir: Path | None = None
+    ensemble_offset: int = 0
+    num_seeds: int = 1
+
+
+# Per-process scoring state used by the scoring pool (or the main process when
+# --workers=1). The teacher is only loaded once a row actually needs scoring.
+_SCORING_CONFIG: ScoringConfig | None = None
+_SCORER: TeacherScorer | None = None
+_SCORER_SEEDS: tuple[Path, ...] | None = None
+_BASE_CACHES: dict[Path, object] = {}
+
+
+def init_scoring_worker(config: ScoringConfig, core_queue=None) -> None:
+    global _SCORING_CONFIG
+    if core_queue is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, core_queue.get())
+    if config.threads is not None:
+        torch.set_num_threads(config.threads)
+    _SCORING_CONFIG = config
+    release_scorer()
+    _BASE_CACHES.clear()
+
+
+def release_scorer() -> None:
+    global _SCORER, _SCORER_SEEDS
+    if _SCORER is None:
+        return
+    _SCORER = None
+    _SCORER_SEEDS = None
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def get_scorer(seed_dirs: tuple[Path, ...] | None = None) -> TeacherScorer:
+    """Return this process's scorer for `seed_dirs` (default: every seed).
+
+    Only one scorer stays resident; asking for other seeds frees the current
+    models before the next ones are loaded.
+    """
+
+    global _SCORER, _SCORER_SEEDS
+    assert _SCORING_CONFIG is not None
+    seed_dirs = seed_dirs or _SCORING_CONFIG.seed_dirs
+    if _SCORER is None or _SCORER_SEEDS != seed_dirs:
+        release_scorer()
+        _SCORER = TeacherScorer(replace(_SCORING_CONFIG, seed_dirs=seed_dirs))
+        _SCORER_SEEDS = seed_dirs
+    return _SCORER
+
+
+def score_shard_task(task: ShardTask) -> int:
+    reuse = task.reuse if task.reuse is not None else [-1] * len(task.rows)
+    missing = [pos for pos, src in enumerate(reuse) if src < 0]
+    reused = [pos for pos, src in enumerate(reuse) if src >= 0]
+
+    fresh: dict[str, np.ndarray] = {}
+    if missing:
+        if task.ensemble_dir is not None:
+            scored = read_ensemble_mean(
+                task.ensemble_dir,
+                start=task.ensemble_offset,
+                count=len(missing),
+                num_seeds=task.num_seeds,
+            )
+        else:
+            scored = get_scorer().score(
+                [task.rows[pos] for pos in missing], desc=task.desc
+            )
+        fresh = teacher_columns(
+            scored, scam_temp=task.scam_temp, topic_temp=task.topic_temp
+        )
+    if not reused:
+        teacher = fresh
+    else:
+        assert task.base_cache is not None
+        if task.base_cache not in _BASE_CACHES:
+            _BASE_CACHES[task.base_cache] = open_logits_cache(task.base_cache)
+        base = _BASE_CACHES[task.base_cache]
+        src_rows = np.array([reuse[pos] for pos in reused], dtype=np.int64)
+        teacher = {}
+        for name in TEACHER_COLUMNS:
+            # Reused rows are copied verbatim, so they stay bit-identical to the base.
+            base_part = np.asarray(base[name][src_rows], dtype=np.float16)
+            column = np.empty((len(task.rows), *base_part.shape[1:]), dtype=np.float16)
+            column[reused] = base_part
+            if missing:
+                if fresh[name].shape[1:] != base_part.shape[1:]:
+                    raise SystemExit(
+                        f"Base cache column '{name}' shape {base_part.shape[1:]} does "
+                        f"not match freshly scored rows {fresh[name].shape[1:]}"
+                    )
+                column[missing] = fresh[name]
+            teacher[name] = column
+
+    write_shard(
+        task.path,
+        rows=task.rows,
+        teacher=teacher,
+        hid_indices=task.hid_indices,
+        scam_temp=task.scam_temp,
+        topic_temp=task.topic_temp,
+    )
+    return task.shard_idx
+
+
+def score_sample_task(rows: list[PreparedRecord]) -> dict[str, np.ndarray]:
+    assert _SCORING_CONFIG is not None
+    if _SCORING_CONFIG.ensemble_schedule != "seed":
+        return get_scorer().score(rows, desc="Parity sample")
+    sums: dict[str, np.ndarray] = {}
+    for seed_dir in _SCORING_CONFIG.seed_dirs:
+        scored = get_scorer((seed_dir,)).score(
+            rows, desc=f"Parity sample ({seed_dir.name})"
+        )
+        for name, values in scored.items():
+            sums[name] = values.copy() if name not in sums else sums[name] + values
+    release_scorer()
+    num_seeds = len(_SCORING_CONFIG.seed_dirs)
+    return {name: total / num_seeds for name, total in sums.items()}
+
+
+# Float32 running sums written by the seed schedule; names match TeacherScorer.score.
+ENSEMBLE_COLUMNS = ("scam_logits", "topic_logits", "hidden")
+
+
+@dataclass(frozen=True)
+class SeedPassTask:
+    seed_idx: int
+    shard_idx: int
+    rows: list[PreparedRecord]
+    offset: int
+    desc: str
+    out_dir: Path
+    prev_dir: Path | None
+
+
+def score_seed_pass_task(task: SeedPassTask) -> int:
+    """Score one shard's rows with one seed and add them to the running sums.
+
+    The sum after seed k is written to a separate accumulator from the sum after
+    seed k - 1, so re-running an interrupted task never double counts.
+    """
+
+    assert _SCORING_CONFIG is not None
+    seed_dir = _SCORING_CONFIG.seed_dirs[task.seed_idx]
+    scored = get_scorer((seed_dir,)).score(task.rows, desc=task.desc)
+    window = slice(task.offset, task.offset + len(task.rows))
+    for name in ENSEMBLE_COLUMNS:
+        out = np.load(task.out_dir / f"{name}.npy", mmap_mode="r+")
+        if task.prev_dir is None:
+            out[window] = scored[name]
+        else:
+            prev = np.load(task.prev_dir / f"{name}.npy", mmap_mode="r")
+            out[window] = prev[window] + scored[name]
+        out.flush()
+        del out
+    return task.shard_idx
+
+
+def read_ensemble_mean(
+    ensemble_dir: Path, *, start: int, count: int, num_seeds: int
+) -> dict[str, np.ndarray]:
+    # Same float32 sum-then-divide as np.mean over the stacked seeds, so the
+    # result is bit-identical to the batch schedule.
+    return {
+        name: np.asarray(
+            np.load(ensemble_dir / f"{name}.npy", mmap_mode="r")[start : start + count]
+        )
+        / num_seeds
+        for name in ENSEMBLE_COLUMNS
+    }
+
+
+@contextmanager
+def scoring_pool(config: ScoringConfig, *, workers: int, pin_workers: bool):
+    """Yield an unordered map(fn, tasks) running on `workers` scoring processes."""
+
+    global _SCORING_CONFIG
+    if workers <= 1:
+        init_scoring_worker(config)
+        try:
+            yield map
+        finally:
+            _SCORING_CONFIG = None
+            release_scorer()
+            _BASE_CACHES.clear()
+        return
+
+    ctx = mp.get_context("spawn")
+    core_queue = None
+    if pin_workers:
+        if not hasattr(os, "sched_getaffinity"):
+            raise SystemExit("--pin-workers requires os.sched_setaffinity (Linux)")
+        cores = sorted(os.sched_getaffinity(0))
+        if len(cores) < workers:
+            raise SystemExit(
+                f"--pin-workers needs >= {workers} cores, have {len(cores)}"
+            )
+        core_queue = ctx.Queue()
+        # Contiguous core ranges keep each worker on one socket on typical hosts.
+        for chunk in np.array_split(np.array(cores), workers):
+            core_queue.put({int(core) for core in chunk})
+    with ctx.Pool(
+        workers, initializer=init_scoring_worker, initargs=(config, core_queue)
+    ) as pool:
+        yield pool.imap_unordered
+
+
+def run_seed_passes(
+    *,
+    ensemble_root: Path,
+    pending: list[tuple[int, list[PreparedRecord], int]],
+    total_rows: int,
+    num_seeds: int,
+    num_layers: int,
+    hidden_size: int,
+    fingerprint: str,
+    split_name: str,
+    run_tasks,
+) -> Path:
+    """Score `pending` (shard_idx, rows, offset) one seed at a time.
+
+    Each seed pass adds its logits and CLS states into float32 memory-mapped
+    running sums laid out over every row of the split that needs scoring, so
+    only one teacher is resident per process whatever the ensemble size.
+    Progress is tracked per (seed, shard); returns the accumulator holding the
+    sum over all seeds.
+    """
+
+    progress_path = ensemble_root / "progress.json"
+    progress = load_json(progress_path) if progress_path.exists() else {}
+    passes = {
+        int(seed_idx): set(shards)
+        for seed_idx, shards in progress.get("passes", {}).items()
+    }
+    sum_dirs = [ensemble_root / f"sum_{seed_idx:02d}" for seed_idx in range(num_seeds)]
+    # A shard resumes at its first missing seed, which needs the previous sum.
+    resumable = progress.get("fingerprint") == fingerprint and all(
+        seed_idx == 0 or sum_dirs[seed_idx - 1].exists()
+        for shard_idx, _rows, _offset in pending
+        for seed_idx in range(num_seeds)
+        if shard_idx not in passes.get(seed_idx, set())
+    )
+    if not resumable:
+        if ensemble_root.exists():
+            shutil.rmtree(ensemble_root)
+        passes = {}
+    ensemble_root.mkdir(parents=True, exist_ok=True)
+
+    shapes = {
+        "scam_logits": (total_rows, 2),
+        "topic_logits": (total_rows,),
+        "hidden": (total_rows, num_layers, hidden_size),
+    }
+    for seed_idx in range(num_seeds):
+        done = passes.setdefault(seed_idx, set())
+        tasks = [
+            SeedPassTask(
+                seed_idx=seed_idx,
+                shard_idx=shard_idx,
+                rows=rows,
+                offset=offset,
+                desc=f"Caching {split_name} shard {shard_idx + 1} "
+                f"(seed {seed_idx + 1}/{num_seeds})",
+                out_dir=sum_dirs[seed_idx],
+                prev_dir=sum_dirs[seed_idx - 1] if seed_idx > 0 else None,
+            )
+            for shard_idx, rows, offset in pending
+            if shard_idx not in done
+        ]
+        if tasks and not sum_dirs[seed_idx].exists():
+            sum_dirs[seed_idx].mkdir()
+            for name, shape in shapes.items():
+                np.lib.format.open_memmap(
+                    sum_dirs[seed_idx] / f"{name}.npy",
+                    mode="w+",
+                    dtype=np.float32,
+                    shape=shape,
+                ).flush()
+        for shard_idx in run_tasks(score_seed_pass_task, tasks):
+            done.add(shard_idx)
+            save_json(
+                progress_path,
+                {
+                    "version": 1,
+                    "fingerprint": fingerprint,
+                    "num_seeds": num_seeds,
+                    "passes": {
+                        str(idx): sorted(shards) for idx, shards in passes.items()
+                    },
+                    "updated_at": utc_now_iso(),
+                },
+            )
+        if seed_idx > 0 and sum_dirs[seed_idx - 1].exists():
+            shutil.rmtree(sum_dirs[seed_idx - 1])
+    release_scorer()
+    return sum_dirs[-1]
+
+
+def check_parity(
+    *,
+    reference_path: Path,
+    rows: list[PreparedRecord],
+    run_tasks,
+    dtype: str,
+    hid_indices: list[int],
+    samples: int,
+    seed: int,
+) -> dict:
+    """Score a sample of rows already in a reference cache and compare logits."""
+
+    reference = open_logits_cache(reference_path)
+    ref_ids = list(reference["ids"].tolist())
+    ref_texts = list(reference["texts"].tolist())
+    ref_index = {str(sample_id): idx for idx, sample_id in enumerate(ref_ids)}
+    candidates = [
+        row
+        for row in rows
+        if row.id in ref_index and ref_texts[ref_index[row.id]] == row.text_normalized
+    ]
+    if not candidates:
+        print(f"Parity: no overlapping rows with {reference_path}; skipped")
+        return {"status": "skipped", "reference": str(reference_path)}
+
+    rng = np.random.default_rng(seed)
+    picked = sorted(
+        rng.choice(len(candidates), size=min(samples, len(candidates)), replace=False)
+    )
+    sample_rows = [candidates[int(i)] for i in picked]
+    ref_rows = np.array([ref_index[row.id] for row in sample_rows], dtype=np.int64)
+    scored = next(iter(run_tasks(score_sample_task, [sample_rows])))
+
+    # Compare at cache storage precision (fp16) on both sides.
+    ours_scam = scored["scam_logits"].astype(np.float16).astype(np.float32)
+    ours_topic = scored["topic_logits"].astype(np.float16).astype(np.float32)
+    ref_scam = np.asarray(reference["scam_logits_raw"][ref_rows], dtype=np.float32)
+    ref_topic = np.asarray(reference["topic_logits_raw"][ref_rows], dtype=np.float32)
+    logit_delta = np.concatenate(
+        [np.abs(ours_scam - ref_scam).ravel(), np.abs(ours_topic - ref_topic).ravel()]
+    )
+    label_agreement = float(
+        np.mean(np.argmax(ours_scam, axis=1) == np.argmax(ref_scam, axis=1))
+    )
+
+    report: dict = {
+        "status": "passed",
+        "reference": str(reference_path),
+        "dtype": dtype,
+        "samples": len(sample_rows),
+        "max_abs_logit": float(logit_delta.max()),
+        "mean_abs_logit": float(logit_delta.mean()),
+        "label_agreement": label_agreement,
+        "tolerance": PARITY_TOLERANCES[dtype],
+    }
+    ref_layers = [int(x) for x in np.asarray(reference["hidden_layer_indices"])]
+    if ref_layers == list(hid_indices):
+        ours_hidden = scored["hidden"].astype(np.float16).astype(np.float32)
+        ref_hidden = np.asarray(
+            reference["teacher_hidden_cls"][ref_rows], dtype=np.float32
+        )
+        dots = np.sum(ours_hidden * ref_hidden, axis=-1)
+        norms = np.linalg.norm(ours_hidden, axis=-1) * np.linalg.norm(
+            ref_hidden, axis=-1
+        )
+        cosine = dots / np.maximum(norms, 1e-12)
+        report["min_hidden_cosine"] = float(cosine.min())
+        report["mean_hidden_cosine"] = float(cosine.mean())
+
+    tolerance = PARITY_TOLERANCES[dtype]
+    failures = [
+        key
+        for key in ("max_abs_logit", "mean_abs_logit")
+        if report[key] > tolerance[key]
+    ]
+    if label_agreement < tolerance["min_label_agreement"]:
+        failures.append("label_agreement")
+    if (
+        "min_hidden_cosine" in report
+        and report["min_hidden_cosine"] < tolerance["min_hidden_cosine"]
+    ):
+        failures.append("min_hidden_cosine")
+
+    print(
+        f"Parity vs {reference_path} ({len(sample_rows)} rows, dtype={dtype}): "
+        f"max_abs_logit={report['max_abs_logit']:.4f} "
+        f"mean_abs_logit={report['mean_abs_logit']:.4f} "
+        f"label_agreement={label_agreement:.4f} "
+        f"min_hidden_cosine={report.get('min_hidden_cosine', float('nan')):.4f}"
+    )
+    if failures:
+        raise SystemExit(
+            f"Teacher logits parity failed against {reference_path}: {failures} "
+            f"exceeded tolerance {tolerance}. Use --skip-parity to override."
+        )
+    return report
+
+
 def cache_split(
     *,
     split_name: str,
     rows: list[PreparedRecord],
-    seed_dirs: list[Path],
-    device: torch.device,
-    batch_size: int,
+    scoring: ScoringConfig,
     out_path: Path,
     scam_temp: float,
     topic_temp: float,
-    dtype: str,
     teacher_id: str,
     calibration_id: str,
     seed_list: list[int],
     label_map_hash: str,
     split_hash: str,
+    shard_size: int,
+    fresh: bool = False,
+    keep_shards: bool = False,
+    workers: int = 1,
+    pin_workers: bool = False,
+    parity_reference: Path | None = None,
+    skip_parity: bool = False,
+    parity_samples: int = 256,
+    parity_seed: int = 42,
+    base_cache: Path | None = None,
 ) -> None:
-    models: list[JanitrTeacherModel] = []
-    tokenizers = []
-    max_lengths: list[int] = []
-
-    for seed_dir in seed_dirs:
-        model, tokenizer, max_length, _model_name = load_teacher(
-            seed_dir, device=device
-        )
-        models.append(model)
-        tokenizers.append(tokenizer)
-        max_lengths.append(max_length)
-
-    max_length = min(max_lengths)
-    dataset = PreparedDataset(rows, tokenizers[0], max_length=max_length)
-    loader = DataLoader(
-        dataset, batch_size=batch_size, shuffle=False, collate_fn=collate
-    )
-
-    num_layers = int(models[0].encoder.config.num_hidden_layers)
-    hid_indices = layer_indices(num_layers, target_layers=4)
-
-    ids: list[str] = []
-    texts: list[str] = []
-    labels: list[str] = []
-    y_scam_clean: list[int] = []
-    y_topic: list[int] = []
-    scam_logits_raw: list[np.ndarray] = []
-    topic_logits_raw: list[float] = []
-    hidden_cls: list[np.ndarray] = []
-
-    use_amp = device.type == "cuda" and dtype in {"fp16", "bf16"}
-    amp_dtype = torch.float16 if dtype == "fp16" else torch.bfloat16
-
-    with torch.no_grad():
-        for batch in tqdm(loader, desc=f"Caching {split_name}"):
-            input_ids = batch["input_ids"].to(device)
-            attention_mask = batch["attention_mask"].to(device)
-
-            seed_scam: list[np.ndarray] = []
-            seed_topic: list[np.ndarray] = []
-            seed_hidden: list[np.ndarray] = []
-
-            for model in models:
-                with torch.autocast(
-                    device_type=device.type, enabled=use_amp, dtype=amp_dtype
-                ):
-                    out = model(input_ids=input_ids, attention_mask=attention_mask)
-                scam = out["scam_logits"].detach().cpu().float().numpy()
-                topic = out["topic_logits"].detach().cpu().float().numpy()
-                hidden_states = out["hidden_states"]
-
-                selected = []
-                for idx in hid_indices:
-                    layer_tensor = hidden_states[idx].detach().cpu().float().numpy()
-                    selected.append(layer_tensor[:, 0, :])  # CLS vectors
-                selected_arr = np.stack(selected, axis=1)
-
-                seed_scam.append(scam)
-                seed_topic.append(topic)
-                seed_hidden.append(selected_arr)
-
-            avg_scam = np.mean(np.stack(seed_scam, axis=0), axis=0)
-            avg_topic = np.mean(np.stack(seed_topic, axis=0), axis=0)
-            avg_hidden = np.mean(np.stack(seed_hidden, axis=0), axis=0)
-
-            ids.extend(batch["id"])
-            texts.extend(batch["text"])
-            labels.extend(batch["collapsed_label"])
-            y_scam_clean.extend(batch["y_scam_clean"].tolist())
-            y_topic.extend(batch["y_topic"].tolist())
-            scam_logits_raw.extend(avg_scam)
-            topic_logits_raw.extend(avg_topic.tolist())
-            hidden_cls.extend(avg_hidden)
-
-    scam_logits = np.array(scam_logits_raw, dtype=np.float32)
-    topic_logits = np.array(topic_logits_raw, dtype=np.float32)
-    hidden = np.array(hidden_cls, dtype=np.float32)
-
-    scam_logits_cal = scam_logits / float(scam_temp)
-    topic_logits_cal = topic_logits / float(topic_temp)
-
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    np.savez_compressed(
-        out_path,
-        ids=np.array(ids, dtype=object),
-        texts=np.array(texts, dtype=object),
-        collapsed_label=np.array(labels, dtype=object),
-        y_scam_clean=np.array(y_scam_clean, dtype=np.int64),
-        y_topic=np.array(y_topic, dtype=np.int64),
-        scam_logits_raw=scam_logits.astype(np.float16),
-        topic_logits_raw=topic_logits.astype(np.float16),
-        scam_logits_cal=scam_logits_cal.astype(np.float16),
-        topic_logits_cal=topic_logits_cal.astype(np.float16),
-        teacher_hidden_cls=hidden.astype(np.float16),
-        hidden_layer_indices=np.array(hid_indices, dtype=np.int64),
-        scam_temp=np.array([scam_temp], dtype=np.float32),
-        topic_temp=np.array([topic_temp], dtype=np.float32),
-    )
     metadata = {
         "version": 1,
         "logits_cache_id": f"logits-{stable_object_hash({'teacher_id': teacher_id, 'calibration_id': calibration_id, 'seed_list': seed_list, 'label_map_hash': label_map_hash, 'split': split_name, 'split_hash': split_hash})[:16]}",
@@ -277,32 +896,240 @@ def cache_split(
         "split": split_name,
         "split_hash": split_hash,
         "rows": len(rows),
-        "code_commit": current_git_commit(),
-        "created_at": utc_now_iso(),
-        "path": str(out_path),
     }
+    if not rows:
+        raise SystemExit(f"No rows to cache for split '{split_name}'")
     meta_path = Path(f"{out_path}.meta.json")
-    if meta_path.exists():
-        existing = load_json(meta_path)
-        for key in (
-            "teacher_id",
-            "calibration_id",
-            "seeds",
-            "label_map_hash",
-            "split",
-            "split_hash",
+    # Fail before spending any teacher compute on an incompatible cache. In
+    # incremental mode the split itself is expected to change.
+    check_existing_metadata(
+        meta_path,
+        metadata,
+        keys=tuple(key for key in CACHE_FINGERPRINT_KEYS if key != "split_hash")
+        if base_cache is not None
+        else CACHE_FINGERPRINT_KEYS,
+    )
+
+    max_length, hid_indices, hidden_size = teacher_layout(list(scoring.seed_dirs))
+    scoring = replace(scoring, max_length=max_length)
+    dtype = scoring.dtype
+    seed_schedule = scoring.ensemble_schedule == "seed"
+
+    reuse: list[int] | None = None
+    incremental: dict | None = None
+    if base_cache is not None:
+        reuse, incremental = plan_reuse(
+            base_cache=base_cache,
+            rows=rows,
+            metadata=metadata,
+            hid_indices=hid_indices,
+        )
+        print(
+            f"Incremental {split_name}: reusing {incremental['reused_rows']} rows from "
+            f"{base_cache}, scoring {incremental['scored_rows']} new/changed rows"
+        )
+
+    num_shards = max(1, (len(rows) + shard_size - 1) // shard_size)
+    shard_fingerprint = stable_object_hash(
+        {
+            **{key: metadata[key] for key in CACHE_FINGERPRINT_KEYS},
+            "rows": len(rows),
+            "shard_size": shard_size,
+            "device": scoring.device,
+            "dtype": dtype,
+            "max_length": max_length,
+            "hidden_layer_indices": hid_indices,
+            "temps": [scam_temp, topic_temp],
+            "base_logits_cache_id": incremental["base_logits_cache_id"]
+            if incremental
+            else None,
+        }
+    )
+    shard_dir = shard_dir_for(out_path)
+    progress = load_progress(shard_dir, fingerprint=shard_fingerprint, fresh=fresh)
+    completed = {int(idx) for idx in progress.get("completed", [])}
+    shard_paths = [shard_dir / f"shard_{idx:05d}" for idx in range(num_shards)]
+    completed = {idx for idx in completed if is_logits_store(shard_paths[idx])}
+    if completed:
+        print(
+            f"Resuming {split_name}: {len(completed)}/{num_shards} shards already cached"
+        )
+    shard_dir.mkdir(parents=True, exist_ok=True)
+
+    if skip_parity:
+        parity_reference = None
+    elif parity_reference is None and scoring.device == "cpu":
+        # CPU caches are checked against the GPU cache they replace, if any.
+        if is_logits_store(out_path) or (
+            out_path.suffix == ".npz" and out_path.is_file()
         ):
-            if existing.get(key) != metadata.get(key):
-                raise SystemExit(
-                    f"Existing cache metadata mismatch for {meta_path} key={key}: "
-                    f"existing={existing.get(key)} new={metadata.get(key)}"
-                )
+            parity_reference = out_path
+
+    # Seed schedule: rows that need the teacher, laid out shard by shard in one
+    # accumulator; offsets cover every shard so resumes keep the same layout.
+    shard_scored_rows: list[list[PreparedRecord]] = []
+    ensemble_offsets: list[int] = []
+    ensemble_rows = 0
+    for shard_idx in range(num_shards):
+        start = shard_idx * shard_size
+        shard_rows = rows[start : start + shard_size]
+        shard_reuse = reuse[start : start + shard_size] if reuse is not None else None
+        shard_scored_rows.append(
+            [
+                row
+                for pos, row in enumerate(shard_rows)
+                if shard_reuse is None or shard_reuse[pos] < 0
+            ]
+        )
+        ensemble_offsets.append(ensemble_rows)
+        ensemble_rows += len(shard_scored_rows[-1])
+    ensemble_root = shard_dir / "ensemble"
+
+    tasks = [
+        ShardTask(
+            shard_idx=shard_idx,
+            rows=rows[shard_idx * shard_size : (shard_idx + 1) * shard_size],
+            path=shard_paths[shard_idx],
+            desc=f"Caching {split_name} shard {shard_idx + 1}/{num_shards}",
+            scam_temp=scam_temp,
+            topic_temp=topic_temp,
+            hid_indices=hid_indices,
+            base_cache=base_cache,
+            reuse=reuse[shard_idx * shard_size : (shard_idx + 1) * shard_size]
+            if reuse is not None
+            else None,
+            ensemble_offset=ensemble_offsets[shard_idx],
+            num_seeds=len(scoring.seed_dirs),
+        )
+        for shard_idx in range(num_shards)
+        if shard_idx not in completed
+    ]
+    parity: dict | None = None
+    with scoring_pool(scoring, workers=workers, pin_workers=pin_workers) as run_tasks:
+        if parity_reference is not None:
+            parity = check_parity(
+                reference_path=parity_reference,
+                rows=rows,
+                run_tasks=run_tasks,
+                dtype=dtype,
+                hid_indices=hid_indices,
+                samples=parity_samples,
+                seed=parity_seed,
+            )
+        if seed_schedule:
+            ensemble_sum = run_seed_passes(
+                ensemble_root=ensemble_root,
+                pending=[
+                    (
+                        task.shard_idx,
+                        shard_scored_rows[task.shard_idx],
+                        ensemble_offsets[task.shard_idx],
+                    )
+                    for task in tasks
+                    if shard_scored_rows[task.shard_idx]
+                ],
+                total_rows=ensemble_rows,
+                num_seeds=len(scoring.seed_dirs),
+                num_layers=len(hid_indices),
+                hidden_size=hidden_size,
+                fingerprint=shard_fingerprint,
+                split_name=split_name,
+                run_tasks=run_tasks,
+            )
+            tasks = [replace(task, ensemble_dir=ensemble_sum) for task in tasks]
+        for shard_idx in run_tasks(score_shard_task, tasks):
+            completed.add(shard_idx)
+            save_json(
+                shard_dir / "progress.json",
+                {
+                    "version": 1,
+                    "fingerprint": shard_fingerprint,
+                    "split": split_name,
+                    "rows": len(rows),
+                    "shard_size": shard_size,
+                    "num_shards": num_shards,
+                    "completed": sorted(completed),
+                    "updated_at": utc_now_iso(),
+                },
+            )
+
+    # Validate shard contents against the prepared split before publishing.
+    merged_ids: list[str] = []
+    for path in shard_paths:
+        merged_ids.extend(LogitsStore(path)["ids"].tolist())
+    expected_ids = [row.id for row in rows]
+    if merged_ids != expected_ids:
+        raise SystemExit(
+            f"Shard ids in {shard_dir} do not match the {split_name} prepared split. "
+            "Re-run with --fresh."
+        )
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    if out_path.suffix == ".npz":
+        # Legacy single-file format (compressed, pickled string columns).
+        merged = merge_shards_in_memory(shard_paths)
+        np.savez_compressed(out_path, **merged)
+        cache_format = "npz"
+    else:
+        merge_logits_stores(shard_paths, out_path, constant_columns=CONSTANT_COLUMNS)
+        cache_format = "store"
+
+    metadata.update(
+        {
+            "format": cache_format,
+            "device": scoring.device,
+            "dtype": dtype,
+            "ensemble_schedule": scoring.ensemble_schedule,
+            "parity": parity,
+            "incremental": incremental,
+            "shard_size": shard_size,
+            "num_shards": num_shards,
+            "code_commit": current_git_commit(),
+            "created_at": utc_now_iso(),
+            "path": str(out_path),
+        }
+    )
     save_json(meta_path, metadata)
+    if not keep_shards:
+        shutil.rmtree(shard_dir)
+    elif ensemble_root.exists():
+        shutil.rmtree(ensemble_root)
 
     print(f"Cached {split_name} logits to {out_path}")
     print(f"Wrote cache metadata to {meta_path}")
 
 
+def resolve_base_cache(
+    explicit: Path | None, out_path: Path, *, incremental: bool
+) -> Path | None:
+    if explicit is not None:
+        if not (is_logits_store(explicit) or explicit.is_file()):
+            raise SystemExit(f"Base cache not found: {explicit}")
+        return explicit
+    if not incremental:
+        return None
+    if is_logits_store(out_path) or (out_path.suffix == ".npz" and out_path.is_file()):
+        return out_path
+    print(f"No existing cache at {out_path}; scoring every row")
+    return None
+
+
+def merge_shards_in_memory(shard_paths: list[Path]) -> dict[str, np.ndarray]:
+    stores = [LogitsStore(path) for path in shard_paths]
+    merged: dict[str, np.ndarray] = {}
+    for name, spec in stores[0].columns.items():
+        if name in CONSTANT_COLUMNS:
+            merged[name] = np.asarray(stores[0][name])
+        elif spec["kind"] == "string":
+            values: list[str] = []
+            for store in stores:
+                values.extend(store[name].tolist())
+            merged[name] = np.array(values, dtype=object)
+        else:
+            merged[name] = np.concatenate([np.asarray(store[name]) for store in stores])
+    return merged
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("--train", type=Path, default=DEFAULT_TRAIN)
@@ -311,26 +1138,116 @@ def main() -> None:
     parser.add_argument("--calibration", type=Path, default=DEFAULT_CALIBRATION)
     parser.add_argument("--seeds", type=str, default=None)
     parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument(
+        "--device",
+        choices=["cuda", "cpu", "auto"],
+        default="cuda",
+        help="Scoring device. 'auto' picks CUDA when available, else CPU.",
+    )
     parser.add_argument(
         "--dtype",
-        choices=["fp16", "bf16", "fp32"],
-        default="bf16"
-        if torch.cuda.is_available() and torch.cuda.is_bf16_supported()
-        else "fp16",
+        choices=["fp16", "bf16", "fp32", "int8"],
+        default=None,
+        help="CUDA: fp16/bf16/fp32 autocast (default bf16 if supported, else fp16). "
+        "CPU: fp32 (default), bf16 autocast, or int8 dynamic quantization.",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="CPU intra-op threads (per worker when --workers > 1)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="CPU scoring processes; shards are distributed across them",
+    )
+    parser.add_argument(
+        "--pin-workers",
+        action="store_true",
+        help="Pin each CPU worker to a contiguous block of cores (Linux)",
+    )
+    parser.add_argument(
+        "--ensemble-schedule",
+        choices=["batch", "seed"],
+        default="batch",
+        help="'batch' keeps every teacher seed loaded and averages per batch; "
+        "'seed' loads one seed at a time and sums over the split in memory-mapped "
+        "buffers (peak memory of one model, identical averages)",
+    )
+    parser.add_argument(
+        "--train-parity-reference",
+        type=Path,
+        default=None,
+        help="Cache to compare against (default on CPU: the existing --train-out cache)",
+    )
+    parser.add_argument(
+        "--valid-parity-reference",
+        type=Path,
+        default=None,
+        help="Cache to compare against (default on CPU: the existing --valid-out cache)",
+    )
+    parser.add_argument("--parity-samples", type=int, default=256)
+    parser.add_argument(
+        "--skip-parity",
+        action="store_true",
+        help="Do not compare against a reference cache",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Reuse rows (same id + text) from the existing output caches and only "
+        "score new or changed rows",
+    )
+    parser.add_argument(
+        "--train-base-cache",
+        type=Path,
+        default=None,
+        help="Cache to reuse train rows from (implies --incremental for train)",
+    )
+    parser.add_argument(
+        "--valid-base-cache",
+        type=Path,
+        default=None,
+        help="Cache to reuse valid rows from (implies --incremental for valid)",
     )
     parser.add_argument(
         "--train-out",
         type=Path,
-        default=MODELS_DIR / "teacher_logits_train.npz",
+        default=MODELS_DIR / "teacher_logits_train",
+        help="Output logits store directory (a .npz path writes the legacy format)",
     )
     parser.add_argument(
         "--valid-out",
         type=Path,
-        default=MODELS_DIR / "teacher_logits_valid.npz",
+        default=MODELS_DIR / "teacher_logits_valid",
+        help="Output logits store directory (a .npz path writes the legacy format)",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=8192,
+        help="Rows per cache shard; completed shards are reused on restart",
+    )
+    parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help="Discard any partial shards instead of resuming",
+    )
+    parser.add_argument(
+        "--keep-shards",
+        action="store_true",
+        help="Keep the per-shard stores after merging",
     )
     parser.add_argument("--seed", type=int, default=42)
     args = parser.parse_args()
 
+    if args.shard_size < 1:
+        raise SystemExit("--shard-size must be >= 1")
+    if args.workers < 1:
+        raise SystemExit("--workers must be >= 1")
+
     set_seed(args.seed)
 
     for path in (args.train, args.valid, args.teacher_dir):
@@ -383,7 +1300,26 @@ def main() -> None:
     }
     label_map_hash = hash_label_map(TRAINING_CLASSES)
 
-    device = require_cuda(context="cache_teacher_logits.py")
+    device = resolve_device(
+        args.device,
+        context="cache_teacher_logits.py",
+        threads=args.threads if args.workers == 1 else None,
+    )
+    dtype = args.dtype
+    if dtype is None:
+        if device.type == "cuda":
+            dtype = "bf16" if torch.cuda.is_bf16_supported() else "fp16"
+        else:
+            dtype = "fp32"
+    if device.type == "cuda" and dtype == "int8":
+        raise SystemExit("--dtype int8 is only supported with --device cpu")
+    if device.type == "cpu" and dtype == "fp16":
+        raise SystemExit("--dtype fp16 is not supported on CPU; use fp32/bf16/int8")
+    if device.type == "cuda" and args.workers > 1:
+        raise SystemExit("--workers > 1 is only supported with --device cpu")
+    worker_threads = args.threads
+    if args.workers > 1 and worker_threads is None:
+        worker_threads = max(1, (os.cpu_count() or 1) // args.workers)
 
     seed_dirs = list_seed_dirs(args.teacher_dir, args.seeds)
     selected_seeds = [int(path.name.split("_", 1)[1]) for path in seed_dirs]
@@ -393,38 +1329,68 @@ def main() -> None:
             "Refusing to mix incompatible seed sets."
         )
     print("Teacher seeds:", ", ".join(path.name for path in seed_dirs))
+    base_caches = {
+        "train": resolve_base_cache(
+            args.train_base_cache, args.train_out, incremental=args.incremental
+        ),
+        "valid": resolve_base_cache(
+            args.valid_base_cache, args.valid_out, incremental=args.incremental
+        ),
+    }
+    scoring = ScoringConfig(
+        seed_dirs=tuple(seed_dirs),
+        device=device.type,
+        dtype=dtype,
+        batch_size=args.batch_size,
+        threads=worker_threads if args.workers > 1 else None,
+        ensemble_schedule=args.ensemble_schedule,
+    )
 
     cache_split(
         split_name="train",
         rows=train_rows,
-        seed_dirs=seed_dirs,
-        device=device,
-        batch_size=args.batch_size,
+        scoring=scoring,
         out_path=args.train_out,
         scam_temp=scam_temp,
         topic_temp=topic_temp,
-        dtype=args.dtype,
         teacher_id=teacher_id,
         calibration_id=calibration_id,
         seed_list=selected_seeds,
         label_map_hash=label_map_hash,
         split_hash=split_hashes["train"],
+        shard_size=args.shard_size,
+        fresh=args.fresh,
+        keep_shards=args.keep_shards,
+        workers=args.workers,
+        pin_workers=args.pin_workers,
+        parity_reference=args.train_parity_reference,
+        skip_parity=args.skip_parity,
+        parity_samples=args.parity_samples,
+        parity_seed=args.seed,
+        base_cache=base_caches["train"],
     )
     cache_split(
         split_name="valid",
         rows=valid_rows,
-        seed_dirs=seed_dirs,
-        device=device,
-        batch_size=args.batch_size,
+        scoring=scoring,
         out_path=args.valid_out,
         scam_temp=scam_temp,
         topic_temp=topic_temp,
-        dtype=args.dtype,
         teacher_id=teacher_id,
         calibration_id=calibration_id,
         seed_list=selected_seeds,
         label_map_hash=label_map_hash,
         split_hash=split_hashes["valid"],
+        shard_size=args.shard_size,
+        fresh=args.fresh,
+        keep_shards=args.keep_shards,
+        workers=args.workers,
+        pin_workers=args.pin_workers,
+        parity_reference=args.valid_parity_reference,
+        skip_parity=args.skip_parity,
+        parity_samples=args.parity_samples,
+        parity_seed=args.seed,
+        base_cache=base_caches["valid"],
     )
 
 
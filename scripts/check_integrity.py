@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-Dataset integrity checks for sample.jsonl.
+Dataset integrity checks for sample.jsonl (or its label store, label_store.py).
 
 Checks:
 1. Valid JSON on every line
@@ -11,18 +11,29 @@ Checks:
 6. ID format consistency
 7. id/source_id consistency for numeric tweet IDs
 
+All checks run as visitors over a single parse of the file (dataset_checks.py);
+--workers checks file chunks in parallel.
+
 Exit codes:
 - 0: All checks passed
 - 1: Errors found
 """
 
 import argparse
-import json
 import re
 import sys
+from collections import Counter
 from pathlib import Path
-from collections import defaultdict
-
+from typing import Any
+
+from dataset_checks import (
+    DuplicateKeyCheck,
+    FileResult,
+    Issues,
+    Profile,
+    RecordCheck,
+    check_file,
+)
 from labelset import load_v2026_labels_from_labels_md
 
 VALID_LABELS = set(load_v2026_labels_from_labels_md())
@@ -34,100 +45,113 @@ def _is_tweet_status_id(value: object) -> bool:
     return isinstance(value, str) and bool(TWEET_STATUS_ID_PATTERN.fullmatch(value))
 
 
-def check_integrity(
-    path: Path, fix_suggestions: bool = False
-) -> tuple[list[str], list[str]]:
-    """Run all integrity checks. Returns (errors, warnings)."""
-    errors = []
-    warnings = []
+class SampleRecordCheck(RecordCheck):
+    """Per-record checks 2 and 4-7."""
+
+    def visit(self, line_num: int, obj: Any, out: Issues) -> None:
+        # Check 2: Required fields
+        id_ = obj.get("id")
+        labels = obj.get("labels")
+        text = obj.get("text")
+
+        if labels is None:
+            out.error(line_num, f"Line {line_num} (id={id_}): Missing 'labels' field")
+        elif not isinstance(labels, list) or not labels:
+            out.error(
+                line_num,
+                f"Line {line_num} (id={id_}): 'labels' must be a non-empty list",
+            )
+
+        if text is None:
+            out.error(line_num, f"Line {line_num} (id={id_}): Missing 'text' field")
+
+        # Check 3: ID type (duplicates are tracked by DuplicateKeyCheck)
+        if id_ is not None:
+            if not isinstance(id_, str):
+                out.error(
+                    line_num,
+                    f"Line {line_num}: 'id' must be a string or null (got {type(id_).__name__})",
+                )
+        else:
+            out.warning(line_num, f"Line {line_num}: Null ID")
+
+        # Check 4: Valid labels
+        if labels is not None and isinstance(labels, list):
+            if len(labels) != len(set(labels)):
+                out.error(
+                    line_num,
+                    f"Line {line_num} (id={id_}): Duplicate labels (labels={labels})",
+                )
+            for label in labels:
+                if label not in VALID_LABELS:
+                    out.error(
+                        line_num,
+                        f"Line {line_num} (id={id_}): Invalid label '{label}' (valid: {VALID_LABELS})",
+                    )
+        # Check 5: Empty text
+        if text is not None and not text.strip():
+            out.warning(line_num, f"Line {line_num} (id={id_}): Empty text")
 
-    id_counts = defaultdict(list)  # id -> [line_numbers]
-    line_num = 0
+        # Check 6: ID format (warning only)
+        if isinstance(id_, str) and not ID_PATTERN.match(id_):
+            out.warning(line_num, f"Line {line_num}: Non-standard ID format '{id_}'")
 
-    try:
-        with path.open(encoding="utf-8") as f:
-            for line_num, line in enumerate(f, 1):
-                line = line.strip()
-                if not line:
-                    warnings.append(f"Line {line_num}: Empty line")
-                    continue
-
-                # Check 1: Valid JSON
-                try:
-                    obj = json.loads(line)
-                except json.JSONDecodeError as e:
-                    errors.append(f"Line {line_num}: Invalid JSON - {e}")
-                    continue
-
-                # Check 2: Required fields
-                id_ = obj.get("id")
-                labels = obj.get("labels")
-                text = obj.get("text")
-
-                if labels is None:
-                    errors.append(f"Line {line_num} (id={id_}): Missing 'labels' field")
-                elif not isinstance(labels, list) or not labels:
-                    errors.append(
-                        f"Line {line_num} (id={id_}): 'labels' must be a non-empty list"
-                    )
+        # Check 7: id/source_id consistency for numeric tweet IDs
+        source_id = obj.get("source_id")
+        source_is_status_id = _is_tweet_status_id(source_id)
+        id_is_status_id = _is_tweet_status_id(id_)
 
-                if text is None:
-                    errors.append(f"Line {line_num} (id={id_}): Missing 'text' field")
-
-                # Check 3: Track IDs for duplicate detection
-                if id_ is not None:
-                    id_counts[id_].append(line_num)
-
-                    if not isinstance(id_, str):
-                        errors.append(
-                            f"Line {line_num}: 'id' must be a string or null (got {type(id_).__name__})"
-                        )
-                else:
-                    warnings.append(f"Line {line_num}: Null ID")
-
-                # Check 4: Valid labels
-                if labels is not None and isinstance(labels, list):
-                    if len(labels) != len(set(labels)):
-                        errors.append(
-                            f"Line {line_num} (id={id_}): Duplicate labels (labels={labels})"
-                        )
-                    for label in labels:
-                        if label not in VALID_LABELS:
-                            errors.append(
-                                f"Line {line_num} (id={id_}): Invalid label '{label}' (valid: {VALID_LABELS})"
-                            )
-                # Check 5: Empty text
-                if text is not None and not text.strip():
-                    warnings.append(f"Line {line_num} (id={id_}): Empty text")
-
-                # Check 6: ID format (warning only)
-                if isinstance(id_, str) and not ID_PATTERN.match(id_):
-                    warnings.append(f"Line {line_num}: Non-standard ID format '{id_}'")
-
-                # Check 7: id/source_id consistency for numeric tweet IDs
-                source_id = obj.get("source_id")
-                source_is_status_id = _is_tweet_status_id(source_id)
-                id_is_status_id = _is_tweet_status_id(id_)
-
-                if source_is_status_id and id_ != source_id:
-                    errors.append(
-                        f"Line {line_num}: Numeric source_id must match id (id={id_}, source_id={source_id})"
-                    )
-                elif id_is_status_id and source_id is not None and source_id != id_:
-                    errors.append(
-                        f"Line {line_num}: Numeric id must match source_id when source_id is present (id={id_}, source_id={source_id})"
-                    )
+        if source_is_status_id and id_ != source_id:
+            out.error(
+                line_num,
+                f"Line {line_num}: Numeric source_id must match id (id={id_}, source_id={source_id})",
+            )
+        elif id_is_status_id and source_id is not None and source_id != id_:
+            out.error(
+                line_num,
+                f"Line {line_num}: Numeric id must match source_id when source_id is present (id={id_}, source_id={source_id})",
+            )
+
+
+class LabelStatsCheck(RecordCheck):
+    """Label counts for the summary printed when all checks pass."""
+
+    def __init__(self, **options: Any) -> None:
+        super().__init__(**options)
+        self.labels: Counter[str] = Counter()
 
+    def visit(self, line_num: int, obj: Any, out: Issues) -> None:
+        for label in obj.get("labels", []) or []:
+            self.labels[label] += 1
+
+    def partial(self) -> Counter[str]:
+        return self.labels
+
+    @classmethod
+    def finalize(cls, partials: list[Any], out: Issues, stats: dict[str, Any]) -> None:
+        labels: Counter[str] = Counter()
+        for part in partials:
+            labels.update(part)
+        stats["labels"] = labels
+
+
+PROFILE = Profile(checks=(SampleRecordCheck, DuplicateKeyCheck, LabelStatsCheck))
+
+
+def run_integrity(path: Path, *, workers: int = 1) -> FileResult:
+    """Run all checks in one pass over ``path``."""
+    try:
+        return check_file(path, PROFILE, workers=workers)
     except FileNotFoundError:
-        errors.append(f"File not found: {path}")
-        return errors, warnings
+        return FileResult(path, [f"File not found: {path}"], [], {}, 0, 0, 0)
 
-    # Check 3b: Report duplicates
-    for id_, lines in id_counts.items():
-        if len(lines) > 1:
-            errors.append(f"Duplicate ID '{id_}' on lines: {lines}")
 
-    return errors, warnings
+def check_integrity(
+    path: Path, fix_suggestions: bool = False
+) -> tuple[list[str], list[str]]:
+    """Run all integrity checks. Returns (errors, warnings)."""
+    result = run_integrity(path)
+    return result.errors, result.warnings
 
 
 def main():
@@ -135,14 +159,21 @@ def main():
         description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
     )
     ap.add_argument(
-        "path", nargs="?", default="data/sample.jsonl", help="Path to JSONL file"
+        "path",
+        nargs="?",
+        default="data/sample.jsonl",
+        help="Path to JSONL file or label store (label_store.py)",
     )
     ap.add_argument("--strict", action="store_true", help="Treat warnings as errors")
     ap.add_argument("--quiet", action="store_true", help="Only output if errors found")
+    ap.add_argument(
+        "--workers", type=int, default=1, help="Check file chunks in parallel"
+    )
     args = ap.parse_args()
 
     path = Path(args.path)
-    errors, warnings = check_integrity(path)
+    result = run_integrity(path, workers=args.workers)
+    errors, warnings = result.errors, result.warnings
 
     exit_code = 0
 
@@ -168,18 +199,12 @@ def main():
                 print(f"  ... and {len(warnings) - 30} more warnings")
 
     if exit_code == 0 and not args.quiet:
-        # Count stats
-        with path.open() as f:
-            lines = [json.loads(l) for l in f if l.strip()]
-
-        labels = defaultdict(int)
-        for obj in lines:
-            for label in obj.get("labels", []) or []:
-                labels[label] += 1
+        # Stats come from the same pass as the checks.
+        labels = result.stats["labels"]
 
         print(f"✅ All checks passed!")
         print(f"\nDataset stats:")
-        print(f"  Total entries: {len(lines)}")
+        print(f"  Total entries: {result.records}")
         for label, count in sorted(labels.items(), key=lambda x: -x[1]):
             print(f"  {label}: {count}")
 
@@ -15,6 +15,9 @@ Checks:
 8. No duplicate tweet status_id values within a sample
 9. Basic type checks for optional tweet metadata
 
+All checks run as visitors over a single parse of the file (dataset_checks.py);
+--workers checks file chunks in parallel.
+
 Exit codes:
 - 0: All checks passed
 - 1: Errors found
@@ -23,12 +26,20 @@ Exit codes:
 from __future__ import annotations
 
 import argparse
-import json
 import sys
-from collections import defaultdict
+from collections import Counter, defaultdict
 from datetime import datetime
 from pathlib import Path
-
+from typing import Any
+
+from dataset_checks import (
+    DuplicateKeyCheck,
+    FileResult,
+    Issues,
+    Profile,
+    RecordCheck,
+    check_file,
+)
 from labelset import load_v2026_labels_from_labels_md
 
 VALID_LABELS = set(load_v2026_labels_from_labels_md())
@@ -185,160 +196,204 @@ def _validate_tweet(
     }
 
 
-def check_integrity(path: Path) -> tuple[list[str], list[str]]:
-    """Run all integrity checks. Returns (errors, warnings)."""
+class ReplyRecordCheck(RecordCheck):
+    """Per-record checks 2 and 4-9 (duplicate ids: ReplyIdCheck)."""
 
-    errors: list[str] = []
-    warnings: list[str] = []
+    def visit(self, line_num: int, obj: Any, out: Issues) -> None:
+        errors: list[str] = []
+        warnings: list[str] = []
+        self._check(line_num, obj, errors, warnings)
+        for message in errors:
+            out.error(line_num, message)
+        for message in warnings:
+            out.warning(line_num, message)
 
-    id_counts: defaultdict[str, list[int]] = defaultdict(list)
+    def _check(
+        self, line_num: int, obj: Any, errors: list[str], warnings: list[str]
+    ) -> None:
+        if not isinstance(obj, dict):
+            errors.append(
+                f"Line {line_num}: Record must be a JSON object (got {type(obj).__name__})"
+            )
+            return
 
-    try:
-        with path.open(encoding="utf-8") as f:
-            for line_num, line in enumerate(f, 1):
-                line = line.strip()
-                if not line:
-                    warnings.append(f"Line {line_num}: Empty line")
-                    continue
+        # Required fields
+        id_ = obj.get("id")
+        platform = obj.get("platform")
+        collected_at = obj.get("collected_at")
+        labels = obj.get("labels")
+        tweets = obj.get("tweets")
 
-                # Check 1: valid JSON
-                try:
-                    obj = json.loads(line)
-                except json.JSONDecodeError as e:
-                    errors.append(f"Line {line_num}: Invalid JSON - {e}")
-                    continue
+        # Check 2: required fields and basic types
+        if not _is_non_empty_string(id_):
+            errors.append(
+                f"Line {line_num} (id={id_}): 'id' must be a non-empty string"
+            )
 
-                if not isinstance(obj, dict):
-                    errors.append(
-                        f"Line {line_num}: Record must be a JSON object (got {type(obj).__name__})"
-                    )
-                    continue
+        if platform != "x":
+            errors.append(
+                f"Line {line_num} (id={id_}): 'platform' must be 'x' for replies dataset"
+            )
 
-                # Required fields
-                id_ = obj.get("id")
-                platform = obj.get("platform")
-                collected_at = obj.get("collected_at")
-                labels = obj.get("labels")
-                tweets = obj.get("tweets")
+        if not _is_iso_datetime(collected_at):
+            errors.append(
+                f"Line {line_num} (id={id_}): Missing or invalid 'collected_at' (ISO 8601 required)"
+            )
 
-                # Check 2: required fields and basic types
-                if not _is_non_empty_string(id_):
-                    errors.append(
-                        f"Line {line_num} (id={id_}): 'id' must be a non-empty string"
-                    )
-                else:
-                    id_counts[id_.strip()].append(line_num)
+        if labels is None:
+            errors.append(f"Line {line_num} (id={id_}): Missing 'labels' field")
+        elif not isinstance(labels, list) or not labels:
+            errors.append(
+                f"Line {line_num} (id={id_}): 'labels' must be a non-empty list"
+            )
 
-                if platform != "x":
-                    errors.append(
-                        f"Line {line_num} (id={id_}): 'platform' must be 'x' for replies dataset"
-                    )
+        if tweets is None:
+            errors.append(f"Line {line_num} (id={id_}): Missing 'tweets' field")
+        elif not isinstance(tweets, list) or not tweets:
+            errors.append(
+                f"Line {line_num} (id={id_}): 'tweets' must be a non-empty array"
+            )
 
-                if not _is_iso_datetime(collected_at):
-                    errors.append(
-                        f"Line {line_num} (id={id_}): Missing or invalid 'collected_at' (ISO 8601 required)"
-                    )
+        # Optional top-level fields
+        if "notes" in obj and not isinstance(obj["notes"], str):
+            errors.append(f"Line {line_num} (id={id_}): 'notes' must be a string")
 
-                if labels is None:
-                    errors.append(f"Line {line_num} (id={id_}): Missing 'labels' field")
-                elif not isinstance(labels, list) or not labels:
-                    errors.append(
-                        f"Line {line_num} (id={id_}): 'labels' must be a non-empty list"
-                    )
+        # Check 4: valid labels
+        if labels is not None and isinstance(labels, list):
+            if len(labels) != len(set(labels)):
+                errors.append(
+                    f"Line {line_num} (id={id_}): Duplicate labels (labels={labels})"
+                )
 
-                if tweets is None:
-                    errors.append(f"Line {line_num} (id={id_}): Missing 'tweets' field")
-                elif not isinstance(tweets, list) or not tweets:
+            for label in labels:
+                if not _is_non_empty_string(label):
                     errors.append(
-                        f"Line {line_num} (id={id_}): 'tweets' must be a non-empty array"
+                        f"Line {line_num} (id={id_}): labels must contain non-empty strings (got {label!r})"
                     )
-
-                # Optional top-level fields
-                if "notes" in obj and not isinstance(obj["notes"], str):
+                    continue
+                if label not in VALID_LABELS:
                     errors.append(
-                        f"Line {line_num} (id={id_}): 'notes' must be a string"
+                        f"Line {line_num} (id={id_}): Invalid label '{label}'"
                     )
 
-                # Check 4: valid labels
-                if labels is not None and isinstance(labels, list):
-                    if len(labels) != len(set(labels)):
+        # Check tweets (schema + relationships)
+        if tweets is not None and isinstance(tweets, list) and tweets:
+            seen_status_ids: set[str] = set()
+            tweet_nodes: list[dict[str, object]] = []
+            role_counts: defaultdict[str, int] = defaultdict(int)
+
+            for idx, tweet in enumerate(tweets, 1):
+                node = _validate_tweet(
+                    tweet,
+                    idx,
+                    line_num,
+                    id_,
+                    errors,
+                    warnings,
+                )
+                if node is None:
+                    continue
+
+                status_id = node.get("status_id")
+                if isinstance(status_id, str):
+                    status_id = status_id.strip()
+                    if status_id in seen_status_ids:
                         errors.append(
-                            f"Line {line_num} (id={id_}): Duplicate labels (labels={labels})"
+                            f"Line {line_num} (id={id_}): duplicate status_id '{status_id}' in tweets[]"
                         )
+                    else:
+                        seen_status_ids.add(status_id)
 
-                    for label in labels:
-                        if not _is_non_empty_string(label):
-                            errors.append(
-                                f"Line {line_num} (id={id_}): labels must contain non-empty strings (got {label!r})"
-                            )
-                            continue
-                        if label not in VALID_LABELS:
-                            errors.append(
-                                f"Line {line_num} (id={id_}): Invalid label '{label}'"
-                            )
-
-                # Check tweets (schema + relationships)
-                if tweets is not None and isinstance(tweets, list) and tweets:
-                    seen_status_ids: set[str] = set()
-                    tweet_nodes: list[dict[str, object]] = []
-                    role_counts: defaultdict[str, int] = defaultdict(int)
-
-                    for idx, tweet in enumerate(tweets, 1):
-                        node = _validate_tweet(
-                            tweet,
-                            idx,
-                            line_num,
-                            id_,
-                            errors,
-                            warnings,
-                        )
-                        if node is None:
-                            continue
-
-                        status_id = node.get("status_id")
-                        if isinstance(status_id, str):
-                            status_id = status_id.strip()
-                            if status_id in seen_status_ids:
-                                errors.append(
-                                    f"Line {line_num} (id={id_}): duplicate status_id '{status_id}' in tweets[]"
-                                )
-                            else:
-                                seen_status_ids.add(status_id)
-
-                        role = node.get("role")
-                        if isinstance(role, str):
-                            role_counts[role] += 1
-
-                        tweet_nodes.append(node)
-
-                    if role_counts.get("ai_reply", 0) < 1:
+                role = node.get("role")
+                if isinstance(role, str):
+                    role_counts[role] += 1
+
+                tweet_nodes.append(node)
+
+            if role_counts.get("ai_reply", 0) < 1:
+                errors.append(
+                    f"Line {line_num} (id={id_}): sample must include at least one tweet with role='ai_reply'"
+                )
+
+            for node in tweet_nodes:
+                tweet_idx = node.get("tweet_idx")
+                parent_status_id = node.get("parent_status_id")
+                if parent_status_id is None:
+                    continue
+
+                if isinstance(parent_status_id, str):
+                    parent_status_id = parent_status_id.strip()
+                    if parent_status_id not in seen_status_ids:
                         errors.append(
-                            f"Line {line_num} (id={id_}): sample must include at least one tweet with role='ai_reply'"
+                            f"Line {line_num} (id={id_}): tweets[{tweet_idx}].parent_status_id='{parent_status_id}' does not match any tweets[].status_id"
                         )
 
-                    for node in tweet_nodes:
-                        tweet_idx = node.get("tweet_idx")
-                        parent_status_id = node.get("parent_status_id")
-                        if parent_status_id is None:
-                            continue
 
-                        if isinstance(parent_status_id, str):
-                            parent_status_id = parent_status_id.strip()
-                            if parent_status_id not in seen_status_ids:
-                                errors.append(
-                                    f"Line {line_num} (id={id_}): tweets[{tweet_idx}].parent_status_id='{parent_status_id}' does not match any tweets[].status_id"
-                                )
+class ReplyIdCheck(DuplicateKeyCheck):
+    def key(self, obj: Any) -> Any:
+        if not isinstance(obj, dict):
+            return None
+        id_ = obj.get("id")
+        return id_.strip() if _is_non_empty_string(id_) else None
+
+
+class ReplyStatsCheck(RecordCheck):
+    """Label/role counts for the summary printed when all checks pass."""
+
+    def __init__(self, **options: Any) -> None:
+        super().__init__(**options)
+        self.labels: Counter[str] = Counter()
+        self.roles: Counter[str] = Counter()
+        self.tweets = 0
 
+    def visit(self, line_num: int, obj: Any, out: Issues) -> None:
+        if not isinstance(obj, dict):
+            return
+        for label in obj.get("labels", []) or []:
+            if isinstance(label, str):
+                self.labels[label] += 1
+
+        tweets = obj.get("tweets")
+        if isinstance(tweets, list):
+            self.tweets += len(tweets)
+            for tweet in tweets:
+                if isinstance(tweet, dict):
+                    role = tweet.get("role")
+                    if isinstance(role, str):
+                        self.roles[role] += 1
+
+    def partial(self) -> tuple[Counter[str], Counter[str], int]:
+        return self.labels, self.roles, self.tweets
+
+    @classmethod
+    def finalize(cls, partials: list[Any], out: Issues, stats: dict[str, Any]) -> None:
+        labels: Counter[str] = Counter()
+        roles: Counter[str] = Counter()
+        tweets = 0
+        for part_labels, part_roles, part_tweets in partials:
+            labels.update(part_labels)
+            roles.update(part_roles)
+            tweets += part_tweets
+        stats.update(labels=labels, roles=roles, tweets=tweets)
+
+
+PROFILE = Profile(checks=(ReplyRecordCheck, ReplyIdCheck, ReplyStatsCheck))
+
+
+def run_integrity(path: Path, *, workers: int = 1) -> FileResult:
+    """Run all checks in one pass over ``path``."""
+
+    try:
+        return check_file(path, PROFILE, workers=workers)
     except FileNotFoundError:
-        errors.append(f"File not found: {path}")
-        return errors, warnings
+        return FileResult(path, [f"File not found: {path}"], [], {}, 0, 0, 0)
 
-    # Check 3b: report duplicates
-    for id_, lines in id_counts.items():
-        if len(lines) > 1:
-            errors.append(f"Duplicate ID '{id_}' on lines: {lines}")
 
-    return errors, warnings
+def check_integrity(path: Path) -> tuple[list[str], list[str]]:
+    """Run all integrity checks. Returns (errors, warnings)."""
+
+    result = run_integrity(path)
+    return result.errors, result.warnings
 
 
 def main() -> None:
@@ -350,10 +405,14 @@ def main() -> None:
     )
     ap.add_argument("--strict", action="store_true", help="Treat warnings as errors")
     ap.add_argument("--quiet", action="store_true", help="Only output if errors found")
+    ap.add_argument(
+        "--workers", type=int, default=1, help="Check file chunks in parallel"
+    )
     args = ap.parse_args()
 
     path = Path(args.path)
-    errors, warnings = check_integrity(path)
+    result = run_integrity(path, workers=args.workers)
+    errors, warnings = result.errors, result.warnings
 
     exit_code = 0
 
@@ -379,30 +438,14 @@ def main() -> None:
                 print(f"  ... and {len(warnings) - 30} more warnings")
 
     if exit_code == 0 and not args.quiet:
-        with path.open(encoding="utf-8") as f:
-            rows = [json.loads(line) for line in f if line.strip()]
-
-        label_counts: defaultdict[str, int] = defaultdict(int)
-        role_counts: defaultdict[str, int] = defaultdict(int)
-        total_tweets = 0
-
-        for row in rows:
-            for label in row.get("labels", []) or []:
-                if isinstance(label, str):
-                    label_counts[label] += 1
-
-            tweets = row.get("tweets")
-            if isinstance(tweets, list):
-                total_tweets += len(tweets)
-                for tweet in tweets:
-                    if isinstance(tweet, dict):
-                        role = tweet.get("role")
-                        if isinstance(role, str):
-                            role_counts[role] += 1
+        # Stats come from the same pass as the checks.
+        label_counts = result.stats["labels"]
+        role_counts = result.stats["roles"]
+        total_tweets = result.stats["tweets"]
 
         print("All checks passed!")
         print("\nDataset stats:")
-        print(f"  Total entries: {len(rows)}")
+        print(f"  Total entries: {result.records}")
         print(f"  Total tweets: {total_tweets}")
         for role, count in sorted(role_counts.items(), key=lambda x: -x[1]):
             print(f"  tweets.role={role}: {count}")
@@ -5,6 +5,11 @@ Check data split leakage via ID overlap.
 By default checks pairwise overlap among train/valid/calib/holdout JSONL files.
 Optionally checks holdout overlap against one or more previous split files
 (JSONL with {"id": ...} rows or plain-text ID lists).
+
+With --near-dup, also finds near-duplicate texts across splits (MinHash LSH
+over text_normalized, see near_dup.py). Campaign templates reposted under new
+IDs pass the ID check but still leak. Split files given as ID lists take their
+text from --text-source, read by id through an in-memory index (jsonl_index.py).
 """
 
 from __future__ import annotations
@@ -13,6 +18,9 @@ import argparse
 import json
 from pathlib import Path
 
+from jsonl_index import JsonlIndex
+from near_dup import MinHashConfig, MinHasher, cluster_groups, near_duplicate_clusters
+
 REPO_ROOT = Path(__file__).parent.parent
 DATA_DIR = REPO_ROOT / "data"
 
@@ -20,36 +28,123 @@ DEFAULT_TRAIN = DATA_DIR / "train.jsonl"
 DEFAULT_VALID = DATA_DIR / "valid.jsonl"
 DEFAULT_CALIB = DATA_DIR / "calib.jsonl"
 DEFAULT_HOLDOUT = DATA_DIR / "holdout.jsonl"
+DEFAULT_TEXT_SOURCE = DATA_DIR / "sample.jsonl"
+SPLIT_PAIRS = [
+    ("train", "valid"),
+    ("train", "calib"),
+    ("train", "holdout"),
+    ("valid", "calib"),
+    ("valid", "holdout"),
+    ("calib", "holdout"),
+]
 
 
 def load_ids(path: Path) -> set[str]:
     if not path.exists():
         raise SystemExit(f"Missing file: {path}")
 
-    ids: set[str] = set()
     with path.open("r", encoding="utf-8") as handle:
-        first = handle.readline()
-        handle.seek(0)
-
-        is_jsonl = first.lstrip().startswith("{")
-
-        if is_jsonl:
-            for line in handle:
-                line = line.strip()
-                if not line:
-                    continue
-                obj = json.loads(line)
-                value = obj.get("id")
-                if value is None:
-                    continue
-                ids.add(str(value))
-        else:
-            for line in handle:
-                value = line.strip()
-                if value:
-                    ids.add(value)
-
-    return ids
+        is_jsonl = handle.readline().lstrip().startswith("{")
+        if not is_jsonl:
+            handle.seek(0)
+            return {value for line in handle if (value := line.strip())}
+
+    with JsonlIndex(path) as index:
+        return {sample_id for sample_id in index.ids() if sample_id is not None}
+
+
+def load_texts(path: Path) -> dict[str, str]:
+    texts: dict[str, str] = {}
+    with path.open("r", encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if not line or not line.startswith("{"):
+                continue
+            obj = json.loads(line)
+            value = obj.get("id")
+            text = obj.get("text") or obj.get("raw_text")
+            if value is not None and isinstance(text, str):
+                texts[str(value)] = text
+    return texts
+
+
+def near_dup_report(
+    split_paths: dict[str, Path],
+    split_ids: dict[str, set[str]],
+    *,
+    text_source: Path,
+    config: MinHashConfig,
+    workers: int,
+    max_clusters: int,
+) -> dict[str, object]:
+    source_index: JsonlIndex | None = None
+    row_ids: list[str] = []
+    row_splits: list[str] = []
+    row_texts: list[str] = []
+    missing_text: dict[str, int] = {}
+    for name, path in split_paths.items():
+        texts = load_texts(path)
+        missing = split_ids[name] - texts.keys()
+        if missing:
+            if source_index is None:
+                if not text_source.exists():
+                    raise SystemExit(f"Missing --text-source: {text_source}")
+                source_index = JsonlIndex(text_source)
+            for sample_id, obj in source_index.get_many(missing).items():
+                text = obj.get("text") or obj.get("raw_text")
+                if isinstance(text, str):
+                    texts[sample_id] = text
+        missing_text[name] = 0
+        for sample_id in sorted(split_ids[name]):
+            text = texts.get(sample_id)
+            if text is None:
+                missing_text[name] += 1
+                continue
+            row_ids.append(sample_id)
+            row_splits.append(name)
+            row_texts.append(text)
+    if source_index is not None:
+        source_index.close()
+
+    signatures = MinHasher(config).signatures(row_texts, workers=workers)
+    clusters = [
+        cluster
+        for cluster in near_duplicate_clusters(signatures, threshold=config.threshold)
+        if len(cluster_groups(cluster, row_splits)) > 1
+    ]
+
+    pair_clusters = {f"{left}_{right}": 0 for left, right in SPLIT_PAIRS}
+    # Rows of the right-hand split with a near-duplicate in the left-hand split.
+    pair_rows = {f"{left}_{right}": 0 for left, right in SPLIT_PAIRS}
+    examples: list[dict[str, object]] = []
+    for cluster in clusters:
+        counts = cluster_groups(cluster, row_splits)
+        for left, right in SPLIT_PAIRS:
+            if left in counts and right in counts:
+                pair_clusters[f"{left}_{right}"] += 1
+                pair_rows[f"{left}_{right}"] += counts[right]
+        if len(examples) < max_clusters:
+            members: dict[str, list[str]] = {}
+            for index in cluster:
+                members.setdefault(row_splits[index], []).append(row_ids[index])
+            examples.append(
+                {
+                    "size": len(cluster),
+                    "split_counts": counts,
+                    "ids": {name: ids[:20] for name, ids in members.items()},
+                    "example_text": row_texts[cluster[0]][:280],
+                }
+            )
+
+    return {
+        "params": config.to_dict(),
+        "rows_signed": len(row_texts),
+        "missing_text": missing_text,
+        "cross_split_clusters": len(clusters),
+        "pairwise_clusters": pair_clusters,
+        "pairwise_rows": pair_rows,
+        "clusters": examples,
+    }
 
 
 def main() -> None:
@@ -71,6 +166,32 @@ def main() -> None:
         default=None,
         help="Optional JSON report output path.",
     )
+    parser.add_argument(
+        "--near-dup",
+        action="store_true",
+        help="Also report cross-split near-duplicate clusters (MinHash LSH).",
+    )
+    parser.add_argument("--near-dup-threshold", type=float, default=0.8)
+    parser.add_argument("--num-perm", type=int, default=128)
+    parser.add_argument("--shingle-size", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--text-source",
+        type=Path,
+        default=DEFAULT_TEXT_SOURCE,
+        help="JSONL with id/text used for splits given as ID lists.",
+    )
+    parser.add_argument(
+        "--max-clusters",
+        type=int,
+        default=50,
+        help="Number of largest cross-split clusters listed in the report.",
+    )
+    parser.add_argument(
+        "--allow-near-dup",
+        action="store_true",
+        help="Report near-duplicates without failing the check.",
+    )
     args = parser.parse_args()
 
     split_paths = {
@@ -82,19 +203,10 @@ def main() -> None:
 
     split_ids = {name: load_ids(path) for name, path in split_paths.items()}
 
-    pairs = [
-        ("train", "valid"),
-        ("train", "calib"),
-        ("train", "holdout"),
-        ("valid", "calib"),
-        ("valid", "holdout"),
-        ("calib", "holdout"),
-    ]
-
     overlap_counts: dict[str, int] = {}
     has_error = False
 
-    for left, right in pairs:
+    for left, right in SPLIT_PAIRS:
         key = f"{left}_{right}"
         count = len(split_ids[left] & split_ids[right])
         overlap_counts[key] = count
@@ -130,12 +242,42 @@ def main() -> None:
                 f"  {item['path']}: overlap={item['holdout_overlap']} rows={item['rows']}"
             )
 
+    near_dup: dict[str, object] | None = None
+    if args.near_dup:
+        try:
+            config = MinHashConfig(
+                num_perm=args.num_perm,
+                shingle_size=args.shingle_size,
+                threshold=args.near_dup_threshold,
+            )
+        except ValueError as exc:
+            raise SystemExit(str(exc)) from exc
+        near_dup = near_dup_report(
+            split_paths,
+            split_ids,
+            text_source=args.text_source,
+            config=config,
+            workers=args.workers,
+            max_clusters=args.max_clusters,
+        )
+        print(
+            f"\nNear-duplicate clusters across splits "
+            f"(jaccard >= {config.threshold}): {near_dup['cross_split_clusters']}"
+        )
+        for key, count in near_dup["pairwise_clusters"].items():
+            rows = near_dup["pairwise_rows"][key]
+            print(f"  {key:16s}: clusters={count} right_rows={rows}")
+        if near_dup["cross_split_clusters"] and not args.allow_near_dup:
+            has_error = True
+
     report = {
         "split_counts": {name: len(ids) for name, ids in split_ids.items()},
         "pairwise_overlaps": overlap_counts,
         "holdout_forbidden_checks": forbidden_reports,
         "ok": not has_error,
     }
+    if near_dup is not None:
+        report["near_duplicates"] = near_dup
 
     if args.out is not None:
         args.out.parent.mkdir(parents=True, exist_ok=True)
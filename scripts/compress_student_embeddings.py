@@ -0,0 +1,574 @@
+#!/usr/bin/env python3
+"""Compress the student's word-embedding table below int8 and sweep size vs FPR.
+
+Dynamic int8 quantization stores the word embeddings as a uint8 table, which
+is still most of ``student.int8.onnx``. This script rewrites that table in
+the int8 graph with one of two smaller encodings. Each encoding decodes only
+the looked-up rows at inference time:
+
+- ``int4-b<B>``: symmetric 4-bit codes in blocks of B values, with one fp16
+  scale per block. Two codes are packed per byte. Gather(packed) and
+  Gather(scales) feed a nibble unpack and a Mul.
+- ``pq-d<D>-k<K>``: product quantization, as in fastText's ``-dsub``. Each row
+  is split into sub-vectors of D values, and each sub-vector is replaced by
+  a uint8 index into a K-entry fp16 codebook for its subspace (k-means).
+  Gather(codes) is offset per subspace and then gathers from the codebooks.
+
+Only standard opset-17 ops are used, so the graphs run on onnxruntime-web.
+For every variant the sweep reports file size, parity against the plain int8
+model, and the scam FPR at a fixed scam recall on the valid and holdout
+splits. A single encoding can be written to ``--out`` with ``--int4-block``
+or ``--pq-dsub``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+from onnxruntime.quantization import QuantType, quantize_dynamic
+
+from evaluate_transformer import infer_probs_onnx
+from export_transformer_student_onnx import enforce_parity, onnx_parity
+from onnx_benchmark import parse_int_csv
+from optimize_transformer_student_onnx import OrtReference
+from student_runtime import load_student_from_dir
+from transformer_common import (
+    DATA_DIR,
+    MODELS_DIR,
+    TRAINING_CLASSES,
+    PreparedRecord,
+    load_prepared_rows,
+    predict_labels_from_probs,
+    safe_div,
+    save_json,
+    summarize_label_predictions,
+    utc_now_iso,
+)
+
+DEFAULT_STUDENT_DIR = MODELS_DIR / "student"
+DEFAULT_IN = MODELS_DIR / "student.onnx"
+DEFAULT_VALID = DATA_DIR / "transformer" / "valid.prepared.jsonl"
+DEFAULT_HOLDOUT = DATA_DIR / "transformer" / "holdout.prepared.jsonl"
+DEFAULT_OUT_DIR = MODELS_DIR / "student_embeddings"
+DEFAULT_RESULTS = DEFAULT_OUT_DIR / "embedding_results.csv"
+DEFAULT_OUT = MODELS_DIR / "student.int8.emb.onnx"
+WORD_EMBEDDINGS = "bert.embeddings.word_embeddings.weight"
+NODE_PREFIX = "/bert/embeddings/word_embeddings/compressed"
+
+
+@dataclass(frozen=True)
+class EmbeddingSpec:
+    method: str  # "int8" (baseline), "int4" or "pq"
+    block_size: int = 0
+    dsub: int = 0
+    centroids: int = 0
+
+    @property
+    def name(self) -> str:
+        if self.method == "int4":
+            return f"int4-b{self.block_size}"
+        if self.method == "pq":
+            return f"pq-d{self.dsub}-k{self.centroids}"
+        return "int8"
+
+
+def build_specs(
+    block_sizes: list[int], dsubs: list[int], centroids: int
+) -> list[EmbeddingSpec]:
+    specs = [EmbeddingSpec("int8")]
+    specs.extend(EmbeddingSpec("int4", block_size=size) for size in block_sizes)
+    specs.extend(EmbeddingSpec("pq", dsub=dsub, centroids=centroids) for dsub in dsubs)
+    return specs
+
+
+def quantize_int4_blocks(
+    weight: np.ndarray, block_size: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return (packed uint8 [V, D/2], fp16 scales [V, D/block_size])."""
+
+    rows, dim = weight.shape
+    if dim % block_size or block_size % 2:
+        raise SystemExit(
+            f"int4 block size {block_size} must be even and divide hidden size {dim}"
+        )
+    blocks = weight.reshape(rows, dim // block_size, block_size).astype(np.float32)
+    scales = (np.abs(blocks).max(axis=-1) / 7.0).astype(np.float16)
+    scales[scales == 0] = 1.0
+    # Quantize against the fp16 scales the graph will actually multiply by.
+    codes = np.clip(
+        np.rint(blocks / scales.astype(np.float32)[..., None]), -8, 7
+    ).astype(np.int16)
+    codes = (codes + 8).astype(np.uint8).reshape(rows, dim // 2, 2)
+    packed = codes[..., 0] | (codes[..., 1] << 4)
+    return packed.astype(np.uint8), scales
+
+
+def kmeans(
+    points: np.ndarray, k: int, *, iters: int, seed: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Plain Lloyd's k-means; returns (centroids [k, d], assignments [n])."""
+
+    rng = np.random.default_rng(seed)
+    k = min(k, len(points))
+    centroids = points[rng.choice(len(points), size=k, replace=False)].copy()
+    assign = np.zeros(len(points), dtype=np.int64)
+    point_norms = (points**2).sum(axis=1, keepdims=True)
+    for _ in range(iters):
+        dists = point_norms - 2 * points @ centroids.T + (centroids**2).sum(axis=1)
+        new_assign = dists.argmin(axis=1)
+        counts = np.bincount(new_assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, new_assign, points)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            # Re-seed empty clusters with the worst-fit points.
+            worst = dists[np.arange(len(points)), new_assign].argsort()[::-1]
+            centroids[empty] = points[worst[: int(empty.sum())]]
+        if np.array_equal(new_assign, assign):
+            break
+        assign = new_assign
+    return centroids, assign
+
+
+def product_quantize(
+    weight: np.ndarray, *, dsub: int, centroids: int, iters: int, seed: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return (codes uint8 [V, D/dsub], fp16 codebooks [D/dsub * K, dsub])."""
+
+    rows, dim = weight.shape
+    if dim % dsub:
+        raise SystemExit(f"PQ dsub {dsub} must divide hidden size {dim}")
+    if not 1 < centroids <= 256:
+        raise SystemExit("PQ centroids must be in (1, 256] to fit uint8 codes")
+    nsub = dim // dsub
+    codes = np.zeros((rows, nsub), dtype=np.uint8)
+    codebooks = np.zeros((nsub, centroids, dsub), dtype=np.float32)
+    for sub in range(nsub):
+        points = weight[:, sub * dsub : (sub + 1) * dsub].astype(np.float32)
+        book, assign = kmeans(points, centroids, iters=iters, seed=seed + sub)
+        codebooks[sub, : len(book)] = book
+        codes[:, sub] = assign
+    return codes, codebooks.reshape(nsub * centroids, dsub).astype(np.float16)
+
+
+def int4_decoder(
+    packed: np.ndarray, scales: np.ndarray, *, ids: str, output: str
+) -> tuple[list[onnx.NodeProto], list[onnx.TensorProto]]:
+    half_dim = packed.shape[1]
+    num_blocks = scales.shape[1]
+    block_size = 2 * half_dim // num_blocks
+    p = NODE_PREFIX
+    initializers = [
+        numpy_helper.from_array(packed, f"{WORD_EMBEDDINGS}_int4"),
+        numpy_helper.from_array(scales, f"{WORD_EMBEDDINGS}_int4_scale"),
+        numpy_helper.from_array(np.array(16.0, dtype=np.float32), f"{p}/sixteen"),
+        numpy_helper.from_array(np.array(8.0, dtype=np.float32), f"{p}/eight"),
+        numpy_helper.from_array(np.array([-1], dtype=np.int64), f"{p}/last_axis"),
+        numpy_helper.from_array(
+            np.array([0, 0, num_blocks, block_size], dtype=np.int64),
+            f"{p}/block_shape",
+        ),
+        numpy_helper.from_array(
+            np.array([0, 0, 2 * half_dim], dtype=np.int64), f"{p}/out_shape"
+        ),
+    ]
+    # Nibbles are unpacked in float: hi = floor(x / 16), lo = x - 16 * hi.
+    nodes = [
+        helper.make_node("Gather", [f"{WORD_EMBEDDINGS}_int4", ids], [f"{p}/packed"]),
+        helper.make_node("Cast", [f"{p}/packed"], [f"{p}/x"], to=TensorProto.FLOAT),
+        helper.make_node("Div", [f"{p}/x", f"{p}/sixteen"], [f"{p}/x16"]),
+        helper.make_node("Floor", [f"{p}/x16"], [f"{p}/hi"]),
+        helper.make_node("Mul", [f"{p}/hi", f"{p}/sixteen"], [f"{p}/hi16"]),
+        helper.make_node("Sub", [f"{p}/x", f"{p}/hi16"], [f"{p}/lo"]),
+        helper.make_node("Unsqueeze", [f"{p}/lo", f"{p}/last_axis"], [f"{p}/lo_u"]),
+        helper.make_node("Unsqueeze", [f"{p}/hi", f"{p}/last_axis"], [f"{p}/hi_u"]),
+        helper.make_node("Concat", [f"{p}/lo_u", f"{p}/hi_u"], [f"{p}/q"], axis=-1),
+        helper.make_node("Sub", [f"{p}/q", f"{p}/eight"], [f"{p}/q_signed"]),
+        helper.make_node(
+            "Reshape", [f"{p}/q_signed", f"{p}/block_shape"], [f"{p}/q_blocks"]
+        ),
+        helper.make_node(
+            "Gather", [f"{WORD_EMBEDDINGS}_int4_scale", ids], [f"{p}/scale_h"]
+        ),
+        helper.make_node(
+            "Cast", [f"{p}/scale_h"], [f"{p}/scale"], to=TensorProto.FLOAT
+        ),
+        helper.make_node(
+            "Unsqueeze", [f"{p}/scale", f"{p}/last_axis"], [f"{p}/scale_u"]
+        ),
+        helper.make_node("Mul", [f"{p}/q_blocks", f"{p}/scale_u"], [f"{p}/blocks"]),
+        helper.make_node("Reshape", [f"{p}/blocks", f"{p}/out_shape"], [output]),
+    ]
+    return nodes, initializers
+
+
+def pq_decoder(
+    codes: np.ndarray, codebooks: np.ndarray, *, ids: str, output: str
+) -> tuple[list[onnx.NodeProto], list[onnx.TensorProto]]:
+    nsub = codes.shape[1]
+    centroids = codebooks.shape[0] // nsub
+    dim = nsub * codebooks.shape[1]
+    p = NODE_PREFIX
+    initializers = [
+        numpy_helper.from_array(codes, f"{WORD_EMBEDDINGS}_pq_codes"),
+        numpy_helper.from_array(codebooks, f"{WORD_EMBEDDINGS}_pq_codebooks"),
+        numpy_helper.from_array(
+            np.arange(nsub, dtype=np.int64) * centroids, f"{p}/sub_offsets"
+        ),
+        numpy_helper.from_array(
+            np.array([0, 0, dim], dtype=np.int64), f"{p}/out_shape"
+        ),
+    ]
+    nodes = [
+        helper.make_node(
+            "Gather", [f"{WORD_EMBEDDINGS}_pq_codes", ids], [f"{p}/codes"]
+        ),
+        helper.make_node(
+            "Cast", [f"{p}/codes"], [f"{p}/codes_i"], to=TensorProto.INT64
+        ),
+        helper.make_node("Add", [f"{p}/codes_i", f"{p}/sub_offsets"], [f"{p}/rows"]),
+        helper.make_node(
+            "Gather", [f"{WORD_EMBEDDINGS}_pq_codebooks", f"{p}/rows"], [f"{p}/subs_h"]
+        ),
+        helper.make_node("Cast", [f"{p}/subs_h"], [f"{p}/subs"], to=TensorProto.FLOAT),
+        helper.make_node("Reshape", [f"{p}/subs", f"{p}/out_shape"], [output]),
+    ]
+    return nodes, initializers
+
+
+def replace_word_embeddings(
+    int8_path: Path,
+    out_path: Path,
+    *,
+    weight: np.ndarray,
+    spec: EmbeddingSpec,
+    pq_iters: int,
+    seed: int,
+) -> None:
+    """Swap the int8 word-embedding Gather+DequantizeLinear for a decoder."""
+
+    model = onnx.load(str(int8_path))
+    graph = model.graph
+    quantized = f"{WORD_EMBEDDINGS}_quantized"
+    gather = next(
+        (n for n in graph.node if n.op_type == "Gather" and n.input[0] == quantized),
+        None,
+    )
+    if gather is None:
+        raise SystemExit(f"No Gather over {quantized} in {int8_path}")
+    dequant = next(
+        n
+        for n in graph.node
+        if n.op_type == "DequantizeLinear" and n.input[0] == gather.output[0]
+    )
+
+    if spec.method == "int4":
+        packed, scales = quantize_int4_blocks(weight, spec.block_size)
+        nodes, initializers = int4_decoder(
+            packed, scales, ids=gather.input[1], output=dequant.output[0]
+        )
+    else:
+        codes, codebooks = product_quantize(
+            weight,
+            dsub=spec.dsub,
+            centroids=spec.centroids,
+            iters=pq_iters,
+            seed=seed,
+        )
+        nodes, initializers = pq_decoder(
+            codes, codebooks, ids=gather.input[1], output=dequant.output[0]
+        )
+
+    position = list(graph.node).index(gather)
+    kept_nodes = [n for n in graph.node if n is not gather and n is not dequant]
+    kept_nodes[position:position] = nodes
+    del graph.node[:]
+    graph.node.extend(kept_nodes)
+
+    dropped = {gather.input[0], *dequant.input[1:]}
+    kept_inits = [init for init in graph.initializer if init.name not in dropped]
+    del graph.initializer[:]
+    graph.initializer.extend(kept_inits + initializers)
+    onnx.checker.check_model(model)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    onnx.save(model, str(out_path))
+
+
+def embedding_bytes(path: Path) -> int:
+    graph = onnx.load(str(path)).graph
+    return sum(
+        len(init.raw_data) or numpy_helper.to_array(init).nbytes
+        for init in graph.initializer
+        if init.name.startswith(WORD_EMBEDDINGS)
+    )
+
+
+def scam_fpr_at_recall(
+    y_true: list[str], scam_probs: np.ndarray, *, target_recall: float
+) -> dict[str, float]:
+    """Highest scam threshold whose recall reaches target_recall, and its FPR."""
+
+    gold = np.array([label == "scam" for label in y_true])
+    positives = int(gold.sum())
+    negatives = len(gold) - positives
+    if positives == 0:
+        return {"threshold": 1.0, "fpr": 0.0, "recall": 0.0, "precision": 0.0}
+    order = np.argsort(-scam_probs, kind="stable")
+    tp_curve = np.cumsum(gold[order])
+    cutoff = int(np.searchsorted(tp_curve, np.ceil(target_recall * positives)))
+    threshold = float(scam_probs[order[min(cutoff, len(order) - 1)]])
+    pred = scam_probs >= threshold
+    tp = int((pred & gold).sum())
+    fp = int((pred & ~gold).sum())
+    return {
+        "threshold": threshold,
+        "fpr": safe_div(fp, negatives),
+        "recall": safe_div(tp, positives),
+        "precision": safe_div(tp, tp + fp),
+    }
+
+
+def evaluate_variant(
+    path: Path,
+    splits: dict[str, list[PreparedRecord]],
+    *,
+    tokenizer,
+    max_length: int,
+    thresholds: dict,
+    batch_size: int,
+    target_recall: float,
+) -> dict[str, dict]:
+    metrics = {}
+    for split, rows in splits.items():
+        scam_probs, topic_probs = infer_probs_onnx(
+            rows,
+            onnx_path=path,
+            tokenizer=tokenizer,
+            max_length=max_length,
+            batch_size=batch_size,
+        )
+        y_true = [row.collapsed_label for row in rows]
+        preds = predict_labels_from_probs(
+            scam_probs,
+            topic_probs,
+            scam_threshold=float(thresholds.get("scam", 0.5)),
+            topic_threshold=float(thresholds.get("topic_crypto", 0.5)),
+        )
+        summary = summarize_label_predictions(y_true, preds, classes=TRAINING_CLASSES)
+        metrics[split] = {
+            "macro_f1": float(summary["macro"]["f1"]),
+            "scam_at_recall": scam_fpr_at_recall(
+                y_true, scam_probs, target_recall=target_recall
+            ),
+        }
+    return metrics
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--student-dir", type=Path, default=DEFAULT_STUDENT_DIR)
+    parser.add_argument(
+        "--input", type=Path, default=DEFAULT_IN, help="fp32 student ONNX export"
+    )
+    parser.add_argument("--valid", type=Path, default=DEFAULT_VALID)
+    parser.add_argument("--holdout", type=Path, default=DEFAULT_HOLDOUT)
+    parser.add_argument("--out-dir", type=Path, default=DEFAULT_OUT_DIR)
+    parser.add_argument(
+        "--results",
+        type=Path,
+        default=DEFAULT_RESULTS,
+        help="CSV output path (use '-' to skip writing)",
+    )
+    parser.add_argument("--block-sizes", default="16,32")
+    parser.add_argument("--dsubs", default="2,4,8")
+    parser.add_argument("--pq-centroids", type=int, default=256)
+    parser.add_argument("--pq-iters", type=int, default=25)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--int4-block",
+        type=int,
+        default=None,
+        help="Write a single int4 model with this block size to --out",
+    )
+    parser.add_argument(
+        "--pq-dsub",
+        type=int,
+        default=None,
+        help="Write a single PQ model with this dsub to --out",
+    )
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT)
+    parser.add_argument(
+        "--target-recall",
+        type=float,
+        default=0.9,
+        help="Scam recall at which FPR is reported",
+    )
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--parity-samples", type=int, default=1000)
+    parser.add_argument("--max-mean-delta", type=float, default=0.01)
+    parser.add_argument("--min-label-agreement", type=float, default=0.99)
+    args = parser.parse_args()
+
+    for path in (args.student_dir, args.input, args.valid, args.holdout):
+        if not path.exists():
+            raise SystemExit(f"Missing required input: {path}")
+    if args.int4_block is not None and args.pq_dsub is not None:
+        raise SystemExit("Pass at most one of --int4-block and --pq-dsub")
+
+    single_mode = args.int4_block is not None or args.pq_dsub is not None
+    if args.int4_block is not None:
+        specs = [EmbeddingSpec("int4", block_size=args.int4_block)]
+    elif args.pq_dsub is not None:
+        specs = [EmbeddingSpec("pq", dsub=args.pq_dsub, centroids=args.pq_centroids)]
+    else:
+        try:
+            specs = build_specs(
+                parse_int_csv(args.block_sizes),
+                parse_int_csv(args.dsubs),
+                args.pq_centroids,
+            )
+        except ValueError as exc:
+            raise SystemExit(str(exc)) from exc
+
+    _, tokenizer, config = load_student_from_dir(args.student_dir)
+    max_length = int(config["architecture"]["max_length"])
+    thresholds = config.get("thresholds", {"scam": 0.5, "topic_crypto": 0.5})
+    splits = {
+        "valid": load_prepared_rows(args.valid),
+        "holdout": load_prepared_rows(args.holdout),
+    }
+    parity_rows = splits["valid"][: args.parity_samples]
+
+    weight = next(
+        (
+            numpy_helper.to_array(init)
+            for init in onnx.load(str(args.input)).graph.initializer
+            if init.name == WORD_EMBEDDINGS
+        ),
+        None,
+    )
+    if weight is None:
+        raise SystemExit(f"{args.input} has no {WORD_EMBEDDINGS} initializer")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        int8_path = Path(tmp) / "student.int8.onnx"
+        quantize_dynamic(
+            model_input=str(args.input),
+            model_output=str(int8_path),
+            weight_type=QuantType.QInt8,
+        )
+        reference = OrtReference(int8_path)
+
+        for spec in specs:
+            if spec.method == "int8":
+                path = int8_path
+            else:
+                path = args.out if single_mode else args.out_dir / f"{spec.name}.onnx"
+                replace_word_embeddings(
+                    int8_path,
+                    path,
+                    weight=weight,
+                    spec=spec,
+                    pq_iters=args.pq_iters,
+                    seed=args.seed,
+                )
+            print(f"[{spec.name}] {path.stat().st_size / 1024:.1f} KiB")
+            parity = onnx_parity(
+                reference,
+                path,
+                parity_rows,
+                tokenizer=tokenizer,
+                max_length=max_length,
+                batch_size=args.batch_size,
+                thresholds=thresholds,
+            )
+            if single_mode:
+                enforce_parity(
+                    parity,
+                    max_mean_delta=args.max_mean_delta,
+                    min_label_agreement=args.min_label_agreement,
+                )
+            metrics = evaluate_variant(
+                path,
+                splits,
+                tokenizer=tokenizer,
+                max_length=max_length,
+                thresholds=thresholds,
+                batch_size=args.batch_size,
+                target_recall=args.target_recall,
+            )
+            results.append(
+                {
+                    "name": spec.name,
+                    "method": spec.method,
+                    "block_size": spec.block_size or "",
+                    "dsub": spec.dsub or "",
+                    "centroids": spec.centroids or "",
+                    "size_bytes": path.stat().st_size,
+                    "embedding_bytes": embedding_bytes(path),
+                    "parity_mean_abs_delta": round(
+                        float(parity["mean_abs_prob_delta"]), 6
+                    ),
+                    "parity_label_agreement": round(
+                        float(parity["label_agreement"]), 4
+                    ),
+                    **{
+                        f"{split}_{key}": round(value, 4)
+                        for split, item in metrics.items()
+                        for key, value in (
+                            ("macro_f1", item["macro_f1"]),
+                            ("scam_fpr", item["scam_at_recall"]["fpr"]),
+                            ("scam_recall", item["scam_at_recall"]["recall"]),
+                        )
+                    },
+                    "model_path": "" if spec.method == "int8" else str(path),
+                }
+            )
+
+    print(
+        f"{'variant':<14} {'KiB':>8} {'emb KiB':>8} {'delta':>8} "
+        f"{'valid fpr':>9} {'holdout fpr':>11}  (scam recall >= {args.target_recall})"
+    )
+    for row in results:
+        print(
+            f"{row['name']:<14} {row['size_bytes'] / 1024:>8.1f} "
+            f"{row['embedding_bytes'] / 1024:>8.1f} "
+            f"{row['parity_mean_abs_delta']:>8.4f} "
+            f"{row['valid_scam_fpr']:>9.4f} {row['holdout_scam_fpr']:>11.4f}"
+        )
+
+    if str(args.results) != "-":
+        args.results.parent.mkdir(parents=True, exist_ok=True)
+        with args.results.open("w", encoding="utf-8", newline="") as handle:
+            writer = csv.DictWriter(handle, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+        save_json(
+            args.results.with_suffix(".meta.json"),
+            {
+                "created_at": utc_now_iso(),
+                "student_dir": str(args.student_dir),
+                "input": str(args.input),
+                "target_scam_recall": args.target_recall,
+                "pq_iters": args.pq_iters,
+                "seed": args.seed,
+            },
+        )
+        print(f"Wrote results to {args.results}")
+    if single_mode:
+        print(f"Wrote {specs[0].name} model to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""Single-pass, chunk-parallel record checks for JSONL datasets.
+
+A check is a ``RecordCheck`` visitor. A ``Profile`` bundles checks with the
+messages for blank and unparsable lines, and each file is checked against
+one profile. The engine works in three steps:
+
+1. Split the file into line-aligned byte ranges. The first line number of
+   each range comes from counting newlines, so no JSON is parsed here.
+2. Each worker parses its range once and runs every check of the profile on
+   each record, in order.
+3. The parent combines the per-chunk state of each check in file order
+   (duplicate ids, stats) with ``RecordCheck.finalize``.
+
+Issues keep the exact message strings the standalone checkers print. They are
+ordered by line number; file-level issues come last.
+"""
+
+from __future__ import annotations
+
+import json
+import multiprocessing as mp
+import sys
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from label_store import is_label_store, iter_dataset_lines
+
+END_OF_FILE = sys.maxsize  # sort key for issues not tied to one line
+
+
+class Issues:
+    """Errors and warnings as (line, message), in emission order."""
+
+    def __init__(self) -> None:
+        self.errors: list[tuple[int, str]] = []
+        self.warnings: list[tuple[int, str]] = []
+
+    def error(self, line: int, message: str) -> None:
+        self.errors.append((line, message))
+
+    def warning(self, line: int, message: str) -> None:
+        self.warnings.append((line, message))
+
+    def extend(self, other: Issues) -> None:
+        self.errors.extend(other.errors)
+        self.warnings.extend(other.warnings)
+
+
+class RecordCheck:
+    """Visitor run on every parsed record of a file.
+
+    Each worker builds a fresh instance per chunk. ``partial`` is the
+    picklable state it hands back. ``finalize`` runs once in the parent with
+    the partials of all chunks in file order.
+    """
+
+    def __init__(self, **options: Any) -> None:
+        self.options = options
+
+    def visit(self, line_num: int, obj: Any, out: Issues) -> None:
+        raise NotImplementedError
+
+    def partial(self) -> Any:
+        return None
+
+    @classmethod
+    def finalize(cls, partials: list[Any], out: Issues, stats: dict[str, Any]) -> None:
+        return None
+
+
+class DuplicateKeyCheck(RecordCheck):
+    """Tracks ``key(obj) -> [(line, detail)]`` across chunks.
+
+    By default every key seen on more than one line is reported once at the
+    end, as check_integrity.py does.
+    """
+
+    def __init__(self, **options: Any) -> None:
+        super().__init__(**options)
+        self.seen: dict[Any, list[tuple[int, Any]]] = {}
+
+    def key(self, obj: Any) -> Any:
+        return obj.get("id") if isinstance(obj, dict) else None
+
+    def detail(self, obj: Any) -> Any:
+        return None
+
+    def visit(self, line_num: int, obj: Any, out: Issues) -> None:
+        key = self.key(obj)
+        if key is not None:
+            self.seen.setdefault(key, []).append((line_num, self.detail(obj)))
+
+    def partial(self) -> dict[Any, list[tuple[int, Any]]]:
+        return self.seen
+
+    @classmethod
+    def finalize(cls, partials: list[Any], out: Issues, stats: dict[str, Any]) -> None:
+        merged: dict[Any, list[tuple[int, Any]]] = {}
+        for part in partials:
+            for key, hits in part.items():
+                merged.setdefault(key, []).extend(hits)
+        for key, hits in merged.items():
+            if len(hits) > 1:
+                cls.report(key, hits, out)
+
+    @classmethod
+    def report(cls, key: Any, hits: list[tuple[int, Any]], out: Issues) -> None:
+        out.error(
+            END_OF_FILE, f"Duplicate ID '{key}' on lines: {[line for line, _ in hits]}"
+        )
+
+
+@dataclass
+class Profile:
+    checks: tuple[type[RecordCheck], ...]
+    invalid_json: str = "Line {line}: Invalid JSON - {error}"
+    # Warning for blank lines; None skips them silently.
+    empty_line: str | None = "Line {line}: Empty line"
+    options: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class FileResult:
+    path: Path
+    errors: list[str]
+    warnings: list[str]
+    stats: dict[str, Any]
+    total: int  # non-blank lines
+    records: int  # lines that parsed as JSON
+    valid: int  # non-blank lines without errors
+
+
+def plan_chunks(path: Path, chunk_bytes: int) -> list[tuple[int, int, int]]:
+    """Line-aligned (start, end, first_line) ranges covering ``path``."""
+
+    tasks: list[tuple[int, int, int]] = []
+    size = path.stat().st_size
+    start = 0
+    first_line = 1
+    with path.open("rb") as handle:
+        while start < size:
+            data = handle.read(chunk_bytes)
+            if handle.tell() < size and not data.endswith(b"\n"):
+                data += handle.readline()
+            end = start + len(data)
+            tasks.append((start, end, first_line))
+            first_line += data.count(b"\n")
+            start = end
+    return tasks
+
+
+def _iter_range(path: Path, start: int, end: int) -> Iterator[str]:
+    with path.open("rb") as handle:
+        handle.seek(start)
+        while handle.tell() < end:
+            line = handle.readline()
+            if not line:
+                break
+            yield line.decode("utf-8")
+
+
+def run_checks(
+    lines: Iterable[str], first_line: int, profile: Profile
+) -> tuple[Issues, list[Any], int, set[int]]:
+    """Parse ``lines`` once and run every check of ``profile`` on each record."""
+
+    checks = [check_cls(**profile.options) for check_cls in profile.checks]
+    out = Issues()
+    records = 0
+    nonblank: set[int] = set()
+    for line_num, line in enumerate(lines, first_line):
+        line = line.strip()
+        if not line:
+            if profile.empty_line is not None:
+                out.warning(line_num, profile.empty_line.format(line=line_num))
+            continue
+        nonblank.add(line_num)
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError as e:
+            out.error(line_num, profile.invalid_json.format(line=line_num, error=e))
+            continue
+        records += 1
+        for check in checks:
+            check.visit(line_num, obj, out)
+    return out, [check.partial() for check in checks], records, nonblank
+
+
+def _run_task(task: tuple[str, int, int, int, Profile]):
+    path, start, end, first_line, profile = task
+    return run_checks(_iter_range(Path(path), start, end), first_line, profile)
+
+
+def check_files(
+    jobs: list[tuple[Path, Profile]], *, workers: int = 1, chunk_mb: float = 8.0
+) -> list[FileResult]:
+    """Check each (path, profile) job; chunks of all files share one pool.
+
+    Raises FileNotFoundError for a missing path.
+    """
+
+    chunk_bytes = max(1, int(chunk_mb * 1024 * 1024))
+    tasks: list[tuple[str, int, int, int, Profile]] = []
+    owners: list[int] = []
+    inline: dict[int, Any] = {}
+    for job_idx, (path, profile) in enumerate(jobs):
+        if not path.exists():
+            raise FileNotFoundError(path)
+        if is_label_store(path):
+            # Label stores are read sequentially; there are no byte ranges.
+            inline[job_idx] = run_checks(iter_dataset_lines(path), 1, profile)
+            continue
+        for start, end, first_line in plan_chunks(path, chunk_bytes):
+            tasks.append((str(path), start, end, first_line, profile))
+            owners.append(job_idx)
+
+    if workers > 1 and len(tasks) > 1:
+        with mp.get_context("spawn").Pool(workers) as pool:
+            chunk_results = pool.map(_run_task, tasks)
+    else:
+        chunk_results = [_run_task(task) for task in tasks]
+
+    per_job: dict[int, list[Any]] = {idx: [] for idx in range(len(jobs))}
+    for job_idx, result in zip(owners, chunk_results):
+        per_job[job_idx].append(result)
+    for job_idx, result in inline.items():
+        per_job[job_idx].append(result)
+
+    results = []
+    for job_idx, (path, profile) in enumerate(jobs):
+        out = Issues()
+        partials: list[list[Any]] = [[] for _ in profile.checks]
+        records = 0
+        nonblank: set[int] = set()
+        for chunk_out, chunk_partials, chunk_records, chunk_lines in per_job[job_idx]:
+            out.extend(chunk_out)
+            for bucket, part in zip(partials, chunk_partials):
+                bucket.append(part)
+            records += chunk_records
+            nonblank |= chunk_lines
+        stats: dict[str, Any] = {}
+        for check_cls, bucket in zip(profile.checks, partials):
+            check_cls.finalize(bucket, out, stats)
+        # Stable sort: same-line issues keep visitor order, finalize issues last.
+        errors = sorted(out.errors, key=lambda item: item[0])
+        warnings = sorted(out.warnings, key=lambda item: item[0])
+        error_lines = {line for line, _ in errors}
+        results.append(
+            FileResult(
+                path=path,
+                errors=[message for _, message in errors],
+                warnings=[message for _, message in warnings],
+                stats=stats,
+                total=len(nonblank),
+                records=records,
+                valid=len(nonblank - error_lines),
+            )
+        )
+    return results
+
+
+def check_file(
+    path: Path, profile: Profile, *, workers: int = 1, chunk_mb: float = 8.0
+) -> FileResult:
+    return check_files([(path, profile)], workers=workers, chunk_mb=chunk_mb)[0]
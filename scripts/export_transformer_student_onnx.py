@@ -63,61 +63,25 @@ def collate(batch: list[dict]) -> dict:
     }
 
 
-def main() -> None:
-    parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument("--student-dir", type=Path, default=DEFAULT_STUDENT_DIR)
-    parser.add_argument("--train", type=Path, default=DEFAULT_TRAIN)
-    parser.add_argument("--valid", type=Path, default=DEFAULT_VALID)
-    parser.add_argument("--out", type=Path, default=DEFAULT_OUT)
-    parser.add_argument("--opset", type=int, default=17)
-    parser.add_argument("--batch-size", type=int, default=64)
-    parser.add_argument("--parity-samples", type=int, default=1000)
-    parser.add_argument("--max-length", type=int, default=96)
-    parser.add_argument("--max-unk-ratio", type=float, default=0.05)
-    parser.add_argument("--tokenizer-sanity-sample-size", type=int, default=512)
-    parser.add_argument("--max-mean-delta", type=float, default=0.01)
-    parser.add_argument("--min-label-agreement", type=float, default=0.99)
-    args = parser.parse_args()
-
-    for path in (args.student_dir, args.train, args.valid):
-        if not Path(path).exists():
-            raise SystemExit(f"Missing required input: {path}")
-    if args.parity_samples < 1000:
-        raise SystemExit(
-            f"parity-samples must be >= 1000 per plan acceptance criteria, got {args.parity_samples}."
-        )
-
-    model, tokenizer, payload = load_student_from_dir(args.student_dir)
-    arch = payload["architecture"]
-    thresholds = payload.get("thresholds", {"scam": 0.5, "topic_crypto": 0.5})
-    max_length = int(arch.get("max_length", args.max_length))
-
-    rows = load_prepared_rows(args.valid) + load_prepared_rows(args.train)
-    tokenizer_stats = assert_tokenizer_sanity(
-        tokenizer=tokenizer,
-        expected_vocab_size=int(arch["vocab_size"]),
-        context="export_transformer_student_onnx.py",
-        sample_texts=[row.text_normalized for row in rows],
-        max_length=max_length,
-        max_unk_ratio=args.max_unk_ratio,
-        sample_size=args.tokenizer_sanity_sample_size,
-    )
-    print(
-        "Tokenizer sanity: "
-        f"backend_vocab={tokenizer_stats['backend_vocab_size']} "
-        f"len={tokenizer_stats['loaded_vocab_size']} "
-        f"unk_ratio={float(tokenizer_stats.get('sample_unk_ratio', 0.0)):.4f} "
-        f"sample_count={int(tokenizer_stats.get('sample_count', 0))}"
-    )
-
+def export_student_onnx(
+    model: torch.nn.Module,
+    out_path: Path,
+    *,
+    max_length: int,
+    opset: int,
+    attn_implementation: str | None = None,
+) -> None:
+    if attn_implementation is not None:
+        # ORT's transformer optimizer only fuses the eager attention pattern.
+        model.bert.set_attn_implementation(attn_implementation)
     dummy_input_ids = torch.ones((1, max_length), dtype=torch.long)
     dummy_attention = torch.ones((1, max_length), dtype=torch.long)
 
-    args.out.parent.mkdir(parents=True, exist_ok=True)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
     torch.onnx.export(
         model,
         (dummy_input_ids, dummy_attention),
-        str(args.out),
+        str(out_path),
         input_names=["input_ids", "attention_mask"],
         output_names=["scam_logits", "topic_logits"],
         dynamic_axes={
@@ -126,23 +90,30 @@ def main() -> None:
             "scam_logits": {0: "batch"},
             "topic_logits": {0: "batch"},
         },
-        opset_version=args.opset,
+        opset_version=opset,
         dynamo=False,
     )
-    print(f"Exported ONNX model to {args.out}")
 
-    if len(rows) < args.parity_samples:
-        raise SystemExit(
-            f"Need at least {args.parity_samples} samples for parity, but only found {len(rows)}."
-        )
-    rows = rows[: args.parity_samples]
+
+def onnx_parity(
+    model: torch.nn.Module,
+    onnx_path: Path,
+    rows,
+    *,
+    tokenizer: BertTokenizerFast,
+    max_length: int,
+    batch_size: int,
+    thresholds: dict,
+) -> dict:
+    """Compare torch and ORT probabilities/labels for ``rows``."""
+
     dataset = EvalDataset(rows, tokenizer=tokenizer, max_length=max_length)
     loader = DataLoader(
-        dataset, batch_size=args.batch_size, shuffle=False, collate_fn=collate
+        dataset, batch_size=batch_size, shuffle=False, collate_fn=collate
     )
 
     ort_session = ort.InferenceSession(
-        str(args.out), providers=["CPUExecutionProvider"]
+        str(onnx_path), providers=["CPUExecutionProvider"]
     )
 
     deltas: list[float] = []
@@ -201,16 +172,99 @@ def main() -> None:
 
     print(f"Parity mean abs prob delta: {mean_delta:.6f}")
     print(f"Parity label agreement: {label_agreement:.4%} ({matches}/{total})")
+    return {
+        "mean_abs_prob_delta": mean_delta,
+        "label_agreement": label_agreement,
+        "matches": matches,
+        "total": total,
+    }
 
-    if mean_delta > args.max_mean_delta:
+
+def enforce_parity(
+    parity: dict, *, max_mean_delta: float, min_label_agreement: float
+) -> None:
+    mean_delta = float(parity["mean_abs_prob_delta"])
+    label_agreement = float(parity["label_agreement"])
+    if mean_delta > max_mean_delta:
         raise SystemExit(
-            f"Parity check failed: mean abs probability delta {mean_delta:.6f} > {args.max_mean_delta:.6f}"
+            f"Parity check failed: mean abs probability delta {mean_delta:.6f} > {max_mean_delta:.6f}"
         )
-    if label_agreement < args.min_label_agreement:
+    if label_agreement < min_label_agreement:
         raise SystemExit(
-            f"Parity check failed: label agreement {label_agreement:.4%} < {args.min_label_agreement:.4%}"
+            f"Parity check failed: label agreement {label_agreement:.4%} < {min_label_agreement:.4%}"
         )
 
 
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--student-dir", type=Path, default=DEFAULT_STUDENT_DIR)
+    parser.add_argument("--train", type=Path, default=DEFAULT_TRAIN)
+    parser.add_argument("--valid", type=Path, default=DEFAULT_VALID)
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT)
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--parity-samples", type=int, default=1000)
+    parser.add_argument("--max-length", type=int, default=96)
+    parser.add_argument("--max-unk-ratio", type=float, default=0.05)
+    parser.add_argument("--tokenizer-sanity-sample-size", type=int, default=512)
+    parser.add_argument("--max-mean-delta", type=float, default=0.01)
+    parser.add_argument("--min-label-agreement", type=float, default=0.99)
+    args = parser.parse_args()
+
+    for path in (args.student_dir, args.train, args.valid):
+        if not Path(path).exists():
+            raise SystemExit(f"Missing required input: {path}")
+    if args.parity_samples < 1000:
+        raise SystemExit(
+            f"parity-samples must be >= 1000 per plan acceptance criteria, got {args.parity_samples}."
+        )
+
+    model, tokenizer, payload = load_student_from_dir(args.student_dir)
+    arch = payload["architecture"]
+    thresholds = payload.get("thresholds", {"scam": 0.5, "topic_crypto": 0.5})
+    max_length = int(arch.get("max_length", args.max_length))
+
+    rows = load_prepared_rows(args.valid) + load_prepared_rows(args.train)
+    tokenizer_stats = assert_tokenizer_sanity(
+        tokenizer=tokenizer,
+        expected_vocab_size=int(arch["vocab_size"]),
+        context="export_transformer_student_onnx.py",
+        sample_texts=[row.text_normalized for row in rows],
+        max_length=max_length,
+        max_unk_ratio=args.max_unk_ratio,
+        sample_size=args.tokenizer_sanity_sample_size,
+    )
+    print(
+        "Tokenizer sanity: "
+        f"backend_vocab={tokenizer_stats['backend_vocab_size']} "
+        f"len={tokenizer_stats['loaded_vocab_size']} "
+        f"unk_ratio={float(tokenizer_stats.get('sample_unk_ratio', 0.0)):.4f} "
+        f"sample_count={int(tokenizer_stats.get('sample_count', 0))}"
+    )
+
+    export_student_onnx(model, args.out, max_length=max_length, opset=args.opset)
+    print(f"Exported ONNX model to {args.out}")
+
+    if len(rows) < args.parity_samples:
+        raise SystemExit(
+            f"Need at least {args.parity_samples} samples for parity, but only found {len(rows)}."
+        )
+    rows = rows[: args.parity_samples]
+    parity = onnx_parity(
+        model,
+        args.out,
+        rows,
+        tokenizer=tokenizer,
+        max_length=max_length,
+        batch_size=args.batch_size,
+        thresholds=thresholds,
+    )
+    enforce_parity(
+        parity,
+        max_mean_delta=args.max_mean_delta,
+        min_label_agreement=args.min_label_agreement,
+    )
+
+
 if __name__ == "__main__":
     main()
@@ -15,11 +15,9 @@ Strategy:
 import argparse
 import copy
 import json
-import os
-import tempfile
-from collections import defaultdict
 from pathlib import Path
 
+from jsonl_index import JsonlIndex
 
 LIST_FIELDS = {"labels", "urls", "addresses"}
 LONGER_TEXT_FIELDS = {"text", "notes"}
@@ -123,24 +121,30 @@ def main():
     ap.add_argument(
         "--fix-nulls", action="store_true", help="Also assign IDs to null entries"
     )
+    ap.add_argument(
+        "--index",
+        type=Path,
+        default=None,
+        help="Persist the byte-offset index here (default: in memory only)",
+    )
     args = ap.parse_args()
 
     path = Path(args.path)
 
-    # First pass: collect all entries and find duplicates
-    entries = []
-    id_to_indexes = defaultdict(list)
-
-    for idx, line in enumerate(path.open(encoding="utf-8")):
-        obj = json.loads(line)
-        entries.append(obj)
-        id_ = obj.get("id")
-        if id_ is not None:
-            id_to_indexes[id_].append(idx)
+    # Duplicates and null ids come from the byte-offset index; only those rows
+    # are parsed, and only those rows are rewritten.
+    index = JsonlIndex(path, index_path=args.index)
+    all_ids = index.ids()
+    unique_ids = {id_ for id_ in all_ids if id_ is not None}
+    duplicates = index.duplicate_ids()
+    null_lines = index.null_lines()
+    entries = index.read_lines(
+        [*(line for lines in duplicates.values() for line in lines), *null_lines]
+    )
 
     # Find max existing ID number for auto-assignment
     max_id_num = 0
-    for id_ in id_to_indexes:
+    for id_ in unique_ids:
         if id_ and id_.startswith("x_"):
             try:
                 num = int(id_.split("_")[1])
@@ -150,52 +154,51 @@ def main():
 
     auto_id_counter = max_id_num + 1
 
-    # Report duplicates
-    duplicates = {k: v for k, v in id_to_indexes.items() if len(v) > 1}
-    null_count = sum(1 for e in entries if e.get("id") is None)
-
-    print(f"Total entries: {len(entries)}")
-    print(f"Unique non-null IDs: {len(id_to_indexes)}")
+    print(f"Total entries: {len(all_ids)}")
+    print(f"Unique non-null IDs: {len(unique_ids)}")
     print(f"Duplicate IDs: {len(duplicates)}")
-    print(f"Null IDs: {null_count}")
+    print(f"Null IDs: {len(null_lines)}")
     print()
 
     if duplicates:
         print("Duplicated IDs (showing first 20):")
-        for id_, indexes in list(duplicates.items())[:20]:
-            print(f"  {id_}: {len(indexes)} occurrences")
+        for id_, lines in list(duplicates.items())[:20]:
+            print(f"  {id_}: {len(lines)} occurrences")
         if len(duplicates) > 20:
             print(f"  ... and {len(duplicates) - 20} more")
         print()
 
-    # Build canonical merged row for each duplicate group.
-    merged_by_id = {}
+    # Build canonical merged row for each duplicate group. The merged row takes
+    # the place of the first occurrence; the other occurrences are deleted.
+    replacements = {}
     duplicate_summaries = []
     duplicate_rows_removed = 0
 
-    for id_, indexes in duplicates.items():
+    for id_, lines in duplicates.items():
         scored = sorted(
-            ((i, _score_entry(entries[i])) for i in indexes),
+            ((line, _score_entry(entries[line])) for line in lines),
             key=lambda item: (item[1], -item[0]),
             reverse=True,
         )
-        canonical_idx = scored[0][0]
-        merged = copy.deepcopy(entries[canonical_idx])
+        canonical_line = scored[0][0]
+        merged = copy.deepcopy(entries[canonical_line])
 
-        for i in indexes:
-            if i == canonical_idx:
+        for line in lines:
+            if line == canonical_line:
                 continue
-            merged = _merge_entries(merged, entries[i])
+            merged = _merge_entries(merged, entries[line])
 
-        merged_by_id[id_] = merged
-        duplicate_rows_removed += len(indexes) - 1
+        replacements[lines[0]] = merged
+        for line in lines[1:]:
+            replacements[line] = None
+        duplicate_rows_removed += len(lines) - 1
 
         varying_fields = []
-        all_fields = set().union(*(entries[i].keys() for i in indexes))
+        all_fields = set().union(*(entries[line].keys() for line in lines))
         for field in sorted(all_fields):
             field_values = []
-            for i in indexes:
-                value = entries[i].get(field)
+            for line in lines:
+                value = entries[line].get(field)
                 if isinstance(value, list):
                     value = tuple(value)
                 field_values.append(value)
@@ -205,42 +208,21 @@ def main():
         duplicate_summaries.append(
             {
                 "id": id_,
-                "count": len(indexes),
-                "canonical_line": canonical_idx + 1,
-                "first_line": indexes[0] + 1,
-                "removed_lines": [i + 1 for i in indexes[1:]],
+                "count": len(lines),
+                "canonical_line": canonical_line,
+                "first_line": lines[0],
+                "removed_lines": lines[1:],
                 "varying_fields": varying_fields,
             }
         )
 
-    # Second pass: emit one row per non-null ID and optionally fix null IDs.
-    first_index_for_id = {id_: indexes[0] for id_, indexes in id_to_indexes.items()}
     null_changes = []
-    output_entries = []
-
-    for idx, obj in enumerate(entries):
-        old_id = obj.get("id")
-        current = copy.deepcopy(obj)
-
-        if old_id is None:
-            if args.fix_nulls:
-                new_id = f"x_auto_{auto_id_counter:04d}"
-                auto_id_counter += 1
-                current["id"] = new_id
-                null_changes.append(
-                    {"line": idx + 1, "old_id": old_id, "new_id": new_id}
-                )
-            output_entries.append(current)
-            continue
-
-        if idx != first_index_for_id[old_id]:
-            # True duplicate row - drop it.
-            continue
-
-        if old_id in merged_by_id:
-            current = merged_by_id[old_id]
-
-        output_entries.append(current)
+    if args.fix_nulls:
+        for line in null_lines:
+            new_id = f"x_auto_{auto_id_counter:04d}"
+            auto_id_counter += 1
+            replacements[line] = {**entries[line], "id": new_id}
+            null_changes.append({"line": line, "old_id": None, "new_id": new_id})
 
     total_changes = duplicate_rows_removed + len(null_changes)
     print(f"Changes to make: {total_changes}")
@@ -269,18 +251,14 @@ def main():
 
     if not args.apply:
         print("\n⚠️  DRY RUN - no changes written. Use --apply to write.")
+        index.close()
         return
 
-    # Write atomically
-    with tempfile.NamedTemporaryFile(
-        "w", delete=False, encoding="utf-8", dir=path.parent
-    ) as tmp:
-        for obj in output_entries:
-            tmp.write(json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n")
-        tmp_path = Path(tmp.name)
-    os.replace(tmp_path, path)
+    # Atomic: unchanged rows are copied byte-for-byte into a temp file.
+    index.rewrite(replacements)
     print(f"\n✅ Fixed {total_changes} entries in {path}")
-    print(f"✅ New total entries: {len(output_entries)}")
+    print(f"✅ New total entries: {len(index)}")
+    index.close()
 
 
 if __name__ == "__main__":
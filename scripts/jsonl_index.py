@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""Byte-offset id index for random access into JSONL files.
+
+The index is a SQLite table built in one pass. It holds one row per
+non-blank line: line number, ``id`` (NULL when missing), byte offset and byte
+length. The file's size and sha256 are stored with it, and an index whose
+file content changed since it was built is stale. Fetching a few rows by id
+then costs a couple of B-tree lookups and one seek+read per row, not a full
+parse.
+
+By default the index lives in memory, so read-only checks never write next
+to the dataset. It is persisted only to an explicit ``index_path`` (this
+script's CLI writes ``<file>.idx.sqlite``). A fresh sidecar at the default
+path is reused by copying it into memory; a stale one is ignored.
+
+``rewrite`` patches or deletes rows by line number. It copies the unchanged
+byte ranges verbatim, so unchanged rows are not re-serialized. It then
+shifts the stored offsets instead of re-indexing.
+
+Usage:
+    python scripts/jsonl_index.py data/sample.jsonl            # build/refresh
+    python scripts/jsonl_index.py data/sample.jsonl --get x_0001 x_0002
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+INDEX_SUFFIX = ".idx.sqlite"
+INDEX_VERSION = 2
+
+
+def index_path_for(path: Path) -> Path:
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def default_dumps(obj: dict[str, Any]) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+@dataclass(frozen=True)
+class RowLocation:
+    line_no: int  # 1-based, counting blank lines
+    sample_id: str | None
+    offset: int
+    length: int  # includes the trailing newline, if any
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS rows (
+    line_no INTEGER NOT NULL,
+    id TEXT,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rows_id ON rows (id);
+CREATE INDEX IF NOT EXISTS rows_line ON rows (line_no);
+"""
+
+
+class JsonlIndex:
+    """Id/offset index for ``path``.
+
+    ``index_path`` persists the index there (rebuilt when stale). Without it
+    the index is kept in memory and nothing is written next to the data.
+    """
+
+    def __init__(self, path: Path, *, index_path: Path | None = None) -> None:
+        if not path.exists():
+            raise SystemExit(f"Missing file: {path}")
+        self.path = path
+        self.index_path = index_path
+        if index_path is not None:
+            self.conn = sqlite3.connect(str(index_path))
+            self.conn.executescript(SCHEMA)
+            if self.is_stale():
+                self.build()
+            return
+        self.conn = sqlite3.connect(":memory:")
+        sidecar = index_path_for(path)
+        if sidecar.exists():
+            source = sqlite3.connect(f"{sidecar.resolve().as_uri()}?mode=ro", uri=True)
+            try:
+                source.backup(self.conn)
+            except sqlite3.DatabaseError:
+                pass  # unreadable sidecar; rebuild below
+            finally:
+                source.close()
+        self.conn.executescript(SCHEMA)
+        if self.is_stale():
+            self.build()
+
+    def __enter__(self) -> JsonlIndex:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _file_state(self, sha256: str | None = None) -> dict[str, str]:
+        return {
+            "version": str(INDEX_VERSION),
+            "size": str(self.path.stat().st_size),
+            "sha256": sha256 or sha256_file(self.path),
+        }
+
+    def is_stale(self) -> bool:
+        """True unless the stored size and content hash match the file."""
+
+        stored = dict(self.conn.execute("SELECT key, value FROM meta"))
+        size = str(self.path.stat().st_size)
+        if stored.get("version") != str(INDEX_VERSION) or stored.get("size") != size:
+            return True
+        return stored.get("sha256") != sha256_file(self.path)
+
+    def _write_state(self, sha256: str | None = None) -> None:
+        self.conn.execute("DELETE FROM meta")
+        self.conn.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?)",
+            self._file_state(sha256).items(),
+        )
+
+    def build(self) -> int:
+        """(Re)index the whole file in one pass; returns the row count."""
+
+        digest = hashlib.sha256()
+
+        def scan() -> Iterable[tuple[int, str | None, int, int]]:
+            offset = 0
+            with self.path.open("rb") as handle:
+                for line_no, line in enumerate(handle, start=1):
+                    digest.update(line)
+                    if line.strip():
+                        value = json.loads(line).get("id")
+                        sample_id = None if value is None else str(value)
+                        yield line_no, sample_id, offset, len(line)
+                    offset += len(line)
+
+        with self.conn:
+            self.conn.execute("DELETE FROM rows")
+            self.conn.executemany(
+                "INSERT INTO rows (line_no, id, offset, length) VALUES (?, ?, ?, ?)",
+                scan(),
+            )
+            self._write_state(digest.hexdigest())
+        return len(self)
+
+    def __len__(self) -> int:
+        return int(self.conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0])
+
+    def __contains__(self, sample_id: object) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM rows WHERE id = ? LIMIT 1", (sample_id,)
+        ).fetchone()
+        return row is not None
+
+    def ids(self) -> list[str | None]:
+        """All ids in file order (None for rows without an id)."""
+
+        return [
+            row[0] for row in self.conn.execute("SELECT id FROM rows ORDER BY line_no")
+        ]
+
+    def locate(self, sample_id: str) -> list[RowLocation]:
+        return [
+            RowLocation(*row)
+            for row in self.conn.execute(
+                "SELECT line_no, id, offset, length FROM rows WHERE id = ? "
+                "ORDER BY line_no",
+                (sample_id,),
+            )
+        ]
+
+    def duplicate_ids(self) -> dict[str, list[int]]:
+        """id -> line numbers for ids on more than one row."""
+
+        out: dict[str, list[int]] = {}
+        for sample_id, line_no in self.conn.execute(
+            "SELECT id, line_no FROM rows WHERE id IN "
+            "(SELECT id FROM rows WHERE id IS NOT NULL GROUP BY id HAVING COUNT(*) > 1) "
+            "ORDER BY line_no"
+        ):
+            out.setdefault(sample_id, []).append(line_no)
+        return out
+
+    def null_lines(self) -> list[int]:
+        """Line numbers of rows without an id."""
+
+        return [
+            row[0]
+            for row in self.conn.execute(
+                "SELECT line_no FROM rows WHERE id IS NULL ORDER BY line_no"
+            )
+        ]
+
+    def read_lines(self, line_nos: Iterable[int]) -> dict[int, dict[str, Any]]:
+        """Parse rows by line number."""
+
+        locations = []
+        for line_no in sorted(set(line_nos)):
+            row = self.conn.execute(
+                "SELECT line_no, id, offset, length FROM rows WHERE line_no = ?",
+                (line_no,),
+            ).fetchone()
+            if row is not None:
+                locations.append(RowLocation(*row))
+        return {loc.line_no: obj for loc, obj in zip(locations, self.read(locations))}
+
+    def read(self, locations: Iterable[RowLocation]) -> list[dict[str, Any]]:
+        """Parse rows at the given locations, in the order given."""
+
+        out = []
+        with self.path.open("rb") as handle:
+            for loc in locations:
+                handle.seek(loc.offset)
+                out.append(json.loads(handle.read(loc.length)))
+        return out
+
+    def get(self, sample_id: str) -> dict[str, Any] | None:
+        """First row with this id, or None."""
+
+        locations = self.locate(sample_id)
+        return self.read(locations[:1])[0] if locations else None
+
+    def get_many(self, sample_ids: Iterable[str]) -> dict[str, dict[str, Any]]:
+        """First row per id for the ids present; reads in file order."""
+
+        first: dict[str, RowLocation] = {}
+        for sample_id in set(sample_ids):
+            locations = self.locate(sample_id)
+            if locations:
+                first[sample_id] = locations[0]
+        ordered = sorted(first.values(), key=lambda loc: loc.offset)
+        return {
+            loc.sample_id: row  # type: ignore[misc]
+            for loc, row in zip(ordered, self.read(ordered))
+        }
+
+    def rewrite(
+        self,
+        replacements: dict[int, dict[str, Any] | None],
+        *,
+        dumps: Callable[[dict[str, Any]], str] = default_dumps,
+    ) -> None:
+        """Replace (dict) or delete (None) rows by line number, atomically.
+
+        Unchanged byte ranges are copied as-is; the index is shifted in place.
+        """
+
+        if not replacements:
+            return
+        touched = []
+        for line_no in sorted(replacements):
+            row = self.conn.execute(
+                "SELECT line_no, id, offset, length FROM rows WHERE line_no = ?",
+                (line_no,),
+            ).fetchone()
+            if row is None:
+                raise SystemExit(f"No indexed row at line {line_no} of {self.path}")
+            touched.append(RowLocation(*row))
+
+        with (
+            self.path.open("rb") as src,
+            tempfile.NamedTemporaryFile(
+                "wb", delete=False, dir=self.path.parent
+            ) as dst,
+        ):
+            digest = hashlib.sha256()
+            position = 0
+            for loc in touched:
+                _copy_range(src, dst, position, loc.offset, digest)
+                new = replacements[loc.line_no]
+                if new is not None:
+                    data = dumps(new).encode("utf-8") + b"\n"
+                    dst.write(data)
+                    digest.update(data)
+                position = loc.offset + loc.length
+            _copy_range(src, dst, position, self.path.stat().st_size, digest)
+            tmp_path = Path(dst.name)
+        os.replace(tmp_path, self.path)
+
+        with self.conn:
+            # Walk backwards so earlier shifts don't move later anchors.
+            for loc in reversed(touched):
+                new = replacements[loc.line_no]
+                if new is None:
+                    self.conn.execute(
+                        "DELETE FROM rows WHERE line_no = ?", (loc.line_no,)
+                    )
+                    self.conn.execute(
+                        "UPDATE rows SET line_no = line_no - 1, offset = offset - ? "
+                        "WHERE line_no > ?",
+                        (loc.length, loc.line_no),
+                    )
+                    continue
+                length = len(dumps(new).encode("utf-8")) + 1
+                value = new.get("id")
+                self.conn.execute(
+                    "UPDATE rows SET id = ?, length = ? WHERE line_no = ?",
+                    (None if value is None else str(value), length, loc.line_no),
+                )
+                self.conn.execute(
+                    "UPDATE rows SET offset = offset + ? WHERE line_no > ?",
+                    (length - loc.length, loc.line_no),
+                )
+            self._write_state(digest.hexdigest())
+
+
+def _copy_range(src, dst, start: int, end: int, digest, chunk: int = 1 << 20) -> None:
+    src.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        data = src.read(min(chunk, remaining))
+        if not data:
+            break
+        dst.write(data)
+        digest.update(data)
+        remaining -= len(data)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("path", type=Path, help="JSONL file to index")
+    parser.add_argument("--index", type=Path, default=None, help="Sidecar path")
+    parser.add_argument("--rebuild", action="store_true", help="Force a full rebuild")
+    parser.add_argument("--get", nargs="+", default=[], help="Print rows by id")
+    args = parser.parse_args()
+
+    index_path = args.index or index_path_for(args.path)
+    with JsonlIndex(args.path, index_path=index_path) as index:
+        if args.rebuild:
+            index.build()
+        if args.get:
+            rows = index.get_many(args.get)
+            for sample_id in args.get:
+                row = rows.get(sample_id)
+                print(default_dumps(row) if row else f"# not found: {sample_id}")
+            return
+        duplicates = index.duplicate_ids()
+        print(
+            f"Indexed {len(index)} rows of {args.path} -> {index.index_path} "
+            f"(duplicate ids={len(duplicates)})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""Bit-packed (rows x labels) label matrices over the v2026 taxonomy.
+
+``LabelVocab`` maps labels to column ids once. It starts from the canonical
+list in docs/LABELS.md (``labelset.load_v2026_labels_from_labels_md``), and
+labels outside the taxonomy (legacy ``crypto``, typos) get extra columns on
+first sight. No label is ever dropped silently.
+
+``LabelMatrix`` stores one row per sample as ``np.packbits`` bytes. That is
+13 bytes per row for the 99-label taxonomy, instead of a Python set.
+Stats are then column sums and one co-occurrence matmul. The training task
+views (scam/topic/clean collapse, multi-label training targets, HF label
+ids) are boolean reductions over column masks. They mirror the per-row
+helpers they replace:
+
+- ``collapsed`` / ``y_scam_clean`` / ``topic_bits``:
+  ``transformer_common.collapse_training_targets`` and
+  ``prepare_data.consolidate_training_label``
+- ``training_targets``: ``make_stratified_splits.map_training_labels``
+- ``hf_label_ids``: the ``label_ids`` of ``prepare_hf.convert_to_hf_format``,
+  in id order
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from labelset import DEFAULT_LABELS_MD_PATH, load_v2026_labels_from_labels_md
+from transformer_common import (
+    SCAM_RAW_LABELS,
+    TOPIC_LABELS,
+    TRAINING_CLASSES,
+    extract_raw_labels,
+)
+
+BLOCK_ROWS = 1 << 16
+
+# Legacy spellings that count as the topic in every training collapse.
+TOPIC_ALIASES = {topic: (topic, topic.replace("topic_", "")) for topic in TOPIC_LABELS}
+
+
+class LabelVocab:
+    """Stable label -> column id mapping; unknown labels are appended."""
+
+    def __init__(self, labels: Iterable[str] = ()) -> None:
+        self.labels: list[str] = []
+        self.index: dict[str, int] = {}
+        for label in labels:
+            self.add(label)
+
+    @classmethod
+    def from_labelset(cls, labels_md_path: Path = DEFAULT_LABELS_MD_PATH) -> LabelVocab:
+        return cls(load_v2026_labels_from_labels_md(labels_md_path))
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def __contains__(self, label: object) -> bool:
+        return label in self.index
+
+    def add(self, label: str) -> int:
+        idx = self.index.get(label)
+        if idx is None:
+            idx = self.index[label] = len(self.labels)
+            self.labels.append(label)
+        return idx
+
+    def ids(self, labels: Iterable[str]) -> list[int]:
+        """Column ids of the known labels; unknown labels are skipped."""
+
+        return [self.index[label] for label in labels if label in self.index]
+
+
+@dataclass
+class LabelMatrix:
+    vocab: LabelVocab
+    bits: np.ndarray  # uint8 (rows, ceil(labels / 8)), np.packbits bit order
+
+    @classmethod
+    def from_label_lists(
+        cls,
+        label_lists: Iterable[Iterable[str]],
+        *,
+        vocab: LabelVocab | None = None,
+        grow: bool = True,
+    ) -> LabelMatrix:
+        """One row per label list. ``grow=False`` drops labels not in ``vocab``."""
+
+        vocab = LabelVocab.from_labelset() if vocab is None else vocab
+        rows: list[int] = []
+        cols: list[int] = []
+        n_rows = 0
+        for row, labels in enumerate(label_lists):
+            ids = [vocab.add(label) for label in labels] if grow else vocab.ids(labels)
+            rows.extend([row] * len(ids))
+            cols.extend(ids)
+            n_rows = row + 1
+        dense = np.zeros((n_rows, len(vocab)), dtype=bool)
+        dense[np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)] = True
+        bits = np.packbits(dense, axis=1)
+        return cls(vocab=vocab, bits=bits)
+
+    @classmethod
+    def from_samples(
+        cls,
+        samples: Iterable[dict[str, Any]],
+        *,
+        extract: Callable[[dict[str, Any]], list[str]] = extract_raw_labels,
+        vocab: LabelVocab | None = None,
+    ) -> LabelMatrix:
+        return cls.from_label_lists((extract(s) for s in samples), vocab=vocab)
+
+    def __len__(self) -> int:
+        return int(self.bits.shape[0])
+
+    def take(self, rows: Sequence[int] | np.ndarray) -> LabelMatrix:
+        """Row subset (e.g. one split), sharing the vocab."""
+
+        return LabelMatrix(
+            vocab=self.vocab, bits=self.bits[np.asarray(rows, dtype=np.int64)]
+        )
+
+    def dense(self) -> np.ndarray:
+        """bool (rows, len(vocab)); columns added after packing read as False."""
+
+        return np.unpackbits(self.bits, axis=1, count=len(self.vocab)).astype(bool)
+
+    def _mask(self, labels: Iterable[str]) -> np.ndarray:
+        mask = np.zeros(self.bits.shape[1], dtype=np.uint8)
+        for idx in self.vocab.ids(labels):
+            if idx >> 3 < mask.size:
+                mask[idx >> 3] |= 1 << (7 - (idx & 7))
+        return mask
+
+    def any_of(self, labels: Iterable[str]) -> np.ndarray:
+        """bool (rows,): the row carries at least one of ``labels``."""
+
+        return (self.bits & self._mask(labels)).any(axis=1)
+
+    def column(self, label: str) -> np.ndarray:
+        return self.any_of([label])
+
+    def _blocks(self) -> Iterator[np.ndarray]:
+        """float64 dense row blocks; BLAS matmuls are exact far beyond our N."""
+
+        for start in range(0, len(self), BLOCK_ROWS):
+            block = self.bits[start : start + BLOCK_ROWS]
+            yield np.unpackbits(block, axis=1, count=len(self.vocab)).astype(np.float64)
+
+    def counts(self) -> np.ndarray:
+        """Rows per column, int64 (len(vocab),)."""
+
+        total = np.zeros(len(self.vocab), dtype=np.float64)
+        for block in self._blocks():
+            total += block.sum(axis=0)
+        return total.astype(np.int64)
+
+    def cooccurrence(self) -> np.ndarray:
+        """int64 (len(vocab), len(vocab)); the diagonal equals ``counts``."""
+
+        total = np.zeros((len(self.vocab), len(self.vocab)), dtype=np.float64)
+        for block in self._blocks():
+            total += block.T @ block
+        return total.astype(np.int64)
+
+    def label_counts(self) -> dict[str, int]:
+        """Non-zero counts in vocab order."""
+
+        return {
+            self.vocab.labels[idx]: int(count)
+            for idx, count in enumerate(self.counts())
+            if count
+        }
+
+    def pair_counts(self) -> dict[str, int]:
+        """Non-zero ``"a|b"`` co-occurrence counts, ``a < b`` by name."""
+
+        cooc = self.cooccurrence()
+        left, right = np.nonzero(np.triu(cooc, k=1))
+        out: dict[str, int] = {}
+        for i, j in zip(left.tolist(), right.tolist()):
+            a, b = sorted((self.vocab.labels[i], self.vocab.labels[j]))
+            out[f"{a}|{b}"] = int(cooc[i, j])
+        return out
+
+    def label_lists(self) -> list[list[str]]:
+        rows, cols = np.nonzero(self.dense())
+        out: list[list[str]] = [[] for _ in range(len(self))]
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            out[row].append(self.vocab.labels[col])
+        return out
+
+    # Task views -----------------------------------------------------------
+
+    def topic_bits(self) -> np.ndarray:
+        """int64 (rows, len(TOPIC_LABELS)); legacy aliases count."""
+
+        return np.stack(
+            [self.any_of(TOPIC_ALIASES[topic]) for topic in TOPIC_LABELS], axis=1
+        ).astype(np.int64)
+
+    def collapsed(self) -> np.ndarray:
+        """int64 (rows,) index into TRAINING_CLASSES; scam > topic > clean."""
+
+        out = np.full(len(self), TRAINING_CLASSES.index("clean"), dtype=np.int64)
+        out[self.topic_bits().any(axis=1)] = TRAINING_CLASSES.index("topic_crypto")
+        out[self.any_of(SCAM_RAW_LABELS)] = TRAINING_CLASSES.index("scam")
+        return out
+
+    def y_scam_clean(self) -> np.ndarray:
+        return self.any_of(SCAM_RAW_LABELS).astype(np.int64)
+
+    def training_targets(self) -> np.ndarray:
+        """bool (rows, len(TRAINING_CLASSES)); scam and topic may co-occur."""
+
+        out = np.zeros((len(self), len(TRAINING_CLASSES)), dtype=bool)
+        out[:, TRAINING_CLASSES.index("scam")] = self.any_of(SCAM_RAW_LABELS)
+        out[:, TRAINING_CLASSES.index("topic_crypto")] = self.any_of(
+            TOPIC_ALIASES["topic_crypto"]
+        )
+        out[:, TRAINING_CLASSES.index("clean")] = ~out.any(axis=1)
+        return out
+
+    def hf_label_ids(self, label_to_id: dict[str, int]) -> np.ndarray:
+        """bool (rows, max id + 1): column ``i`` is the label with HF id ``i``."""
+
+        out = np.zeros((len(self), max(label_to_id.values()) + 1), dtype=bool)
+        for label, idx in label_to_id.items():
+            out[:, idx] = self.column(label)
+        return out
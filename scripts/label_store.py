@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""Transactional SQLite store for the labeled dataset.
+
+The store holds one row per sample.jsonl line (``posts``). Each row keeps the
+line's compact JSON body verbatim, in file order. ``post_labels`` is a label
+table indexed by label, and ``label_history`` records one entry per applied
+relabel. The database runs in WAL mode. Writers take ``BEGIN IMMEDIATE``, so a
+batch of label changes lands atomically. Concurrent relabelers queue on the
+lock instead of overwriting each other's files.
+
+``export_jsonl`` writes the bodies back in order. It regenerates sample.jsonl
+byte-for-byte in the current format, so the JSONL stays the shipped artifact
+and the store is the editable copy. The store records the sha256 of the JSONL
+it last imported or exported. An export refuses to overwrite a file with
+different content, since that file was edited outside the store; re-import
+it first. Exports run under the write lock, so no relabel lands between the
+check and the write.
+
+Usage:
+    python scripts/label_store.py --import data/sample.jsonl
+    python scripts/label_store.py --import data/sample.jsonl --replace  # re-sync
+    python scripts/label_store.py --label scam            # ids with a label
+    python scripts/label_store.py --history x_0001
+    python scripts/label_store.py --export data/sample.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from jsonl_index import sha256_file
+
+# Stdlib-only: dataset_checks and the validators import this module, and
+# those run in CI and the pre-commit hook without numpy.
+DATA_DIR = Path(__file__).parent.parent / "data"
+DEFAULT_STORE = DATA_DIR / "sample.sqlite"
+STORE_VERSION = 1
+SQLITE_MAGIC = b"SQLite format 3\x00"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS posts (
+    seq INTEGER PRIMARY KEY,
+    id TEXT,
+    collected_at TEXT,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_id ON posts (id);
+CREATE INDEX IF NOT EXISTS posts_collected_at ON posts (collected_at);
+CREATE TABLE IF NOT EXISTS post_labels (
+    seq INTEGER NOT NULL REFERENCES posts (seq) ON DELETE CASCADE,
+    label TEXT NOT NULL,
+    PRIMARY KEY (seq, label)
+);
+CREATE INDEX IF NOT EXISTS post_labels_label ON post_labels (label);
+CREATE TABLE IF NOT EXISTS label_history (
+    change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    seq INTEGER NOT NULL,
+    id TEXT,
+    old_labels TEXT NOT NULL,
+    new_labels TEXT NOT NULL,
+    source TEXT,
+    changed_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS label_history_id ON label_history (id);
+"""
+
+
+def utc_now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def dumps_row(obj: dict[str, Any]) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def row_labels(obj: dict[str, Any]) -> list[str]:
+    """Raw labels of a row (``labels`` list, or the legacy ``label`` string)."""
+
+    labels = obj.get("labels")
+    if isinstance(labels, list):
+        return [str(label) for label in labels]
+    label = obj.get("label")
+    return [label] if isinstance(label, str) else []
+
+
+def is_label_store(path: Path) -> bool:
+    if not path.is_file():
+        return False
+    with path.open("rb") as handle:
+        return handle.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+
+
+def iter_dataset_lines(path: Path) -> Iterator[str]:
+    """JSONL lines of a dataset given as a JSONL file or a label store."""
+
+    if is_label_store(path):
+        with LabelStore(path) as store:
+            yield from store.bodies()
+        return
+    with path.open("r", encoding="utf-8") as handle:
+        yield from handle
+
+
+class LabelStore:
+    def __init__(self, path: Path = DEFAULT_STORE, *, timeout: float = 30.0) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode; transactions are explicit (see _write).
+        self.conn = sqlite3.connect(str(path), timeout=timeout, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self) -> LabelStore:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _write(self) -> _WriteTransaction:
+        return _WriteTransaction(self.conn)
+
+    def meta(self) -> dict[str, str]:
+        return dict(self.conn.execute("SELECT key, value FROM meta"))
+
+    def __len__(self) -> int:
+        return int(self.conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0])
+
+    def import_jsonl(
+        self, path: Path, *, replace: bool = False, keep_history: bool = False
+    ) -> int:
+        """Load a JSONL dataset in file order; returns the row count.
+
+        ``keep_history`` keeps label_history across a re-import (entries are
+        looked up by id, so they stay meaningful).
+        """
+
+        if len(self) and not replace:
+            raise SystemExit(
+                f"{self.path} already holds {len(self)} rows; pass --replace to re-import."
+            )
+        rows = 0
+        digest = hashlib.sha256()
+        with self._write(), path.open("rb") as handle:
+            self.conn.execute("DELETE FROM post_labels")
+            self.conn.execute("DELETE FROM posts")
+            if not keep_history:
+                self.conn.execute("DELETE FROM label_history")
+            for raw in handle:
+                digest.update(raw)
+                line = raw.decode("utf-8").strip()
+                if not line:
+                    continue
+                obj = json.loads(line)
+                rows += 1
+                self._insert(rows, obj)
+            self.conn.execute("DELETE FROM meta")
+            self.conn.executemany(
+                "INSERT INTO meta (key, value) VALUES (?, ?)",
+                [
+                    ("version", str(STORE_VERSION)),
+                    ("imported_from", str(path)),
+                    ("imported_at", utc_now_iso()),
+                ],
+            )
+            self._set_synced(digest.hexdigest())
+        return rows
+
+    def _set_synced(self, sha256: str) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('jsonl_sha256', ?)",
+            (sha256,),
+        )
+
+    def jsonl_matches(self, path: Path) -> bool:
+        """True if ``path`` holds the JSONL last imported into or exported from
+        the store (or does not exist). False means it was edited outside it."""
+
+        if not path.exists():
+            return True
+        return self.meta().get("jsonl_sha256") == sha256_file(path)
+
+    def _insert(self, seq: int, obj: dict[str, Any]) -> None:
+        sample_id = obj.get("id")
+        collected_at = obj.get("collected_at")
+        self.conn.execute(
+            "INSERT INTO posts (seq, id, collected_at, body) VALUES (?, ?, ?, ?)",
+            (
+                seq,
+                None if sample_id is None else str(sample_id),
+                None if collected_at is None else str(collected_at),
+                dumps_row(obj),
+            ),
+        )
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO post_labels (seq, label) VALUES (?, ?)",
+            [(seq, label) for label in row_labels(obj)],
+        )
+
+    def export_jsonl(self, path: Path, *, force: bool = False) -> int:
+        """Atomically write all rows to ``path`` in order; returns the row count.
+
+        Refuses to overwrite a file edited outside the store unless ``force``.
+        """
+
+        with self._write():
+            return self._export(path, force=force)
+
+    def _export(self, path: Path, *, force: bool = False) -> int:
+        """export_jsonl body; the caller holds the write transaction."""
+
+        if not force and not self.jsonl_matches(path):
+            raise SystemExit(
+                f"{path} changed since it was last synced with {self.path}; "
+                "re-import it first (label_store.py --import --replace, or "
+                "manual_relabel.py --reimport) so its rows are not lost."
+            )
+        rows = 0
+        digest = hashlib.sha256()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile("wb", delete=False, dir=path.parent) as tmp:
+            for body in self.bodies():
+                data = body.encode("utf-8") + b"\n"
+                tmp.write(data)
+                digest.update(data)
+                rows += 1
+            tmp_path = Path(tmp.name)
+        os.replace(tmp_path, path)
+        self._set_synced(digest.hexdigest())
+        return rows
+
+    def bodies(self) -> Iterator[str]:
+        for (body,) in self.conn.execute("SELECT body FROM posts ORDER BY seq"):
+            yield body
+
+    def iter_rows(self) -> Iterator[tuple[int, dict[str, Any]]]:
+        for seq, body in self.conn.execute("SELECT seq, body FROM posts ORDER BY seq"):
+            yield seq, json.loads(body)
+
+    def rows_for_ids(self, ids: Iterable[str]) -> list[tuple[int, dict[str, Any]]]:
+        """(seq, row) for every row carrying one of ``ids``, in file order."""
+
+        out = []
+        for sample_id in set(ids):
+            out.extend(
+                self.conn.execute(
+                    "SELECT seq, body FROM posts WHERE id = ?", (sample_id,)
+                ).fetchall()
+            )
+        return [(seq, json.loads(body)) for seq, body in sorted(out)]
+
+    def rows_with_label(self, label: str) -> list[tuple[int, dict[str, Any]]]:
+        return [
+            (seq, json.loads(body))
+            for seq, body in self.conn.execute(
+                "SELECT p.seq, p.body FROM post_labels l JOIN posts p USING (seq) "
+                "WHERE l.label = ? ORDER BY p.seq",
+                (label,),
+            )
+        ]
+
+    def ids_with_label(self, label: str) -> list[str]:
+        return [
+            row[0]
+            for row in self.conn.execute(
+                "SELECT p.id FROM post_labels l JOIN posts p USING (seq) "
+                "WHERE l.label = ? AND p.id IS NOT NULL ORDER BY p.seq",
+                (label,),
+            )
+        ]
+
+    def label_counts(self) -> dict[str, int]:
+        return dict(
+            self.conn.execute(
+                "SELECT label, COUNT(*) FROM post_labels GROUP BY label "
+                "ORDER BY COUNT(*) DESC, label"
+            )
+        )
+
+    def rows_collected_between(
+        self, start: str | None = None, end: str | None = None
+    ) -> list[tuple[int, dict[str, Any]]]:
+        """Rows with ``start <= collected_at < end`` (ISO strings), in file order."""
+
+        query = "SELECT seq, body FROM posts WHERE collected_at IS NOT NULL"
+        params: list[str] = []
+        if start is not None:
+            query += " AND collected_at >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND collected_at < ?"
+            params.append(end)
+        return [
+            (seq, json.loads(body))
+            for seq, body in self.conn.execute(query + " ORDER BY seq", params)
+        ]
+
+    def history(self, sample_id: str) -> list[dict[str, Any]]:
+        return [
+            {
+                "change_id": change_id,
+                "seq": seq,
+                "old_labels": json.loads(old),
+                "new_labels": json.loads(new),
+                "source": source,
+                "changed_at": changed_at,
+            }
+            for change_id, seq, old, new, source, changed_at in self.conn.execute(
+                "SELECT change_id, seq, old_labels, new_labels, source, changed_at "
+                "FROM label_history WHERE id = ? ORDER BY change_id",
+                (sample_id,),
+            )
+        ]
+
+    def set_labels(
+        self,
+        updates: dict[int, list[str]],
+        *,
+        source: str,
+        export: Path | None = None,
+    ) -> int:
+        """Set ``labels`` on rows by seq in one transaction; returns rows changed.
+
+        The legacy ``label`` field is dropped. Every change is logged to
+        label_history with the labels it replaced. ``export`` re-exports that
+        JSONL before the commit; if the export is refused, nothing is applied.
+        """
+
+        changed = 0
+        now = utc_now_iso()
+        with self._write():
+            for seq, new_labels in sorted(updates.items()):
+                row = self.conn.execute(
+                    "SELECT id, body FROM posts WHERE seq = ?", (seq,)
+                ).fetchone()
+                if row is None:
+                    raise SystemExit(f"No row with seq {seq} in {self.path}")
+                sample_id, body = row
+                obj = json.loads(body)
+                old_labels = row_labels(obj)
+                obj["labels"] = list(new_labels)
+                obj.pop("label", None)
+                new_body = dumps_row(obj)
+                if new_body == body:
+                    continue
+                self.conn.execute(
+                    "UPDATE posts SET body = ? WHERE seq = ?", (new_body, seq)
+                )
+                self.conn.execute("DELETE FROM post_labels WHERE seq = ?", (seq,))
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO post_labels (seq, label) VALUES (?, ?)",
+                    [(seq, label) for label in new_labels],
+                )
+                self.conn.execute(
+                    "INSERT INTO label_history "
+                    "(seq, id, old_labels, new_labels, source, changed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        seq,
+                        sample_id,
+                        json.dumps(old_labels),
+                        json.dumps(list(new_labels)),
+                        source,
+                        now,
+                    ),
+                )
+                changed += 1
+            if export is not None:
+                self._export(export)
+        return changed
+
+
+class _WriteTransaction:
+    """``BEGIN IMMEDIATE`` ... ``COMMIT``; rolls back if the block raises."""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+
+    def __enter__(self) -> None:
+        self.conn.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, *exc: object) -> None:
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--store", type=Path, default=DEFAULT_STORE)
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--import", dest="import_path", type=Path, default=None)
+    action.add_argument("--export", type=Path, default=None)
+    action.add_argument("--label", type=str, default=None, help="Print ids with label")
+    action.add_argument("--history", type=str, default=None, help="Print label history")
+    action.add_argument("--stats", action="store_true", help="Print label counts")
+    parser.add_argument(
+        "--replace", action="store_true", help="Allow --import over a non-empty store"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Let --export overwrite a file edited outside the store",
+    )
+    args = parser.parse_args()
+
+    if args.import_path is not None and not args.import_path.exists():
+        raise SystemExit(f"Input file not found: {args.import_path}")
+    if args.import_path is None and not is_label_store(args.store):
+        raise SystemExit(f"Missing label store: {args.store} (run with --import first)")
+
+    with LabelStore(args.store) as store:
+        if args.import_path is not None:
+            rows = store.import_jsonl(args.import_path, replace=args.replace)
+            print(f"Imported {rows} rows from {args.import_path} into {args.store}")
+        elif args.export is not None:
+            rows = store.export_jsonl(args.export, force=args.force)
+            print(f"Exported {rows} rows from {args.store} to {args.export}")
+        elif args.label is not None:
+            for sample_id in store.ids_with_label(args.label):
+                print(sample_id)
+        elif args.history is not None:
+            for entry in store.history(args.history):
+                print(json.dumps(entry, ensure_ascii=False))
+        else:
+            print(json.dumps({"rows": len(store), **store.label_counts()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
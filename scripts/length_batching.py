@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Length-bucketed batching helpers for transformer training loops."""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Iterator, Sequence
+
+import numpy as np
+import torch
+
+
+def token_lengths(tokenizer, texts: Sequence[str], max_length: int) -> list[int]:
+    """Token count per text after truncation (special tokens included)."""
+
+    encoded = tokenizer(
+        list(texts),
+        truncation=True,
+        max_length=max_length,
+        add_special_tokens=True,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+    )
+    return [len(ids) for ids in encoded["input_ids"]]
+
+
+def trim_to_longest(batch: dict) -> dict:
+    """Drop right-padding columns that no row in the batch uses."""
+
+    attention_mask = batch["attention_mask"]
+    longest = max(1, int(attention_mask.sum(dim=1).max()))
+    if longest < attention_mask.shape[1]:
+        batch["input_ids"] = batch["input_ids"][:, :longest]
+        batch["attention_mask"] = attention_mask[:, :longest]
+    return batch
+
+
+class LengthBucketBatchSampler:
+    """Random batches of indices whose rows have similar token lengths.
+
+    Each epoch the rows are shuffled and cut into buckets of
+    ``bucket_batches`` global batches. Rows are sorted by length inside a
+    bucket and split into batches, and the order of all batches is then
+    shuffled, so batches stay random while padding stays short.
+
+    With ``num_replicas > 1`` every global batch of ``batch_size *
+    num_replicas`` rows is split across ranks, so each rank gets the same
+    number of batches, like DistributedSampler (short tails wrap around).
+    """
+
+    def __init__(
+        self,
+        lengths: Sequence[int],
+        batch_size: int,
+        *,
+        seed: int,
+        bucket_batches: int = 50,
+        num_replicas: int = 1,
+        rank: int = 0,
+    ) -> None:
+        if batch_size < 1:
+            raise ValueError("batch_size must be >= 1")
+        if bucket_batches < 1:
+            raise ValueError("bucket_batches must be >= 1")
+        if not 0 <= rank < num_replicas:
+            raise ValueError(f"rank {rank} out of range for {num_replicas} replicas")
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.batch_size = batch_size
+        self.seed = seed
+        self.bucket_batches = bucket_batches
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+
+    def __len__(self) -> int:
+        global_batch = self.batch_size * self.num_replicas
+        return (len(self.lengths) + global_batch - 1) // global_batch
+
+    def __iter__(self) -> Iterator[list[int]]:
+        rng = np.random.default_rng([self.seed, self.epoch])
+        global_batch = self.batch_size * self.num_replicas
+        order = rng.permutation(len(self.lengths))
+        bucket_rows = global_batch * self.bucket_batches
+
+        batches: list[np.ndarray] = []
+        for start in range(0, len(order), bucket_rows):
+            bucket = order[start : start + bucket_rows]
+            bucket = bucket[np.argsort(self.lengths[bucket], kind="stable")]
+            batches.extend(
+                bucket[pos : pos + global_batch]
+                for pos in range(0, len(bucket), global_batch)
+            )
+        rng.shuffle(batches)
+
+        for batch in batches:
+            if self.num_replicas > 1:
+                short = global_batch - len(batch)
+                if short:
+                    batch = np.concatenate([batch, np.resize(batch, short)])
+                batch = batch[
+                    self.rank * self.batch_size : (self.rank + 1) * self.batch_size
+                ]
+            yield batch.tolist()
+
+
+class ThroughputMeter:
+    """Per-epoch tokens/sec and padding efficiency from attention masks."""
+
+    def __init__(self) -> None:
+        self.real_tokens = 0
+        self.padded_tokens = 0
+        self.samples = 0
+        self.start = time.perf_counter()
+
+    def update(self, attention_mask: torch.Tensor) -> None:
+        self.real_tokens += int(attention_mask.sum())
+        self.padded_tokens += int(attention_mask.numel())
+        self.samples += int(attention_mask.shape[0])
+
+    def summary(self, *, world_size: int = 1) -> dict[str, float]:
+        seconds = max(time.perf_counter() - self.start, 1e-9)
+        return {
+            "seconds": round(seconds, 3),
+            "samples_per_sec": self.samples * world_size / seconds,
+            "tokens_per_sec": self.real_tokens * world_size / seconds,
+            "padding_efficiency": self.real_tokens / max(1, self.padded_tokens),
+        }
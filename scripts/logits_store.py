@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""Memory-mapped columnar store for cached teacher logits.
+
+A store is a directory of raw ``.npy`` columns plus a ``store.json`` manifest.
+Numeric columns are opened with ``mmap_mode="r"`` so readers only page in the
+rows they touch. String columns (ids, texts, labels) are offset-encoded as a
+UTF-8 ``uint8`` buffer plus ``int64`` offsets, so nothing is pickled.
+
+Legacy ``.npz`` caches written by older versions of cache_teacher_logits.py can
+still be opened through ``open_logits_cache``.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+from collections.abc import Iterator, Sequence
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from transformer_common import load_json, save_json
+
+STORE_FORMAT = "janitr-logits-store"
+STORE_VERSION = 1
+MANIFEST_NAME = "store.json"
+
+
+class StringColumn(Sequence[str]):
+    """Read-only view over an offset-encoded UTF-8 string column."""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray) -> None:
+        if offsets.ndim != 1 or offsets.shape[0] < 1:
+            raise ValueError("String column offsets must be a non-empty 1-D array")
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return int(self.offsets.shape[0]) - 1
+
+    def __getitem__(self, idx):  # type: ignore[override]
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        idx = int(idx)
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError(idx)
+        start = int(self.offsets[idx])
+        end = int(self.offsets[idx + 1])
+        return self.data[start:end].tobytes().decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.tolist())
+
+    def tolist(self) -> list[str]:
+        blob = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        return [
+            blob[offsets[i] : offsets[i + 1]].decode("utf-8")
+            for i in range(len(offsets) - 1)
+        ]
+
+
+def encode_strings(values: Sequence[str]) -> tuple[np.ndarray, np.ndarray]:
+    encoded = [str(value).encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(item) for item in encoded], dtype=np.int64)
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return data, offsets
+
+
+def is_logits_store(path: Path) -> bool:
+    return path.is_dir() and (path / MANIFEST_NAME).exists()
+
+
+def write_logits_store(
+    out_dir: Path,
+    *,
+    arrays: dict[str, np.ndarray],
+    strings: dict[str, Sequence[str]],
+) -> None:
+    """Write columns to ``out_dir`` atomically (temp dir + rename)."""
+
+    names = list(arrays) + list(strings)
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate column names: {names}")
+
+    tmp_dir = out_dir.with_name(f".{out_dir.name}.tmp-{os.getpid()}")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    columns: dict[str, dict[str, Any]] = {}
+    for name, values in arrays.items():
+        arr = np.ascontiguousarray(values)
+        if arr.dtype == object:
+            raise ValueError(f"Column '{name}' has object dtype; store it as a string")
+        np.save(tmp_dir / f"{name}.npy", arr, allow_pickle=False)
+        columns[name] = {
+            "kind": "array",
+            "dtype": arr.dtype.str,
+            "shape": list(arr.shape),
+        }
+    for name, values in strings.items():
+        data, offsets = encode_strings(values)
+        np.save(tmp_dir / f"{name}.bytes.npy", data, allow_pickle=False)
+        np.save(tmp_dir / f"{name}.offsets.npy", offsets, allow_pickle=False)
+        columns[name] = {"kind": "string", "rows": int(offsets.shape[0] - 1)}
+
+    save_json(
+        tmp_dir / MANIFEST_NAME,
+        {"format": STORE_FORMAT, "version": STORE_VERSION, "columns": columns},
+    )
+
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    tmp_dir.rename(out_dir)
+
+
+def merge_logits_stores(
+    shard_dirs: Sequence[Path],
+    out_dir: Path,
+    *,
+    constant_columns: Sequence[str] = (),
+) -> int:
+    """Concatenate shard stores row-wise into ``out_dir`` without loading them whole.
+
+    ``constant_columns`` are per-store values (e.g. temperatures) that must be
+    identical across shards and are copied once. Returns the merged row count.
+    """
+
+    if not shard_dirs:
+        raise ValueError("No shards to merge")
+    shards = [LogitsStore(path) for path in shard_dirs]
+    first = shards[0]
+    for shard in shards[1:]:
+        if set(shard.columns) != set(first.columns):
+            raise SystemExit(f"Shard column mismatch: {shard.path} vs {first.path}")
+
+    tmp_dir = out_dir.with_name(f".{out_dir.name}.tmp-{os.getpid()}")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    total_rows: int | None = None
+    columns: dict[str, dict[str, Any]] = {}
+    for name, spec in first.columns.items():
+        if name in constant_columns:
+            reference = np.asarray(first[name])
+            for shard in shards[1:]:
+                if not np.array_equal(np.asarray(shard[name]), reference):
+                    raise SystemExit(
+                        f"Constant column '{name}' differs between shards "
+                        f"{first.path} and {shard.path}"
+                    )
+            np.save(tmp_dir / f"{name}.npy", reference, allow_pickle=False)
+            columns[name] = dict(spec)
+            continue
+
+        if spec["kind"] == "string":
+            parts = [shard[name] for shard in shards]
+            rows = sum(len(part) for part in parts)
+            nbytes = sum(int(part.offsets[-1]) for part in parts)
+            data = np.lib.format.open_memmap(
+                tmp_dir / f"{name}.bytes.npy",
+                mode="w+",
+                dtype=np.uint8,
+                shape=(nbytes,),
+            )
+            offsets = np.lib.format.open_memmap(
+                tmp_dir / f"{name}.offsets.npy",
+                mode="w+",
+                dtype=np.int64,
+                shape=(rows + 1,),
+            )
+            offsets[0] = 0
+            row_cursor = 0
+            byte_cursor = 0
+            for part in parts:
+                count = len(part)
+                size = int(part.offsets[-1])
+                data[byte_cursor : byte_cursor + size] = part.data[:size]
+                offsets[row_cursor + 1 : row_cursor + count + 1] = (
+                    np.asarray(part.offsets[1:]) + byte_cursor
+                )
+                row_cursor += count
+                byte_cursor += size
+            data.flush()
+            offsets.flush()
+            del data, offsets
+            columns[name] = {"kind": "string", "rows": rows}
+        else:
+            parts = [shard[name] for shard in shards]
+            tail_shape = tuple(parts[0].shape[1:])
+            for part in parts[1:]:
+                if tuple(part.shape[1:]) != tail_shape or part.dtype != parts[0].dtype:
+                    raise SystemExit(f"Shard shape/dtype mismatch for column '{name}'")
+            rows = sum(int(part.shape[0]) for part in parts)
+            merged = np.lib.format.open_memmap(
+                tmp_dir / f"{name}.npy",
+                mode="w+",
+                dtype=parts[0].dtype,
+                shape=(rows, *tail_shape),
+            )
+            cursor = 0
+            for part in parts:
+                merged[cursor : cursor + part.shape[0]] = part
+                cursor += int(part.shape[0])
+            merged.flush()
+            del merged
+            columns[name] = {
+                "kind": "array",
+                "dtype": parts[0].dtype.str,
+                "shape": [rows, *tail_shape],
+            }
+
+        if total_rows is None:
+            total_rows = rows
+        elif rows != total_rows:
+            raise SystemExit(
+                f"Column '{name}' has {rows} rows after merge, expected {total_rows}"
+            )
+
+    save_json(
+        tmp_dir / MANIFEST_NAME,
+        {"format": STORE_FORMAT, "version": STORE_VERSION, "columns": columns},
+    )
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    tmp_dir.rename(out_dir)
+    return int(total_rows or 0)
+
+
+class LogitsStore:
+    """Mapping-style reader over a logits store directory."""
+
+    def __init__(self, path: Path) -> None:
+        manifest_path = path / MANIFEST_NAME
+        if not manifest_path.exists():
+            raise SystemExit(f"Logits store manifest missing: {manifest_path}")
+        manifest = load_json(manifest_path)
+        if manifest.get("format") != STORE_FORMAT:
+            raise SystemExit(f"Unrecognized logits store format at {manifest_path}")
+        if int(manifest.get("version", 0)) != STORE_VERSION:
+            raise SystemExit(
+                f"Unsupported logits store version {manifest.get('version')} at {manifest_path}"
+            )
+        self.path = path
+        self.columns: dict[str, dict[str, Any]] = dict(manifest["columns"])
+        self._cache: dict[str, Any] = {}
+
+    @property
+    def files(self) -> list[str]:
+        return list(self.columns)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.columns
+
+    def __getitem__(self, name: str):
+        if name in self._cache:
+            return self._cache[name]
+        spec = self.columns.get(name)
+        if spec is None:
+            raise KeyError(name)
+        if spec["kind"] == "string":
+            value: Any = StringColumn(
+                np.load(self.path / f"{name}.bytes.npy", mmap_mode="r"),
+                np.load(self.path / f"{name}.offsets.npy", mmap_mode="r"),
+            )
+        else:
+            value = np.load(self.path / f"{name}.npy", mmap_mode="r")
+        self._cache[name] = value
+        return value
+
+
+def open_logits_cache(path: Path):
+    """Open a logits cache as a mapping of column name -> array-like.
+
+    Store directories are memory-mapped. Legacy ``.npz`` files are loaded
+    eagerly (they need pickle for the object columns).
+    """
+
+    if is_logits_store(path):
+        return LogitsStore(path)
+    if path.suffix == ".npz" and path.is_file():
+        with np.load(path, allow_pickle=True) as npz:
+            return {key: npz[key] for key in npz.files}
+    raise SystemExit(f"Not a logits store or .npz cache: {path}")
@@ -5,6 +5,8 @@ Create co-occurrence-aware train/valid/calib/holdout splits from JSONL.
 Key goals:
 - Preserve per-label prevalence across splits.
 - Preserve pairwise co-occurrence prevalence (e.g., scam+topic_crypto).
+- Optionally keep near-duplicate texts (MinHash LSH clusters, see near_dup.py)
+  together so reposted scam templates never straddle splits.
 - Produce fastText TXT files and split JSONL files for downstream pipeline steps.
 """
 
@@ -14,12 +16,18 @@ import argparse
 import json
 import random
 from collections import Counter, defaultdict
+from contextlib import closing
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from itertools import combinations
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Sequence
 
+import numpy as np
+
+from label_matrix import LabelMatrix, LabelVocab
+from label_store import iter_dataset_lines
+from near_dup import MinHashConfig, MinHasher, near_duplicate_clusters
 from prepare_data import SCAM_RAW_LABELS, clean_text, extract_raw_labels  # type: ignore
 
 REPO_ROOT = Path(__file__).parent.parent
@@ -132,6 +140,31 @@ def largest_remainder_counts(total: int, ratios: list[float]) -> list[int]:
     return counts
 
 
+def build_units(
+    records: list[dict[str, object]],
+    *,
+    config: MinHashConfig | None,
+    workers: int,
+) -> list[list[dict[str, object]]]:
+    """Group records into assignment units: near-duplicate clusters or singletons."""
+
+    if config is None:
+        return [[rec] for rec in records]
+    signatures = MinHasher(config).signatures(
+        (str(rec["text"]) for rec in records), workers=workers
+    )
+    clusters = near_duplicate_clusters(signatures, threshold=config.threshold)
+    clustered = {index for cluster in clusters for index in cluster}
+    units = [[records[index] for index in cluster] for cluster in clusters]
+    units.extend([rec] for index, rec in enumerate(records) if index not in clustered)
+    return units
+
+
+def unit_labelset(unit: list[dict[str, object]]) -> tuple[str, ...]:
+    counts = Counter(tuple(sorted(rec["training_labels"])) for rec in unit)  # type: ignore[arg-type]
+    return max(sorted(counts), key=lambda key: counts[key])
+
+
 def feature_tokens(labels: list[str]) -> list[str]:
     feats: list[str] = []
     unique = sorted(set(labels))
@@ -148,26 +181,47 @@ def format_rate(value: float) -> str:
 
 def build_distribution_report(
     split_rows: dict[str, list[tuple[list[str], str]]],
+    *,
+    classes: Sequence[str] | None = CLASSES,
+    top_pairs: int | None = None,
 ) -> dict[str, object]:
-    totals = Counter()
-    pair_totals = Counter()
-    total_rows = 0
+    """Per-split label and pair prevalence vs the pooled data.
 
-    for rows in split_rows.values():
+    ``classes=None`` reports every observed label. ``top_pairs`` limits pair
+    tracking to the most frequent co-occurring pairs, which keeps the report
+    small for a 100+ label taxonomy.
+    """
+
+    # One shared vocab so per-split counts line up; stats are column sums and
+    # co-occurrence products over bit-packed label matrices.
+    vocab = LabelVocab()
+    split_counts: dict[str, tuple[Counter, Counter]] = {}
+    total_rows = 0
+    for split, rows in split_rows.items():
         total_rows += len(rows)
-        for labels, _ in rows:
-            unique = sorted(set(labels))
-            for label in unique:
-                totals[label] += 1
-            for a, b in combinations(unique, 2):
-                pair_totals[f"{a}|{b}"] += 1
+        matrix = LabelMatrix.from_label_lists(
+            (labels for labels, _ in rows), vocab=vocab
+        )
+        split_counts[split] = (
+            Counter(matrix.label_counts()),
+            Counter(matrix.pair_counts()),
+        )
+    totals = sum((labels for labels, _ in split_counts.values()), Counter())
+    pair_totals = sum((pairs for _, pairs in split_counts.values()), Counter())
+
+    if classes is None:
+        classes = sorted(totals)
+    tracked_pairs = dict(pair_totals)
+    if top_pairs is not None:
+        ranked = sorted(pair_totals.items(), key=lambda item: (-item[1], item[0]))
+        tracked_pairs = dict(ranked[:top_pairs])
 
     global_label_rates = {
-        label: (totals[label] / total_rows if total_rows else 0.0) for label in CLASSES
+        label: (totals[label] / total_rows if total_rows else 0.0) for label in classes
     }
     global_pair_rates = {
         pair: (count / total_rows if total_rows else 0.0)
-        for pair, count in sorted(pair_totals.items())
+        for pair, count in sorted(tracked_pairs.items())
     }
 
     split_reports: dict[str, dict[str, object]] = {}
@@ -176,19 +230,11 @@ def build_distribution_report(
 
     for split, rows in split_rows.items():
         row_count = len(rows)
-        labels_counter = Counter()
-        pairs_counter = Counter()
-
-        for labels, _ in rows:
-            unique = sorted(set(labels))
-            for label in unique:
-                labels_counter[label] += 1
-            for a, b in combinations(unique, 2):
-                pairs_counter[f"{a}|{b}"] += 1
+        labels_counter, pairs_counter = split_counts[split]
 
         label_rates: dict[str, float] = {}
         label_delta_abs: dict[str, float] = {}
-        for label in CLASSES:
+        for label in classes:
             rate = labels_counter[label] / row_count if row_count else 0.0
             label_rates[label] = rate
             delta = abs(rate - global_label_rates[label])
@@ -197,6 +243,10 @@ def build_distribution_report(
 
         pair_rates: dict[str, float] = {}
         pair_delta_abs: dict[str, float] = {}
+        if top_pairs is not None:
+            pairs_counter = Counter(
+                {pair: pairs_counter[pair] for pair in tracked_pairs}
+            )
         all_pairs = sorted(set(global_pair_rates) | set(pairs_counter.keys()))
         for pair in all_pairs:
             rate = pairs_counter[pair] / row_count if row_count else 0.0
@@ -217,8 +267,8 @@ def build_distribution_report(
 
     return {
         "total_rows": total_rows,
-        "global_label_counts": {label: totals[label] for label in CLASSES},
-        "global_pair_counts": dict(sorted(pair_totals.items())),
+        "global_label_counts": {label: totals[label] for label in classes},
+        "global_pair_counts": dict(sorted(tracked_pairs.items())),
         "global_label_rates": global_label_rates,
         "global_pair_rates": global_pair_rates,
         "splits": split_reports,
@@ -227,9 +277,199 @@ def build_distribution_report(
     }
 
 
+def split_candidates(
+    split_names: list[str],
+    sizes: dict[str, int],
+    target_size_by_split: dict[str, int],
+    unit_size: int,
+) -> list[str]:
+    """Splits that can take the whole unit, else any with room, else all."""
+
+    return (
+        [s for s in split_names if sizes[s] + unit_size <= target_size_by_split[s]]
+        or [s for s in split_names if sizes[s] < target_size_by_split[s]]
+        or split_names[:]
+    )
+
+
+def assign_by_labelset(
+    units: list[list[dict[str, object]]],
+    *,
+    split_names: list[str],
+    split_ratios: dict[str, float],
+    target_size_by_split: dict[str, int],
+    rng: random.Random,
+) -> dict[str, list[dict[str, object]]]:
+    split_buckets: dict[str, list[dict[str, object]]] = {
+        split: [] for split in split_names
+    }
+
+    # Co-occurrence-aware assignment by exact labelset preserves pair prevalence
+    # much better than naive time/random splits. Units are single records, or
+    # whole near-duplicate clusters keyed by their most common labelset.
+    groups: dict[tuple[str, ...], list[list[dict[str, object]]]] = defaultdict(list)
+    labelset_totals: Counter[tuple[str, ...]] = Counter()
+    for unit in units:
+        groups[unit_labelset(unit)].append(unit)
+        for rec in unit:
+            labelset_totals[tuple(sorted(rec["training_labels"]))] += 1  # type: ignore[arg-type]
+
+    desired = {
+        split: {
+            key: split_ratios[split] * count for key, count in labelset_totals.items()
+        }
+        for split in split_names
+    }
+    assigned = {split: Counter() for split in split_names}
+
+    def group_rows(key: tuple[str, ...]) -> int:
+        return sum(len(unit) for unit in groups[key])
+
+    group_keys = sorted(groups.keys(), key=group_rows, reverse=True)
+    for key in group_keys:
+        bucket = groups[key]
+        rng.shuffle(bucket)
+        # Place big clusters first while every split still has room for them.
+        bucket.sort(key=len, reverse=True)
+
+        for unit in bucket:
+            size = len(unit)
+            candidates = split_candidates(
+                split_names,
+                {split: len(split_buckets[split]) for split in split_names},
+                target_size_by_split,
+                size,
+            )
+            unit_keys = Counter(
+                tuple(sorted(rec["training_labels"]))  # type: ignore[arg-type]
+                for rec in unit
+            )
+
+            # Fill the most under-assigned split for this unit's labelsets first.
+            best_split = max(
+                candidates,
+                key=lambda split: (
+                    sum(
+                        count * (desired[split][k] - assigned[split][k])
+                        for k, count in unit_keys.items()
+                    )
+                    / size,
+                    target_size_by_split[split] - len(split_buckets[split]),
+                ),
+            )
+            split_buckets[best_split].extend(unit)
+            assigned[best_split].update(unit_keys)
+
+    return split_buckets
+
+
+def assign_iterative(
+    units: list[list[dict[str, object]]],
+    *,
+    split_names: list[str],
+    split_ratios: dict[str, float],
+    target_size_by_split: dict[str, int],
+    rng: random.Random,
+) -> dict[str, list[dict[str, object]]]:
+    """Iterative stratification (Sechidis et al., 2011) over raw labels.
+
+    Repeatedly takes the label with the fewest unassigned rows and sends each
+    unit carrying it to the split that still wants the most of that label.
+    Ties go to the split that wants most of the unit's other labels, then
+    most rows overall, then random. Label membership is kept in CSR arrays,
+    so the cost is O(rows * labels-per-row + labels^2) rather than one group
+    per distinct labelset.
+
+    The 3-class label/pair tokens (``features``) are stratified alongside the
+    raw labels. Otherwise the most common labels (``clean``) come last and
+    only fill whatever room rare labels left in each split. Rare labels
+    round toward train, so small splits ended up skewed toward clean.
+    """
+
+    label_lists = [
+        [*rec["stratify_labels"], *rec["features"]]  # type: ignore[misc]
+        for unit in units
+        for rec in unit
+    ]
+    vocab = LabelVocab(sorted({label for labels in label_lists for label in labels}))
+    matrix = LabelMatrix.from_label_lists(label_lists, vocab=vocab)
+    unit_sizes = np.asarray([len(unit) for unit in units], dtype=np.int64)
+    row_unit = np.repeat(np.arange(len(units)), unit_sizes)
+
+    # Per-unit label counts in CSR form: unit_ptr[u]:unit_ptr[u + 1].
+    rows, cols = np.nonzero(matrix.dense())
+    width = max(len(vocab), 1)
+    keys, label_counts = np.unique(row_unit[rows] * width + cols, return_counts=True)
+    owner, label_ids = np.divmod(keys, width)
+    unit_ptr = np.searchsorted(owner, np.arange(len(units) + 1))
+
+    # Inverse index label -> units, also CSR.
+    order = np.argsort(label_ids, kind="stable")
+    label_units = owner[order]
+    label_ptr = np.searchsorted(label_ids[order], np.arange(len(vocab) + 1))
+
+    ratios = np.asarray([split_ratios[s] for s in split_names], dtype=np.float64)
+    remaining = np.bincount(label_ids, weights=label_counts, minlength=len(vocab))
+    desired_label = ratios[:, None] * remaining[None, :]
+    desired_rows = ratios * float(unit_sizes.sum())
+    assigned = np.full(len(units), -1, dtype=np.int64)
+    sizes = {split: 0 for split in split_names}
+    split_pos = {split: idx for idx, split in enumerate(split_names)}
+
+    def place(u: int, label: int | None) -> None:
+        candidates = split_candidates(
+            split_names, sizes, target_size_by_split, int(unit_sizes[u])
+        )
+        span = slice(unit_ptr[u], unit_ptr[u + 1])
+        best = max(
+            candidates,
+            key=lambda split: (
+                desired_label[split_pos[split], label] if label is not None else 0.0,
+                float(desired_label[split_pos[split], label_ids[span]].sum()),
+                desired_rows[split_pos[split]],
+                rng.random(),
+            ),
+        )
+        j = split_pos[best]
+        assigned[u] = j
+        sizes[best] += int(unit_sizes[u])
+        desired_rows[j] -= unit_sizes[u]
+        desired_label[j, label_ids[span]] -= label_counts[span]
+        remaining[label_ids[span]] -= label_counts[span]
+
+    while True:
+        open_labels = np.flatnonzero(remaining > 0)
+        if open_labels.size == 0:
+            break
+        label = int(open_labels[np.argmin(remaining[open_labels])])
+        members = label_units[label_ptr[label] : label_ptr[label + 1]]
+        members = [int(u) for u in members if assigned[u] < 0]
+        rng.shuffle(members)
+        members.sort(key=lambda u: -unit_sizes[u])
+        for u in members:
+            place(u, label)
+
+    unlabeled = [u for u in range(len(units)) if assigned[u] < 0]
+    rng.shuffle(unlabeled)
+    for u in unlabeled:
+        place(u, None)
+
+    split_buckets: dict[str, list[dict[str, object]]] = {
+        split: [] for split in split_names
+    }
+    for u, j in enumerate(assigned):
+        split_buckets[split_names[j]].extend(units[u])
+    return split_buckets
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument("--input", type=Path, default=DEFAULT_INPUT)
+    parser.add_argument(
+        "--input",
+        type=Path,
+        default=DEFAULT_INPUT,
+        help="Dataset JSONL or label store (label_store.py)",
+    )
 
     parser.add_argument("--train-ratio", type=float, default=0.80)
     parser.add_argument("--valid-ratio", type=float, default=0.10)
@@ -262,6 +502,28 @@ def main() -> None:
         action="store_true",
         help="Exit non-zero if split distribution drift exceeds thresholds.",
     )
+    parser.add_argument(
+        "--strategy",
+        choices=("labelset", "iterative"),
+        default="labelset",
+        help="labelset = exact 3-class labelset groups; iterative = iterative "
+        "stratification over raw taxonomy labels",
+    )
+    parser.add_argument(
+        "--report-top-pairs",
+        type=int,
+        default=50,
+        help="Most frequent raw label pairs tracked in the raw-label drift report",
+    )
+    parser.add_argument(
+        "--group-near-dups",
+        action="store_true",
+        help="Assign near-duplicate text clusters (MinHash LSH) to a single split.",
+    )
+    parser.add_argument("--near-dup-threshold", type=float, default=0.8)
+    parser.add_argument("--num-perm", type=int, default=128)
+    parser.add_argument("--shingle-size", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1)
 
     args = parser.parse_args()
 
@@ -286,7 +548,7 @@ def main() -> None:
     records: list[dict[str, object]] = []
     skipped_empty = 0
 
-    with args.input.open("r", encoding="utf-8") as handle:
+    with closing(iter_dataset_lines(args.input)) as handle:
         for line_no, line in enumerate(handle, 1):
             text = line.strip()
             if not text:
@@ -313,6 +575,7 @@ def main() -> None:
                 "obj": obj,
                 "raw_labels": raw_labels,
                 "training_labels": training_labels,
+                "stratify_labels": sorted(set(normalize_labels(raw_labels))),
                 "features": feature_tokens(training_labels),
                 "text": cleaned,
                 "ts": parse_time(obj.get("collected_at")),
@@ -335,44 +598,34 @@ def main() -> None:
         spec.name: target_sizes[idx] for idx, spec in enumerate(split_specs)
     }
 
-    split_buckets: dict[str, list[dict[str, object]]] = {
-        split: [] for split in split_names
-    }
-
-    # Co-occurrence-aware assignment by exact labelset preserves pair prevalence
-    # much better than naive time/random splits.
-    groups: dict[tuple[str, ...], list[dict[str, object]]] = defaultdict(list)
-    for rec in records:
-        key = tuple(sorted(rec["training_labels"]))  # type: ignore[arg-type]
-        groups[key].append(rec)
-
-    group_keys = sorted(groups.keys(), key=lambda key: len(groups[key]), reverse=True)
-    for key in group_keys:
-        bucket = groups[key]
-        rng.shuffle(bucket)
-        group_size = len(bucket)
-        desired = {split: split_ratios[split] * group_size for split in split_names}
-        assigned = {split: 0 for split in split_names}
-
-        for rec in bucket:
-            candidates = [
-                split
-                for split in split_names
-                if len(split_buckets[split]) < target_size_by_split[split]
-            ]
-            if not candidates:
-                candidates = split_names[:]
-
-            # Fill the most under-assigned split for this labelset first.
-            best_split = max(
-                candidates,
-                key=lambda split: (
-                    desired[split] - assigned[split],
-                    target_size_by_split[split] - len(split_buckets[split]),
-                ),
+    near_dup_config: MinHashConfig | None = None
+    if args.group_near_dups:
+        try:
+            near_dup_config = MinHashConfig(
+                num_perm=args.num_perm,
+                shingle_size=args.shingle_size,
+                threshold=args.near_dup_threshold,
             )
-            split_buckets[best_split].append(rec)
-            assigned[best_split] += 1
+        except ValueError as exc:
+            raise SystemExit(str(exc)) from exc
+    units = build_units(records, config=near_dup_config, workers=args.workers)
+
+    if args.strategy == "iterative":
+        split_buckets = assign_iterative(
+            units,
+            split_names=split_names,
+            split_ratios=split_ratios,
+            target_size_by_split=target_size_by_split,
+            rng=rng,
+        )
+    else:
+        split_buckets = assign_by_labelset(
+            units,
+            split_names=split_names,
+            split_ratios=split_ratios,
+            target_size_by_split=target_size_by_split,
+            rng=rng,
+        )
 
     split_json_rows: dict[str, list[dict]] = {}
     split_txt_rows: dict[str, list[tuple[list[str], str]]] = {}
@@ -410,15 +663,41 @@ def main() -> None:
         write_fasttext(spec.txt_path, txt_rows)
 
     report = build_distribution_report(split_txt_rows)
+    # Full-taxonomy drift; only enforced when stratifying on raw labels.
+    raw_rows = {
+        spec.name: [
+            (list(row["stratify_labels"]), "")  # type: ignore[arg-type]
+            for row in split_buckets[spec.name]
+        ]
+        for spec in split_specs
+    }
+    report["raw_labels"] = build_distribution_report(
+        raw_rows, classes=None, top_pairs=args.report_top_pairs
+    )
     args.report_out.parent.mkdir(parents=True, exist_ok=True)
     args.report_out.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
 
     drift_label = float(report["max_label_delta_abs"])
     drift_pair = float(report["max_pair_delta_abs"])
+    drift_checks = [("label", drift_label, args.max_label_delta)]
+    drift_checks.append(("pair", drift_pair, args.max_pair_delta))
+    raw_report: dict = report["raw_labels"]  # type: ignore[assignment]
+    if args.strategy == "iterative":
+        drift_checks.append(
+            (
+                "raw label",
+                float(raw_report["max_label_delta_abs"]),
+                args.max_label_delta,
+            )
+        )
+        drift_checks.append(
+            ("raw pair", float(raw_report["max_pair_delta_abs"]), args.max_pair_delta)
+        )
 
     meta = {
         "input": str(args.input),
         "seed": args.seed,
+        "strategy": args.strategy,
         "ratios": {spec.name: spec.ratio for spec in split_specs},
         "target_sizes": target_size_by_split,
         "actual_sizes": {split: len(split_json_rows[split]) for split in split_names},
@@ -435,6 +714,17 @@ def main() -> None:
             "max_pair_delta": args.max_pair_delta,
         },
     }
+    meta["raw_max_label_delta_abs"] = raw_report["max_label_delta_abs"]
+    meta["raw_max_pair_delta_abs"] = raw_report["max_pair_delta_abs"]
+    meta["report_top_pairs"] = args.report_top_pairs
+    if near_dup_config is not None:
+        clusters = [unit for unit in units if len(unit) > 1]
+        meta["near_dup"] = {
+            **near_dup_config.to_dict(),
+            "clusters": len(clusters),
+            "clustered_rows": sum(len(unit) for unit in clusters),
+            "largest_cluster": max((len(unit) for unit in clusters), default=0),
+        }
     args.meta_out.parent.mkdir(parents=True, exist_ok=True)
     args.meta_out.write_text(json.dumps(meta, indent=2) + "\n", encoding="utf-8")
 
@@ -453,23 +743,17 @@ def main() -> None:
         print(f"  {label:12s} {format_rate(global_label_rates[label])}")
 
     print("\nMax distribution deltas:")
-    print(f"  label delta abs max = {drift_label:.4f}")
-    print(f"  pair  delta abs max = {drift_pair:.4f}")
+    for name, value, _ in drift_checks:
+        print(f"  {name + ' delta abs max':<24s}= {value:.4f}")
 
     print(f"\nWrote report: {args.report_out}")
     print(f"Wrote meta:   {args.meta_out}")
 
     failed = False
-    if drift_label > args.max_label_delta:
-        print(
-            f"ERROR: label drift {drift_label:.4f} exceeds threshold {args.max_label_delta:.4f}"
-        )
-        failed = True
-    if drift_pair > args.max_pair_delta:
-        print(
-            f"ERROR: pair drift {drift_pair:.4f} exceeds threshold {args.max_pair_delta:.4f}"
-        )
-        failed = True
+    for name, value, threshold in drift_checks:
+        if value > threshold:
+            print(f"ERROR: {name} drift {value:.4f} exceeds threshold {threshold:.4f}")
+            failed = True
 
     if failed and args.strict:
         raise SystemExit(1)
@@ -11,6 +11,14 @@ Usage:
     # Apply changes
     python scripts/manual_relabel.py data/sample.jsonl --changes changes.txt --apply
 
+    # Apply through the label store (transactional, with label history)
+    python scripts/manual_relabel.py data/sample.jsonl --changes changes.txt \\
+        --store data/sample.sqlite --apply
+
+    # ... after the JSONL was edited outside the store, load it back in first
+    python scripts/manual_relabel.py data/sample.jsonl --changes changes.txt \\
+        --store data/sample.sqlite --reimport --apply
+
 Changes file format (one per line):
     # Single label
     x_0001 topic_crypto
@@ -21,12 +29,11 @@ Changes file format (one per line):
 """
 
 import argparse
-import json
-import os
 import sys
-import tempfile
 from pathlib import Path
 
+from jsonl_index import JsonlIndex
+from label_store import LabelStore, is_label_store
 
 VALID_LABELS = {"clean", "topic_crypto", "scam", "promo", "ai_generated_reply"}
 
@@ -79,6 +86,25 @@ def load_changes(changes_path: Path) -> dict[str, list[str]]:
     return changes
 
 
+def relabel_row(id_: str, obj: dict, new_labels: list[str]) -> bool:
+    """Set ``labels`` on ``obj`` in place; returns False if nothing changes."""
+    old_labels = []
+    if isinstance(obj.get("labels"), list):
+        old_labels = normalize_labels(obj.get("labels"))
+    elif isinstance(obj.get("label"), str):
+        old_labels = normalize_labels([obj.get("label")])
+    if (
+        old_labels == new_labels
+        and obj.get("labels") == new_labels
+        and "label" not in obj
+    ):
+        return False
+    print(f"  {id_}: {old_labels} → {new_labels}")
+    obj["labels"] = new_labels
+    obj.pop("label", None)
+    return True
+
+
 def main():
     ap = argparse.ArgumentParser(
         description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
@@ -90,8 +116,24 @@ def main():
         action="store_true",
         help="Actually write changes (default: preview only)",
     )
+    ap.add_argument(
+        "--store",
+        type=Path,
+        default=None,
+        help="Apply through this label store (label_store.py) in one transaction, "
+        "logging label history, then re-export the JSONL path from it",
+    )
+    ap.add_argument(
+        "--reimport",
+        action="store_true",
+        help="With --store: re-import the JSONL path into the store first "
+        "(required when it was edited outside the store; keeps label history)",
+    )
     args = ap.parse_args()
 
+    if args.reimport and args.store is None:
+        raise SystemExit("--reimport requires --store")
+
     path = Path(args.path)
     changes = load_changes(Path(args.changes))
 
@@ -101,51 +143,66 @@ def main():
 
     print(f"Loaded {len(changes)} changes from {args.changes}", file=sys.stderr)
 
-    # Process file
-    applied = 0
-    not_found = set(changes.keys())
-    output_lines = []
-
-    for line in path.open(encoding="utf-8"):
-        obj = json.loads(line)
-        id_ = obj.get("id")
-        if id_ in changes:
-            old_labels = []
-            if isinstance(obj.get("labels"), list):
-                old_labels = normalize_labels(obj.get("labels"))
-            elif isinstance(obj.get("label"), str):
-                old_labels = normalize_labels([obj.get("label")])
-            new_labels = changes[id_]
-            if (
-                old_labels != new_labels
-                or obj.get("labels") != new_labels
-                or "label" in obj
-            ):
-                print(f"  {id_}: {old_labels} → {new_labels}")
-                obj["labels"] = new_labels
-                obj.pop("label", None)
-                applied += 1
+    # Only the changed ids are read (and rewritten): by seq from the label store,
+    # or by line number via the JSONL byte-offset index.
+    if args.store is not None:
+        if not is_label_store(args.store):
+            raise SystemExit(
+                f"Missing label store: {args.store} (run label_store.py --import)"
+            )
+        backend = LabelStore(args.store)
+        if args.reimport:
+            backend.import_jsonl(path, replace=True, keep_history=True)
+        elif not backend.jsonl_matches(path):
+            backend.close()
+            raise SystemExit(
+                f"{path} changed since it was last synced with {args.store}; "
+                "pass --reimport to load it into the store first."
+            )
+        rows = [(seq, obj.get("id"), obj) for seq, obj in backend.rows_for_ids(changes)]
+    else:
+        backend = JsonlIndex(path)
+        rows = []
+        for id_ in changes:
+            locations = backend.locate(id_)
+            for loc, obj in zip(locations, backend.read(locations)):
+                rows.append((loc.line_no, id_, obj))
+
+    try:
+        not_found = set(changes.keys())
+        updates: dict[int, dict] = {}
+        for key, id_, obj in rows:
+            if relabel_row(id_, obj, changes[id_]):
+                updates[key] = obj
             not_found.discard(id_)
-        output_lines.append(json.dumps(obj, ensure_ascii=False, separators=(",", ":")))
-
-    if not_found:
-        print(f"\n⚠️  IDs not found in dataset: {sorted(not_found)}", file=sys.stderr)
-
-    print(f"\nTotal changes to apply: {applied}", file=sys.stderr)
-
-    if not args.apply:
-        print(
-            "\n⚠️  DRY RUN - no changes written. Use --apply to write.", file=sys.stderr
-        )
-        return
-
-    # Write atomically
-    with tempfile.NamedTemporaryFile(
-        "w", delete=False, encoding="utf-8", dir=path.parent
-    ) as tmp:
-        tmp.write("\n".join(output_lines) + "\n")
-        tmp_path = Path(tmp.name)
-    os.replace(tmp_path, path)
+        applied = len(updates)
+
+        if not_found:
+            print(
+                f"\n⚠️  IDs not found in dataset: {sorted(not_found)}", file=sys.stderr
+            )
+
+        print(f"\nTotal changes to apply: {applied}", file=sys.stderr)
+
+        if not args.apply:
+            print(
+                "\n⚠️  DRY RUN - no changes written. Use --apply to write.",
+                file=sys.stderr,
+            )
+            return
+
+        if isinstance(backend, LabelStore):
+            # The export runs inside the relabel transaction, under its lock.
+            backend.set_labels(
+                {seq: obj["labels"] for seq, obj in updates.items()},
+                source=f"manual_relabel:{args.changes}",
+                export=path,
+            )
+        else:
+            # Atomic: unchanged rows are copied byte-for-byte into a temp file.
+            backend.rewrite(updates)
+    finally:
+        backend.close()
     print(f"✅ Applied {applied} changes to {path}", file=sys.stderr)
 
 
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""MinHash + LSH near-duplicate detection for short post texts.
+
+Texts are normalized with ``transformer_common.clean_text`` (the same
+``text_normalized`` the transformer pipeline trains on), then split into
+overlapping UTF-8 byte shingles. A MinHash signature (``num_perm`` universal
+hashes mod a 32-bit prime) estimates the Jaccard similarity of two shingle
+sets. Signatures are banded for LSH. Rows that share a band bucket are
+compared to the bucket's first member, and the pairs above ``threshold`` are
+merged with union-find. The result is a list of near-duplicate clusters
+(connected components). All of this is numpy-only, and signing runs in
+worker processes, so millions of rows take minutes on one machine.
+
+For streaming dedup, ``band_keys`` turns a signature into per-band bucket
+keys. ``BloomFilter`` (bounded memory) and ``SqliteKeyIndex`` (exact,
+disk-backed) remember the keys seen so far. ``SignatureIndex`` also keeps
+each kept signature on disk by bucket. A bucket hit then counts as a near
+duplicate only if the estimated Jaccard reaches ``threshold``, the same
+check ``near_duplicate_clusters`` applies.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import multiprocessing as mp
+import sqlite3
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterable, Sequence
+
+import numpy as np
+
+from transformer_common import clean_text
+
+PRIME = np.uint64(4294967291)  # largest prime below 2**32
+SHINGLE_BASE = np.uint64(257)
+MIX_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+MAX_HASH = np.uint32(0xFFFFFFFF)
+
+
+@dataclass(frozen=True)
+class MinHashConfig:
+    num_perm: int = 128
+    shingle_size: int = 5
+    threshold: float = 0.8
+    seed: int = 1
+
+    def __post_init__(self) -> None:
+        if self.num_perm < 2:
+            raise ValueError("num_perm must be at least 2")
+        if not 1 <= self.shingle_size <= 7:
+            # 257**k must stay below 2**64 for the exact shingle ids.
+            raise ValueError("shingle_size must be between 1 and 7")
+        if not 0.0 < self.threshold <= 1.0:
+            raise ValueError("threshold must be in (0, 1]")
+
+    def to_dict(self) -> dict:
+        bands, rows = lsh_params(self.threshold, self.num_perm)
+        return {**asdict(self), "bands": bands, "rows_per_band": rows}
+
+
+def lsh_params(threshold: float, num_perm: int) -> tuple[int, int]:
+    """(bands, rows) minimizing false-positive + false-negative area at threshold."""
+
+    grid = np.linspace(0.0, 1.0, 201)
+    below = grid < threshold
+    best: tuple[float, int, int] | None = None
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            prob = 1.0 - (1.0 - grid**rows) ** bands
+            # Riemann sums over the 0.005-wide grid cells.
+            false_pos = prob[below].sum() / (len(grid) - 1)
+            false_neg = (1.0 - prob[~below]).sum() / (len(grid) - 1)
+            error = float(false_pos + false_neg)
+            if best is None or error < best[0]:
+                best = (error, bands, rows)
+    assert best is not None
+    return best[1], best[2]
+
+
+def shingle_hashes(text: str, shingle_size: int) -> np.ndarray:
+    """Unique 32-bit hashes of the text's UTF-8 byte k-grams."""
+
+    data = np.frombuffer(text.encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+    if data.size == 0:
+        return np.zeros(0, dtype=np.uint64)
+    if data.size < shingle_size:
+        shingle_size = int(data.size)
+    windows = np.lib.stride_tricks.sliding_window_view(data, shingle_size)
+    powers = SHINGLE_BASE ** np.arange(shingle_size - 1, -1, -1, dtype=np.uint64)
+    ids = (windows * powers).sum(axis=1, dtype=np.uint64)
+    # Fold the exact 56-bit shingle id to 32 bits (wrapping multiply is intended).
+    with np.errstate(over="ignore"):
+        mixed = (ids + np.uint64(1)) * MIX_MULTIPLIER
+    return np.unique(mixed >> np.uint64(32))
+
+
+class MinHasher:
+    def __init__(self, config: MinHashConfig) -> None:
+        self.config = config
+        rng = np.random.default_rng(config.seed)
+        self.a = rng.integers(1, int(PRIME), size=config.num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(PRIME), size=config.num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash of clean_text(text); all-MAX_HASH for empty texts."""
+
+        hashes = shingle_hashes(clean_text(text), self.config.shingle_size)
+        if hashes.size == 0:
+            return np.full(self.config.num_perm, MAX_HASH, dtype=np.uint32)
+        # a, x < 2**32, so a * x + b fits in uint64 before the modulo.
+        values = (hashes[:, None] * self.a[None, :] + self.b[None, :]) % PRIME
+        return values.min(axis=0).astype(np.uint32)
+
+    def signatures(
+        self, texts: Iterable[str], *, workers: int = 1, chunk_size: int = 2048
+    ) -> np.ndarray:
+        texts = list(texts)
+        if workers <= 1 or len(texts) < 2 * chunk_size:
+            rows = [self.signature(text) for text in texts]
+        else:
+            chunks = [
+                texts[start : start + chunk_size]
+                for start in range(0, len(texts), chunk_size)
+            ]
+            with mp.get_context("spawn").Pool(
+                workers, initializer=_init_worker, initargs=(self.config,)
+            ) as pool:
+                rows = [sig for part in pool.imap(_sign_chunk, chunks) for sig in part]
+        if not rows:
+            return np.zeros((0, self.config.num_perm), dtype=np.uint32)
+        return np.stack(rows)
+
+
+_WORKER_HASHER: MinHasher | None = None
+
+
+def _init_worker(config: MinHashConfig) -> None:
+    global _WORKER_HASHER
+    _WORKER_HASHER = MinHasher(config)
+
+
+def _sign_chunk(texts: list[str]) -> list[np.ndarray]:
+    assert _WORKER_HASHER is not None
+    return [_WORKER_HASHER.signature(text) for text in texts]
+
+
+class UnionFind:
+    def __init__(self, size: int) -> None:
+        self.parent = list(range(size))
+
+    def find(self, item: int) -> int:
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, left: int, right: int) -> None:
+        left_root, right_root = self.find(left), self.find(right)
+        if left_root != right_root:
+            self.parent[max(left_root, right_root)] = min(left_root, right_root)
+
+
+def estimated_jaccard(left: np.ndarray, right: np.ndarray) -> float:
+    return float(np.mean(left == right))
+
+
+def near_duplicate_clusters(
+    signatures: np.ndarray, *, threshold: float, valid: np.ndarray | None = None
+) -> list[list[int]]:
+    """Connected components (size >= 2) of rows whose MinHash Jaccard >= threshold.
+
+    ``valid`` masks out rows (e.g. empty texts) that must not be clustered.
+    Clusters are sorted by size, largest first; members are sorted indices.
+    """
+
+    count, num_perm = signatures.shape
+    bands, rows = lsh_params(threshold, num_perm)
+    keep = np.ones(count, dtype=bool) if valid is None else np.asarray(valid, bool)
+    candidates = np.flatnonzero(keep)
+    uf = UnionFind(count)
+    for band in range(bands):
+        block = np.ascontiguousarray(
+            signatures[candidates, band * rows : (band + 1) * rows]
+        )
+        keys = block.view(np.dtype((np.void, block.dtype.itemsize * rows))).ravel()
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+        for start, end in zip(starts, ends):
+            if end - start < 2:
+                continue
+            members = candidates[order[start:end]]
+            rep = int(members[0])
+            sims = (signatures[members[1:]] == signatures[rep]).mean(axis=1)
+            for member in members[1:][sims >= threshold]:
+                uf.union(rep, int(member))
+
+    groups: dict[int, list[int]] = {}
+    for index in candidates:
+        groups.setdefault(uf.find(int(index)), []).append(int(index))
+    clusters = [members for members in groups.values() if len(members) > 1]
+    clusters.sort(key=lambda members: (-len(members), members[0]))
+    return clusters
+
+
+def cluster_groups(cluster: Sequence[int], labels: Sequence[str]) -> dict[str, int]:
+    """Count cluster members per group label (e.g. split name)."""
+
+    counts: dict[str, int] = {}
+    for index in cluster:
+        counts[labels[index]] = counts.get(labels[index], 0) + 1
+    return counts
+
+
+def band_keys(signature: np.ndarray, *, bands: int, rows: int) -> list[bytes]:
+    """16-byte LSH bucket keys, one per band, for a streaming seen-set."""
+
+    return [
+        hashlib.blake2b(
+            signature[band * rows : (band + 1) * rows].tobytes(),
+            digest_size=16,
+            person=band.to_bytes(2, "little") * 8,
+        ).digest()
+        for band in range(bands)
+    ]
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 16-byte keys (e.g. blake2b digests).
+
+    Membership has no false negatives. The false-positive rate stays near
+    ``error_rate`` until more than ``capacity`` keys are added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        if capacity < 1 or not 0.0 < error_rate < 1.0:
+            raise ValueError("Bloom filter needs capacity >= 1 and 0 < error_rate < 1")
+        self.capacity = capacity
+        self.num_bits = max(
+            64, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        )
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+        self.count = 0
+        self._steps = np.arange(self.num_hashes, dtype=np.uint64)
+
+    def _positions(self, keys: Sequence[bytes]) -> np.ndarray:
+        # Double hashing (Kirsch-Mitzenmacher) on the two halves of each key.
+        halves = np.frombuffer(b"".join(keys), dtype=np.uint64).reshape(-1, 2)
+        with np.errstate(over="ignore"):
+            positions = halves[:, :1] + self._steps[None, :] * (halves[:, 1:] | 1)
+        return positions % np.uint64(self.num_bits)
+
+    def contains_any(self, keys: Sequence[bytes]) -> bool:
+        positions = self._positions(keys)
+        hits = self.bits[positions >> np.uint64(3)] & (
+            np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)
+        )
+        return bool((hits != 0).all(axis=1).any())
+
+    def add_all(self, keys: Sequence[bytes]) -> None:
+        positions = self._positions(keys).ravel()
+        np.bitwise_or.at(
+            self.bits,
+            positions >> np.uint64(3),
+            np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8),
+        )
+        self.count += len(keys)
+
+    def expected_error_rate(self) -> float:
+        fill = 1.0 - math.exp(-self.num_hashes * self.count / self.num_bits)
+        return fill**self.num_hashes
+
+    def stats(self) -> dict:
+        return {
+            "backend": "bloom",
+            "capacity": self.capacity,
+            "keys": self.count,
+            "bytes": int(self.bits.nbytes),
+            "num_hashes": self.num_hashes,
+            "expected_error_rate": self.expected_error_rate(),
+        }
+
+
+class SqliteKeyIndex:
+    """Exact, disk-backed seen-set with the BloomFilter interface."""
+
+    def __init__(self, path: Path, *, table: str) -> None:
+        self.path = path
+        self.table = table
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key BLOB PRIMARY KEY) WITHOUT ROWID"
+        )
+        self.count = 0
+
+    def contains_any(self, keys: Sequence[bytes]) -> bool:
+        marks = ",".join("?" * len(keys))
+        row = self.conn.execute(
+            f"SELECT 1 FROM {self.table} WHERE key IN ({marks}) LIMIT 1", list(keys)
+        ).fetchone()
+        return row is not None
+
+    def add_all(self, keys: Sequence[bytes]) -> None:
+        self.conn.executemany(
+            f"INSERT OR IGNORE INTO {self.table} (key) VALUES (?)",
+            [(key,) for key in keys],
+        )
+        self.count += len(keys)
+
+    def stats(self) -> dict:
+        return {"backend": "sqlite", "path": str(self.path), "keys": self.count}
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+
+class SignatureIndex:
+    """Disk-backed LSH index of kept signatures for verified streaming dedup.
+
+    ``prefilter`` (a BloomFilter over band keys) skips the disk lookup for
+    texts without any bucket hit, which is almost all of them.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        threshold: float,
+        prefilter: BloomFilter | None = None,
+    ) -> None:
+        self.path = path
+        self.threshold = threshold
+        self.prefilter = prefilter
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS signatures (row INTEGER PRIMARY KEY, sig BLOB);
+            CREATE TABLE IF NOT EXISTS buckets (
+                key BLOB NOT NULL,
+                row INTEGER NOT NULL,
+                PRIMARY KEY (key, row)
+            ) WITHOUT ROWID;
+            """
+        )
+        self.rows = 0
+        self.candidates = 0  # texts sharing a bucket with a kept text
+        self.rejected = 0  # ... whose candidates were all below threshold
+        self.compared = 0  # signature pairs compared
+
+    def find(self, keys: Sequence[bytes], signature: np.ndarray) -> bool:
+        """True if a kept text shares a bucket and reaches ``threshold``."""
+
+        if self.prefilter is not None and not self.prefilter.contains_any(keys):
+            return False
+        marks = ",".join("?" * len(keys))
+        cursor = self.conn.execute(
+            "SELECT sig FROM signatures WHERE row IN "
+            f"(SELECT row FROM buckets WHERE key IN ({marks}))",
+            list(keys),
+        )
+        seen = False
+        for (blob,) in cursor:
+            seen = True
+            self.compared += 1
+            kept = np.frombuffer(blob, dtype=np.uint32)
+            if estimated_jaccard(kept, signature) >= self.threshold:
+                self.candidates += 1
+                return True
+        if seen:
+            self.candidates += 1
+            self.rejected += 1
+        return False
+
+    def add(self, keys: Sequence[bytes], signature: np.ndarray) -> None:
+        self.rows += 1
+        self.conn.execute(
+            "INSERT INTO signatures (row, sig) VALUES (?, ?)",
+            (self.rows, signature.astype(np.uint32).tobytes()),
+        )
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO buckets (key, row) VALUES (?, ?)",
+            [(key, self.rows) for key in keys],
+        )
+        if self.prefilter is not None:
+            self.prefilter.add_all(keys)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "sqlite" if self.prefilter is None else "bloom+sqlite",
+            "path": str(self.path),
+            "threshold": self.threshold,
+            "signatures": self.rows,
+            "lsh_candidates": self.candidates,
+            "lsh_rejected": self.rejected,
+            "pairs_compared": self.compared,
+            **({"prefilter": self.prefilter.stats()} if self.prefilter else {}),
+        }
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
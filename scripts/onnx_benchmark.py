@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Measure ONNX Runtime CPU latency and size of an exported student model."""
+
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import onnxruntime as ort
+from transformers import BertTokenizerFast
+
+from transformer_common import (
+    DATA_DIR,
+    MODELS_DIR,
+    load_json,
+    load_prepared_rows,
+    save_json,
+)
+
+DEFAULT_MODEL = MODELS_DIR / "student.int8.onnx"
+DEFAULT_STUDENT_DIR = MODELS_DIR / "student"
+DEFAULT_VALID = DATA_DIR / "transformer" / "valid.prepared.jsonl"
+
+
+def parse_int_csv(value: str) -> list[int]:
+    items = [int(item) for item in value.split(",") if item.strip()]
+    if not items or any(item < 1 for item in items):
+        raise ValueError(f"Expected comma-separated positive integers, got '{value}'")
+    return items
+
+
+def build_feeds(
+    tokenizer: BertTokenizerFast,
+    texts: list[str],
+    *,
+    max_length: int,
+    batch_size: int,
+) -> dict[str, np.ndarray]:
+    """Tokenize `batch_size` real texts (cycled if needed) like the exporter does."""
+
+    if not texts:
+        raise SystemExit("No texts available to build benchmark inputs")
+    chunk = [texts[idx % len(texts)] for idx in range(batch_size)]
+    enc = tokenizer(
+        chunk,
+        truncation=True,
+        padding="max_length",
+        max_length=max_length,
+        return_attention_mask=True,
+    )
+    return {
+        "input_ids": np.array(enc["input_ids"], dtype=np.int64),
+        "attention_mask": np.array(enc["attention_mask"], dtype=np.int64),
+    }
+
+
+def create_session(model_path: Path, *, threads: int) -> ort.InferenceSession:
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    return ort.InferenceSession(
+        str(model_path), sess_options=options, providers=["CPUExecutionProvider"]
+    )
+
+
+def time_session(
+    session: ort.InferenceSession,
+    feeds: dict[str, np.ndarray],
+    *,
+    warmup: int,
+    iters: int,
+) -> dict[str, float]:
+    input_names = {item.name for item in session.get_inputs()}
+    feeds = {name: value for name, value in feeds.items() if name in input_names}
+    for _ in range(warmup):
+        session.run(None, feeds)
+    timings = np.empty(iters, dtype=np.float64)
+    for idx in range(iters):
+        start = time.perf_counter()
+        session.run(None, feeds)
+        timings[idx] = (time.perf_counter() - start) * 1000.0
+    batch_size = int(next(iter(feeds.values())).shape[0])
+    mean_ms = float(timings.mean())
+    return {
+        "batch_size": batch_size,
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p90_ms": float(np.percentile(timings, 90)),
+        "mean_ms": mean_ms,
+        "rows_per_sec": batch_size * 1000.0 / max(mean_ms, 1e-9),
+    }
+
+
+def benchmark_onnx(
+    model_path: Path,
+    *,
+    tokenizer: BertTokenizerFast,
+    texts: list[str],
+    max_length: int,
+    batch_sizes: list[int],
+    threads: int = 1,
+    warmup: int = 10,
+    iters: int = 100,
+) -> dict:
+    """Latency per batch size plus on-disk size for one ONNX model."""
+
+    session = create_session(model_path, threads=threads)
+    latency = {
+        str(batch_size): time_session(
+            session,
+            build_feeds(tokenizer, texts, max_length=max_length, batch_size=batch_size),
+            warmup=warmup,
+            iters=iters,
+        )
+        for batch_size in batch_sizes
+    }
+    return {
+        "model": str(model_path),
+        "size_bytes": model_path.stat().st_size,
+        "threads": threads,
+        "max_length": max_length,
+        "warmup": warmup,
+        "iters": iters,
+        "latency": latency,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", type=Path, default=DEFAULT_MODEL)
+    parser.add_argument(
+        "--student-dir",
+        type=Path,
+        default=DEFAULT_STUDENT_DIR,
+        help="Student directory providing tokenizer/ and student_config.json",
+    )
+    parser.add_argument("--valid", type=Path, default=DEFAULT_VALID)
+    parser.add_argument("--batch-sizes", type=str, default="1,32")
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="ORT intra-op threads (1 approximates single-threaded on-device WASM)",
+    )
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--iters", type=int, default=100)
+    parser.add_argument("--out", type=Path, default=None, help="Optional JSON report")
+    args = parser.parse_args()
+
+    for path in (args.model, args.student_dir, args.valid):
+        if not path.exists():
+            raise SystemExit(f"Missing required input: {path}")
+    try:
+        batch_sizes = parse_int_csv(args.batch_sizes)
+    except ValueError as exc:
+        raise SystemExit(str(exc)) from exc
+
+    config = load_json(args.student_dir / "student_config.json")
+    max_length = int(config["architecture"]["max_length"])
+    tokenizer = BertTokenizerFast.from_pretrained(str(args.student_dir / "tokenizer"))
+    texts = [row.text_normalized for row in load_prepared_rows(args.valid)]
+
+    report = benchmark_onnx(
+        args.model,
+        tokenizer=tokenizer,
+        texts=texts,
+        max_length=max_length,
+        batch_sizes=batch_sizes,
+        threads=args.threads,
+        warmup=args.warmup,
+        iters=args.iters,
+    )
+    print(
+        f"{args.model}: {report['size_bytes'] / (1024 * 1024):.2f} MB, "
+        f"threads={args.threads}"
+    )
+    for batch_size, stats in report["latency"].items():
+        print(
+            f"  batch={batch_size}: p50={stats['p50_ms']:.2f} ms "
+            f"p90={stats['p90_ms']:.2f} ms rows/sec={stats['rows_per_sec']:.1f}"
+        )
+    if args.out is not None:
+        save_json(args.out, report)
+        print(f"Wrote benchmark report to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
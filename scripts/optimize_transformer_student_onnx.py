@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""Fuse the student ONNX graph with ORT's transformer optimizer (fp32 + int8).
+
+The student is re-exported with eager attention, which is the pattern the
+BERT fusions recognise. It is then optimized with
+``onnxruntime.transformers.optimizer`` (EmbedLayerNormalization, Attention,
+SkipLayerNormalization, BiasGelu and constant folding at ``--opt-level``) and
+dynamically quantized to int8. The fused graph uses com.microsoft contrib ops
+from the onnxruntime CPU/WASM builds.
+
+Two parity gates apply. The fp32 optimized graph is checked against torch.
+The int8 optimized graph is checked against the plain int8 export that
+quantize_transformer_student.py produces. The report lists node counts, size
+and single-thread CPU latency before and after optimization.
+
+Attention fusion assumes one head count for every layer, so it is skipped
+for students with per-layer pruned heads (prune_student_structure.py). The
+other fusions still run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+import onnx
+import onnxruntime as ort
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from onnxruntime.transformers.fusion_options import FusionOptions
+from onnxruntime.transformers.optimizer import optimize_model
+
+from export_transformer_student_onnx import (
+    enforce_parity,
+    export_student_onnx,
+    onnx_parity,
+)
+from onnx_benchmark import benchmark_onnx, parse_int_csv
+from student_runtime import load_student_from_dir
+from transformer_common import (
+    DATA_DIR,
+    MODELS_DIR,
+    load_prepared_rows,
+    save_json,
+    utc_now_iso,
+)
+
+DEFAULT_STUDENT_DIR = MODELS_DIR / "student"
+DEFAULT_TRAIN = DATA_DIR / "transformer" / "train.prepared.jsonl"
+DEFAULT_VALID = DATA_DIR / "transformer" / "valid.prepared.jsonl"
+DEFAULT_OUT = MODELS_DIR / "student.opt.onnx"
+DEFAULT_OUT_INT8 = MODELS_DIR / "student.opt.int8.onnx"
+DEFAULT_REPORT = MODELS_DIR / "student.opt.report.json"
+
+
+class OrtReference(torch.nn.Module):
+    """An ONNX model behind the torch call signature onnx_parity expects."""
+
+    def __init__(self, model_path: Path) -> None:
+        super().__init__()
+        self.session = ort.InferenceSession(
+            str(model_path), providers=["CPUExecutionProvider"]
+        )
+
+    def forward(
+        self, input_ids: torch.Tensor, attention_mask: torch.Tensor
+    ) -> tuple[torch.Tensor, torch.Tensor]:
+        scam, topic = self.session.run(
+            ["scam_logits", "topic_logits"],
+            {
+                "input_ids": input_ids.numpy(),
+                "attention_mask": attention_mask.numpy(),
+            },
+        )
+        return torch.from_numpy(scam), torch.from_numpy(topic)
+
+
+def fusion_settings(arch: dict) -> tuple[int, int, FusionOptions]:
+    options = FusionOptions("bert")
+    if arch.get("layer_num_heads"):
+        options.enable_attention = False
+        return 0, 0, options
+    return int(arch["num_attention_heads"]), int(arch["hidden_size"]), options
+
+
+def optimize_student_graph(
+    in_path: Path, out_path: Path, *, arch: dict, opt_level: int
+) -> dict[str, int]:
+    num_heads, hidden_size, options = fusion_settings(arch)
+    optimized = optimize_model(
+        str(in_path),
+        model_type="bert",
+        num_heads=num_heads,
+        hidden_size=hidden_size,
+        opt_level=opt_level,
+        optimization_options=options,
+    )
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    optimized.save_model_to_file(str(out_path))
+    return {
+        name: int(count)
+        for name, count in optimized.get_fused_operator_statistics().items()
+        if count
+    }
+
+
+def quantize_int8(in_path: Path, out_path: Path) -> None:
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    quantize_dynamic(
+        model_input=str(in_path),
+        model_output=str(out_path),
+        weight_type=QuantType.QInt8,
+        # Shape inference cannot type the outputs of fused contrib ops.
+        extra_options={"DefaultTensorType": onnx.TensorProto.FLOAT},
+    )
+
+
+def graph_summary(path: Path) -> dict:
+    ops = Counter(node.op_type for node in onnx.load(str(path)).graph.node)
+    return {
+        "nodes": sum(ops.values()),
+        "op_types": dict(sorted(ops.items())),
+        "size_bytes": path.stat().st_size,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--student-dir", type=Path, default=DEFAULT_STUDENT_DIR)
+    parser.add_argument("--train", type=Path, default=DEFAULT_TRAIN)
+    parser.add_argument("--valid", type=Path, default=DEFAULT_VALID)
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT)
+    parser.add_argument("--out-int8", type=Path, default=DEFAULT_OUT_INT8)
+    parser.add_argument("--report", type=Path, default=DEFAULT_REPORT)
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument(
+        "--opt-level",
+        type=int,
+        choices=[0, 1, 2, 99],
+        default=1,
+        help="ORT graph optimization level baked into the file (1 = constant "
+        "folding and basic rewrites; higher levels may be CPU-specific)",
+    )
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--parity-samples", type=int, default=1000)
+    parser.add_argument("--max-mean-delta", type=float, default=0.01)
+    parser.add_argument("--min-label-agreement", type=float, default=0.99)
+    parser.add_argument("--latency-batch-sizes", type=str, default="1,32")
+    parser.add_argument("--latency-threads", type=int, default=1)
+    parser.add_argument("--latency-warmup", type=int, default=10)
+    parser.add_argument("--latency-iters", type=int, default=100)
+    args = parser.parse_args()
+
+    for path in (args.student_dir, args.train, args.valid):
+        if not path.exists():
+            raise SystemExit(f"Missing required input: {path}")
+    try:
+        batch_sizes = parse_int_csv(args.latency_batch_sizes)
+    except ValueError as exc:
+        raise SystemExit(str(exc)) from exc
+
+    model, tokenizer, payload = load_student_from_dir(args.student_dir)
+    arch = payload["architecture"]
+    thresholds = payload.get("thresholds", {"scam": 0.5, "topic_crypto": 0.5})
+    max_length = int(arch["max_length"])
+
+    valid_rows = load_prepared_rows(args.valid)
+    rows = valid_rows + load_prepared_rows(args.train)
+    if len(rows) < args.parity_samples:
+        raise SystemExit(
+            f"Need at least {args.parity_samples} samples for parity, but only found {len(rows)}."
+        )
+    rows = rows[: args.parity_samples]
+    parity_kwargs = {
+        "tokenizer": tokenizer,
+        "max_length": max_length,
+        "batch_size": args.batch_size,
+        "thresholds": thresholds,
+    }
+    gate_kwargs = {
+        "max_mean_delta": args.max_mean_delta,
+        "min_label_agreement": args.min_label_agreement,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = Path(tmp) / "student.onnx"
+        baseline_int8 = Path(tmp) / "student.int8.onnx"
+        eager = Path(tmp) / "student.eager.onnx"
+
+        # Baseline: the plain export + dynamic int8 the pipeline ships today.
+        export_student_onnx(model, baseline, max_length=max_length, opset=args.opset)
+        quantize_dynamic(
+            model_input=str(baseline),
+            model_output=str(baseline_int8),
+            weight_type=QuantType.QInt8,
+        )
+
+        export_student_onnx(
+            model,
+            eager,
+            max_length=max_length,
+            opset=args.opset,
+            attn_implementation="eager",
+        )
+        fused = optimize_student_graph(
+            eager, args.out, arch=arch, opt_level=args.opt_level
+        )
+        print(f"Fused operators: {fused}")
+        if "Attention" not in fused and not arch.get("layer_num_heads"):
+            print("Warning: attention was not fused; check the exported pattern.")
+        quantize_int8(args.out, args.out_int8)
+
+        print("Parity: optimized fp32 vs torch")
+        fp32_parity = onnx_parity(model, args.out, rows, **parity_kwargs)
+        enforce_parity(fp32_parity, **gate_kwargs)
+        print("Parity: optimized int8 vs plain int8")
+        int8_parity = onnx_parity(
+            OrtReference(baseline_int8), args.out_int8, rows, **parity_kwargs
+        )
+        enforce_parity(int8_parity, **gate_kwargs)
+
+        texts = [row.text_normalized for row in valid_rows]
+        variants = {}
+        for name, path in (
+            ("fp32", baseline),
+            ("fp32_optimized", args.out),
+            ("int8", baseline_int8),
+            ("int8_optimized", args.out_int8),
+        ):
+            bench = benchmark_onnx(
+                path,
+                tokenizer=tokenizer,
+                texts=texts,
+                max_length=max_length,
+                batch_sizes=batch_sizes,
+                threads=args.latency_threads,
+                warmup=args.latency_warmup,
+                iters=args.latency_iters,
+            )
+            variants[name] = {**graph_summary(path), "latency": bench["latency"]}
+
+    print(
+        f"{'variant':<16} {'nodes':>6} {'MB':>6} "
+        + " ".join(f"{f'b{size} p50 ms':>11}" for size in batch_sizes)
+    )
+    for name, item in variants.items():
+        print(
+            f"{name:<16} {item['nodes']:>6} {item['size_bytes'] / (1024 * 1024):>6.2f} "
+            + " ".join(
+                f"{item['latency'][str(size)]['p50_ms']:>11.2f}" for size in batch_sizes
+            )
+        )
+
+    save_json(
+        args.report,
+        {
+            "version": 1,
+            "created_at": utc_now_iso(),
+            "student_dir": str(args.student_dir),
+            "opt_level": args.opt_level,
+            "fused_operators": fused,
+            "attention_fused": "Attention" in fused,
+            "outputs": {"fp32": str(args.out), "int8": str(args.out_int8)},
+            "parity": {"fp32_vs_torch": fp32_parity, "int8_vs_plain_int8": int8_parity},
+            "latency_threads": args.latency_threads,
+            "variants": variants,
+        },
+    )
+    print(f"Wrote optimized fp32 model to {args.out}")
+    print(f"Wrote optimized int8 model to {args.out_int8}")
+    print(f"Wrote optimization report to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+"""Structured pruning of student attention heads and FFN neurons.
+
+Every head and every intermediate neuron gets a gate fixed at 1.0. Its
+importance is the Fisher estimate (summed squared gradient of the
+distillation loss w.r.t. the gate) over the cached teacher targets. Units
+with the lowest importance per MAC are removed greedily until the encoder
+fits ``--target-flops-ratio`` of its original MACs per token. With
+``--target-latency-ms`` the budget keeps shrinking until the int8 ONNX export
+meets the batch-1 latency target on CPU.
+
+Pruned layers are physically smaller, so each layer can end up with its own
+head count and FFN width. Both are recorded in student_config.json, where
+load_student_from_dir and the ONNX exporter pick them up. The pruned student
+is then briefly fine-tuned with train_transformer_student_distill.py
+--init-from.
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import shlex
+import shutil
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from torch.utils.data import DataLoader
+from transformers import BertTokenizerFast
+
+from export_transformer_student_onnx import export_student_onnx
+from onnx_benchmark import benchmark_onnx
+from student_runtime import (
+    TinyStudentModel,
+    load_student_from_dir,
+    prune_student_ffn,
+    prune_student_heads,
+    student_structure,
+)
+from train_transformer_student_distill import (
+    DEFAULT_CACHE_TRAIN,
+    DEFAULT_CACHE_VALID,
+    DEFAULT_HOLDOUT,
+    DEFAULT_TRAIN,
+    DEFAULT_VALID,
+    DISTILL_TARGET_KEYS,
+    build_arg_parser,
+    collate,
+    compute_weights,
+    distillation_loss,
+    evaluate_model,
+    load_student_inputs,
+    run_student,
+)
+from transformer_common import (
+    MODELS_DIR,
+    load_json,
+    resolve_device,
+    save_json,
+    set_seed,
+    utc_now_iso,
+)
+
+DEFAULT_STUDENT_DIR = MODELS_DIR / "student"
+DEFAULT_OUT_DIR = MODELS_DIR / "student_pruned_structure"
+
+
+@dataclass(frozen=True)
+class PruneUnit:
+    layer: int
+    kind: str  # "head" or "ffn"
+    index: int
+    importance: float
+    cost: int
+
+
+def layer_shapes(model: TinyStudentModel) -> list[tuple[int, int]]:
+    """(num_heads, ffn_width) per encoder layer."""
+
+    return [
+        (
+            int(block.attention.self.num_attention_heads),
+            int(block.intermediate.dense.out_features),
+        )
+        for block in model.bert.encoder.layer
+    ]
+
+
+def unit_costs(model: TinyStudentModel, seq_len: int) -> tuple[int, int]:
+    """MACs per token of one attention head and of one FFN neuron."""
+
+    hidden = int(model.bert.config.hidden_size)
+    head_size = int(model.bert.encoder.layer[0].attention.self.attention_head_size)
+    # q/k/v/output projections plus the score and context matmuls.
+    head_cost = 4 * hidden * head_size + 2 * seq_len * head_size
+    return head_cost, 2 * hidden
+
+
+def encoder_macs(shapes: list[tuple[int, int]], costs: tuple[int, int]) -> int:
+    head_cost, neuron_cost = costs
+    return sum(heads * head_cost + width * neuron_cost for heads, width in shapes)
+
+
+def score_units(
+    model: TinyStudentModel,
+    loader: DataLoader,
+    *,
+    device: torch.device,
+    loss_kwargs: dict,
+    max_batches: int,
+) -> tuple[list[np.ndarray], list[np.ndarray]]:
+    """Fisher importance per head and per FFN neuron, layer by layer."""
+
+    blocks = model.bert.encoder.layer
+    head_gates = [
+        torch.ones(
+            block.attention.self.num_attention_heads, device=device, requires_grad=True
+        )
+        for block in blocks
+    ]
+    ffn_gates = [
+        torch.ones(
+            block.intermediate.dense.out_features, device=device, requires_grad=True
+        )
+        for block in blocks
+    ]
+    handles = []
+    for block, head_gate, ffn_gate in zip(blocks, head_gates, ffn_gates):
+        head_size = block.attention.self.attention_head_size
+        handles.append(
+            block.attention.output.dense.register_forward_pre_hook(
+                _gate_hook(head_gate, repeat=head_size)
+            )
+        )
+        handles.append(
+            block.output.dense.register_forward_pre_hook(_gate_hook(ffn_gate))
+        )
+
+    gates = head_gates + ffn_gates
+    fisher = [torch.zeros_like(gate) for gate in gates]
+    model.eval()
+    try:
+        for step, batch in enumerate(loader):
+            if step >= max_batches:
+                break
+            out = model(
+                input_ids=batch["input_ids"].to(device),
+                attention_mask=batch["attention_mask"].to(device),
+                output_hidden_states=True,
+            )
+            targets = {key: batch[key].to(device) for key in DISTILL_TARGET_KEYS}
+            loss = distillation_loss(
+                out,
+                targets,
+                teacher_projections=model.teacher_projections,
+                **loss_kwargs,
+            )
+            for acc, grad in zip(fisher, torch.autograd.grad(loss, gates)):
+                acc += grad.detach() ** 2
+    finally:
+        for handle in handles:
+            handle.remove()
+
+    values = [acc.cpu().numpy() for acc in fisher]
+    return values[: len(blocks)], values[len(blocks) :]
+
+
+def _gate_hook(gate: torch.Tensor, *, repeat: int = 1):
+    def hook(_module, inputs):
+        scale = gate.repeat_interleave(repeat) if repeat > 1 else gate
+        return (inputs[0] * scale.to(inputs[0].dtype),)
+
+    return hook
+
+
+def plan_pruning(
+    units: list[PruneUnit],
+    shapes: list[tuple[int, int]],
+    *,
+    costs: tuple[int, int],
+    budget_macs: int,
+    min_heads: int,
+    min_ffn: int,
+) -> dict[int, dict[str, list[int]]]:
+    """Greedy lowest-importance-per-MAC removal down to ``budget_macs``.
+
+    Returns the indices to keep, per layer, for heads and FFN neurons.
+    """
+
+    heads = [h for h, _ in shapes]
+    widths = [w for _, w in shapes]
+    removed: set[tuple[int, str, int]] = set()
+    total = encoder_macs(shapes, costs)
+    for unit in sorted(units, key=lambda u: (u.importance / u.cost, u.layer, u.index)):
+        if total <= budget_macs:
+            break
+        if unit.kind == "head":
+            if heads[unit.layer] <= min_heads:
+                continue
+            heads[unit.layer] -= 1
+        else:
+            if widths[unit.layer] <= min_ffn:
+                continue
+            widths[unit.layer] -= 1
+        removed.add((unit.layer, unit.kind, unit.index))
+        total -= unit.cost
+    if total > budget_macs:
+        raise SystemExit(
+            f"Cannot reach {budget_macs} MACs/token with --min-heads {min_heads} "
+            f"and --min-ffn {min_ffn} (best: {total})"
+        )
+    return {
+        layer: {
+            "heads": [i for i in range(num_heads) if (layer, "head", i) not in removed],
+            "ffn": [i for i in range(width) if (layer, "ffn", i) not in removed],
+        }
+        for layer, (num_heads, width) in enumerate(shapes)
+    }
+
+
+def apply_plan(model: TinyStudentModel, plan: dict[int, dict[str, list[int]]]) -> None:
+    for layer, keep in plan.items():
+        block = model.bert.encoder.layer[layer]
+        if len(keep["heads"]) < block.attention.self.num_attention_heads:
+            prune_student_heads(model, layer, keep["heads"])
+        if len(keep["ffn"]) < block.intermediate.dense.out_features:
+            prune_student_ffn(model, layer, keep["ffn"])
+
+
+def int8_latency_ms(
+    model: TinyStudentModel,
+    *,
+    tokenizer: BertTokenizerFast,
+    texts: list[str],
+    max_length: int,
+    opset: int,
+    iters: int,
+) -> float:
+    """Batch-1 p50 latency of the int8 ONNX export on one CPU thread."""
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fp32_path = Path(tmp) / "student.onnx"
+        int8_path = Path(tmp) / "student.int8.onnx"
+        export_student_onnx(model, fp32_path, max_length=max_length, opset=opset)
+        quantize_dynamic(
+            model_input=str(fp32_path),
+            model_output=str(int8_path),
+            weight_type=QuantType.QInt8,
+        )
+        report = benchmark_onnx(
+            int8_path,
+            tokenizer=tokenizer,
+            texts=texts,
+            max_length=max_length,
+            batch_sizes=[1],
+            threads=1,
+            iters=iters,
+        )
+    return float(report["latency"]["1"]["p50_ms"])
+
+
+def save_student(
+    model: TinyStudentModel, *, source_dir: Path, out_dir: Path, payload: dict
+) -> None:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    torch.save(model.state_dict(), out_dir / "pytorch_model.bin")
+    shutil.copytree(source_dir / "tokenizer", out_dir / "tokenizer", dirs_exist_ok=True)
+    save_json(out_dir / "student_config.json", payload)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--student-dir", type=Path, default=DEFAULT_STUDENT_DIR)
+    parser.add_argument("--out-dir", type=Path, default=DEFAULT_OUT_DIR)
+    parser.add_argument("--train", type=Path, default=DEFAULT_TRAIN)
+    parser.add_argument("--valid", type=Path, default=DEFAULT_VALID)
+    parser.add_argument("--holdout", type=Path, default=DEFAULT_HOLDOUT)
+    parser.add_argument("--cache-train", type=Path, default=DEFAULT_CACHE_TRAIN)
+    parser.add_argument("--cache-valid", type=Path, default=DEFAULT_CACHE_VALID)
+    parser.add_argument(
+        "--target-flops-ratio",
+        type=float,
+        default=None,
+        help="Keep this fraction of encoder MACs/token (default 0.5 without "
+        "--target-latency-ms, else the starting point of the latency search)",
+    )
+    parser.add_argument(
+        "--target-latency-ms",
+        type=float,
+        default=None,
+        help="Batch-1 p50 budget for the int8 ONNX on one CPU thread",
+    )
+    parser.add_argument("--latency-step", type=float, default=0.05)
+    parser.add_argument("--latency-iters", type=int, default=50)
+    parser.add_argument("--min-heads", type=int, default=1)
+    parser.add_argument("--min-ffn", type=int, default=32)
+    parser.add_argument(
+        "--importance-batches",
+        type=int,
+        default=200,
+        help="Training batches used to estimate importance",
+    )
+    parser.add_argument("--finetune-epochs", type=int, default=2)
+    parser.add_argument(
+        "--student-args",
+        type=str,
+        default="",
+        help="Extra train_transformer_student_distill.py flags for scoring and "
+        "fine-tuning, e.g. '--device cpu --lr 1e-4'",
+    )
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+
+    if args.target_flops_ratio is None:
+        args.target_flops_ratio = 1.0 if args.target_latency_ms else 0.5
+    if not 0.0 < args.target_flops_ratio <= 1.0:
+        raise SystemExit("--target-flops-ratio must be in (0, 1]")
+    if args.min_heads < 1 or args.min_ffn < 1:
+        raise SystemExit("--min-heads and --min-ffn must be >= 1")
+    if args.finetune_epochs < 0:
+        raise SystemExit("--finetune-epochs must be >= 0")
+    if args.out_dir.resolve() == args.student_dir.resolve():
+        raise SystemExit("--out-dir must differ from --student-dir")
+
+    model, tokenizer, payload = load_student_from_dir(args.student_dir)
+    arch = payload["architecture"]
+    max_length = int(arch["max_length"])
+
+    student_argv = [
+        "--train",
+        str(args.train),
+        "--valid",
+        str(args.valid),
+        "--holdout",
+        str(args.holdout),
+        "--cache-train",
+        str(args.cache_train),
+        "--cache-valid",
+        str(args.cache_valid),
+        *shlex.split(args.student_args),
+    ]
+    base_args = build_arg_parser().parse_args(student_argv)
+    if base_args.nproc != 1:
+        raise SystemExit(
+            "Pruning fine-tunes in-process; drop --nproc from --student-args"
+        )
+    set_seed(base_args.seed)
+    inputs = load_student_inputs(base_args)
+    datasets = inputs.datasets_for(
+        tokenizer, args.student_dir / "tokenizer", max_length
+    )
+    device = resolve_device(
+        base_args.device,
+        context="prune_student_structure.py",
+        threads=base_args.threads,
+    )
+    model.to(device)
+
+    train_loader = DataLoader(
+        datasets.train,
+        batch_size=base_args.batch_size,
+        shuffle=True,
+        collate_fn=collate,
+        generator=torch.Generator().manual_seed(base_args.seed),
+    )
+    valid_loader = DataLoader(
+        datasets.valid,
+        batch_size=base_args.eval_batch_size,
+        shuffle=False,
+        collate_fn=collate,
+    )
+    eval_kwargs = {
+        "loader": valid_loader,
+        "device": device,
+        "scam_threshold": float(payload["thresholds"]["scam"]),
+        "topic_threshold": float(payload["thresholds"]["topic_crypto"]),
+        "dtype": "fp32",
+    }
+    ce_weight, topic_pos_weight = compute_weights(datasets.train.rows, device)
+    head_scores, ffn_scores = score_units(
+        model,
+        train_loader,
+        device=device,
+        loss_kwargs={
+            "ce_weight": ce_weight,
+            "topic_pos_weight": topic_pos_weight,
+            "args": base_args,
+        },
+        max_batches=args.importance_batches,
+    )
+
+    shapes = layer_shapes(model)
+    costs = unit_costs(model, max_length)
+    total_macs = encoder_macs(shapes, costs)
+    units = [
+        PruneUnit(layer, "head", idx, float(score), costs[0])
+        for layer, scores in enumerate(head_scores)
+        for idx, score in enumerate(scores)
+    ] + [
+        PruneUnit(layer, "ffn", idx, float(score), costs[1])
+        for layer, scores in enumerate(ffn_scores)
+        for idx, score in enumerate(scores)
+    ]
+    valid_before = evaluate_model(model=model, **eval_kwargs)
+
+    texts = [row.text_normalized for row in inputs.valid_rows]
+    ratio = args.target_flops_ratio
+    latency_ms = None
+    while True:
+        plan = plan_pruning(
+            units,
+            shapes,
+            costs=costs,
+            budget_macs=int(total_macs * ratio),
+            min_heads=args.min_heads,
+            min_ffn=args.min_ffn,
+        )
+        candidate = copy.deepcopy(model).cpu()
+        apply_plan(candidate, plan)
+        if args.target_latency_ms is None:
+            break
+        latency_ms = int8_latency_ms(
+            candidate,
+            tokenizer=tokenizer,
+            texts=texts,
+            max_length=max_length,
+            opset=args.opset,
+            iters=args.latency_iters,
+        )
+        print(f"flops_ratio={ratio:.2f} int8_b1_p50={latency_ms:.2f}ms")
+        if latency_ms <= args.target_latency_ms:
+            break
+        ratio = round(ratio - args.latency_step, 6)
+        if ratio <= 0.0:
+            raise SystemExit(
+                f"Could not reach {args.target_latency_ms} ms batch-1 latency"
+            )
+
+    model = candidate.to(device)
+    pruned_shapes = layer_shapes(model)
+    pruned_macs = encoder_macs(pruned_shapes, costs)
+    valid_after_prune = evaluate_model(model=model, **eval_kwargs)
+    print(
+        f"Pruned encoder MACs/token {total_macs} -> {pruned_macs} "
+        f"({pruned_macs / total_macs:.1%}); heads={[h for h, _ in pruned_shapes]} "
+        f"ffn={[w for _, w in pruned_shapes]}"
+    )
+    print(
+        f"valid_macro_f1 before={valid_before['macro']['f1']:.4f} "
+        f"after_prune={valid_after_prune['macro']['f1']:.4f}"
+    )
+
+    pruning = {
+        "source_student_dir": str(args.student_dir),
+        "method": "fisher_gate_importance_per_mac",
+        "importance_batches": args.importance_batches,
+        "target_flops_ratio": args.target_flops_ratio,
+        "final_flops_ratio": pruned_macs / total_macs,
+        "target_latency_ms": args.target_latency_ms,
+        "int8_b1_p50_ms": latency_ms,
+        "encoder_macs_per_token_before": total_macs,
+        "encoder_macs_per_token_after": pruned_macs,
+        "kept_heads": {str(layer): keep["heads"] for layer, keep in plan.items()},
+        "head_importance": [scores.tolist() for scores in head_scores],
+        "valid_macro_f1_before": float(valid_before["macro"]["f1"]),
+        "valid_macro_f1_after_prune": float(valid_after_prune["macro"]["f1"]),
+        "finetune_epochs": args.finetune_epochs,
+        "created_at": utc_now_iso(),
+    }
+    pruned_arch = {
+        key: value for key, value in arch.items() if not key.startswith("layer_")
+    }
+    pruned_payload = {
+        **payload,
+        "architecture": {**pruned_arch, **student_structure(model)},
+        "pruning": pruning,
+    }
+
+    if args.finetune_epochs == 0:
+        save_student(
+            model.cpu(),
+            source_dir=args.student_dir,
+            out_dir=args.out_dir,
+            payload=pruned_payload,
+        )
+        print(f"Saved pruned student to {args.out_dir}")
+        return
+
+    init_dir = args.out_dir / "pruned_init"
+    save_student(
+        model.cpu(),
+        source_dir=args.student_dir,
+        out_dir=init_dir,
+        payload=pruned_payload,
+    )
+    finetune_args = build_arg_parser().parse_args(
+        [
+            *student_argv,
+            "--init-from",
+            str(init_dir),
+            "--epochs",
+            str(args.finetune_epochs),
+            "--output-dir",
+            str(args.out_dir),
+        ]
+    )
+    run_student(finetune_args, inputs=inputs)
+
+    config_path = args.out_dir / "student_config.json"
+    final_payload = load_json(config_path)
+    student_eval = load_json(args.out_dir / "student_eval.json")
+    pruning["valid_macro_f1_after_finetune"] = float(
+        student_eval["valid"]["macro"]["f1"]
+    )
+    final_payload["pruning"] = pruning
+    save_json(config_path, final_payload)
+    print(
+        f"valid_macro_f1 after_finetune={pruning['valid_macro_f1_after_finetune']:.4f}"
+    )
+    print(f"Saved pruned + fine-tuned student to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""Prune unused WordPiece entries from a trained student (no retraining).
+
+Token usage is counted over the prepared corpus with the student tokenizer.
+Entries used fewer than ``--min-count`` times are dropped, and the rows of the
+word-embedding matrix are sliced to match. Special tokens and single-character
+pieces (``a``, ``##a``) are kept unless ``--prune-unused-chars`` is set, so a
+dropped word falls back to shorter subwords instead of becoming ``[UNK]``.
+
+WordPiece is greedy longest-match, so a piece that is never emitted on the
+corpus never wins a match there. With the default ``--min-count 1`` the
+corpus therefore tokenizes exactly as before, just with new ids. The pruned
+student is exported to ONNX and must pass the same torch/ORT parity check as
+export_transformer_student_onnx.py.
+"""
+
+from __future__ import annotations
+
+import argparse
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+from transformers import BertTokenizerFast
+
+from export_transformer_student_onnx import (
+    EvalDataset,
+    collate,
+    enforce_parity,
+    export_student_onnx,
+    onnx_parity,
+)
+from student_runtime import TinyStudentModel, load_student_from_dir
+from transformer_common import (
+    DATA_DIR,
+    MODELS_DIR,
+    assert_tokenizer_sanity,
+    decision_from_probs,
+    load_prepared_rows,
+    save_json,
+    sigmoid,
+    softmax,
+    utc_now_iso,
+)
+
+DEFAULT_STUDENT_DIR = MODELS_DIR / "student"
+DEFAULT_OUT_DIR = MODELS_DIR / "student_pruned"
+DEFAULT_CORPUS = [
+    DATA_DIR / "transformer" / "train.prepared.jsonl",
+    DATA_DIR / "transformer" / "valid.prepared.jsonl",
+    DATA_DIR / "transformer" / "holdout.prepared.jsonl",
+]
+EMBEDDING_KEY = "bert.embeddings.word_embeddings.weight"
+
+
+def count_token_usage(tokenizer: BertTokenizerFast, texts: list[str]) -> Counter:
+    """Occurrences of each token id over ``texts`` (untruncated, no specials)."""
+
+    counts: Counter = Counter()
+    batch_size = 1024
+    for start in range(0, len(texts), batch_size):
+        encoded = tokenizer(
+            texts[start : start + batch_size],
+            add_special_tokens=False,
+            truncation=False,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+        )
+        for ids in encoded["input_ids"]:
+            counts.update(ids)
+    return counts
+
+
+def is_fallback_piece(token: str) -> bool:
+    return len(token) == 1 or (token.startswith("##") and len(token) == 3)
+
+
+def select_kept_ids(
+    tokenizer: BertTokenizerFast,
+    counts: Counter,
+    *,
+    min_count: int,
+    keep_chars: bool = True,
+) -> list[int]:
+    """Old ids to keep, in their original order."""
+
+    special_ids = set(tokenizer.all_special_ids)
+    id_to_token = {idx: token for token, idx in tokenizer.get_vocab().items()}
+    return [
+        idx
+        for idx in sorted(id_to_token)
+        if idx in special_ids
+        or (keep_chars and is_fallback_piece(id_to_token[idx]))
+        or counts.get(idx, 0) >= min_count
+    ]
+
+
+def write_pruned_tokenizer(
+    tokenizer: BertTokenizerFast, kept_ids: list[int], tokenizer_dir: Path
+) -> BertTokenizerFast:
+    id_to_token = {idx: token for token, idx in tokenizer.get_vocab().items()}
+    tokenizer_dir.mkdir(parents=True, exist_ok=True)
+    vocab_path = tokenizer_dir / "vocab.txt"
+    vocab_path.write_text(
+        "".join(f"{id_to_token[idx]}\n" for idx in kept_ids), encoding="utf-8"
+    )
+    # Same construction as train_transformer_student_distill.py.
+    pruned = BertTokenizerFast(
+        vocab=str(vocab_path),
+        do_lower_case=True,
+        unk_token="[UNK]",
+        sep_token="[SEP]",
+        pad_token="[PAD]",
+        cls_token="[CLS]",
+        mask_token="[MASK]",
+    )
+    pruned.save_pretrained(str(tokenizer_dir))
+    return BertTokenizerFast.from_pretrained(str(tokenizer_dir))
+
+
+def retokenization_changes(
+    old: BertTokenizerFast,
+    new: BertTokenizerFast,
+    texts: list[str],
+    old_to_new: dict[int, int],
+) -> int:
+    """Number of texts whose pruned tokenization differs from the remapped original."""
+
+    changed = 0
+    batch_size = 1024
+    kwargs = {
+        "add_special_tokens": False,
+        "truncation": False,
+        "return_attention_mask": False,
+        "return_token_type_ids": False,
+    }
+    for start in range(0, len(texts), batch_size):
+        chunk = texts[start : start + batch_size]
+        old_ids = old(chunk, **kwargs)["input_ids"]
+        new_ids = new(chunk, **kwargs)["input_ids"]
+        for before, after in zip(old_ids, new_ids):
+            if [old_to_new.get(idx, -1) for idx in before] != after:
+                changed += 1
+    return changed
+
+
+def predict_probs(
+    model: TinyStudentModel, loader: DataLoader
+) -> tuple[np.ndarray, np.ndarray]:
+    scam_probs: list[np.ndarray] = []
+    topic_probs: list[np.ndarray] = []
+    with torch.no_grad():
+        for batch in loader:
+            scam_logits, topic_logits = model(
+                input_ids=batch["input_ids"], attention_mask=batch["attention_mask"]
+            )
+            scam_probs.append(softmax(scam_logits.numpy())[:, 1])
+            topic_probs.append(sigmoid(topic_logits.numpy().reshape(-1)))
+    return np.concatenate(scam_probs), np.concatenate(topic_probs)
+
+
+def compare_to_original(
+    original: tuple[TinyStudentModel, BertTokenizerFast],
+    pruned: tuple[TinyStudentModel, BertTokenizerFast],
+    rows,
+    *,
+    max_length: int,
+    batch_size: int,
+    thresholds: dict,
+) -> dict:
+    """Torch-vs-torch probability delta and label agreement, original vs pruned."""
+
+    probs = []
+    for model, tokenizer in (original, pruned):
+        dataset = EvalDataset(rows, tokenizer=tokenizer, max_length=max_length)
+        loader = DataLoader(
+            dataset, batch_size=batch_size, shuffle=False, collate_fn=collate
+        )
+        probs.append(predict_probs(model, loader))
+    (orig_scam, orig_topic), (new_scam, new_topic) = probs
+
+    delta = (np.abs(orig_scam - new_scam) + np.abs(orig_topic - new_topic)) / 2.0
+    scam_thr = float(thresholds.get("scam", 0.5))
+    topic_thr = float(thresholds.get("topic_crypto", 0.5))
+    matches = sum(
+        decision_from_probs(
+            float(a), float(b), scam_threshold=scam_thr, topic_threshold=topic_thr
+        )
+        == decision_from_probs(
+            float(c), float(d), scam_threshold=scam_thr, topic_threshold=topic_thr
+        )
+        for a, b, c, d in zip(orig_scam, orig_topic, new_scam, new_topic)
+    )
+    return {
+        "mean_abs_prob_delta": float(delta.mean()) if len(delta) else 0.0,
+        "max_abs_prob_delta": float(delta.max()) if len(delta) else 0.0,
+        "label_agreement": float(matches / len(delta)) if len(delta) else 1.0,
+        "total": len(delta),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--student-dir", type=Path, default=DEFAULT_STUDENT_DIR)
+    parser.add_argument("--out-dir", type=Path, default=DEFAULT_OUT_DIR)
+    parser.add_argument(
+        "--corpus",
+        type=Path,
+        nargs="+",
+        default=DEFAULT_CORPUS,
+        help="Prepared JSONL files to count token usage over",
+    )
+    parser.add_argument(
+        "--min-count",
+        type=int,
+        default=1,
+        help="Keep pieces emitted at least this often (1 = drop only unused pieces)",
+    )
+    parser.add_argument(
+        "--prune-unused-chars",
+        action="store_true",
+        help="Also drop never-seen single-character pieces (they become [UNK])",
+    )
+    parser.add_argument(
+        "--onnx-out",
+        type=Path,
+        default=None,
+        help="Pruned ONNX path (default: <out-dir>/student.onnx)",
+    )
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--parity-samples", type=int, default=1000)
+    parser.add_argument("--max-unk-ratio", type=float, default=0.05)
+    parser.add_argument("--tokenizer-sanity-sample-size", type=int, default=512)
+    parser.add_argument("--max-mean-delta", type=float, default=0.01)
+    parser.add_argument("--min-label-agreement", type=float, default=0.99)
+    args = parser.parse_args()
+
+    for path in (args.student_dir, *args.corpus):
+        if not path.exists():
+            raise SystemExit(f"Missing required input: {path}")
+    if args.min_count < 1:
+        raise SystemExit("--min-count must be >= 1")
+    if args.out_dir.resolve() == args.student_dir.resolve():
+        raise SystemExit("--out-dir must differ from --student-dir")
+    onnx_out = args.onnx_out or args.out_dir / "student.onnx"
+
+    model, tokenizer, payload = load_student_from_dir(args.student_dir)
+    arch = payload["architecture"]
+    thresholds = payload.get("thresholds", {"scam": 0.5, "topic_crypto": 0.5})
+    max_length = int(arch["max_length"])
+
+    rows = [row for path in args.corpus for row in load_prepared_rows(path)]
+    texts = [row.text_normalized for row in rows]
+    counts = count_token_usage(tokenizer, texts)
+    kept_ids = select_kept_ids(
+        tokenizer,
+        counts,
+        min_count=args.min_count,
+        keep_chars=not args.prune_unused_chars,
+    )
+    old_vocab_size = int(arch["vocab_size"])
+    new_vocab_size = len(kept_ids)
+    print(
+        f"Token usage over {len(rows)} rows: {len(counts)}/{old_vocab_size} pieces "
+        f"used; keeping {new_vocab_size} (min_count={args.min_count})"
+    )
+    if new_vocab_size == old_vocab_size:
+        raise SystemExit("Nothing to prune: every vocab entry is kept")
+
+    pruned_tokenizer = write_pruned_tokenizer(
+        tokenizer, kept_ids, args.out_dir / "tokenizer"
+    )
+    old_to_new = {old: new for new, old in enumerate(kept_ids)}
+    changed_rows = retokenization_changes(
+        tokenizer, pruned_tokenizer, texts, old_to_new
+    )
+    print(f"Rows whose tokenization changed: {changed_rows}/{len(rows)}")
+
+    state = model.state_dict()
+    embedding = state[EMBEDDING_KEY]
+    state[EMBEDDING_KEY] = embedding[torch.tensor(kept_ids, dtype=torch.long)].clone()
+    torch.save(state, args.out_dir / "pytorch_model.bin")
+
+    pruned_params = int(embedding.shape[1]) * (old_vocab_size - new_vocab_size)
+    payload["architecture"] = {**arch, "vocab_size": new_vocab_size}
+    payload["vocab_pruning"] = {
+        "source_student_dir": str(args.student_dir),
+        "corpus": [str(path) for path in args.corpus],
+        "corpus_rows": len(rows),
+        "min_count": args.min_count,
+        "prune_unused_chars": bool(args.prune_unused_chars),
+        "vocab_size_before": old_vocab_size,
+        "vocab_size_after": new_vocab_size,
+        "embedding_params_removed": pruned_params,
+        "rows_retokenized_differently": changed_rows,
+        "created_at": utc_now_iso(),
+    }
+    save_json(args.out_dir / "student_config.json", payload)
+
+    pruned_model, pruned_tokenizer, _ = load_student_from_dir(args.out_dir)
+    stats = assert_tokenizer_sanity(
+        tokenizer=pruned_tokenizer,
+        expected_vocab_size=new_vocab_size,
+        context="prune_student_vocab.py pruned tokenizer",
+        sample_texts=texts,
+        max_length=max_length,
+        max_unk_ratio=args.max_unk_ratio,
+        sample_size=args.tokenizer_sanity_sample_size,
+    )
+    print(
+        "Tokenizer sanity (pruned): "
+        f"backend_vocab={stats['backend_vocab_size']} "
+        f"len={stats['loaded_vocab_size']} "
+        f"unk_ratio={float(stats.get('sample_unk_ratio', 0.0)):.4f} "
+        f"sample_count={int(stats.get('sample_count', 0))}"
+    )
+
+    if len(rows) < args.parity_samples:
+        raise SystemExit(
+            f"Need at least {args.parity_samples} samples for parity, but only found {len(rows)}."
+        )
+    parity_rows = rows[: args.parity_samples]
+    vs_original = compare_to_original(
+        (model, tokenizer),
+        (pruned_model, pruned_tokenizer),
+        parity_rows,
+        max_length=max_length,
+        batch_size=args.batch_size,
+        thresholds=thresholds,
+    )
+    print(
+        "Pruned vs original (torch): "
+        f"mean_delta={vs_original['mean_abs_prob_delta']:.6f} "
+        f"max_delta={vs_original['max_abs_prob_delta']:.6f} "
+        f"label_agreement={vs_original['label_agreement']:.4%}"
+    )
+
+    export_student_onnx(pruned_model, onnx_out, max_length=max_length, opset=args.opset)
+    print(f"Exported pruned ONNX model to {onnx_out}")
+    parity = onnx_parity(
+        pruned_model,
+        onnx_out,
+        parity_rows,
+        tokenizer=pruned_tokenizer,
+        max_length=max_length,
+        batch_size=args.batch_size,
+        thresholds=thresholds,
+    )
+    payload["vocab_pruning"]["vs_original"] = vs_original
+    payload["vocab_pruning"]["onnx_parity"] = parity
+    save_json(args.out_dir / "student_config.json", payload)
+    for label, stats in (("pruned vs original", vs_original), ("ONNX", parity)):
+        try:
+            enforce_parity(
+                stats,
+                max_mean_delta=args.max_mean_delta,
+                min_label_agreement=args.min_label_agreement,
+            )
+        except SystemExit as exc:
+            raise SystemExit(f"{label}: {exc}") from exc
+    print(
+        f"Pruned student written to {args.out_dir} "
+        f"({old_vocab_size} -> {new_vocab_size} pieces, "
+        f"{pruned_params} embedding params removed)"
+    )
+
+
+if __name__ == "__main__":
+    main()
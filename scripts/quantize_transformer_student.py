@@ -1,5 +1,11 @@
 #!/usr/bin/env python3
-"""Quantize exported student ONNX model for browser deployment."""
+"""Quantize exported student ONNX model for browser deployment.
+
+``--mode qat`` is for students trained with ``--qat-epochs``: their weights
+already sit on the int8 grid used in training, so dynamic quantization keeps
+the trained scales. The int8 model is then checked against the student's
+fake-quant forward pass in torch.
+"""
 
 from __future__ import annotations
 
@@ -16,6 +22,9 @@ from onnxruntime.quantization import (
 )
 from transformers import BertTokenizerFast
 
+from export_transformer_student_onnx import enforce_parity, onnx_parity
+from student_qat import QAT_SCHEME, enable_student_qat
+from student_runtime import load_student_from_dir
 from transformer_common import DATA_DIR, MODELS_DIR, load_prepared_rows
 
 DEFAULT_IN = MODELS_DIR / "student.onnx"
@@ -54,16 +63,62 @@ class StudentCalibrationReader(CalibrationDataReader):
         return next(self._iter, None)
 
 
+def quantize_qat_student(args: argparse.Namespace) -> None:
+    model, tokenizer, payload = load_student_from_dir(args.student_dir)
+    qat = payload.get("qat") or {}
+    if qat.get("scheme") != QAT_SCHEME:
+        raise SystemExit(
+            f"{args.student_dir} was not trained with QAT scheme {QAT_SCHEME} "
+            "(use train_transformer_student_distill.py --qat-epochs N)"
+        )
+    if not args.valid.exists():
+        raise SystemExit(f"Prepared valid split not found: {args.valid}")
+
+    # The settings student_qat.py simulates during training.
+    quantize_dynamic(
+        model_input=str(args.input),
+        model_output=str(args.output),
+        weight_type=QuantType.QInt8,
+        per_channel=False,
+        reduce_range=False,
+        extra_options={"WeightSymmetric": True, "ActivationSymmetric": False},
+    )
+
+    enable_student_qat(model)
+    rows = load_prepared_rows(args.valid)[: args.parity_samples]
+    print(f"QAT parity (torch fake-quant vs ORT int8) on {len(rows)} valid rows")
+    parity = onnx_parity(
+        model,
+        args.output,
+        rows,
+        tokenizer=tokenizer,
+        max_length=int(payload["architecture"]["max_length"]),
+        batch_size=args.parity_batch_size,
+        thresholds=payload.get("thresholds", {"scam": 0.5, "topic_crypto": 0.5}),
+    )
+    enforce_parity(
+        parity,
+        max_mean_delta=args.max_mean_delta,
+        min_label_agreement=args.min_label_agreement,
+    )
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("--input", type=Path, default=DEFAULT_IN)
     parser.add_argument("--output", type=Path, default=DEFAULT_OUT)
-    parser.add_argument("--mode", choices=["dynamic", "static"], default="dynamic")
+    parser.add_argument(
+        "--mode", choices=["dynamic", "static", "qat"], default="dynamic"
+    )
     parser.add_argument("--student-dir", type=Path, default=DEFAULT_STUDENT_DIR)
     parser.add_argument("--valid", type=Path, default=DEFAULT_VALID)
     parser.add_argument("--max-length", type=int, default=96)
     parser.add_argument("--calib-batch-size", type=int, default=32)
     parser.add_argument("--calib-max-samples", type=int, default=512)
+    parser.add_argument("--parity-samples", type=int, default=1000)
+    parser.add_argument("--parity-batch-size", type=int, default=64)
+    parser.add_argument("--max-mean-delta", type=float, default=0.01)
+    parser.add_argument("--min-label-agreement", type=float, default=0.99)
     args = parser.parse_args()
 
     if not args.input.exists():
@@ -71,7 +126,9 @@ def main() -> None:
 
     args.output.parent.mkdir(parents=True, exist_ok=True)
 
-    if args.mode == "dynamic":
+    if args.mode == "qat":
+        quantize_qat_student(args)
+    elif args.mode == "dynamic":
         quantize_dynamic(
             model_input=str(args.input),
             model_output=str(args.output),
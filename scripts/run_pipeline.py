@@ -0,0 +1,613 @@
+#!/usr/bin/env python3
+"""
+Run the Janitr training workflow as a content-addressed stage DAG.
+
+Each stage declares the script it runs, its inputs and its outputs. A stage is
+skipped when its fingerprint (script code + local imports + args + input
+content hashes) matches the last successful run and all outputs still exist.
+Independent stages (e.g. fastText training and teacher training) run
+concurrently.
+
+Usage:
+    # Build everything that is out of date
+    python scripts/run_pipeline.py
+
+    # Show what would run without running anything
+    python scripts/run_pipeline.py --dry-run
+
+    # Re-tune transformer thresholds only (seconds, no retrain)
+    python scripts/run_pipeline.py --targets evaluate_transformer \
+        --stage-arg "evaluate_transformer=--target-scam-fpr 0.015"
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import hashlib
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from transformer_common import (
+    REPO_ROOT,
+    hash_prepared_rows,
+    load_json,
+    load_prepared_rows,
+    save_json,
+    stable_object_hash,
+    utc_now_iso,
+)
+
+SCRIPTS_DIR = REPO_ROOT / "scripts"
+DEFAULT_STATE_DIR = REPO_ROOT / "models" / ".pipeline"
+STATE_VERSION = 1
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    script: str
+    args: tuple[str, ...] = ()
+    inputs: tuple[str, ...] = ()
+    outputs: tuple[str, ...] = ()
+    deps: tuple[str, ...] = ()
+
+
+def build_default_stages() -> list[Stage]:
+    """Default Janitr workflow. Paths are relative to the repo root."""
+
+    prepared = (
+        "data/transformer/train.prepared.jsonl",
+        "data/transformer/valid.prepared.jsonl",
+        "data/transformer/holdout.prepared.jsonl",
+    )
+    return [
+        Stage(
+            name="splits",
+            script="make_stratified_splits.py",
+            inputs=("data/sample.jsonl",),
+            outputs=(
+                "data/train.jsonl",
+                "data/valid.jsonl",
+                "data/calib.jsonl",
+                "data/holdout.jsonl",
+                "data/train.txt",
+                "data/valid.txt",
+                "data/calib.txt",
+                "data/holdout.txt",
+                "data/stratified_split_meta.json",
+            ),
+        ),
+        Stage(
+            name="fasttext_train",
+            script="train_fasttext.py",
+            args=("--run-name", "pipeline"),
+            inputs=("data/train.txt",),
+            outputs=("models/scam_detector.bin",),
+            deps=("splits",),
+        ),
+        Stage(
+            name="fasttext_thresholds",
+            script="tune_thresholds_fpr.py",
+            inputs=("models/scam_detector.bin", "data/calib.txt"),
+            outputs=("config/thresholds.json",),
+            deps=("fasttext_train",),
+        ),
+        Stage(
+            name="fasttext_eval",
+            script="evaluate.py",
+            inputs=(
+                "models/scam_detector.bin",
+                "data/valid.txt",
+                "config/thresholds.json",
+            ),
+            deps=("fasttext_thresholds",),
+        ),
+        Stage(
+            name="prepare_transformer",
+            script="prepare_transformer_data.py",
+            inputs=("data/train.jsonl", "data/valid.jsonl", "data/holdout.jsonl"),
+            outputs=prepared,
+            deps=("splits",),
+        ),
+        Stage(
+            name="teacher",
+            script="train_transformer_teacher.py",
+            args=("--run-name", "pipeline"),
+            inputs=prepared,
+            outputs=(
+                "models/teacher/teacher_manifest.json",
+                "models/teacher_valid_preds.jsonl",
+                "models/teacher_holdout_preds.jsonl",
+            ),
+            deps=("prepare_transformer",),
+        ),
+        Stage(
+            name="calibrate_teacher",
+            script="calibrate_teacher.py",
+            inputs=(
+                "data/transformer/valid.prepared.jsonl",
+                "models/teacher_valid_preds.jsonl",
+                "models/teacher/teacher_manifest.json",
+            ),
+            outputs=(
+                "models/teacher_calibration.json",
+                "models/teacher_valid_preds_calibrated.jsonl",
+            ),
+            deps=("teacher",),
+        ),
+        Stage(
+            name="cache_teacher_logits",
+            script="cache_teacher_logits.py",
+            inputs=(
+                "data/transformer/train.prepared.jsonl",
+                "data/transformer/valid.prepared.jsonl",
+                "models/teacher/teacher_manifest.json",
+                "models/teacher_calibration.json",
+            ),
+            outputs=(
+                "models/teacher_logits_train",
+                "models/teacher_logits_valid",
+                "models/teacher_logits_train.meta.json",
+                "models/teacher_logits_valid.meta.json",
+            ),
+            deps=("calibrate_teacher",),
+        ),
+        Stage(
+            name="student",
+            script="train_transformer_student_distill.py",
+            args=("--run-name", "pipeline"),
+            inputs=(
+                *prepared,
+                "models/teacher_logits_train",
+                "models/teacher_logits_valid",
+                "models/teacher_logits_train.meta.json",
+                "models/teacher_logits_valid.meta.json",
+            ),
+            outputs=(
+                "models/student/pytorch_model.bin",
+                "models/student/student_config.json",
+                "models/student/tokenizer/vocab.txt",
+            ),
+            deps=("cache_teacher_logits",),
+        ),
+        Stage(
+            name="export_student",
+            script="export_transformer_student_onnx.py",
+            inputs=(
+                "models/student/pytorch_model.bin",
+                "models/student/student_config.json",
+                "models/student/tokenizer/vocab.txt",
+                "data/transformer/train.prepared.jsonl",
+                "data/transformer/valid.prepared.jsonl",
+            ),
+            outputs=("models/student.onnx",),
+            deps=("student",),
+        ),
+        Stage(
+            name="quantize_student",
+            script="quantize_transformer_student.py",
+            inputs=("models/student.onnx",),
+            outputs=("models/student.int8.onnx",),
+            deps=("export_student",),
+        ),
+        Stage(
+            name="evaluate_transformer",
+            script="evaluate_transformer.py",
+            args=("--onnx", "models/student.int8.onnx"),
+            inputs=(
+                "models/student.int8.onnx",
+                "models/student/student_config.json",
+                "models/student/tokenizer/vocab.txt",
+                *prepared,
+            ),
+            outputs=(
+                "config/thresholds.transformer.json",
+                "models/student_holdout_eval.json",
+            ),
+            deps=("quantize_student",),
+        ),
+    ]
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def local_imports(script_path: Path) -> set[Path]:
+    """Return repo-local modules imported (transitively) by a script."""
+
+    seen: set[Path] = set()
+    stack = [script_path]
+    while stack:
+        path = stack.pop()
+        if path in seen or not path.exists():
+            continue
+        seen.add(path)
+        tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+        for node in ast.walk(tree):
+            names: list[str] = []
+            if isinstance(node, ast.Import):
+                names = [alias.name.split(".")[0] for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module.split(".")[0]]
+            for name in names:
+                candidate = SCRIPTS_DIR / f"{name}.py"
+                if candidate.exists() and candidate not in seen:
+                    stack.append(candidate)
+    return seen
+
+
+class ContentHasher:
+    """Content hashes with a (size, mtime) memo so unchanged files are not re-read."""
+
+    def __init__(self, memo: dict[str, dict[str, Any]]) -> None:
+        self.memo = memo
+        self.lock = threading.Lock()
+
+    def _file_digest(self, path: Path) -> str:
+        stat = path.stat()
+        key = str(
+            path.relative_to(REPO_ROOT) if path.is_relative_to(REPO_ROOT) else path
+        )
+        signature = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        with self.lock:
+            cached = self.memo.get(key)
+            if cached and all(cached.get(k) == v for k, v in signature.items()):
+                return str(cached["digest"])
+
+        if path.name.endswith(".prepared.jsonl"):
+            # Prepared splits are fingerprinted on the fields the models consume,
+            # matching the split_hash recorded in teacher/cache manifests.
+            digest = f"prepared:{hash_prepared_rows(load_prepared_rows(path))}"
+        else:
+            digest = f"sha256:{sha256_file(path)}"
+
+        with self.lock:
+            self.memo[key] = {**signature, "digest": digest}
+        return digest
+
+    def digest(self, path: Path) -> str | None:
+        if not path.exists():
+            return None
+        if path.is_dir():
+            files = sorted(p for p in path.rglob("*") if p.is_file())
+            return "dir:" + stable_object_hash(
+                {str(p.relative_to(path)): self._file_digest(p) for p in files}
+            )
+        return self._file_digest(path)
+
+
+def stage_fingerprint(stage: Stage, hasher: ContentHasher) -> tuple[str, dict]:
+    script_path = SCRIPTS_DIR / stage.script
+    code = {
+        str(path.relative_to(REPO_ROOT)): hasher.digest(path)
+        for path in sorted(local_imports(script_path))
+    }
+    inputs = {rel: hasher.digest(REPO_ROOT / rel) for rel in stage.inputs}
+    payload = {
+        "script": stage.script,
+        "args": list(stage.args),
+        "code": code,
+        "inputs": inputs,
+        "outputs": list(stage.outputs),
+    }
+    return stable_object_hash(payload), payload
+
+
+def select_stages(stages: list[Stage], targets: list[str] | None) -> dict[str, Stage]:
+    by_name = {stage.name: stage for stage in stages}
+    if not targets:
+        return by_name
+
+    selected: dict[str, Stage] = {}
+    stack = list(targets)
+    while stack:
+        name = stack.pop()
+        if name in selected:
+            continue
+        if name not in by_name:
+            raise SystemExit(
+                f"Unknown stage '{name}'. Known stages: {', '.join(by_name)}"
+            )
+        selected[name] = by_name[name]
+        stack.extend(by_name[name].deps)
+
+    # Deps outside the selection are satisfied by whatever is on disk.
+    return {
+        name: Stage(
+            name=stage.name,
+            script=stage.script,
+            args=stage.args,
+            inputs=stage.inputs,
+            outputs=stage.outputs,
+            deps=tuple(dep for dep in stage.deps if dep in selected),
+        )
+        for name, stage in by_name.items()
+        if name in selected
+    }
+
+
+def apply_stage_args(stages: list[Stage], overrides: list[str]) -> list[Stage]:
+    extra: dict[str, list[str]] = {}
+    for item in overrides:
+        name, sep, value = item.partition("=")
+        if not sep or not name.strip():
+            raise SystemExit(f"--stage-arg must look like STAGE=ARGS, got {item!r}")
+        extra.setdefault(name.strip(), []).extend(shlex.split(value))
+
+    known = {stage.name for stage in stages}
+    unknown = sorted(set(extra) - known)
+    if unknown:
+        raise SystemExit(f"--stage-arg references unknown stages: {unknown}")
+
+    return [
+        Stage(
+            name=stage.name,
+            script=stage.script,
+            args=stage.args + tuple(extra.get(stage.name, [])),
+            inputs=stage.inputs,
+            outputs=stage.outputs,
+            deps=stage.deps,
+        )
+        for stage in stages
+    ]
+
+
+def topo_order(stages: dict[str, Stage]) -> list[str]:
+    order: list[str] = []
+    state: dict[str, int] = {}
+
+    def visit(name: str) -> None:
+        mark = state.get(name, 0)
+        if mark == 2:
+            return
+        if mark == 1:
+            raise SystemExit(f"Pipeline has a dependency cycle through '{name}'")
+        state[name] = 1
+        for dep in stages[name].deps:
+            visit(dep)
+        state[name] = 2
+        order.append(name)
+
+    for name in stages:
+        visit(name)
+    return order
+
+
+@dataclass
+class PipelineState:
+    path: Path
+    stamps: dict[str, dict[str, Any]] = field(default_factory=dict)
+    hash_memo: dict[str, dict[str, Any]] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    @classmethod
+    def load(cls, path: Path) -> PipelineState:
+        if not path.exists():
+            return cls(path=path)
+        payload = load_json(path)
+        if int(payload.get("version", 0)) != STATE_VERSION:
+            return cls(path=path)
+        return cls(
+            path=path,
+            stamps=dict(payload.get("stamps", {})),
+            hash_memo=dict(payload.get("hash_memo", {})),
+        )
+
+    def save(self) -> None:
+        with self.lock:
+            save_json(
+                self.path,
+                {
+                    "version": STATE_VERSION,
+                    "stamps": self.stamps,
+                    "hash_memo": self.hash_memo,
+                },
+            )
+
+
+def is_up_to_date(stage: Stage, fingerprint: str, state: PipelineState) -> bool:
+    stamp = state.stamps.get(stage.name)
+    if not stamp or stamp.get("fingerprint") != fingerprint:
+        return False
+    return all((REPO_ROOT / rel).exists() for rel in stage.outputs)
+
+
+def run_stage(
+    stage: Stage,
+    *,
+    log_dir: Path,
+    python: str,
+) -> tuple[int, float, Path]:
+    log_dir.mkdir(parents=True, exist_ok=True)
+    log_path = log_dir / f"{stage.name}.log"
+    cmd = [python, str(SCRIPTS_DIR / stage.script), *stage.args]
+    started = time.monotonic()
+    with log_path.open("w", encoding="utf-8") as log:
+        log.write(f"$ {shlex.join(cmd)}\n")
+        log.flush()
+        proc = subprocess.run(
+            cmd,
+            cwd=REPO_ROOT,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            check=False,
+        )
+    return proc.returncode, time.monotonic() - started, log_path
+
+
+def tail(path: Path, lines: int = 20) -> str:
+    content = path.read_text(encoding="utf-8", errors="replace").splitlines()
+    return "\n".join(content[-lines:])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--targets",
+        type=str,
+        default=None,
+        help="Comma-separated stages to build (plus their deps). Defaults to all.",
+    )
+    parser.add_argument(
+        "--force",
+        action="append",
+        default=[],
+        help="Stage to rebuild even if up to date (repeatable, 'all' for every stage).",
+    )
+    parser.add_argument(
+        "--stage-arg",
+        action="append",
+        default=[],
+        help='Extra args for a stage, e.g. "evaluate_transformer=--target-scam-fpr 0.015".',
+    )
+    parser.add_argument("--jobs", type=int, default=2, help="Max concurrent stages")
+    parser.add_argument("--state-dir", type=Path, default=DEFAULT_STATE_DIR)
+    parser.add_argument("--python", type=str, default=sys.executable)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--list", action="store_true", help="List stages and exit")
+    args = parser.parse_args()
+
+    if args.jobs < 1:
+        raise SystemExit("--jobs must be >= 1")
+
+    all_stages = apply_stage_args(build_default_stages(), args.stage_arg)
+    if args.list:
+        for stage in all_stages:
+            deps = ", ".join(stage.deps) or "-"
+            print(f"{stage.name:22s} {stage.script:40s} deps: {deps}")
+        return
+
+    targets = (
+        [item.strip() for item in args.targets.split(",") if item.strip()]
+        if args.targets
+        else None
+    )
+    stages = select_stages(all_stages, targets)
+    order = topo_order(stages)
+    forced = set(args.force)
+    if "all" in forced:
+        forced = set(stages)
+
+    state = PipelineState.load(args.state_dir / "state.json")
+    hasher = ContentHasher(state.hash_memo)
+    log_dir = args.state_dir / "logs"
+
+    if args.dry_run:
+        stale: set[str] = set()
+        for name in order:
+            stage = stages[name]
+            fingerprint, _ = stage_fingerprint(stage, hasher)
+            upstream = [dep for dep in stage.deps if dep in stale]
+            if name in forced:
+                status = "run (forced)"
+            elif upstream:
+                status = f"run (upstream: {', '.join(upstream)})"
+            elif not is_up_to_date(stage, fingerprint, state):
+                status = "run (changed)"
+            else:
+                status = "skip (up to date)"
+            if status.startswith("run"):
+                stale.add(name)
+            print(f"{name:22s} {status}")
+        state.save()
+        return
+
+    pending = set(order)
+    done: set[str] = set()
+    failed: set[str] = set()
+    summary: dict[str, str] = {}
+    running: dict[Future, tuple[Stage, str, dict]] = {}
+
+    def ready(name: str) -> bool:
+        return all(dep in done for dep in stages[name].deps)
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        while pending or running:
+            for name in [n for n in order if n in pending]:
+                stage = stages[name]
+                if any(dep in failed for dep in stage.deps):
+                    pending.discard(name)
+                    failed.add(name)
+                    summary[name] = "blocked"
+                    print(f"[pipeline] {name}: blocked by failed dependency")
+                    continue
+                if not ready(name) or len(running) >= args.jobs:
+                    continue
+                pending.discard(name)
+                fingerprint, payload = stage_fingerprint(stage, hasher)
+                if name not in forced and is_up_to_date(stage, fingerprint, state):
+                    done.add(name)
+                    summary[name] = "skipped"
+                    print(f"[pipeline] {name}: up to date")
+                    continue
+                print(f"[pipeline] {name}: running {stage.script}")
+                future = pool.submit(
+                    run_stage, stage, log_dir=log_dir, python=args.python
+                )
+                running[future] = (stage, fingerprint, payload)
+
+            if not running:
+                continue
+
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, fingerprint, payload = running.pop(future)
+                returncode, elapsed, log_path = future.result()
+                missing = [
+                    rel for rel in stage.outputs if not (REPO_ROOT / rel).exists()
+                ]
+                if returncode != 0 or missing:
+                    failed.add(stage.name)
+                    reason = (
+                        f"exit code {returncode}"
+                        if returncode != 0
+                        else f"missing outputs {missing}"
+                    )
+                    summary[stage.name] = f"failed ({reason})"
+                    print(
+                        f"[pipeline] {stage.name}: FAILED after {elapsed:.1f}s "
+                        f"({reason}); log: {log_path}"
+                    )
+                    print(tail(log_path))
+                    continue
+
+                with state.lock:
+                    state.stamps[stage.name] = {
+                        "fingerprint": fingerprint,
+                        "inputs": payload["inputs"],
+                        "args": payload["args"],
+                        "elapsed_sec": round(elapsed, 3),
+                        "completed_at": utc_now_iso(),
+                    }
+                state.save()
+                done.add(stage.name)
+                summary[stage.name] = f"built in {elapsed:.1f}s"
+                print(f"[pipeline] {stage.name}: built in {elapsed:.1f}s")
+
+    state.save()
+
+    print("\nPipeline summary:")
+    for name in order:
+        print(f"  {name:22s} {summary.get(name, 'not run')}")
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
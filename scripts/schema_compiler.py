@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""Compile JSON Schemas into plain-Python validity predicates.
+
+``jsonschema`` validates every row by walking the schema through its generic
+keyword dispatch. The schemas in docs/schemas and the labeled sample schema
+use only a small keyword subset. For that subset this module generates one
+straight-line function per object/array subschema: isinstance checks,
+frozenset lookups, precompiled regexes. It returns a single
+``is_valid(instance) -> bool``.
+
+The predicate is a fast path, not a replacement. It may reject a row that
+jsonschema would accept; callers re-run full jsonschema on every rejected
+row, so error messages are unchanged. It never accepts a row that jsonschema
+would reject. Where exact semantics would be costly, the generated code
+rejects and leaves the call to jsonschema. Examples: ``uniqueItems`` over
+non-strings, and ``enum`` over values that are not strings or null.
+
+``format`` is treated as an annotation, because validate.py builds its
+validator without a format checker. Schemas using any other keyword raise
+``UnsupportedSchema``, and callers then fall back to jsonschema for every row.
+
+Generated sources are cached under ``.cache/schema_validators/`` keyed by the
+schema hash and ``COMPILER_VERSION``. Worker processes therefore load the
+cached source instead of regenerating it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+# Stdlib-only (validate.py runs in CI without numpy): no transformer_common.
+REPO_ROOT = Path(__file__).parent.parent
+COMPILER_VERSION = 1
+DEFAULT_CACHE_DIR = REPO_ROOT / ".cache" / "schema_validators"
+
+_LOADED: dict[str, Callable[[Any], bool]] = {}  # per-process, by schema_key
+
+ANNOTATIONS = {
+    "$schema",
+    "$id",
+    "$comment",
+    "title",
+    "description",
+    "examples",
+    "default",
+    "deprecated",
+    "readOnly",
+    "writeOnly",
+    "format",
+}
+SUPPORTED = ANNOTATIONS | {
+    "type",
+    "enum",
+    "required",
+    "properties",
+    "additionalProperties",
+    "items",
+    "minItems",
+    "maxItems",
+    "uniqueItems",
+    "minLength",
+    "maxLength",
+    "pattern",
+    "minimum",
+    "maximum",
+}
+
+TYPE_CHECKS = {
+    "string": "isinstance({v}, str)",
+    "object": "isinstance({v}, dict)",
+    "array": "isinstance({v}, list)",
+    "boolean": "isinstance({v}, bool)",
+    "null": "{v} is None",
+    "number": "(isinstance({v}, (int, float)) and not isinstance({v}, bool))",
+    "integer": "((isinstance({v}, int) and not isinstance({v}, bool)) "
+    "or (isinstance({v}, float) and {v}.is_integer()))",
+}
+
+PRELUDE = """\
+import re
+
+
+def _unique(items):
+    # Exact for strings; anything else is left to jsonschema.
+    if all(isinstance(item, str) for item in items):
+        return len(set(items)) == len(items)
+    return False
+"""
+
+
+class UnsupportedSchema(ValueError):
+    pass
+
+
+class _Generator:
+    def __init__(self) -> None:
+        self.constants: list[str] = []
+        self.functions: list[str] = []
+        self.counter = 0
+
+    def constant(self, source: str) -> str:
+        name = f"_C{len(self.constants)}"
+        self.constants.append(f"{name} = {source}")
+        return name
+
+    def function(self, schema: Any) -> str:
+        """Emit ``def _vN(v)`` for ``schema``; returns its name."""
+
+        name = f"_v{len(self.functions)}"
+        self.functions.append("")  # reserve the slot so nested names stay ordered
+        lines = [f"def {name}(v):"]
+        self.emit(schema, "v", lines, "    ")
+        lines.append("    return True")
+        self.functions[int(name[2:])] = "\n".join(lines)
+        return name
+
+    def fresh(self) -> str:
+        self.counter += 1
+        return f"x{self.counter}"
+
+    def emit(self, schema: Any, v: str, lines: list[str], pad: str) -> None:
+        if schema is True:
+            return
+        if schema is False:
+            lines.append(f"{pad}return False")
+            return
+        if not isinstance(schema, dict):
+            raise UnsupportedSchema(f"Schema must be an object or boolean: {schema!r}")
+        unknown = set(schema) - SUPPORTED
+        if unknown:
+            raise UnsupportedSchema(f"Unsupported keywords: {sorted(unknown)}")
+
+        types = schema.get("type")
+        if isinstance(types, str):
+            types = [types]
+        if types is not None:
+            if any(t not in TYPE_CHECKS for t in types):
+                raise UnsupportedSchema(f"Unsupported type: {schema['type']!r}")
+            check = " or ".join(TYPE_CHECKS[t].format(v=v) for t in types)
+            lines.append(f"{pad}if not ({check}):")
+            lines.append(f"{pad}    return False")
+
+        if "enum" in schema:
+            values = schema["enum"]
+            strings = [value for value in values if isinstance(value, str)]
+            if len(strings) + values.count(None) != len(values):
+                raise UnsupportedSchema("enum values must be strings or null")
+            members = self.constant(f"frozenset({sorted(set(strings))!r})")
+            check = f"(isinstance({v}, str) and {v} in {members})"
+            if None in values:
+                check = f"({v} is None or {check})"
+            lines.append(f"{pad}if not {check}:")
+            lines.append(f"{pad}    return False")
+
+        self.emit_string(schema, v, lines, pad, types)
+        self.emit_number(schema, v, lines, pad, types)
+        self.emit_array(schema, v, lines, pad, types)
+        self.emit_object(schema, v, lines, pad, types)
+
+    def guard(
+        self, kind: str, v: str, lines: list[str], pad: str, types: list[str] | None
+    ) -> str:
+        """Open ``if isinstance(v, kind)`` unless ``type`` already ensures it."""
+
+        if types == [kind]:
+            return pad
+        lines.append(f"{pad}if {TYPE_CHECKS[kind].format(v=v)}:")
+        return pad + "    "
+
+    def emit_string(self, schema, v, lines, pad, types) -> None:
+        keys = [k for k in ("minLength", "maxLength", "pattern") if k in schema]
+        if not keys:
+            return
+        inner = self.guard("string", v, lines, pad, types)
+        if "minLength" in schema:
+            lines.append(f"{inner}if len({v}) < {int(schema['minLength'])}:")
+            lines.append(f"{inner}    return False")
+        if "maxLength" in schema:
+            lines.append(f"{inner}if len({v}) > {int(schema['maxLength'])}:")
+            lines.append(f"{inner}    return False")
+        if "pattern" in schema:
+            regex = self.constant(f"re.compile({schema['pattern']!r})")
+            lines.append(f"{inner}if {regex}.search({v}) is None:")
+            lines.append(f"{inner}    return False")
+
+    def emit_number(self, schema, v, lines, pad, types) -> None:
+        keys = [k for k in ("minimum", "maximum") if k in schema]
+        if not keys:
+            return
+        inner = self.guard("number", v, lines, pad, types)
+        if "minimum" in schema:
+            lines.append(f"{inner}if {v} < {schema['minimum']!r}:")
+            lines.append(f"{inner}    return False")
+        if "maximum" in schema:
+            lines.append(f"{inner}if {v} > {schema['maximum']!r}:")
+            lines.append(f"{inner}    return False")
+
+    def emit_array(self, schema, v, lines, pad, types) -> None:
+        keys = [
+            k for k in ("items", "minItems", "maxItems", "uniqueItems") if k in schema
+        ]
+        if not keys:
+            return
+        inner = self.guard("array", v, lines, pad, types)
+        if "minItems" in schema:
+            lines.append(f"{inner}if len({v}) < {int(schema['minItems'])}:")
+            lines.append(f"{inner}    return False")
+        if "maxItems" in schema:
+            lines.append(f"{inner}if len({v}) > {int(schema['maxItems'])}:")
+            lines.append(f"{inner}    return False")
+        if schema.get("uniqueItems") is True:
+            lines.append(f"{inner}if not _unique({v}):")
+            lines.append(f"{inner}    return False")
+        if "items" in schema and schema["items"] is not True:
+            item = self.fresh()
+            lines.append(f"{inner}for {item} in {v}:")
+            self.emit_child(schema["items"], item, lines, inner + "    ")
+
+    def emit_object(self, schema, v, lines, pad, types) -> None:
+        keys = [
+            k for k in ("required", "properties", "additionalProperties") if k in schema
+        ]
+        if not keys:
+            return
+        inner = self.guard("object", v, lines, pad, types)
+        if schema.get("required"):
+            required = self.constant(f"frozenset({sorted(set(schema['required']))!r})")
+            lines.append(f"{inner}if not {v}.keys() >= {required}:")
+            lines.append(f"{inner}    return False")
+        properties = schema.get("properties", {})
+        for name, subschema in properties.items():
+            if subschema is True:
+                continue
+            value = self.fresh()
+            lines.append(f"{inner}if {name!r} in {v}:")
+            lines.append(f"{inner}    {value} = {v}[{name!r}]")
+            self.emit_child(subschema, value, lines, inner + "    ")
+        additional = schema.get("additionalProperties", True)
+        if additional is True:
+            return
+        known = self.constant(f"frozenset({sorted(properties)!r})")
+        if additional is False:
+            lines.append(f"{inner}if not {v}.keys() <= {known}:")
+            lines.append(f"{inner}    return False")
+            return
+        key, value = self.fresh(), self.fresh()
+        lines.append(f"{inner}for {key}, {value} in {v}.items():")
+        lines.append(f"{inner}    if {key} not in {known}:")
+        self.emit_child(additional, value, lines, inner + "        ")
+
+    def emit_child(self, schema: Any, v: str, lines: list[str], pad: str) -> None:
+        """Inline scalar subschemas; containers get their own function."""
+
+        nested = isinstance(schema, dict) and any(
+            k in schema for k in ("properties", "items", "additionalProperties")
+        )
+        if not nested:
+            before = len(lines)
+            self.emit(schema, v, lines, pad)
+            if len(lines) == before:
+                lines.append(f"{pad}pass")
+            return
+        name = self.function(schema)
+        lines.append(f"{pad}if not {name}({v}):")
+        lines.append(f"{pad}    return False")
+
+
+def generate_source(schema: dict[str, Any]) -> str:
+    """Python module source defining ``is_valid(instance) -> bool``."""
+
+    generator = _Generator()
+    root = generator.function(schema)
+    return "\n\n".join(
+        [
+            f"# Generated by scripts/schema_compiler.py v{COMPILER_VERSION}; do not edit.\n"
+            + PRELUDE,
+            "\n".join(generator.constants),
+            *generator.functions,
+            f"is_valid = {root}\n",
+        ]
+    )
+
+
+def schema_key(schema: dict[str, Any]) -> str:
+    blob = json.dumps(
+        {"compiler": COMPILER_VERSION, "schema": schema},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def load_validator(
+    schema: dict[str, Any], *, cache_dir: Path | None = DEFAULT_CACHE_DIR
+) -> Callable[[Any], bool]:
+    """Compiled predicate for ``schema``, using the on-disk cache if present.
+
+    Raises UnsupportedSchema if the schema is outside the compiled subset.
+    """
+
+    key = schema_key(schema)
+    if key in _LOADED:
+        return _LOADED[key]
+    source = None
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = cache_dir / f"{key}.py"
+        if cache_path.exists():
+            source = cache_path.read_text(encoding="utf-8")
+    if source is None:
+        source = generate_source(schema)
+        if cache_path is not None:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                "w", delete=False, encoding="utf-8", dir=cache_path.parent
+            ) as tmp:
+                tmp.write(source)
+                tmp_path = Path(tmp.name)
+            os.replace(tmp_path, cache_path)
+    namespace: dict[str, Any] = {}
+    exec(compile(source, str(cache_path or "<schema>"), "exec"), namespace)  # noqa: S102
+    _LOADED[key] = namespace["is_valid"]
+    return _LOADED[key]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("schema", type=Path, help="Schema JSON file")
+    args = parser.parse_args()
+
+    with args.schema.open(encoding="utf-8") as handle:
+        schema = json.load(handle)
+    try:
+        print(generate_source(schema))
+    except UnsupportedSchema as exc:
+        raise SystemExit(f"{args.schema}: {exc}") from exc
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""Precomputed count tables per dataset snapshot, and a fast snapshot diff.
+
+sync_datasets_to_experiments_repo.py writes ``STATS.json`` next to each
+snapshot's JSONL files. For every dataset (x-posts, x-replies), it holds
+count tables for:
+
+- raw labels and raw label pairs (via label_matrix.LabelMatrix)
+- the collapsed training class (scam > topic_crypto > clean)
+- author handles (from the author fields, else the ``source_url`` path)
+- ``collected_at`` time buckets, with training-class counts per bucket
+
+Comparing two snapshots then only loads two small JSON files, so no JSONL is
+re-read. Label and pair deltas are rate differences, as in
+check_split_drift.py.
+
+Usage:
+    python scripts/snapshot_stats.py 2026-02-01-brave-otter latest
+    python scripts/snapshot_stats.py latest data/sample.jsonl --strict
+    python scripts/snapshot_stats.py --backfill          # missing/outdated STATS.json
+
+A snapshot is named by id (or ``latest`` / ``previous``) under --dest-root,
+as a snapshot directory, as a STATS.json file, or as a raw dataset file
+(JSONL or label store). A raw dataset file is counted on the fly as
+``--dataset``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sys
+from collections import Counter
+from contextlib import closing
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from label_matrix import LabelMatrix, LabelVocab
+from label_store import iter_dataset_lines
+from make_stratified_splits import parse_time
+from transformer_common import (
+    TRAINING_CLASSES,
+    extract_author_handle,
+    extract_raw_labels,
+    load_json,
+    save_json,
+    utc_now_iso,
+)
+
+STATS_VERSION = 2  # 2: author handles fall back to source_url
+STATS_NAME = "STATS.json"
+DEFAULT_DEST_ROOT = Path("~/offline/janitr-experiments").expanduser()
+# Snapshot file name (without .jsonl) -> dataset key, as written by the sync.
+SNAPSHOT_DATASETS = ("x-posts", "x-replies")
+BUCKET_FORMATS = {"day": "%Y-%m-%d", "week": "%G-W%V", "month": "%Y-%m"}
+UNKNOWN_BUCKET = "unknown"
+# https://x.com/<handle>/status/<id>, or a profile URL.
+SOURCE_URL_HANDLE = re.compile(
+    r"^https?://(?:www\.|mobile\.)?(?:x|twitter)\.com/([A-Za-z0-9_]{1,15})(?:[/?#]|$)"
+)
+RESERVED_PATHS = {"home", "i", "intent", "explore", "search", "hashtag", "share"}
+
+
+def source_url_handle(url: Any) -> str | None:
+    if not isinstance(url, str):
+        return None
+    match = SOURCE_URL_HANDLE.match(url.strip())
+    if match is None or match.group(1).lower() in RESERVED_PATHS:
+        return None
+    return match.group(1).lower()
+
+
+def record_author(obj: dict[str, Any]) -> str | None:
+    """Post author handle; for reply threads, the handle of the AI reply.
+
+    Posts without an author field (most of sample.jsonl) fall back to the
+    handle in their ``source_url``.
+    """
+
+    handle = extract_author_handle(obj) or source_url_handle(obj.get("source_url"))
+    if handle is not None:
+        return handle
+    for tweet in obj.get("tweets") or []:
+        if isinstance(tweet, dict) and tweet.get("role") == "ai_reply":
+            value = tweet.get("handle")
+            if isinstance(value, str) and value.strip():
+                return value.strip().lower()
+    return None
+
+
+def build_dataset_stats(path: Path, *, bucket: str = "month") -> dict[str, Any]:
+    """Count tables for one dataset file, in a single pass."""
+
+    label_lists: list[list[str]] = []
+    bucket_keys: list[str] = []
+    authors: Counter[str] = Counter()
+    authors_unknown = 0
+    fmt = BUCKET_FORMATS[bucket]
+    with closing(iter_dataset_lines(path)) as handle:
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            obj = json.loads(line)
+            label_lists.append(extract_raw_labels(obj))
+            ts = parse_time(obj.get("collected_at"))
+            bucket_keys.append(ts.strftime(fmt) if ts is not None else UNKNOWN_BUCKET)
+            author = record_author(obj)
+            if author is None:
+                authors_unknown += 1
+            else:
+                authors[author] += 1
+
+    matrix = LabelMatrix.from_label_lists(label_lists, vocab=LabelVocab())
+    collapsed = matrix.collapsed()
+    buckets = sorted(set(bucket_keys))
+    bucket_ids = np.searchsorted(buckets, bucket_keys) if bucket_keys else []
+    per_bucket = np.zeros((len(buckets), len(TRAINING_CLASSES)), dtype=np.int64)
+    np.add.at(per_bucket, (bucket_ids, collapsed), 1)
+
+    return {
+        "rows": len(label_lists),
+        "labels": dict(sorted(matrix.label_counts().items())),
+        "pairs": dict(sorted(matrix.pair_counts().items())),
+        "training": {
+            label: int(count)
+            for label, count in zip(
+                TRAINING_CLASSES,
+                np.bincount(collapsed, minlength=len(TRAINING_CLASSES)),
+            )
+        },
+        "authors": dict(sorted(authors.items())),
+        "authors_unknown": authors_unknown,
+        "bucket": bucket,
+        "time_buckets": {
+            key: {
+                "rows": int(row.sum()),
+                "training": dict(zip(TRAINING_CLASSES, row.tolist())),
+            }
+            for key, row in zip(buckets, per_bucket)
+        },
+    }
+
+
+def build_stats(
+    files: dict[str, Path],
+    *,
+    bucket: str = "month",
+    sha256: dict[str, str] | None = None,
+) -> dict[str, Any]:
+    datasets = {}
+    for name, path in files.items():
+        datasets[name] = build_dataset_stats(path, bucket=bucket)
+        if sha256 and name in sha256:
+            datasets[name]["sha256"] = sha256[name]
+    posts = datasets.get("x-posts")
+    if posts and posts["rows"] and not posts["authors"]:
+        # Every x-posts row carries an author field or an x.com source_url;
+        # an empty table means the handle extraction no longer matches.
+        raise SystemExit(
+            f"No author handles found in {files['x-posts']} "
+            f"({posts['rows']} rows); check record_author."
+        )
+    return {
+        "stats_version": STATS_VERSION,
+        "created_at": utc_now_iso(),
+        "datasets": datasets,
+    }
+
+
+def snapshot_files(snapshot_dir: Path) -> dict[str, Path]:
+    return {
+        name: snapshot_dir / f"{name}.jsonl"
+        for name in SNAPSHOT_DATASETS
+        if (snapshot_dir / f"{name}.jsonl").exists()
+    }
+
+
+def write_snapshot_stats(snapshot_dir: Path, *, bucket: str = "month") -> Path:
+    """Build and save ``STATS.json`` for a snapshot directory."""
+
+    sha256 = {}
+    manifest = snapshot_dir / "SNAPSHOT.json"
+    if manifest.exists():
+        files = load_json(manifest).get("files", {})
+        sha256 = {name: entry["sha256"] for name, entry in files.items()}
+    out = snapshot_dir / STATS_NAME
+    save_json(
+        out, build_stats(snapshot_files(snapshot_dir), bucket=bucket, sha256=sha256)
+    )
+    return out
+
+
+def stats_is_current(stats_path: Path) -> bool:
+    if not stats_path.exists():
+        return False
+    return load_json(stats_path).get("stats_version") == STATS_VERSION
+
+
+def snapshot_ids(dest_root: Path) -> list[str]:
+    index_path = dest_root / "datasets" / "INDEX.json"
+    if not index_path.exists():
+        raise SystemExit(f"Snapshot index not found: {index_path}")
+    return [
+        str(entry["snapshot_id"])
+        for entry in load_json(index_path).get("snapshots", [])
+        if isinstance(entry, dict) and entry.get("snapshot_id")
+    ]
+
+
+def load_stats(
+    ref: str, *, dest_root: Path, dataset: str, bucket: str
+) -> tuple[str, dict[str, Any]]:
+    """Resolve a snapshot reference to (label, stats)."""
+
+    path = Path(ref).expanduser()
+    if ref in ("latest", "previous"):
+        ids = snapshot_ids(dest_root)
+        offset = 1 if ref == "latest" else 2
+        if len(ids) < offset:
+            raise SystemExit(f"No {ref} snapshot in {dest_root}")
+        ref = ids[-offset]
+        path = dest_root / "datasets" / "snapshots" / ref
+    elif not path.exists():
+        path = dest_root / "datasets" / "snapshots" / ref
+        if not path.exists():
+            raise SystemExit(f"Unknown snapshot: {ref}")
+
+    if path.is_dir():
+        stats_path = path / STATS_NAME
+        if not stats_is_current(stats_path):
+            print(f"[snapshot_stats] building {stats_path}", file=sys.stderr)
+            write_snapshot_stats(path, bucket=bucket)
+        return ref, load_json(stats_path)
+    if path.suffix == ".json":
+        return ref, load_json(path)
+    return ref, build_stats({dataset: path}, bucket=bucket)
+
+
+def rate_deltas(
+    old: dict[str, int], new: dict[str, int], old_rows: int, new_rows: int
+) -> dict[str, dict[str, float]]:
+    """Per-key counts, rates and rate delta (new - old), largest change first."""
+
+    out = {}
+    for key in set(old) | set(new):
+        old_rate = old.get(key, 0) / old_rows if old_rows else 0.0
+        new_rate = new.get(key, 0) / new_rows if new_rows else 0.0
+        out[key] = {
+            "old": old.get(key, 0),
+            "new": new.get(key, 0),
+            "old_rate": old_rate,
+            "new_rate": new_rate,
+            "delta": new_rate - old_rate,
+        }
+    return dict(sorted(out.items(), key=lambda item: (-abs(item[1]["delta"]), item[0])))
+
+
+def diff_dataset(
+    old: dict[str, Any], new: dict[str, Any], *, top: int
+) -> dict[str, Any]:
+    old_rows, new_rows = int(old["rows"]), int(new["rows"])
+    labels = rate_deltas(old["labels"], new["labels"], old_rows, new_rows)
+    pairs = rate_deltas(old["pairs"], new["pairs"], old_rows, new_rows)
+    training = rate_deltas(old["training"], new["training"], old_rows, new_rows)
+
+    old_authors, new_authors = old["authors"], new["authors"]
+    author_changes = sorted(
+        (
+            (handle, new_authors.get(handle, 0) - old_authors.get(handle, 0))
+            for handle in set(old_authors) | set(new_authors)
+        ),
+        key=lambda item: (-abs(item[1]), item[0]),
+    )
+    old_buckets, new_buckets = old["time_buckets"], new["time_buckets"]
+    buckets = {
+        key: {
+            "old": old_buckets.get(key, {}).get("rows", 0),
+            "new": new_buckets.get(key, {}).get("rows", 0),
+        }
+        for key in sorted(set(old_buckets) | set(new_buckets))
+    }
+    return {
+        "rows": {"old": old_rows, "new": new_rows, "delta": new_rows - old_rows},
+        "training": training,
+        "labels": dict(list(labels.items())[:top]),
+        "pairs": dict(list(pairs.items())[:top]),
+        "labels_added": sorted(set(new["labels"]) - set(old["labels"])),
+        "labels_removed": sorted(set(old["labels"]) - set(new["labels"])),
+        "max_label_delta_abs": max(
+            (abs(item["delta"]) for item in labels.values()), default=0.0
+        ),
+        "max_pair_delta_abs": max(
+            (abs(item["delta"]) for item in pairs.values()), default=0.0
+        ),
+        "authors": {
+            "old_distinct": len(old_authors),
+            "new_distinct": len(new_authors),
+            "added": len(set(new_authors) - set(old_authors)),
+            "removed": len(set(old_authors) - set(new_authors)),
+            "top_changes": {
+                handle: delta for handle, delta in author_changes[:top] if delta
+            },
+        },
+        "time_buckets": {
+            key: {**counts, "delta": counts["new"] - counts["old"]}
+            for key, counts in buckets.items()
+            if counts["new"] != counts["old"]
+        },
+    }
+
+
+def diff_stats(
+    old: dict[str, Any], new: dict[str, Any], *, top: int = 20
+) -> dict[str, Any]:
+    datasets = {}
+    for name in sorted(set(old["datasets"]) & set(new["datasets"])):
+        datasets[name] = diff_dataset(
+            old["datasets"][name], new["datasets"][name], top=top
+        )
+    return {
+        "datasets": datasets,
+        "only_old": sorted(set(old["datasets"]) - set(new["datasets"])),
+        "only_new": sorted(set(new["datasets"]) - set(old["datasets"])),
+    }
+
+
+def print_diff(old_ref: str, new_ref: str, report: dict[str, Any]) -> None:
+    print(f"Snapshot diff: {old_ref} -> {new_ref}")
+    for name, diff in report["datasets"].items():
+        rows = diff["rows"]
+        print(f"\n[{name}] rows {rows['old']} -> {rows['new']} ({rows['delta']:+d})")
+        print("  training class rates:")
+        for label in TRAINING_CLASSES:
+            item = diff["training"].get(label)
+            if item is not None:
+                print(
+                    f"    {label:12s} {item['old_rate']:.4f} -> "
+                    f"{item['new_rate']:.4f} ({item['delta']:+.4f})"
+                )
+        print("  largest label rate changes:")
+        for label, item in diff["labels"].items():
+            if item["delta"]:
+                print(
+                    f"    {label:28s} {item['old']:6d} -> {item['new']:6d} "
+                    f"({item['delta']:+.4f})"
+                )
+        if diff["labels_added"]:
+            print(f"  labels added:   {', '.join(diff['labels_added'])}")
+        if diff["labels_removed"]:
+            print(f"  labels removed: {', '.join(diff['labels_removed'])}")
+        authors = diff["authors"]
+        print(
+            f"  authors: {authors['old_distinct']} -> {authors['new_distinct']} "
+            f"(+{authors['added']} / -{authors['removed']})"
+        )
+        for key, counts in diff["time_buckets"].items():
+            print(
+                f"  bucket {key:10s} {counts['old']:6d} -> {counts['new']:6d} "
+                f"({counts['delta']:+d})"
+            )
+        print(f"  label delta abs max = {diff['max_label_delta_abs']:.4f}")
+        print(f"  pair  delta abs max = {diff['max_pair_delta_abs']:.4f}")
+    for name in report["only_old"]:
+        print(f"\n[{name}] only in {old_ref}")
+    for name in report["only_new"]:
+        print(f"\n[{name}] only in {new_ref}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "old", nargs="?", help="Snapshot id, dir, STATS.json or dataset"
+    )
+    parser.add_argument(
+        "new", nargs="?", help="Snapshot id, dir, STATS.json or dataset"
+    )
+    parser.add_argument("--dest-root", type=Path, default=DEFAULT_DEST_ROOT)
+    parser.add_argument(
+        "--dataset",
+        default="x-posts",
+        choices=SNAPSHOT_DATASETS,
+        help="Dataset key for raw dataset files",
+    )
+    parser.add_argument("--bucket", choices=sorted(BUCKET_FORMATS), default="month")
+    parser.add_argument(
+        "--backfill",
+        action="store_true",
+        help="Write STATS.json for every snapshot under --dest-root missing one "
+        "or holding an older stats version",
+    )
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--out", type=Path, default=None, help="JSON diff report path")
+    parser.add_argument("--max-label-delta", type=float, default=0.03)
+    parser.add_argument("--max-pair-delta", type=float, default=0.05)
+    parser.add_argument("--strict", action="store_true")
+    args = parser.parse_args()
+    dest_root = args.dest_root.expanduser()
+
+    if args.backfill:
+        snapshots_root = dest_root / "datasets" / "snapshots"
+        for snapshot_id in snapshot_ids(dest_root):
+            snapshot_dir = snapshots_root / snapshot_id
+            if snapshot_dir.is_dir() and not stats_is_current(
+                snapshot_dir / STATS_NAME
+            ):
+                out = write_snapshot_stats(snapshot_dir, bucket=args.bucket)
+                print(f"[snapshot_stats] wrote: {out}")
+        return
+
+    if not args.old or not args.new:
+        parser.error("two snapshots are required unless --backfill is given")
+
+    old_ref, old = load_stats(
+        args.old, dest_root=dest_root, dataset=args.dataset, bucket=args.bucket
+    )
+    new_ref, new = load_stats(
+        args.new, dest_root=dest_root, dataset=args.dataset, bucket=args.bucket
+    )
+    report = diff_stats(old, new, top=args.top)
+    print_diff(old_ref, new_ref, report)
+
+    if args.out is not None:
+        save_json(
+            args.out,
+            {"created_at": utc_now_iso(), "old": old_ref, "new": new_ref, **report},
+        )
+        print(f"\nWrote report: {args.out}")
+
+    failed = False
+    for name, diff in report["datasets"].items():
+        if diff["max_label_delta_abs"] > args.max_label_delta:
+            print(
+                f"ERROR: [{name}] label drift {diff['max_label_delta_abs']:.4f} "
+                f"exceeds threshold {args.max_label_delta:.4f}"
+            )
+            failed = True
+        if diff["max_pair_delta_abs"] > args.max_pair_delta:
+            print(
+                f"ERROR: [{name}] pair drift {diff['max_pair_delta_abs']:.4f} "
+                f"exceeds threshold {args.max_pair_delta:.4f}"
+            )
+            failed = True
+    if failed and args.strict:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Quantization-aware training helpers for the tiny student.
+
+Fake-quant reproduces what ``onnxruntime.quantization.quantize_dynamic`` with
+``QuantType.QInt8`` does to the exported student graph:
+
+- Linear (MatMul/Gemm) weights: per-tensor symmetric int8 in [-127, 127].
+- Linear inputs: per-tensor asymmetric uint8, recomputed on every batch
+  (ORT's DynamicQuantizeLinear).
+- Embedding tables (Gather): per-tensor asymmetric uint8.
+
+Attention score matmuls, LayerNorm and softmax stay fp32 in ORT and here.
+Gradients pass through the rounding with the straight-through estimator.
+Weights are snapped to the int8 grid before saving, so the scales ORT derives
+at export time are the ones the model was trained with.
+"""
+
+from __future__ import annotations
+
+import torch
+import torch.nn.functional as F
+from torch import nn
+
+QAT_SCHEME = "ort_dynamic_int8_v1"
+
+
+def _fake_quant(
+    x: torch.Tensor, *, qmin: int, qmax: int, symmetric: bool
+) -> torch.Tensor:
+    data = x.float()
+    with torch.no_grad():
+        # Same range/scale/zero-point rules as ORT's compute_scale_zp.
+        rmin = torch.clamp(data.min(), max=0.0)
+        rmax = torch.clamp(data.max(), min=0.0)
+        if symmetric:
+            absmax = torch.maximum(-rmin, rmax)
+            rmin, rmax = -absmax, absmax
+        scale = (rmax - rmin) / float(qmax - qmin)
+        tiny = torch.finfo(torch.float32).tiny
+        scale = torch.where(scale < tiny, torch.ones_like(scale), scale)
+        if symmetric:
+            zero_point = torch.zeros((), dtype=torch.int32, device=data.device)
+        else:
+            zero_point = torch.clamp(torch.round(qmin - rmin / scale), qmin, qmax)
+            zero_point = zero_point.to(torch.int32)
+    out = torch.fake_quantize_per_tensor_affine(data, scale, zero_point, qmin, qmax)
+    return out.to(x.dtype)
+
+
+def fake_quant_int8_symmetric(x: torch.Tensor) -> torch.Tensor:
+    return _fake_quant(x, qmin=-127, qmax=127, symmetric=True)
+
+
+def fake_quant_uint8(x: torch.Tensor) -> torch.Tensor:
+    return _fake_quant(x, qmin=0, qmax=255, symmetric=False)
+
+
+class QATLinear(nn.Linear):
+    """nn.Linear with int8 weight and dynamic uint8 input fake-quant."""
+
+    @classmethod
+    def from_float(cls, linear: nn.Linear) -> QATLinear:
+        qat = cls(
+            linear.in_features,
+            linear.out_features,
+            bias=linear.bias is not None,
+            device="meta",
+        )
+        # Share the Parameters so optimizers and DDP keep tracking them.
+        qat.weight = linear.weight
+        qat.bias = linear.bias
+        return qat
+
+    def forward(self, input: torch.Tensor) -> torch.Tensor:
+        return F.linear(
+            fake_quant_uint8(input), fake_quant_int8_symmetric(self.weight), self.bias
+        )
+
+
+class QATEmbedding(nn.Embedding):
+    """nn.Embedding whose table is fake-quantized to uint8."""
+
+    @classmethod
+    def from_float(cls, embedding: nn.Embedding) -> QATEmbedding:
+        qat = cls(
+            embedding.num_embeddings,
+            embedding.embedding_dim,
+            padding_idx=embedding.padding_idx,
+            device="meta",
+        )
+        qat.weight = embedding.weight
+        return qat
+
+    def forward(self, input: torch.Tensor) -> torch.Tensor:
+        return F.embedding(
+            input,
+            fake_quant_uint8(self.weight),
+            self.padding_idx,
+            self.max_norm,
+            self.norm_type,
+            self.scale_grad_by_freq,
+            self.sparse,
+        )
+
+
+def _swap_modules(parent: nn.Module) -> int:
+    swapped = 0
+    for name, child in parent.named_children():
+        if type(child) is nn.Linear:
+            setattr(parent, name, QATLinear.from_float(child))
+            swapped += 1
+        elif type(child) is nn.Embedding:
+            setattr(parent, name, QATEmbedding.from_float(child))
+            swapped += 1
+        else:
+            swapped += _swap_modules(child)
+    return swapped
+
+
+def enable_student_qat(model: nn.Module) -> int:
+    """Swap the exported student's Linear/Embedding layers for QAT versions.
+
+    Only modules that end up in the ONNX graph are touched (the encoder and
+    both heads); ``teacher_projections`` is a training-only aid and stays
+    fp32. Returns the number of swapped modules. State dict keys are unchanged.
+    """
+
+    swapped = _swap_modules(model.bert)
+    for name in ("head_scam_clean", "head_topic"):
+        head = getattr(model, name)
+        if type(head) is nn.Linear:
+            setattr(model, name, QATLinear.from_float(head))
+            swapped += 1
+    return swapped
+
+
+@torch.no_grad()
+def snap_student_weights(model: nn.Module) -> None:
+    """Replace QAT weights with their fake-quantized values in place."""
+
+    for module in model.modules():
+        if isinstance(module, QATLinear):
+            module.weight.copy_(fake_quant_int8_symmetric(module.weight))
+        elif isinstance(module, QATEmbedding):
+            module.weight.copy_(fake_quant_uint8(module.weight))
@@ -3,6 +3,7 @@
 
 from __future__ import annotations
 
+from collections.abc import Sequence
 from pathlib import Path
 from typing import Any
 
@@ -80,7 +81,100 @@ def load_student_from_dir(
     model = TinyStudentModel(
         config, teacher_hidden_size=int(arch["teacher_hidden_size"])
     )
+    apply_student_structure(model, arch)
     state = torch.load(student_dir / "pytorch_model.bin", map_location="cpu")
     model.load_state_dict(state)
     model.eval()
     return model, tokenizer, config_payload
+
+
+def _slice_linear(linear: nn.Linear, index: torch.Tensor, *, dim: int) -> nn.Linear:
+    """Copy of ``linear`` keeping output rows (dim=0) or input columns (dim=1)."""
+
+    weight = linear.weight.detach().index_select(dim, index.to(linear.weight.device))
+    bias = linear.bias
+    if bias is not None and dim == 0:
+        bias = bias.detach().index_select(0, index.to(bias.device))
+    sliced = nn.Linear(
+        weight.shape[1],
+        weight.shape[0],
+        bias=bias is not None,
+        device=weight.device,
+        dtype=weight.dtype,
+    )
+    with torch.no_grad():
+        sliced.weight.copy_(weight)
+        if bias is not None:
+            sliced.bias.copy_(bias.detach())
+    return sliced
+
+
+def prune_student_heads(
+    model: TinyStudentModel, layer: int, keep_heads: Sequence[int]
+) -> None:
+    """Physically drop attention heads of one encoder layer."""
+
+    attention = model.bert.encoder.layer[layer].attention
+    self_attn = attention.self
+    if not keep_heads:
+        raise ValueError(f"layer {layer}: at least one attention head must remain")
+    head_size = self_attn.attention_head_size
+    index = torch.tensor(
+        [
+            head * head_size + offset
+            for head in sorted(keep_heads)
+            for offset in range(head_size)
+        ],
+        dtype=torch.long,
+    )
+    self_attn.query = _slice_linear(self_attn.query, index, dim=0)
+    self_attn.key = _slice_linear(self_attn.key, index, dim=0)
+    self_attn.value = _slice_linear(self_attn.value, index, dim=0)
+    attention.output.dense = _slice_linear(attention.output.dense, index, dim=1)
+    self_attn.num_attention_heads = len(keep_heads)
+    self_attn.all_head_size = len(keep_heads) * head_size
+
+
+def prune_student_ffn(
+    model: TinyStudentModel, layer: int, keep_neurons: Sequence[int]
+) -> None:
+    """Physically drop intermediate (FFN) neurons of one encoder layer."""
+
+    block = model.bert.encoder.layer[layer]
+    if not keep_neurons:
+        raise ValueError(f"layer {layer}: at least one FFN neuron must remain")
+    index = torch.tensor(sorted(keep_neurons), dtype=torch.long)
+    block.intermediate.dense = _slice_linear(block.intermediate.dense, index, dim=0)
+    block.output.dense = _slice_linear(block.output.dense, index, dim=1)
+
+
+def student_structure(model: TinyStudentModel) -> dict[str, list[int]]:
+    """Per-layer head counts / FFN widths, or {} for an unpruned student.
+
+    Stored under ``architecture`` in student_config.json so
+    load_student_from_dir can rebuild pruned shapes before loading weights.
+    """
+
+    config = model.bert.config
+    layers = model.bert.encoder.layer
+    heads = [int(block.attention.self.num_attention_heads) for block in layers]
+    widths = [int(block.intermediate.dense.out_features) for block in layers]
+    if all(n == config.num_attention_heads for n in heads) and all(
+        w == config.intermediate_size for w in widths
+    ):
+        return {}
+    return {"layer_num_heads": heads, "layer_intermediate_sizes": widths}
+
+
+def apply_student_structure(model: TinyStudentModel, arch: dict[str, Any]) -> None:
+    """Shrink a freshly built student to the per-layer shapes in ``arch``."""
+
+    for layer, num_heads in enumerate(arch.get("layer_num_heads") or []):
+        if (
+            num_heads
+            != model.bert.encoder.layer[layer].attention.self.num_attention_heads
+        ):
+            prune_student_heads(model, layer, range(int(num_heads)))
+    for layer, width in enumerate(arch.get("layer_intermediate_sizes") or []):
+        if width != model.bert.encoder.layer[layer].intermediate.dense.out_features:
+            prune_student_ffn(model, layer, range(int(width)))
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""Sweep tiny-student shapes against one teacher cache; report quality/latency/size.
+
+Every grid point is distilled from the same logits cache, exported to ONNX,
+dynamically int8-quantized, evaluated, and benchmarked on CPU at the requested
+batch sizes. Splits, the teacher cache, tokenizers (one per vocab size) and
+tokenized datasets are loaded once and shared by all runs, so the sweep costs
+roughly the student training time. Finished grid points are skipped on re-run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import shlex
+import shutil
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from onnxruntime.quantization import QuantType, quantize_dynamic
+
+from evaluate_transformer import infer_probs_onnx
+from export_transformer_student_onnx import export_student_onnx
+from onnx_benchmark import benchmark_onnx, parse_int_csv
+from student_runtime import load_student_from_dir
+from train_transformer_student_distill import (
+    DEFAULT_CACHE_TRAIN,
+    DEFAULT_CACHE_VALID,
+    DEFAULT_HOLDOUT,
+    DEFAULT_TRAIN,
+    DEFAULT_VALID,
+    StudentInputs,
+    build_arg_parser,
+    load_student_inputs,
+    run_student,
+    train_or_load_tokenizer,
+)
+from transformer_common import (
+    MODELS_DIR,
+    TRAINING_CLASSES,
+    PreparedRecord,
+    load_json,
+    predict_labels_from_probs,
+    save_json,
+    summarize_label_predictions,
+    utc_now_iso,
+)
+
+DEFAULT_OUT_DIR = MODELS_DIR / "student_sweep"
+
+
+@dataclass(frozen=True)
+class StudentShape:
+    hidden_size: int
+    num_hidden_layers: int
+    num_attention_heads: int
+    intermediate_size: int
+    vocab_size: int
+
+    @property
+    def name(self) -> str:
+        return (
+            f"h{self.hidden_size}-l{self.num_hidden_layers}-a{self.num_attention_heads}"
+            f"-i{self.intermediate_size}-v{self.vocab_size}"
+        )
+
+    def student_args(self) -> list[str]:
+        return [
+            "--hidden-size",
+            str(self.hidden_size),
+            "--num-hidden-layers",
+            str(self.num_hidden_layers),
+            "--num-attention-heads",
+            str(self.num_attention_heads),
+            "--intermediate-size",
+            str(self.intermediate_size),
+            "--vocab-size",
+            str(self.vocab_size),
+        ]
+
+
+def build_grid(
+    *,
+    hidden_sizes: list[int],
+    layer_counts: list[int],
+    intermediate_multipliers: list[int],
+    vocab_sizes: list[int],
+    head_dim: int,
+) -> list[StudentShape]:
+    grid: list[StudentShape] = []
+    for vocab_size in vocab_sizes:
+        for hidden_size in hidden_sizes:
+            if hidden_size % head_dim != 0:
+                raise SystemExit(
+                    f"--hidden-sizes entry {hidden_size} is not divisible by "
+                    f"--head-dim {head_dim}"
+                )
+            for num_layers in layer_counts:
+                for multiplier in intermediate_multipliers:
+                    grid.append(
+                        StudentShape(
+                            hidden_size=hidden_size,
+                            num_hidden_layers=num_layers,
+                            num_attention_heads=hidden_size // head_dim,
+                            intermediate_size=hidden_size * multiplier,
+                            vocab_size=vocab_size,
+                        )
+                    )
+    return grid
+
+
+def shared_tokenizer_dir(
+    *,
+    sweep_dir: Path,
+    inputs: StudentInputs,
+    student_args: argparse.Namespace,
+    vocab_size: int,
+) -> Path:
+    """Train (or reuse) the sweep-wide tokenizer for one vocab size."""
+
+    tokenizer_dir = sweep_dir / "tokenizers" / f"vocab_{vocab_size}"
+    train_or_load_tokenizer(
+        rows=inputs.train_rows,
+        tokenizer_dir=tokenizer_dir,
+        vocab_size=vocab_size,
+        min_frequency=student_args.min_frequency,
+        max_length=student_args.max_length,
+        max_unk_ratio=student_args.max_unk_ratio,
+        sanity_sample_size=student_args.tokenizer_sanity_sample_size,
+    )
+    return tokenizer_dir
+
+
+def onnx_quality(
+    rows: list[PreparedRecord],
+    *,
+    onnx_path: Path,
+    tokenizer,
+    max_length: int,
+    thresholds: dict,
+    batch_size: int,
+) -> dict:
+    scam_probs, topic_probs = infer_probs_onnx(
+        rows,
+        onnx_path=onnx_path,
+        tokenizer=tokenizer,
+        max_length=max_length,
+        batch_size=batch_size,
+    )
+    preds = predict_labels_from_probs(
+        scam_probs,
+        topic_probs,
+        scam_threshold=float(thresholds.get("scam", 0.5)),
+        topic_threshold=float(thresholds.get("topic_crypto", 0.5)),
+    )
+    return summarize_label_predictions(
+        [row.collapsed_label for row in rows], preds, classes=TRAINING_CLASSES
+    )
+
+
+def sweep_one(
+    shape: StudentShape,
+    *,
+    run_dir: Path,
+    tokenizer_dir: Path,
+    inputs: StudentInputs,
+    student_argv: list[str],
+    args: argparse.Namespace,
+    batch_sizes: list[int],
+) -> dict:
+    run_dir.mkdir(parents=True, exist_ok=True)
+    # The student script keeps an existing tokenizer that passes its sanity checks.
+    shutil.copytree(tokenizer_dir, run_dir / "tokenizer", dirs_exist_ok=True)
+    student_args = build_arg_parser().parse_args(
+        [
+            *student_argv,
+            *shape.student_args(),
+            "--output-dir",
+            str(run_dir),
+            "--run-name",
+            f"sweep-{shape.name}",
+        ]
+    )
+    run_student(student_args, inputs=inputs)
+
+    model, tokenizer, config = load_student_from_dir(run_dir)
+    max_length = int(config["architecture"]["max_length"])
+    fp32_path = run_dir / "student.onnx"
+    int8_path = run_dir / "student.int8.onnx"
+    export_student_onnx(model, fp32_path, max_length=max_length, opset=args.opset)
+    quantize_dynamic(
+        model_input=str(fp32_path),
+        model_output=str(int8_path),
+        weight_type=QuantType.QInt8,
+    )
+
+    thresholds = config.get("thresholds", {"scam": 0.5, "topic_crypto": 0.5})
+    quality = {
+        split: onnx_quality(
+            rows,
+            onnx_path=int8_path,
+            tokenizer=tokenizer,
+            max_length=max_length,
+            thresholds=thresholds,
+            batch_size=args.eval_batch_size,
+        )
+        for split, rows in (
+            ("valid", inputs.valid_rows),
+            ("holdout", inputs.holdout_rows),
+        )
+    }
+    benchmark = benchmark_onnx(
+        int8_path,
+        tokenizer=tokenizer,
+        texts=[row.text_normalized for row in inputs.valid_rows],
+        max_length=max_length,
+        batch_sizes=batch_sizes,
+        threads=args.latency_threads,
+        warmup=args.latency_warmup,
+        iters=args.latency_iters,
+    )
+    exported_params = sum(
+        param.numel()
+        for name, param in model.named_parameters()
+        if not name.startswith("teacher_projections.")
+    )
+    student_eval = load_json(run_dir / "student_eval.json")
+    result = {
+        "name": shape.name,
+        "shape": asdict(shape),
+        "run_dir": str(run_dir),
+        "params": int(exported_params),
+        "fp32_bytes": fp32_path.stat().st_size,
+        "int8_bytes": int8_path.stat().st_size,
+        "latency": benchmark["latency"],
+        "int8_valid_macro_f1": float(quality["valid"]["macro"]["f1"]),
+        "int8_holdout_macro_f1": float(quality["holdout"]["macro"]["f1"]),
+        "torch_holdout_macro_f1": float(student_eval["holdout"]["macro"]["f1"]),
+        "int8_metrics": quality,
+        "training": config["training"],
+        "created_at": utc_now_iso(),
+    }
+    save_json(run_dir / "sweep_result.json", result)
+    return result
+
+
+def pareto_front(results: list[dict], *, batch_sizes: list[int]) -> set[str]:
+    """Names not dominated on (valid F1 up; latency per batch size, size down)."""
+
+    def objectives(item: dict) -> list[float]:
+        return [
+            -item["int8_valid_macro_f1"],
+            *(item["latency"][str(size)]["p50_ms"] for size in batch_sizes),
+            float(item["int8_bytes"]),
+        ]
+
+    front: set[str] = set()
+    for item in results:
+        mine = objectives(item)
+        dominated = False
+        for other in results:
+            if other is item:
+                continue
+            theirs = objectives(other)
+            if all(t <= m for t, m in zip(theirs, mine)) and any(
+                t < m for t, m in zip(theirs, mine)
+            ):
+                dominated = True
+                break
+        if not dominated:
+            front.add(item["name"])
+    return front
+
+
+def render_table(
+    results: list[dict], *, front: set[str], batch_sizes: list[int]
+) -> str:
+    header = [
+        "pareto",
+        "shape",
+        "params (M)",
+        "int8 MB",
+        *(f"b{size} p50 ms" for size in batch_sizes),
+        "valid macro F1 (int8)",
+        "holdout macro F1 (int8)",
+    ]
+    lines = [
+        "| " + " | ".join(header) + " |",
+        "|" + "|".join("---" for _ in header) + "|",
+    ]
+    ordered = sorted(
+        results, key=lambda item: item["latency"][str(batch_sizes[0])]["p50_ms"]
+    )
+    for item in ordered:
+        cells = [
+            "*" if item["name"] in front else "",
+            item["name"],
+            f"{item['params'] / 1e6:.2f}",
+            f"{item['int8_bytes'] / (1024 * 1024):.2f}",
+            *(f"{item['latency'][str(size)]['p50_ms']:.2f}" for size in batch_sizes),
+            f"{item['int8_valid_macro_f1']:.4f}",
+            f"{item['int8_holdout_macro_f1']:.4f}",
+        ]
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines) + "\n"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--train", type=Path, default=DEFAULT_TRAIN)
+    parser.add_argument("--valid", type=Path, default=DEFAULT_VALID)
+    parser.add_argument("--holdout", type=Path, default=DEFAULT_HOLDOUT)
+    parser.add_argument("--cache-train", type=Path, default=DEFAULT_CACHE_TRAIN)
+    parser.add_argument("--cache-valid", type=Path, default=DEFAULT_CACHE_VALID)
+    parser.add_argument("--out-dir", type=Path, default=DEFAULT_OUT_DIR)
+    parser.add_argument("--hidden-sizes", type=str, default="128,192,256")
+    parser.add_argument("--num-hidden-layers", type=str, default="2,4")
+    parser.add_argument(
+        "--intermediate-multipliers",
+        type=str,
+        default="4",
+        help="intermediate_size = hidden_size * multiplier",
+    )
+    parser.add_argument("--vocab-sizes", type=str, default="8192")
+    parser.add_argument(
+        "--head-dim",
+        type=int,
+        default=48,
+        help="Attention heads = hidden_size / head_dim (192 -> 4 heads)",
+    )
+    parser.add_argument(
+        "--student-args",
+        type=str,
+        default="",
+        help="Extra train_transformer_student_distill.py flags for every run, "
+        "e.g. '--epochs 5 --device cpu'",
+    )
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--eval-batch-size", type=int, default=64)
+    parser.add_argument("--latency-batch-sizes", type=str, default="1,32")
+    parser.add_argument(
+        "--latency-threads",
+        type=int,
+        default=1,
+        help="ORT intra-op threads for latency (1 approximates on-device WASM)",
+    )
+    parser.add_argument("--latency-warmup", type=int, default=10)
+    parser.add_argument("--latency-iters", type=int, default=100)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-run grid points that already have a sweep_result.json",
+    )
+    args = parser.parse_args()
+
+    try:
+        grid = build_grid(
+            hidden_sizes=parse_int_csv(args.hidden_sizes),
+            layer_counts=parse_int_csv(args.num_hidden_layers),
+            intermediate_multipliers=parse_int_csv(args.intermediate_multipliers),
+            vocab_sizes=parse_int_csv(args.vocab_sizes),
+            head_dim=args.head_dim,
+        )
+        batch_sizes = parse_int_csv(args.latency_batch_sizes)
+    except ValueError as exc:
+        raise SystemExit(str(exc)) from exc
+
+    student_argv = [
+        "--train",
+        str(args.train),
+        "--valid",
+        str(args.valid),
+        "--holdout",
+        str(args.holdout),
+        "--cache-train",
+        str(args.cache_train),
+        "--cache-valid",
+        str(args.cache_valid),
+        *shlex.split(args.student_args),
+    ]
+    base_args = build_arg_parser().parse_args(student_argv)
+    if base_args.nproc != 1:
+        raise SystemExit("Sweeps train in-process; drop --nproc from --student-args")
+
+    print(f"Sweeping {len(grid)} student shapes into {args.out_dir}")
+    inputs: StudentInputs | None = None
+    tokenizer_dirs: dict[int, Path] = {}
+    results: list[dict] = []
+    for idx, shape in enumerate(grid, start=1):
+        run_dir = args.out_dir / "runs" / shape.name
+        result_path = run_dir / "sweep_result.json"
+        if result_path.exists() and not args.force:
+            print(f"[{idx}/{len(grid)}] {shape.name}: reusing {result_path}")
+            results.append(load_json(result_path))
+            continue
+
+        print(f"[{idx}/{len(grid)}] {shape.name}: training")
+        if inputs is None:
+            inputs = load_student_inputs(base_args)
+        if shape.vocab_size not in tokenizer_dirs:
+            tokenizer_dirs[shape.vocab_size] = shared_tokenizer_dir(
+                sweep_dir=args.out_dir,
+                inputs=inputs,
+                student_args=base_args,
+                vocab_size=shape.vocab_size,
+            )
+        result = sweep_one(
+            shape,
+            run_dir=run_dir,
+            tokenizer_dir=tokenizer_dirs[shape.vocab_size],
+            inputs=inputs,
+            student_argv=student_argv,
+            args=args,
+            batch_sizes=batch_sizes,
+        )
+        results.append(result)
+        stats = result["latency"][str(batch_sizes[0])]
+        print(
+            f"[{idx}/{len(grid)}] {shape.name}: "
+            f"valid_macro_f1={result['int8_valid_macro_f1']:.4f} "
+            f"b{batch_sizes[0]}_p50={stats['p50_ms']:.2f}ms "
+            f"int8={result['int8_bytes'] / (1024 * 1024):.2f}MB"
+        )
+
+    front = pareto_front(results, batch_sizes=batch_sizes)
+    table = render_table(results, front=front, batch_sizes=batch_sizes)
+    save_json(
+        args.out_dir / "sweep_results.json",
+        {
+            "version": 1,
+            "created_at": utc_now_iso(),
+            "student_args": args.student_args,
+            "latency": {
+                "batch_sizes": batch_sizes,
+                "threads": args.latency_threads,
+                "iters": args.latency_iters,
+            },
+            "pareto": sorted(front),
+            "results": results,
+        },
+    )
+    (args.out_dir / "pareto.md").write_text(table, encoding="utf-8")
+    print(table)
+    print(f"Wrote sweep results to {args.out_dir / 'sweep_results.json'}")
+    print(f"Wrote Pareto table to {args.out_dir / 'pareto.md'}")
+
+
+if __name__ == "__main__":
+    main()
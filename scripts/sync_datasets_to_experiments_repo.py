@@ -16,6 +16,7 @@ from typing import Any
 from run_naming import resolve_run_name
 
 REPO_ROOT = Path(__file__).resolve().parent.parent
+STATS_NAME = "STATS.json"  # snapshot_stats.STATS_NAME; imported lazily below
 DEFAULT_DEST_ROOT = Path("~/offline/janitr-experiments").expanduser()
 DEFAULT_X_POSTS_SOURCE = REPO_ROOT / "data" / "sample.jsonl"
 DEFAULT_X_REPLIES_SOURCE = REPO_ROOT / "data" / "replies.jsonl"
@@ -203,6 +204,7 @@ def main() -> int:
                 "destination": f"datasets/snapshots/{snapshot_id}/x-replies.jsonl",
             },
         },
+        "stats": f"datasets/snapshots/{snapshot_id}/{STATS_NAME}",
     }
 
     if args.dry_run:
@@ -215,10 +217,14 @@ def main() -> int:
         )
         return 0
 
+    # snapshot_stats needs numpy; keep it out of dry runs and the import path.
+    from snapshot_stats import write_snapshot_stats
+
     snapshot_dir.mkdir(parents=True, exist_ok=False)
     shutil.copy2(x_posts_source, snapshot_dir / "x-posts.jsonl")
     shutil.copy2(x_replies_source, snapshot_dir / "x-replies.jsonl")
     save_json(snapshot_dir / "SNAPSHOT.json", snapshot_entry)
+    stats_path = write_snapshot_stats(snapshot_dir)
 
     snapshots.append(snapshot_entry)
     index_payload["schema_version"] = 1
@@ -231,6 +237,7 @@ def main() -> int:
     print(f"[sync_datasets] x_replies_sha256: {x_replies_sha}")
     print(f"[sync_datasets] combined_sha256: {combined_sha}")
     print(f"[sync_datasets] wrote: {snapshot_dir}")
+    print(f"[sync_datasets] wrote: {stats_path}")
     print(f"[sync_datasets] wrote: {index_path}")
     return 0
 
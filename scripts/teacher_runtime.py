@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Shared teacher runtime helpers (architecture + selective CLS capture)."""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Sequence
+
+import torch
+from torch import nn
+from transformers import AutoModel
+
+
+class JanitrTeacherModel(nn.Module):
+    def __init__(
+        self, model_name_or_path: str, gradient_checkpointing: bool = False
+    ) -> None:
+        super().__init__()
+        self.encoder = AutoModel.from_pretrained(model_name_or_path)
+        if gradient_checkpointing:
+            self.encoder.gradient_checkpointing_enable()
+
+        hidden_size = int(self.encoder.config.hidden_size)
+        dropout_prob = float(getattr(self.encoder.config, "hidden_dropout_prob", 0.1))
+        self.dropout = nn.Dropout(dropout_prob)
+        self.head_scam_clean = nn.Linear(hidden_size, 2)
+        self.head_topic = nn.Linear(hidden_size, 1)
+
+    def hidden_state_module(self, index: int) -> nn.Module:
+        """Module whose output is ``hidden_states[index]`` in HF numbering.
+
+        Index 0 is the embedding output; index ``i`` is the output of encoder
+        layer ``i - 1``.
+        """
+
+        embeddings = getattr(self.encoder, "embeddings", None)
+        layers = getattr(getattr(self.encoder, "encoder", None), "layer", None)
+        if embeddings is None or layers is None:
+            raise SystemExit(
+                f"Unsupported teacher encoder layout: {type(self.encoder).__name__}"
+            )
+        if index < 0 or index > len(layers):
+            raise SystemExit(
+                f"Hidden layer index {index} out of range for {len(layers)} layers"
+            )
+        return embeddings if index == 0 else layers[index - 1]
+
+    def forward(
+        self,
+        *,
+        input_ids: torch.Tensor,
+        attention_mask: torch.Tensor,
+        cls_layers: Sequence[int] = (),
+    ) -> dict[str, torch.Tensor | None]:
+        """Run the teacher; ``cls_layers`` selects hidden states to keep.
+
+        Only the CLS vector of each requested layer is retained (cloned on
+        device inside a forward hook), so the full ``[batch, seq, hidden]``
+        activations are never materialised as outputs. ``hidden_cls`` is
+        ``[batch, len(cls_layers), hidden]`` or None when nothing was requested.
+        """
+
+        captured: dict[int, torch.Tensor] = {}
+        handles = [
+            self.hidden_state_module(index).register_forward_hook(
+                _cls_capture_hook(index, captured)
+            )
+            for index in dict.fromkeys(int(i) for i in cls_layers)
+        ]
+        try:
+            out = self.encoder(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                return_dict=True,
+            )
+        finally:
+            for handle in handles:
+                handle.remove()
+
+        pooled = self.dropout(out.last_hidden_state[:, 0])
+        return {
+            "scam_logits": self.head_scam_clean(pooled),
+            "topic_logits": self.head_topic(pooled),
+            "hidden_cls": (
+                torch.stack([captured[int(i)] for i in cls_layers], dim=1)
+                if cls_layers
+                else None
+            ),
+        }
+
+
+def _cls_capture_hook(
+    index: int, captured: dict[int, torch.Tensor]
+) -> Callable[[nn.Module, tuple, object], None]:
+    def hook(_module: nn.Module, _inputs: tuple, output: object) -> None:
+        hidden = output[0] if isinstance(output, tuple) else output
+        # clone() so the slice does not pin the whole layer activation.
+        captured[index] = hidden[:, 0].clone()
+
+    return hook
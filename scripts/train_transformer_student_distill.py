@@ -4,19 +4,40 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
+import os
+import shutil
+import socket
 from collections import Counter
+from collections.abc import Mapping
+from contextlib import nullcontext
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any
 
-import numpy as np
 import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
 import torch.nn.functional as F
 from tokenizers import BertWordPieceTokenizer
-from torch.utils.data import DataLoader, Dataset
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, Dataset, DistributedSampler
 from tqdm.auto import tqdm
 from transformers import BertConfig, BertTokenizerFast
 
+from length_batching import (
+    LengthBucketBatchSampler,
+    ThroughputMeter,
+    trim_to_longest,
+)
+from logits_store import open_logits_cache
 from run_naming import apply_run_name_template, resolve_run_name
-from student_runtime import TinyStudentModel
+from student_qat import QAT_SCHEME, enable_student_qat, snap_student_weights
+from student_runtime import (
+    TinyStudentModel,
+    apply_student_structure,
+    student_structure,
+)
 
 from transformer_common import (
     DATA_DIR,
@@ -24,12 +45,13 @@ from transformer_common import (
     TRAINING_CLASSES,
     PreparedRecord,
     assert_tokenizer_sanity,
+    autocast_settings,
     hash_label_map,
     hash_prepared_rows,
     load_json,
     load_prepared_rows,
     predict_labels_from_probs,
-    require_cuda,
+    resolve_device,
     save_json,
     set_seed,
     sigmoid,
@@ -41,8 +63,8 @@ from transformer_common import (
 DEFAULT_TRAIN = DATA_DIR / "transformer" / "train.prepared.jsonl"
 DEFAULT_VALID = DATA_DIR / "transformer" / "valid.prepared.jsonl"
 DEFAULT_HOLDOUT = DATA_DIR / "transformer" / "holdout.prepared.jsonl"
-DEFAULT_CACHE_TRAIN = MODELS_DIR / "teacher_logits_train.npz"
-DEFAULT_CACHE_VALID = MODELS_DIR / "teacher_logits_valid.npz"
+DEFAULT_CACHE_TRAIN = MODELS_DIR / "teacher_logits_train"
+DEFAULT_CACHE_VALID = MODELS_DIR / "teacher_logits_valid"
 DEFAULT_OUT_DIR = MODELS_DIR / "student"
 
 SPECIAL_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
@@ -59,17 +81,42 @@ REQUIRED_CACHE_META_KEYS = {
 }
 
 
+def encode_texts(
+    tokenizer: BertTokenizerFast, texts: list[str], max_length: int
+) -> dict[str, torch.Tensor]:
+    """Tokenize a whole split once, padded to max_length (trimmed per batch)."""
+
+    if not texts:
+        empty = torch.zeros((0, max_length), dtype=torch.long)
+        return {"input_ids": empty, "attention_mask": empty.clone()}
+    enc = tokenizer(
+        texts,
+        truncation=True,
+        padding="max_length",
+        max_length=max_length,
+        return_attention_mask=True,
+        return_tensors="pt",
+    )
+    return {
+        "input_ids": enc["input_ids"].long(),
+        "attention_mask": enc["attention_mask"].long(),
+    }
+
+
 class DistillTrainDataset(Dataset):
     def __init__(
         self,
         rows: list[PreparedRecord],
         tokenizer: BertTokenizerFast,
         max_length: int,
-        cache: dict[str, np.ndarray],
+        cache: Mapping[str, Any],
     ) -> None:
         self.rows = rows
         self.tokenizer = tokenizer
         self.max_length = max_length
+        self.encodings = encode_texts(
+            tokenizer, [row.text_normalized for row in rows], max_length
+        )
 
         ids = cache["ids"].tolist()
         self.id_to_idx = {str(sample_id): idx for idx, sample_id in enumerate(ids)}
@@ -84,22 +131,18 @@ class DistillTrainDataset(Dataset):
     def __len__(self) -> int:
         return len(self.rows)
 
+    def lengths(self) -> list[int]:
+        return self.encodings["attention_mask"].sum(dim=1).tolist()
+
     def __getitem__(self, idx: int) -> dict:
         row = self.rows[idx]
-        enc = self.tokenizer(
-            row.text_normalized,
-            truncation=True,
-            padding="max_length",
-            max_length=self.max_length,
-            return_attention_mask=True,
-        )
         cache_idx = self.id_to_idx[row.id]
 
         return {
             "id": row.id,
             "collapsed_label": row.collapsed_label,
-            "input_ids": torch.tensor(enc["input_ids"], dtype=torch.long),
-            "attention_mask": torch.tensor(enc["attention_mask"], dtype=torch.long),
+            "input_ids": self.encodings["input_ids"][idx],
+            "attention_mask": self.encodings["attention_mask"][idx],
             "y_scam_clean": torch.tensor(row.y_scam_clean, dtype=torch.long),
             "y_topic": torch.tensor(float(row.y_topics[0]), dtype=torch.float32),
             "teacher_scam_logits": torch.tensor(
@@ -121,24 +164,20 @@ class EvalDataset(Dataset):
         self.rows = rows
         self.tokenizer = tokenizer
         self.max_length = max_length
+        self.encodings = encode_texts(
+            tokenizer, [row.text_normalized for row in rows], max_length
+        )
 
     def __len__(self) -> int:
         return len(self.rows)
 
     def __getitem__(self, idx: int) -> dict:
         row = self.rows[idx]
-        enc = self.tokenizer(
-            row.text_normalized,
-            truncation=True,
-            padding="max_length",
-            max_length=self.max_length,
-            return_attention_mask=True,
-        )
         return {
             "id": row.id,
             "collapsed_label": row.collapsed_label,
-            "input_ids": torch.tensor(enc["input_ids"], dtype=torch.long),
-            "attention_mask": torch.tensor(enc["attention_mask"], dtype=torch.long),
+            "input_ids": self.encodings["input_ids"][idx],
+            "attention_mask": self.encodings["attention_mask"][idx],
             "y_scam_clean": torch.tensor(row.y_scam_clean, dtype=torch.long),
             "y_topic": torch.tensor(float(row.y_topics[0]), dtype=torch.float32),
         }
@@ -163,7 +202,68 @@ def collate(batch: list[dict]) -> dict:
         out["teacher_hidden_cls"] = torch.stack(
             [x["teacher_hidden_cls"] for x in batch]
         )
-    return out
+    return trim_to_longest(out)
+
+
+@dataclass
+class StudentDatasets:
+    train: DistillTrainDataset
+    valid: EvalDataset
+    holdout: EvalDataset
+
+
+def build_student_datasets(
+    *,
+    train_rows: list[PreparedRecord],
+    valid_rows: list[PreparedRecord],
+    holdout_rows: list[PreparedRecord],
+    cache_train: Mapping[str, Any],
+    tokenizer: BertTokenizerFast,
+    max_length: int,
+) -> StudentDatasets:
+    return StudentDatasets(
+        train=DistillTrainDataset(
+            rows=train_rows,
+            tokenizer=tokenizer,
+            max_length=max_length,
+            cache=cache_train,
+        ),
+        valid=EvalDataset(valid_rows, tokenizer=tokenizer, max_length=max_length),
+        holdout=EvalDataset(holdout_rows, tokenizer=tokenizer, max_length=max_length),
+    )
+
+
+@dataclass
+class StudentInputs:
+    """Prepared splits and teacher cache, loaded once and reusable across runs.
+
+    Tokenized datasets are memoised per (vocab file, max_length), so a sweep
+    over student shapes only pays for tokenization once per vocabulary.
+    """
+
+    train_rows: list[PreparedRecord]
+    valid_rows: list[PreparedRecord]
+    holdout_rows: list[PreparedRecord]
+    cache_train: Mapping[str, Any]
+    cache_train_meta: dict
+    cache_valid_meta: dict
+    datasets: dict[tuple[str, int], StudentDatasets] = field(default_factory=dict)
+
+    def datasets_for(
+        self, tokenizer: BertTokenizerFast, tokenizer_dir: Path, max_length: int
+    ) -> StudentDatasets:
+        vocab_hash = hashlib.sha256((tokenizer_dir / "vocab.txt").read_bytes())
+        key = (vocab_hash.hexdigest(), max_length)
+        if key not in self.datasets:
+            self.datasets[key] = build_student_datasets(
+                train_rows=self.train_rows,
+                valid_rows=self.valid_rows,
+                holdout_rows=self.holdout_rows,
+                cache_train=self.cache_train,
+                tokenizer=tokenizer,
+                max_length=max_length,
+            )
+        return self.datasets[key]
 
 
 def infer_cache_meta_path(cache_path: Path) -> Path:
@@ -336,13 +436,12 @@ def evaluate_model(
     dtype: str,
 ) -> dict:
     model.eval()
-    use_amp = device.type == "cuda" and dtype in {"fp16", "bf16"}
-    amp_dtype = torch.float16 if dtype == "fp16" else torch.bfloat16
+    use_amp, amp_dtype = autocast_settings(device.type, dtype)
 
     y_true: list[str] = []
     y_pred: list[str] = []
 
-    with torch.no_grad():
+    with torch.inference_mode():
         for batch in loader:
             input_ids = batch["input_ids"].to(device)
             attention_mask = batch["attention_mask"].to(device)
@@ -369,7 +468,76 @@ def evaluate_model(
     return summarize_label_predictions(y_true, y_pred, classes=TRAINING_CLASSES)
 
 
-def main() -> None:
+DISTILL_TARGET_KEYS = (
+    "y_scam_clean",
+    "y_topic",
+    "teacher_scam_logits",
+    "teacher_topic_logit",
+    "teacher_hidden_cls",
+)
+
+
+def distillation_loss(
+    out: dict,
+    targets: Mapping[str, torch.Tensor],
+    *,
+    teacher_projections: torch.nn.ModuleList,
+    ce_weight: torch.Tensor,
+    topic_pos_weight: torch.Tensor,
+    args: argparse.Namespace,
+) -> torch.Tensor:
+    """Hard-label + soft-teacher + CLS hidden-state loss for one batch.
+
+    ``out`` is the student's ``output_hidden_states=True`` dict and
+    ``targets`` holds the DISTILL_TARGET_KEYS tensors, already on device.
+    """
+
+    student_scam_logits = out["scam_logits"]
+    student_topic_logits = out["topic_logits"]
+
+    hard_ce = F.cross_entropy(
+        student_scam_logits, targets["y_scam_clean"], weight=ce_weight
+    )
+    hard_topic = F.binary_cross_entropy_with_logits(
+        student_topic_logits,
+        targets["y_topic"],
+        pos_weight=topic_pos_weight,
+    )
+    hard_loss = hard_ce + hard_topic
+
+    t = args.distill_temp
+    teacher_scam_probs = F.softmax(targets["teacher_scam_logits"] / t, dim=-1)
+    student_scam_log_probs = F.log_softmax(student_scam_logits / t, dim=-1)
+    soft_scam = F.kl_div(
+        student_scam_log_probs,
+        teacher_scam_probs,
+        reduction="batchmean",
+    ) * (t * t)
+
+    teacher_topic_probs = torch.sigmoid(targets["teacher_topic_logit"] / t)
+    soft_topic = F.binary_cross_entropy_with_logits(
+        student_topic_logits / t,
+        teacher_topic_probs,
+    ) * (t * t)
+    soft_loss = soft_scam + soft_topic
+
+    student_hidden_states = out["hidden_states"]
+    teacher_hidden = targets["teacher_hidden_cls"]
+    hidden_losses: list[torch.Tensor] = []
+    for idx, projection in enumerate(teacher_projections):
+        student_cls = student_hidden_states[idx + 1][:, 0, :]
+        proj_teacher = projection(teacher_hidden[:, idx, :])
+        hidden_losses.append(F.mse_loss(student_cls, proj_teacher))
+    hidden_loss = torch.stack(hidden_losses).mean()
+
+    return (
+        args.alpha * hard_loss
+        + (1.0 - args.alpha) * soft_loss
+        + args.hidden_loss_weight * hidden_loss
+    )
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("--train", type=Path, default=DEFAULT_TRAIN)
     parser.add_argument("--valid", type=Path, default=DEFAULT_VALID)
@@ -385,6 +553,13 @@ def main() -> None:
         default=None,
         help="Run name. Defaults to yyyy-mm-dd-<petname>. Use {run_name} in --output-dir to template.",
     )
+    parser.add_argument(
+        "--init-from",
+        type=Path,
+        default=None,
+        help="Start from an existing student dir (architecture incl. per-layer "
+        "pruned shapes, tokenizer and weights), e.g. to fine-tune a pruned student",
+    )
     parser.add_argument("--seed", type=int, default=42)
     parser.add_argument("--epochs", type=int, default=10)
     parser.add_argument("--batch-size", type=int, default=32)
@@ -405,22 +580,54 @@ def main() -> None:
     parser.add_argument("--num-attention-heads", type=int, default=4)
     parser.add_argument("--intermediate-size", type=int, default=768)
     parser.add_argument("--dropout", type=float, default=0.1)
+    parser.add_argument(
+        "--qat-epochs",
+        type=int,
+        default=0,
+        help="Train the last N epochs with int8 fake-quant matching ORT dynamic "
+        "quantization (0 disables QAT)",
+    )
     parser.add_argument("--scam-threshold", type=float, default=0.5)
     parser.add_argument("--topic-threshold", type=float, default=0.5)
+    parser.add_argument(
+        "--no-length-bucketing",
+        action="store_true",
+        help="Shuffle rows uniformly instead of batching rows of similar length",
+    )
+    parser.add_argument(
+        "--bucket-batches",
+        type=int,
+        default=50,
+        help="Batches per length bucket (larger = less padding, less randomness)",
+    )
+    parser.add_argument(
+        "--device",
+        choices=["cuda", "cpu", "auto"],
+        default="cuda",
+        help="Training device. 'auto' picks CUDA when available, else CPU.",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="CPU intra-op threads (per process when --nproc > 1)",
+    )
+    parser.add_argument(
+        "--nproc",
+        type=int,
+        default=1,
+        help="Local CPU training processes (DistributedDataParallel over gloo)",
+    )
     parser.add_argument(
         "--dtype",
         choices=["fp16", "bf16", "fp32"],
-        default="bf16"
-        if torch.cuda.is_available() and torch.cuda.is_bf16_supported()
-        else "fp16",
+        default=None,
+        help="Autocast dtype (CUDA default: bf16 if supported, else fp16; CPU default: fp32)",
     )
-    args = parser.parse_args()
+    return parser
 
-    run_name = resolve_run_name(args.run_name)
-    output_dir = apply_run_name_template(args.output_dir, run_name)
-
-    set_seed(args.seed)
 
+def load_student_inputs(args: argparse.Namespace) -> StudentInputs:
     for path in (
         args.train,
         args.valid,
@@ -456,13 +663,57 @@ def main() -> None:
         f"seeds={','.join(str(s) for s in cache_train_meta['seeds'])}"
     )
 
-    with np.load(args.cache_train, allow_pickle=True) as cache_train_npz:
-        cache_train = {key: cache_train_npz[key] for key in cache_train_npz.files}
-    teacher_hidden_size = int(cache_train["teacher_hidden_cls"].shape[-1])
+    return StudentInputs(
+        train_rows=train_rows,
+        valid_rows=valid_rows,
+        holdout_rows=holdout_rows,
+        cache_train=open_logits_cache(args.cache_train),
+        cache_train_meta=cache_train_meta,
+        cache_valid_meta=cache_valid_meta,
+    )
+
+
+def main() -> None:
+    run_student(build_arg_parser().parse_args())
+
+
+def run_student(
+    args: argparse.Namespace, *, inputs: StudentInputs | None = None
+) -> Path:
+    """Train one student; returns its output directory.
+
+    Pass `inputs` to reuse already loaded splits, cache and tokenized datasets
+    (sweep_student_arch.py does this for every grid point).
+    """
+
+    if args.nproc < 1:
+        raise SystemExit("--nproc must be >= 1")
+    if args.bucket_batches < 1:
+        raise SystemExit("--bucket-batches must be >= 1")
+    if not 0 <= args.qat_epochs <= args.epochs:
+        raise SystemExit("--qat-epochs must be between 0 and --epochs")
+
+    run_name = resolve_run_name(args.run_name)
+    output_dir = apply_run_name_template(args.output_dir, run_name)
+
+    set_seed(args.seed)
+
+    if inputs is None:
+        inputs = load_student_inputs(args)
+    cache_train_meta = inputs.cache_train_meta
+    cache_valid_meta = inputs.cache_valid_meta
+    teacher_hidden_size = int(inputs.cache_train["teacher_hidden_cls"].shape[-1])
 
     tokenizer_dir = output_dir / "tokenizer"
+    init_arch = None
+    if args.init_from is not None:
+        init_arch = adopt_init_student(
+            args,
+            output_dir=output_dir,
+            teacher_hidden_size=teacher_hidden_size,
+        )
     tokenizer = train_or_load_tokenizer(
-        rows=train_rows,
+        rows=inputs.train_rows,
         tokenizer_dir=tokenizer_dir,
         vocab_size=args.vocab_size,
         min_frequency=args.min_frequency,
@@ -489,24 +740,204 @@ def main() -> None:
         pad_token_id=tokenizer.pad_token_id,
     )
 
-    device = require_cuda(context="train_transformer_student_distill.py")
-
-    model = TinyStudentModel(config, teacher_hidden_size=teacher_hidden_size).to(device)
-
-    train_ds = DistillTrainDataset(
-        rows=train_rows,
-        tokenizer=tokenizer,
-        max_length=args.max_length,
-        cache=cache_train,
+    device = resolve_device(
+        args.device,
+        context="train_transformer_student_distill.py",
+        threads=args.threads if args.nproc == 1 else None,
     )
-    valid_ds = EvalDataset(valid_rows, tokenizer=tokenizer, max_length=args.max_length)
-    holdout_ds = EvalDataset(
-        holdout_rows, tokenizer=tokenizer, max_length=args.max_length
+    if args.dtype is None:
+        if device.type == "cuda":
+            args.dtype = "bf16" if torch.cuda.is_bf16_supported() else "fp16"
+        else:
+            args.dtype = "fp32"
+    autocast_settings(device.type, args.dtype)
+    if device.type == "cpu" and args.dtype == "bf16" and not cpu_supports_bf16():
+        print(
+            "Warning: this CPU has no native bf16 support; bf16 autocast will be "
+            "emulated and is likely slower than fp32."
+        )
+    if args.nproc > 1:
+        if device.type != "cpu":
+            raise SystemExit("--nproc > 1 is only supported with --device cpu")
+        if args.batch_size % args.nproc != 0:
+            raise SystemExit(
+                f"--batch-size {args.batch_size} must be divisible by --nproc {args.nproc} "
+                "so the global batch matches a single-process run"
+            )
+    threads = args.threads
+    if args.nproc > 1 and threads is None:
+        threads = max(1, (os.cpu_count() or 1) // args.nproc)
+
+    run = StudentRun(
+        args=args,
+        run_name=run_name,
+        output_dir=output_dir,
+        tokenizer_dir=tokenizer_dir,
+        tokenizer=tokenizer,
+        config=config,
+        teacher_hidden_size=teacher_hidden_size,
+        vocab_size_actual=vocab_size_actual,
+        cache_train_meta=cache_train_meta,
+        cache_valid_meta=cache_valid_meta,
+        device_type=device.type,
+        threads=threads,
+        init_arch=init_arch,
+        # DDP processes tokenize for themselves rather than unpickling copies.
+        datasets=inputs.datasets_for(tokenizer, tokenizer_dir, args.max_length)
+        if args.nproc == 1
+        else None,
     )
 
-    train_loader = DataLoader(
-        train_ds, batch_size=args.batch_size, shuffle=True, collate_fn=collate
-    )
+    if args.nproc > 1:
+        os.environ.setdefault("MASTER_ADDR", "127.0.0.1")
+        os.environ.setdefault("MASTER_PORT", str(find_free_port()))
+        print(f"Launching {args.nproc} CPU training processes (gloo DDP)")
+        mp.spawn(train_worker, args=(args.nproc, run), nprocs=args.nproc, join=True)
+    else:
+        train_worker(0, 1, run)
+    return output_dir
+
+
+def cpu_supports_bf16() -> bool:
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def find_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+@dataclass
+class StudentRun:
+    """Everything a training process needs; picklable for mp.spawn."""
+
+    args: argparse.Namespace
+    run_name: str
+    output_dir: Path
+    tokenizer_dir: Path
+    tokenizer: BertTokenizerFast
+    config: BertConfig
+    teacher_hidden_size: int
+    vocab_size_actual: int
+    cache_train_meta: dict
+    cache_valid_meta: dict
+    device_type: str
+    threads: int | None
+    datasets: StudentDatasets | None = None
+    init_arch: dict | None = None
+
+
+def adopt_init_student(
+    args: argparse.Namespace, *, output_dir: Path, teacher_hidden_size: int
+) -> dict:
+    """Take architecture and tokenizer from --init-from; returns its architecture."""
+
+    init_dir = args.init_from
+    for path in (init_dir / "student_config.json", init_dir / "pytorch_model.bin"):
+        if not path.exists():
+            raise SystemExit(f"--init-from is missing {path}")
+    if init_dir.resolve() == output_dir.resolve():
+        raise SystemExit("--init-from must differ from --output-dir")
+    arch = load_json(init_dir / "student_config.json")["architecture"]
+    if int(arch["teacher_hidden_size"]) != teacher_hidden_size:
+        raise SystemExit(
+            f"--init-from student expects teacher hidden size {arch['teacher_hidden_size']}, "
+            f"cache has {teacher_hidden_size}"
+        )
+    args.vocab_size = int(arch["vocab_size"])
+    args.hidden_size = int(arch["hidden_size"])
+    args.num_hidden_layers = int(arch["num_hidden_layers"])
+    args.num_attention_heads = int(arch["num_attention_heads"])
+    args.intermediate_size = int(arch["intermediate_size"])
+    args.max_length = int(arch["max_length"])
+    tokenizer_dir = output_dir / "tokenizer"
+    if not (tokenizer_dir / "vocab.txt").exists():
+        shutil.copytree(init_dir / "tokenizer", tokenizer_dir, dirs_exist_ok=True)
+    return arch
+
+
+def train_worker(rank: int, world_size: int, run: StudentRun) -> None:
+    args = run.args
+    config = run.config
+    tokenizer = run.tokenizer
+    output_dir = run.output_dir
+    tokenizer_dir = run.tokenizer_dir
+    run_name = run.run_name
+    teacher_hidden_size = run.teacher_hidden_size
+    vocab_size_actual = run.vocab_size_actual
+    cache_train_meta = run.cache_train_meta
+    cache_valid_meta = run.cache_valid_meta
+    distributed = world_size > 1
+    is_main = rank == 0
+
+    if distributed:
+        if run.threads is not None:
+            torch.set_num_threads(run.threads)
+        dist.init_process_group("gloo", rank=rank, world_size=world_size)
+    device = torch.device(run.device_type)
+
+    set_seed(args.seed)
+
+    datasets = run.datasets
+    if datasets is None:
+        datasets = build_student_datasets(
+            train_rows=load_prepared_rows(args.train),
+            valid_rows=load_prepared_rows(args.valid),
+            holdout_rows=load_prepared_rows(args.holdout),
+            cache_train=open_logits_cache(args.cache_train),
+            tokenizer=tokenizer,
+            max_length=args.max_length,
+        )
+    train_ds, valid_ds, holdout_ds = datasets.train, datasets.valid, datasets.holdout
+    train_rows = train_ds.rows
+
+    model = TinyStudentModel(config, teacher_hidden_size=teacher_hidden_size)
+    if run.init_arch is not None:
+        apply_student_structure(model, run.init_arch)
+        model.load_state_dict(
+            torch.load(args.init_from / "pytorch_model.bin", map_location="cpu")
+        )
+    model = model.to(device)
+    core_model = model
+    if distributed:
+        # Construction broadcasts rank 0's initial weights to every process.
+        model = DistributedDataParallel(model)
+
+    train_sampler: LengthBucketBatchSampler | DistributedSampler | None = None
+    if not args.no_length_bucketing:
+        train_sampler = LengthBucketBatchSampler(
+            train_ds.lengths(),
+            args.batch_size // world_size,
+            seed=args.seed,
+            bucket_batches=args.bucket_batches,
+            num_replicas=world_size,
+            rank=rank,
+        )
+        train_loader = DataLoader(
+            train_ds, batch_sampler=train_sampler, collate_fn=collate
+        )
+    elif distributed:
+        train_sampler = DistributedSampler(
+            train_ds,
+            num_replicas=world_size,
+            rank=rank,
+            shuffle=True,
+            seed=args.seed,
+        )
+        train_loader = DataLoader(
+            train_ds,
+            batch_size=args.batch_size // world_size,
+            sampler=train_sampler,
+            collate_fn=collate,
+        )
+    else:
+        train_loader = DataLoader(
+            train_ds, batch_size=args.batch_size, shuffle=True, collate_fn=collate
+        )
     valid_loader = DataLoader(
         valid_ds, batch_size=args.eval_batch_size, shuffle=False, collate_fn=collate
     )
@@ -522,86 +953,68 @@ def main() -> None:
     optimizer = torch.optim.AdamW(
         model.parameters(), lr=args.lr, weight_decay=args.weight_decay
     )
-    use_amp = device.type == "cuda" and args.dtype in {"fp16", "bf16"}
+    use_amp, amp_dtype = autocast_settings(device.type, args.dtype)
     scaler = torch.cuda.amp.GradScaler(enabled=(use_amp and args.dtype == "fp16"))
-    amp_dtype = torch.float16 if args.dtype == "fp16" else torch.bfloat16
 
     best_state: dict[str, torch.Tensor] | None = None
     best_valid_macro_f1 = -1.0
+    epoch_throughput: list[dict[str, float]] = []
 
+    qat_start_epoch = args.epochs - args.qat_epochs + 1 if args.qat_epochs else None
     for epoch in range(1, args.epochs + 1):
+        if epoch == qat_start_epoch:
+            swapped = enable_student_qat(core_model)
+            # Only int8-simulated epochs are eligible as the exported checkpoint.
+            best_state = None
+            best_valid_macro_f1 = -1.0
+            if is_main:
+                print(f"epoch={epoch} enabling QAT fake-quant on {swapped} modules")
         model.train()
+        if train_sampler is not None:
+            train_sampler.set_epoch(epoch)
         running_loss = 0.0
         optimizer.zero_grad(set_to_none=True)
+        meter = ThroughputMeter()
 
         progress = tqdm(
-            train_loader, desc=f"student epoch {epoch}/{args.epochs}", leave=False
+            train_loader,
+            desc=f"student epoch {epoch}/{args.epochs}",
+            leave=False,
+            # Only rank 0 reports progress; keep TQDM_DISABLE working there.
+            **({} if is_main else {"disable": True}),
         )
         for step, batch in enumerate(progress, start=1):
             input_ids = batch["input_ids"].to(device)
             attention_mask = batch["attention_mask"].to(device)
-            y_scam = batch["y_scam_clean"].to(device)
-            y_topic = batch["y_topic"].to(device)
-
-            teacher_scam_logits = batch["teacher_scam_logits"].to(device)
-            teacher_topic_logit = batch["teacher_topic_logit"].to(device)
-            teacher_hidden = batch["teacher_hidden_cls"].to(device)
-
-            with torch.autocast(
-                device_type=device.type, enabled=use_amp, dtype=amp_dtype
-            ):
-                out = model(
-                    input_ids=input_ids,
-                    attention_mask=attention_mask,
-                    output_hidden_states=True,
-                )
-                student_scam_logits = out["scam_logits"]
-                student_topic_logits = out["topic_logits"]
-
-                hard_ce = F.cross_entropy(student_scam_logits, y_scam, weight=ce_weight)
-                hard_topic = F.binary_cross_entropy_with_logits(
-                    student_topic_logits,
-                    y_topic,
-                    pos_weight=topic_pos_weight,
-                )
-                hard_loss = hard_ce + hard_topic
-
-                t = args.distill_temp
-                teacher_scam_probs = F.softmax(teacher_scam_logits / t, dim=-1)
-                student_scam_log_probs = F.log_softmax(student_scam_logits / t, dim=-1)
-                soft_scam = F.kl_div(
-                    student_scam_log_probs, teacher_scam_probs, reduction="batchmean"
-                ) * (t * t)
-
-                teacher_topic_probs = torch.sigmoid(teacher_topic_logit / t)
-                soft_topic = F.binary_cross_entropy_with_logits(
-                    student_topic_logits / t,
-                    teacher_topic_probs,
-                ) * (t * t)
-                soft_loss = soft_scam + soft_topic
-
-                student_hidden_states = out["hidden_states"]
-                hidden_losses: list[torch.Tensor] = []
-                for idx in range(config.num_hidden_layers):
-                    student_cls = student_hidden_states[idx + 1][:, 0, :]
-                    teacher_cls = teacher_hidden[:, idx, :]
-                    proj_teacher = model.teacher_projections[idx](teacher_cls)
-                    hidden_losses.append(F.mse_loss(student_cls, proj_teacher))
-                hidden_loss = torch.stack(hidden_losses).mean()
-
-                loss = (
-                    args.alpha * hard_loss
-                    + (1.0 - args.alpha) * soft_loss
-                    + args.hidden_loss_weight * hidden_loss
-                )
-                loss_scaled = loss / args.grad_accum_steps
+            targets = {key: batch[key].to(device) for key in DISTILL_TARGET_KEYS}
+
+            is_step = step % args.grad_accum_steps == 0 or step == len(train_loader)
+            sync_ctx = model.no_sync() if distributed and not is_step else nullcontext()
+            with sync_ctx:
+                with torch.autocast(
+                    device_type=device.type, enabled=use_amp, dtype=amp_dtype
+                ):
+                    out = model(
+                        input_ids=input_ids,
+                        attention_mask=attention_mask,
+                        output_hidden_states=True,
+                    )
+                    loss = distillation_loss(
+                        out,
+                        targets,
+                        teacher_projections=core_model.teacher_projections,
+                        ce_weight=ce_weight,
+                        topic_pos_weight=topic_pos_weight,
+                        args=args,
+                    )
+                    loss_scaled = loss / args.grad_accum_steps
 
-            if scaler.is_enabled():
-                scaler.scale(loss_scaled).backward()
-            else:
-                loss_scaled.backward()
+                if scaler.is_enabled():
+                    scaler.scale(loss_scaled).backward()
+                else:
+                    loss_scaled.backward()
 
-            if step % args.grad_accum_steps == 0 or step == len(train_loader):
+            if is_step:
                 if scaler.is_enabled():
                     scaler.step(optimizer)
                     scaler.update()
@@ -610,29 +1023,50 @@ def main() -> None:
                 optimizer.zero_grad(set_to_none=True)
 
             running_loss += float(loss.item())
+            meter.update(batch["attention_mask"])
             progress.set_postfix(loss=f"{loss.item():.4f}")
 
-        valid_metrics = evaluate_model(
-            model=model,
-            loader=valid_loader,
-            device=device,
-            scam_threshold=args.scam_threshold,
-            topic_threshold=args.topic_threshold,
-            dtype=args.dtype,
-        )
-        valid_macro_f1 = float(valid_metrics["macro"]["f1"])
-        print(
-            f"epoch={epoch} train_loss={running_loss / max(1, len(train_loader)):.4f} "
-            f"valid_macro_f1={valid_macro_f1:.4f}"
-        )
-
-        if valid_macro_f1 > best_valid_macro_f1:
-            best_valid_macro_f1 = valid_macro_f1
-            best_state = {k: v.detach().cpu() for k, v in model.state_dict().items()}
+        throughput = meter.summary(world_size=world_size)
+        epoch_throughput.append(throughput)
+
+        if is_main:
+            valid_metrics = evaluate_model(
+                model=core_model,
+                loader=valid_loader,
+                device=device,
+                scam_threshold=args.scam_threshold,
+                topic_threshold=args.topic_threshold,
+                dtype=args.dtype,
+            )
+            valid_macro_f1 = float(valid_metrics["macro"]["f1"])
+            print(
+                f"epoch={epoch} train_loss={running_loss / max(1, len(train_loader)):.4f} "
+                f"valid_macro_f1={valid_macro_f1:.4f} "
+                f"samples_per_sec={throughput['samples_per_sec']:.1f} "
+                f"tokens_per_sec={throughput['tokens_per_sec']:.0f} "
+                f"padding_efficiency={throughput['padding_efficiency']:.3f}"
+            )
 
+            if valid_macro_f1 > best_valid_macro_f1:
+                best_valid_macro_f1 = valid_macro_f1
+                best_state = {
+                    k: v.detach().cpu().clone()
+                    for k, v in core_model.state_dict().items()
+                }
+        if distributed:
+            dist.barrier()
+
+    if distributed:
+        dist.destroy_process_group()
+    if not is_main:
+        return
+
+    model = core_model
     if best_state is None:
         best_state = {k: v.detach().cpu() for k, v in model.state_dict().items()}
     model.load_state_dict(best_state)
+    if qat_start_epoch is not None:
+        snap_student_weights(model)
 
     output_dir.mkdir(parents=True, exist_ok=True)
     torch.save(model.state_dict(), output_dir / "pytorch_model.bin")
@@ -666,8 +1100,10 @@ def main() -> None:
             "max_length": args.max_length,
             "vocab_size": vocab_size_actual,
             "teacher_hidden_size": teacher_hidden_size,
+            **student_structure(model),
         },
         "training": {
+            "init_from": str(args.init_from) if args.init_from else None,
             "epochs": args.epochs,
             "batch_size": args.batch_size,
             "lr": args.lr,
@@ -676,9 +1112,32 @@ def main() -> None:
             "alpha": args.alpha,
             "hidden_loss_weight": args.hidden_loss_weight,
             "dtype": args.dtype,
+            "device": device.type,
+            "nproc": world_size,
+            "threads": torch.get_num_threads() if device.type == "cpu" else None,
+            "length_bucketing": not args.no_length_bucketing,
+            "bucket_batches": args.bucket_batches,
+            **{
+                key: round(
+                    sum(x[key] for x in epoch_throughput)
+                    / max(1, len(epoch_throughput)),
+                    4,
+                )
+                for key in ("samples_per_sec", "tokens_per_sec", "padding_efficiency")
+            },
+            "epoch_throughput": epoch_throughput,
             "seed": args.seed,
             "output_dir": str(output_dir),
         },
+        "qat": (
+            {
+                "scheme": QAT_SCHEME,
+                "epochs": args.qat_epochs,
+                "start_epoch": qat_start_epoch,
+            }
+            if qat_start_epoch is not None
+            else None
+        ),
         "thresholds": {
             "scam": args.scam_threshold,
             "topic_crypto": args.topic_threshold,
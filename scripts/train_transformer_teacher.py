@@ -14,23 +14,30 @@ from pathlib import Path
 import numpy as np
 import torch
 import torch.nn.functional as F
-from torch import nn
 from torch.utils.data import DataLoader, Dataset
 from tqdm.auto import tqdm
-from transformers import AutoModel, AutoTokenizer
+from transformers import AutoTokenizer
 
+from length_batching import (
+    LengthBucketBatchSampler,
+    ThroughputMeter,
+    token_lengths,
+    trim_to_longest,
+)
 from run_naming import apply_run_name_template, resolve_run_name
+from teacher_runtime import JanitrTeacherModel
 from transformer_common import (
     DATA_DIR,
     MODELS_DIR,
     TRAINING_CLASSES,
     PreparedRecord,
+    autocast_settings,
     current_git_commit,
     decision_from_probs,
     hash_prepared_rows,
     load_prepared_rows,
     parse_seed_csv,
-    require_cuda,
+    resolve_device,
     save_json,
     set_seed,
     sigmoid,
@@ -48,46 +55,6 @@ DEFAULT_HOLDOUT = DATA_DIR / "transformer" / "holdout.prepared.jsonl"
 DEFAULT_OUTPUT = MODELS_DIR / "teacher"
 
 
-class JanitrTeacherModel(nn.Module):
-    def __init__(self, model_name_or_path: str, gradient_checkpointing: bool) -> None:
-        super().__init__()
-        self.encoder = AutoModel.from_pretrained(
-            model_name_or_path,
-            output_hidden_states=True,
-        )
-        if gradient_checkpointing:
-            self.encoder.gradient_checkpointing_enable()
-
-        hidden_size = int(self.encoder.config.hidden_size)
-        dropout_prob = float(getattr(self.encoder.config, "hidden_dropout_prob", 0.1))
-        self.dropout = nn.Dropout(dropout_prob)
-        self.head_scam_clean = nn.Linear(hidden_size, 2)
-        self.head_topic = nn.Linear(hidden_size, 1)
-
-    def forward(
-        self,
-        *,
-        input_ids: torch.Tensor,
-        attention_mask: torch.Tensor,
-        output_hidden_states: bool = False,
-    ) -> dict[str, torch.Tensor | tuple[torch.Tensor, ...] | None]:
-        out = self.encoder(
-            input_ids=input_ids,
-            attention_mask=attention_mask,
-            output_hidden_states=output_hidden_states,
-            return_dict=True,
-        )
-        cls = out.last_hidden_state[:, 0]
-        pooled = self.dropout(cls)
-        scam_logits = self.head_scam_clean(pooled)
-        topic_logits = self.head_topic(pooled)
-        return {
-            "scam_logits": scam_logits,
-            "topic_logits": topic_logits,
-            "hidden_states": out.hidden_states if output_hidden_states else None,
-        }
-
-
 class PreparedDataset(Dataset):
     def __init__(self, rows: list[PreparedRecord], tokenizer, max_length: int) -> None:
         self.rows = rows
@@ -135,15 +102,17 @@ def collate(batch: list[dict]) -> dict:
         out["y_scam_clean"].append(item["y_scam_clean"])
         out["y_topic"].append(item["y_topic"])
 
-    return {
-        "id": out["id"],
-        "text": out["text"],
-        "collapsed_label": out["collapsed_label"],
-        "input_ids": torch.stack(out["input_ids"]),
-        "attention_mask": torch.stack(out["attention_mask"]),
-        "y_scam_clean": torch.stack(out["y_scam_clean"]),
-        "y_topic": torch.stack(out["y_topic"]),
-    }
+    return trim_to_longest(
+        {
+            "id": out["id"],
+            "text": out["text"],
+            "collapsed_label": out["collapsed_label"],
+            "input_ids": torch.stack(out["input_ids"]),
+            "attention_mask": torch.stack(out["attention_mask"]),
+            "y_scam_clean": torch.stack(out["y_scam_clean"]),
+            "y_topic": torch.stack(out["y_topic"]),
+        }
+    )
 
 
 @dataclass
@@ -176,12 +145,6 @@ def compute_loss_weights(
     return LossWeights(ce_weight=ce_weight, bce_pos_weight=pos_weight)
 
 
-def get_amp_dtype(dtype: str) -> torch.dtype:
-    if dtype == "fp16":
-        return torch.float16
-    return torch.bfloat16
-
-
 def train_one_seed(
     *,
     seed: int,
@@ -201,11 +164,12 @@ def train_one_seed(
     eval_batch_size: int,
     scam_threshold: float,
     topic_threshold: float,
+    device: torch.device,
+    length_bucketing: bool,
+    bucket_batches: int,
 ) -> dict:
     set_seed(seed)
 
-    device = require_cuda(context=f"train_transformer_teacher.py seed={seed}")
-
     tokenizer = AutoTokenizer.from_pretrained(model_name_or_path)
     model = JanitrTeacherModel(
         model_name_or_path=model_name_or_path,
@@ -216,9 +180,23 @@ def train_one_seed(
     valid_ds = PreparedDataset(valid_rows, tokenizer, max_length=max_length)
     holdout_ds = PreparedDataset(holdout_rows, tokenizer, max_length=max_length)
 
-    train_loader = DataLoader(
-        train_ds, batch_size=batch_size, shuffle=True, collate_fn=collate
-    )
+    train_sampler: LengthBucketBatchSampler | None = None
+    if length_bucketing:
+        train_sampler = LengthBucketBatchSampler(
+            token_lengths(
+                tokenizer, [row.text_normalized for row in train_rows], max_length
+            ),
+            batch_size,
+            seed=seed,
+            bucket_batches=bucket_batches,
+        )
+        train_loader = DataLoader(
+            train_ds, batch_sampler=train_sampler, collate_fn=collate
+        )
+    else:
+        train_loader = DataLoader(
+            train_ds, batch_size=batch_size, shuffle=True, collate_fn=collate
+        )
     valid_loader = DataLoader(
         valid_ds, batch_size=eval_batch_size, shuffle=False, collate_fn=collate
     )
@@ -229,17 +207,20 @@ def train_one_seed(
     weights = compute_loss_weights(train_rows, device)
     optimizer = torch.optim.AdamW(model.parameters(), lr=lr, weight_decay=weight_decay)
 
-    use_amp = device.type == "cuda" and dtype in {"fp16", "bf16"}
+    use_amp, amp_dtype = autocast_settings(device.type, dtype)
     scaler = torch.cuda.amp.GradScaler(enabled=(use_amp and dtype == "fp16"))
-    amp_dtype = get_amp_dtype(dtype)
 
     best_valid_f1 = -1.0
     best_state: dict[str, torch.Tensor] | None = None
+    epoch_throughput: list[dict[str, float]] = []
 
     for epoch in range(1, epochs + 1):
         model.train()
+        if train_sampler is not None:
+            train_sampler.set_epoch(epoch)
         running_loss = 0.0
         optimizer.zero_grad(set_to_none=True)
+        meter = ThroughputMeter()
 
         progress = tqdm(
             train_loader, desc=f"seed {seed} epoch {epoch}/{epochs}", leave=False
@@ -285,8 +266,11 @@ def train_one_seed(
                 optimizer.zero_grad(set_to_none=True)
 
             running_loss += float(loss.item())
+            meter.update(batch["attention_mask"])
             progress.set_postfix(loss=f"{loss.item():.4f}")
 
+        throughput = meter.summary()
+        epoch_throughput.append(throughput)
         valid_metrics, _ = evaluate_loader(
             model=model,
             loader=valid_loader,
@@ -298,7 +282,9 @@ def train_one_seed(
         valid_f1 = valid_metrics["metrics"]["scam"]["f1"]
         print(
             f"[seed={seed}] epoch={epoch} train_loss={running_loss / max(1, len(train_loader)):.4f} "
-            f"valid_scam_f1={valid_f1:.4f}"
+            f"valid_scam_f1={valid_f1:.4f} "
+            f"tokens_per_sec={throughput['tokens_per_sec']:.0f} "
+            f"padding_efficiency={throughput['padding_efficiency']:.3f}"
         )
         if valid_f1 > best_valid_f1:
             best_valid_f1 = valid_f1
@@ -352,6 +338,7 @@ def train_one_seed(
         "holdout_metrics": holdout_metrics,
         "valid_preds": valid_preds,
         "holdout_preds": holdout_preds,
+        "throughput": epoch_throughput,
     }
 
 
@@ -365,14 +352,13 @@ def evaluate_loader(
     topic_threshold: float,
 ) -> tuple[dict, list[dict]]:
     model.eval()
-    use_amp = device.type == "cuda" and dtype in {"fp16", "bf16"}
-    amp_dtype = get_amp_dtype(dtype)
+    use_amp, amp_dtype = autocast_settings(device.type, dtype)
 
     y_true: list[str] = []
     y_pred: list[str] = []
     pred_rows: list[dict] = []
 
-    with torch.no_grad():
+    with torch.inference_mode():
         for batch in loader:
             input_ids = batch["input_ids"].to(device)
             attention_mask = batch["attention_mask"].to(device)
@@ -517,14 +503,33 @@ def main() -> None:
     parser.add_argument("--topic-threshold", type=float, default=0.5)
     parser.add_argument("--gradient-checkpointing", action="store_true", default=True)
     parser.add_argument("--no-gradient-checkpointing", action="store_true")
+    parser.add_argument(
+        "--no-length-bucketing",
+        action="store_true",
+        help="Shuffle rows uniformly instead of batching rows of similar length",
+    )
+    parser.add_argument(
+        "--bucket-batches",
+        type=int,
+        default=50,
+        help="Batches per length bucket (larger = less padding, less randomness)",
+    )
+    parser.add_argument(
+        "--device",
+        choices=["cuda", "cpu", "auto"],
+        default="cuda",
+        help="Training/evaluation device. 'auto' picks CUDA when available.",
+    )
+    parser.add_argument("--threads", type=int, default=None, help="CPU threads")
     parser.add_argument(
         "--dtype",
         choices=["fp16", "bf16", "fp32"],
-        default="bf16"
-        if torch.cuda.is_available() and torch.cuda.is_bf16_supported()
-        else "fp16",
+        default=None,
+        help="Autocast dtype (CUDA default: bf16 if supported, else fp16; CPU default: fp32)",
     )
     args = parser.parse_args()
+    if args.bucket_batches < 1:
+        raise SystemExit("--bucket-batches must be >= 1")
 
     for path in (args.train, args.valid, args.holdout):
         if not path.exists():
@@ -549,6 +554,16 @@ def main() -> None:
             f"Teacher must be {DEFAULT_MODEL} for this pipeline; got {args.model_name}."
         )
 
+    device = resolve_device(
+        args.device, context="train_transformer_teacher.py", threads=args.threads
+    )
+    if args.dtype is None:
+        if device.type == "cuda":
+            args.dtype = "bf16" if torch.cuda.is_bf16_supported() else "fp16"
+        else:
+            args.dtype = "fp32"
+    autocast_settings(device.type, args.dtype)
+
     run_name = resolve_run_name(args.run_name)
     model_name_or_path = args.teacher_init_path or args.model_name
     out_dir = apply_run_name_template(args.output_dir, run_name)
@@ -594,6 +609,9 @@ def main() -> None:
             eval_batch_size=args.eval_batch_size,
             scam_threshold=args.scam_threshold,
             topic_threshold=args.topic_threshold,
+            device=device,
+            length_bucketing=not args.no_length_bucketing,
+            bucket_batches=args.bucket_batches,
         )
         per_seed_results.append(result)
 
@@ -626,6 +644,8 @@ def main() -> None:
         "dtype": args.dtype,
         "gradient_checkpointing": args.gradient_checkpointing
         and not args.no_gradient_checkpointing,
+        "length_bucketing": not args.no_length_bucketing,
+        "bucket_batches": args.bucket_batches,
         "thresholds": {
             "scam": args.scam_threshold,
             "topic_crypto": args.topic_threshold,
@@ -636,6 +656,7 @@ def main() -> None:
                 "seed_dir": item["seed_dir"],
                 "valid": item["valid_metrics"],
                 "holdout": item["holdout_metrics"],
+                "throughput": item["throughput"],
             }
             for item in per_seed_results
         ],
@@ -102,6 +102,41 @@ def require_cuda(*, context: str) -> "Any":
     return device
 
 
+def resolve_device(
+    requested: str, *, context: str, threads: int | None = None
+) -> "Any":
+    """Resolve a --device choice (cuda/cpu/auto) into a torch.device."""
+
+    if requested not in {"cuda", "cpu", "auto"}:
+        raise SystemExit(f"{context}: unsupported device '{requested}'")
+    import torch
+
+    if requested == "cuda" or (requested == "auto" and torch.cuda.is_available()):
+        return require_cuda(context=context)
+
+    if threads is not None:
+        if threads < 1:
+            raise SystemExit(f"{context}: --threads must be >= 1")
+        torch.set_num_threads(threads)
+    print(
+        f"{context}: using CPU (torch={torch.__version__}, threads={torch.get_num_threads()})"
+    )
+    return torch.device("cpu")
+
+
+def autocast_settings(device_type: str, dtype: str) -> tuple[bool, "Any"]:
+    """Return (enabled, amp_dtype) for torch.autocast on the given device."""
+
+    import torch
+
+    if dtype == "fp16" and device_type == "cpu":
+        raise SystemExit("fp16 autocast is not supported on CPU; use bf16 or fp32.")
+    amp_dtype = torch.float16 if dtype == "fp16" else torch.bfloat16
+    if device_type == "cuda":
+        return dtype in {"fp16", "bf16"}, amp_dtype
+    return dtype == "bf16", amp_dtype
+
+
 def clean_text(
     text: str | None,
     *,
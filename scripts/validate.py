@@ -11,10 +11,20 @@ Usage:
 import argparse
 import json
 import sys
+from collections.abc import Callable
 from pathlib import Path
 from typing import Any
 
+from dataset_checks import (
+    FileResult,
+    Issues,
+    Profile,
+    RecordCheck,
+    check_file,
+    check_files,
+)
 from labelset import load_v2026_labels_from_labels_md
+from schema_compiler import UnsupportedSchema, load_validator
 
 try:
     import jsonschema
@@ -97,38 +107,63 @@ def load_schema(schema_name: str) -> dict[str, Any]:
         return json.load(f)
 
 
+def compiled_validator(schema: dict[str, Any]) -> Callable[[Any], bool] | None:
+    """Fast validity predicate for ``schema``, or None if it can't be compiled."""
+    try:
+        return load_validator(schema)
+    except UnsupportedSchema:
+        return None
+
+
+class SchemaCheck(RecordCheck):
+    """Validates each record against the ``schema`` option.
+
+    Records accepted by the compiled predicate skip jsonschema; the rest are
+    re-validated by jsonschema so messages are unchanged. ``compiled=False``
+    disables the fast path.
+    """
+
+    def __init__(self, **options: Any) -> None:
+        super().__init__(**options)
+        self.validator = Draft202012Validator(options["schema"])
+        self.fast = (
+            compiled_validator(options["schema"])
+            if options.get("compiled", True)
+            else None
+        )
+
+    def visit(self, line_num: int, obj: Any, out: Issues) -> None:
+        if self.fast is not None and self.fast(obj):
+            return
+        for err in self.validator.iter_errors(obj):
+            path = ".".join(str(p) for p in err.absolute_path) or "(root)"
+            out.error(line_num, f"  Line {line_num}, {path}: {err.message}")
+
+
+def schema_profile(schema: dict[str, Any], *, compiled: bool = True) -> Profile:
+    return Profile(
+        checks=(SchemaCheck,),
+        invalid_json="  Line {line}: Invalid JSON - {error}",
+        empty_line=None,
+        options={"schema": schema, "compiled": compiled},
+    )
+
+
+def jsonl_counts(result: FileResult) -> tuple[int, int, list[str]]:
+    return result.valid, len(result.errors), result.errors
+
+
 def validate_jsonl(
-    file_path: Path, schema: dict[str, Any]
+    file_path: Path, schema: dict[str, Any], *, workers: int = 1, compiled: bool = True
 ) -> tuple[int, int, list[str]]:
     """Validate a JSONL file. Returns (valid_count, error_count, errors)."""
-    validator = Draft202012Validator(schema)
-    valid = 0
-    errors_list = []
+    profile = schema_profile(schema, compiled=compiled)
+    return jsonl_counts(check_file(file_path, profile, workers=workers))
 
-    with open(file_path) as f:
-        for line_num, line in enumerate(f, 1):
-            line = line.strip()
-            if not line:
-                continue
-
-            try:
-                record = json.loads(line)
-            except json.JSONDecodeError as e:
-                errors_list.append(f"  Line {line_num}: Invalid JSON - {e}")
-                continue
-
-            errs = list(validator.iter_errors(record))
-            if errs:
-                for err in errs:
-                    path = ".".join(str(p) for p in err.absolute_path) or "(root)"
-                    errors_list.append(f"  Line {line_num}, {path}: {err.message}")
-            else:
-                valid += 1
-
-    return valid, len(errors_list), errors_list
 
-
-def validate_json(file_path: Path, schema: dict[str, Any]) -> tuple[bool, list[str]]:
+def validate_json(
+    file_path: Path, schema: dict[str, Any], *, compiled: bool = True
+) -> tuple[bool, list[str]]:
     """Validate a single JSON file. Returns (is_valid, errors)."""
     validator = Draft202012Validator(schema)
 
@@ -138,6 +173,10 @@ def validate_json(file_path: Path, schema: dict[str, Any]) -> tuple[bool, list[s
         except json.JSONDecodeError as e:
             return False, [f"Invalid JSON: {e}"]
 
+    fast = compiled_validator(schema) if compiled else None
+    if fast is not None and fast(data):
+        return True, []
+
     errs = list(validator.iter_errors(data))
     if errs:
         errors_list = []
@@ -182,6 +221,17 @@ def main():
     parser.add_argument(
         "--check-schemas", action="store_true", help="Validate schema files"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Validate JSONL file chunks in parallel (one pass per file)",
+    )
+    parser.add_argument(
+        "--no-compile",
+        action="store_true",
+        help="Skip the compiled schema fast path (always use jsonschema)",
+    )
     args = parser.parse_args()
 
     if args.check_schemas:
@@ -222,6 +272,21 @@ def main():
         print(f"No .json or .jsonl files found in {path}")
         sys.exit(1)
 
+    # All JSONL files are parsed in one batch so their chunks share the pool.
+    jsonl_files = sorted(f for f in files if f.suffix == ".jsonl")
+    jsonl_results = dict(
+        zip(
+            jsonl_files,
+            check_files(
+                [
+                    (f, schema_profile(schema, compiled=not args.no_compile))
+                    for f in jsonl_files
+                ],
+                workers=args.workers,
+            ),
+        )
+    )
+
     for file_path in sorted(files):
         rel_path = (
             file_path.relative_to(REPO_ROOT)
@@ -230,7 +295,7 @@ def main():
         )
 
         if file_path.suffix == ".jsonl":
-            valid, err_count, errors = validate_jsonl(file_path, schema)
+            valid, err_count, errors = jsonl_counts(jsonl_results[file_path])
             total_valid += valid
             total_errors += err_count
             status = "✓" if err_count == 0 else "✗"
@@ -238,7 +303,9 @@ def main():
             if errors:
                 all_errors.extend([f"{rel_path}:"] + errors)
         else:
-            is_valid, errors = validate_json(file_path, schema)
+            is_valid, errors = validate_json(
+                file_path, schema, compiled=not args.no_compile
+            )
             if is_valid:
                 total_valid += 1
                 print(f"✓ {rel_path}")
@@ -8,9 +8,11 @@ Defaults to data/accounts.jsonl if no path given.
 Exit code 0 = valid, 1 = errors found.
 """
 
-import json
 import sys
 from pathlib import Path
+from typing import Any
+
+from dataset_checks import DuplicateKeyCheck, Issues, Profile, RecordCheck, check_file
 
 VALID_CATEGORIES = {
     "clean",
@@ -222,55 +224,53 @@ def validate_record(record: dict, line_num: int) -> list[str]:
     return errors
 
 
-def validate_file(path: Path) -> tuple[int, int, list[str]]:
-    """Validate a JSONL file. Returns (total, valid, errors)."""
-    all_errors = []
-    total = 0
-    valid = 0
-    handles_seen = set()
+class AccountRecordCheck(RecordCheck):
+    def visit(self, line_num: int, obj: Any, out: Issues) -> None:
+        if not isinstance(obj, dict):
+            out.error(line_num, f"line {line_num}: record must be a JSON object")
+            return
+        for error in validate_record(obj, line_num):
+            out.error(line_num, error)
 
-    if not path.exists():
-        return 0, 0, [f"File not found: {path}"]
 
-    if path.stat().st_size == 0:
-        print(f"  {path}: empty file (no records)")
-        return 0, 0, []
+class HandleCheck(DuplicateKeyCheck):
+    """Flags every repeat of a handle (case-insensitive) on its own line."""
 
-    with open(path) as f:
-        for line_num, line in enumerate(f, 1):
-            line = line.strip()
-            if not line:
-                continue
+    def key(self, obj: Any) -> Any:
+        if not isinstance(obj, dict):
+            return None
+        handle = obj.get("handle", "")
+        if not isinstance(handle, str) or not handle:
+            return None
+        return handle.lower()
 
-            total += 1
+    def detail(self, obj: Any) -> Any:
+        return obj.get("handle")
 
-            try:
-                record = json.loads(line)
-            except json.JSONDecodeError as e:
-                all_errors.append(f"line {line_num}: invalid JSON — {e}")
-                continue
+    @classmethod
+    def report(cls, key: Any, hits: list[tuple[int, Any]], out: Issues) -> None:
+        for line_num, handle in hits[1:]:
+            out.error(line_num, f"line {line_num} ({handle}): duplicate handle")
 
-            if not isinstance(record, dict):
-                all_errors.append(f"line {line_num}: record must be a JSON object")
-                continue
 
-            errors = validate_record(record, line_num)
+PROFILE = Profile(
+    checks=(AccountRecordCheck, HandleCheck),
+    invalid_json="line {line}: invalid JSON — {error}",
+    empty_line=None,
+)
 
-            # Check for duplicate handles
-            handle = record.get("handle", "").lower()
-            if handle:
-                if handle in handles_seen:
-                    errors.append(
-                        f"line {line_num} ({record.get('handle')}): duplicate handle"
-                    )
-                handles_seen.add(handle)
 
-            if errors:
-                all_errors.extend(errors)
-            else:
-                valid += 1
+def validate_file(path: Path, *, workers: int = 1) -> tuple[int, int, list[str]]:
+    """Validate a JSONL file. Returns (total, valid, errors)."""
+    if not path.exists():
+        return 0, 0, [f"File not found: {path}"]
+
+    if path.stat().st_size == 0:
+        print(f"  {path}: empty file (no records)")
+        return 0, 0, []
 
-    return total, valid, all_errors
+    result = check_file(path, PROFILE, workers=workers)
+    return result.total, result.valid, result.errors
 
 
 def main():
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Run every dataset check in one pass per file.
+
+Each file is parsed once. All checks registered for its kind run as visitors
+over that parse (dataset_checks.py):
+
+- sample:   check_integrity.py checks + labeled JSON schema (validate.py)
+- replies:  check_reply_integrity.py checks
+- accounts: validate_accounts.py checks
+- splits:   id collection for the pairwise overlap in check_split_leakage.py
+
+The chunks of all files share one process pool (``--workers``). Duplicate-id
+state is merged per file at the end. The standalone scripts use the same
+checks and keep their own output formats and exit codes.
+
+Exit codes:
+- 0: All checks passed
+- 1: Errors found (or warnings, with --strict)
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import check_integrity
+import check_reply_integrity
+import validate_accounts
+from dataset_checks import FileResult, Issues, Profile, RecordCheck, check_files
+from validate import SchemaCheck, build_labeled_sample_schema
+
+# Stdlib-only, like the checkers it runs: no transformer_common (numpy) or
+# check_split_leakage (near_dup) imports.
+DATA_DIR = Path(__file__).parent.parent / "data"
+SPLITS = ("train", "valid", "calib", "holdout")
+SPLIT_PAIRS = list(itertools.combinations(SPLITS, 2))  # as check_split_leakage.py
+
+
+def utc_now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def save_json(path: Path, payload: dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+
+
+class SplitIdCheck(RecordCheck):
+    """Collects non-null ids for the cross-split overlap check."""
+
+    def __init__(self, **options: Any) -> None:
+        super().__init__(**options)
+        self.ids: set[str] = set()
+
+    def visit(self, line_num: int, obj: Any, out: Issues) -> None:
+        value = obj.get("id") if isinstance(obj, dict) else None
+        if value is not None:
+            self.ids.add(str(value))
+
+    def partial(self) -> set[str]:
+        return self.ids
+
+    @classmethod
+    def finalize(cls, partials: list[Any], out: Issues, stats: dict[str, Any]) -> None:
+        stats["ids"] = set().union(*partials)
+
+
+def build_jobs(args: argparse.Namespace) -> list[tuple[str, Path, Profile]]:
+    sample_checks = check_integrity.PROFILE.checks
+    sample_options: dict[str, Any] = {}
+    if not args.no_schema:
+        sample_checks += (SchemaCheck,)
+        sample_options["schema"] = build_labeled_sample_schema()
+
+    jobs = [
+        (
+            "sample",
+            args.sample,
+            Profile(checks=sample_checks, options=sample_options),
+        ),
+        ("replies", args.replies, check_reply_integrity.PROFILE),
+        ("accounts", args.accounts, validate_accounts.PROFILE),
+    ]
+    for name in SPLITS:
+        path = getattr(args, name)
+        jobs.append((name, path, Profile(checks=(SplitIdCheck,), empty_line=None)))
+    return jobs
+
+
+def print_issues(kind: str, items: list[str], limit: int) -> None:
+    for item in items[:limit]:
+        print(f"    {item.strip()}")
+    if len(items) > limit:
+        print(f"    ... and {len(items) - limit} more {kind}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sample", type=Path, default=DATA_DIR / "sample.jsonl")
+    parser.add_argument("--replies", type=Path, default=DATA_DIR / "replies.jsonl")
+    parser.add_argument("--accounts", type=Path, default=DATA_DIR / "accounts.jsonl")
+    for name in SPLITS:
+        parser.add_argument(f"--{name}", type=Path, default=DATA_DIR / f"{name}.jsonl")
+    parser.add_argument(
+        "--no-schema", action="store_true", help="Skip the labeled JSON schema"
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk-mb", type=float, default=8.0)
+    parser.add_argument(
+        "--strict", action="store_true", help="Treat warnings as errors"
+    )
+    parser.add_argument("--max-issues", type=int, default=20)
+    parser.add_argument("--out", type=Path, default=None, help="JSON report path")
+    args = parser.parse_args()
+
+    jobs = []
+    skipped = []
+    for name, path, profile in build_jobs(args):
+        if path.exists():
+            jobs.append((name, path, profile))
+        else:
+            skipped.append(name)
+    if not jobs:
+        raise SystemExit("No dataset files found.")
+
+    results: dict[str, FileResult] = dict(
+        zip(
+            [name for name, _, _ in jobs],
+            check_files(
+                [(path, profile) for _, path, profile in jobs],
+                workers=args.workers,
+                chunk_mb=args.chunk_mb,
+            ),
+        )
+    )
+
+    failed = False
+    report: dict[str, Any] = {"created_at": utc_now_iso(), "files": {}}
+    for name, result in results.items():
+        bad = bool(result.errors) or (args.strict and bool(result.warnings))
+        failed |= bad
+        status = "✗" if bad else "✓"
+        print(
+            f"{status} {name:8s} {result.path}: {result.total} rows, "
+            f"{len(result.errors)} errors, {len(result.warnings)} warnings"
+        )
+        print_issues("errors", result.errors, args.max_issues)
+        if args.strict or not result.errors:
+            print_issues("warnings", result.warnings, args.max_issues)
+        report["files"][name] = {
+            "path": str(result.path),
+            "rows": result.total,
+            "valid": result.valid,
+            "errors": result.errors,
+            "warnings": result.warnings,
+        }
+    if skipped:
+        print(f"Skipped (not found): {', '.join(skipped)}")
+
+    split_ids = {name: results[name].stats["ids"] for name in SPLITS if name in results}
+    if len(split_ids) > 1:
+        overlaps = {
+            f"{left}_{right}": len(split_ids[left] & split_ids[right])
+            for left, right in SPLIT_PAIRS
+            if left in split_ids and right in split_ids
+        }
+        print("\nPairwise split overlaps:")
+        for key, count in overlaps.items():
+            print(f"  {key:16s}: {count}")
+        failed |= any(overlaps.values())
+        report["pairwise_overlaps"] = overlaps
+
+    report["ok"] = not failed
+    if args.out is not None:
+        save_json(args.out, report)
+        print(f"\nWrote report to {args.out}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()